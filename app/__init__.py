@@ -15,6 +15,30 @@ def create_app(config_name='development'):
     # Carrega configurações
     app.config.from_object(config.get(config_name, config['default']))
     
+    # Aplica o perfil de pool de conexões
+    from app.database import opcoes_engine, instrumentar_pool, configurar_replica, configurar_sqlite
+    from app.database.sqlite import pragmas_da_config, criar_fts, iniciar_manutencao_periodica
+    
+    opcoes_pool = opcoes_engine(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        app.config.get('DB_POOL_PROFILE', 'padrao'),
+        env=os.environ,
+        medir_espera=app.config.get('DB_POOL_METRICS', False)
+    )
+    if opcoes_pool:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_pool
+    
+    # Réplica de leitura como bind separado (nenhum modelo é associado a ela)
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = {
+            'url': replica_url,
+            **opcoes_engine(replica_url, app.config.get('DB_POOL_PROFILE', 'padrao'), env=os.environ,
+                            medir_espera=False)
+        }
+        app.config['SQLALCHEMY_BINDS'] = binds
+    
     # Inicializa extensões
     from app.extensions import db, login_manager, migrate
     
@@ -22,24 +46,101 @@ def create_app(config_name='development'):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
+    with app.app_context():
+        for engine in db.engines.values():
+            configurar_sqlite(engine, pragmas_da_config(app.config))
+        if app.config.get('DB_POOL_METRICS'):
+            app.extensions['i9_pool'] = instrumentar_pool(db.engine)
+    
+    configurar_replica(app, db)
+    
+    # Fingerprints de SQL por endpoint, SQL lento e detecção de N+1
+    from app.database import configurar_metricas_sql
+    configurar_metricas_sql(app, db)
+    
+    # Conexões mTLS com os DETRANs (pools por filial), provedores e fontes do relatório
+    from app.conectores import (
+        configurar_detran, configurar_provedores, configurar_relatorio, configurar_retentativas
+    )
+    configurar_detran(app)
+    configurar_retentativas(app)
+    configurar_provedores(app)
+    configurar_relatorio(app)
+    
+    # Último login e histórico de logins gravados em lote
+    from app.database.atividade import configurar_registro_logins
+    configurar_registro_logins(app)
+    
+    # Coordenação entre instâncias: advisory locks e LISTEN/NOTIFY (PostgreSQL) ou memória
+    from app.coordenacao import configurar_coordenacao
+    configurar_coordenacao(app)
+    
+    # Monitoramento de frota: placas reconsultadas em segundo plano, com alertas
+    from app.monitoramento import configurar_monitoramento
+    configurar_monitoramento(app)
+    
+    # Pré-aquecimento do cache: placas de provável nova consulta renovadas fora do expediente
+    from app.preaquecimento import configurar_preaquecimento
+    configurar_preaquecimento(app)
+    
+    # Fila de tarefas no banco (consultas em lote, exportações, verificações, certificados)
+    from app.tarefas import configurar_tarefas
+    configurar_tarefas(app)
+    
     # Importa modelos (necessário para migrations)
-    from app.models import Usuario, Filial, UsuarioFilial, Auditoria
+    from app.models import (
+        Usuario, Filial, UsuarioFilial, Auditoria, SnapshotVeiculo, VersaoDados, HistoricoLogin,
+        ChaveIdempotencia, VeiculoMonitorado, AlertaVeiculo, Tarefa
+    )
     
     # User loader para Flask-Login
+    from app.rastreamento import span
+    
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(int(user_id))
+        with span('sessao.carregar_usuario'):
+            return Usuario.query.get(int(user_id))
     
     # Registra Blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
     from app.routes.admin import admin_bp
     from app.routes.consulta import consulta_bp
+    from app.routes.monitoramento import monitoramento_bp
+    from app.routes.tarefas import tarefas_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(consulta_bp, url_prefix='/api')
+    app.register_blueprint(monitoramento_bp, url_prefix='/api/monitoramento')
+    app.register_blueprint(tarefas_bp, url_prefix='/api/tarefas')
+    
+    # Cache de bytecode/fragmentos e tempo de renderização dos templates
+    from app.renderizacao import configurar_renderizacao
+    configurar_renderizacao(app)
+    
+    # Traces por requisição (trace id nos logs e auditorias) e exportação OTLP
+    from app.rastreamento import configurar_rastreamento
+    configurar_rastreamento(app)
+    
+    # Captura de requisições lentas, amostrador de pilhas e cProfile sob demanda
+    from app.perfilamento import configurar_perfilamento
+    configurar_perfilamento(app)
+    
+    # Estáticos versionados (static_url) e cache imutável de static/dist
+    from app.assets import configurar_assets
+    configurar_assets(app)
+    
+    # JSON com orjson (se instalado), compressão, ETag e Cache-Control das respostas
+    from app.serializacao import configurar_json
+    configurar_json(app)
+    from app.compressao import configurar_respostas
+    configurar_respostas(app)
+    
+    # Comandos CLI (flask i9 ...)
+    from app.cli import i9_cli
+    app.cli.add_command(i9_cli)
     
     # Cria diretório de certificados
     cert_folder = app.config.get('UPLOAD_FOLDER')
@@ -50,6 +151,11 @@ def create_app(config_name='development'):
     with app.app_context():
         db.create_all()
         
+        # Índice FTS5 de placas (apenas SQLite)
+        app.extensions['i9_fts'] = criar_fts(db.engine)
+        if not app.testing:
+            iniciar_manutencao_periodica(db.engine, app.config.get('SQLITE_MANUTENCAO_HORAS'))
+        
         # Cria admin padrão se não existir
         _criar_admin_padrao(db, Usuario)
     
@@ -58,19 +164,20 @@ def create_app(config_name='development'):
 
 def _criar_admin_padrao(db, Usuario):
     """Cria usuário admin padrão e filial de teste se não existirem."""
-    from werkzeug.security import generate_password_hash
-    from app.models import Filial
+    from app.senhas import gerar_hash
+    from app.models import Filial, VersaoDados
     
     # Cria admin se não existir
     if Usuario.query.filter_by(role='admin').first() is None:
         admin = Usuario(
             nome='Administrador',
             email='admin@i9sistema.com',
-            senha_hash=generate_password_hash('admin123'),
+            senha_hash=gerar_hash('admin123'),
             role='admin',
             ativo=True
         )
         db.session.add(admin)
+        VersaoDados.incrementar('usuarios')
         db.session.commit()
         print("✅ Usuário admin criado: admin@i9sistema.com / admin123")
     
@@ -85,5 +192,6 @@ def _criar_admin_padrao(db, Usuario):
             ativa=True
         )
         db.session.add(filial)
+        VersaoDados.incrementar('filiais')
         db.session.commit()
         print("✅ Filial Bexp Morumbi criada (configure CERT_FILIAL_1_PASS no .env)")
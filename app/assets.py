@@ -0,0 +1,150 @@
+"""
+Sistema I9 - Pipeline de Arquivos Estáticos
+
+O CSS é gerado pelo Tailwind (apenas as classes usadas em templates e
+scripts, minificado) e todos os estáticos são copiados para static/dist com
+o hash do conteúdo no nome. Os templates usam static_url('js/dashboard.js'),
+que resolve o nome versionado pelo manifest.json; esses arquivos nunca mudam
+e são servidos com cache imutável de um ano.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+from flask import current_app, request, url_for
+
+PASTA_DIST = 'dist'
+PASTA_FONTES = 'src'
+MANIFESTO = 'manifest.json'
+CSS_ENTRADA = os.path.join(PASTA_FONTES, 'app.css')
+CSS_SAIDA = 'css/app.css'
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def _comando_tailwind(binario):
+    """Localiza o Tailwind: binário configurado/standalone ou npx."""
+    if binario and shutil.which(binario):
+        return [shutil.which(binario)]
+    if shutil.which('npx'):
+        return ['npx', '--yes', 'tailwindcss@3']
+    raise RuntimeError(
+        'Tailwind não encontrado: instale o binário standalone e defina TAILWIND_BIN, '
+        'ou instale o Node.js (npx)'
+    )
+
+
+def compilar_css(static_folder, raiz, binario=None):
+    """Gera o CSS purgado e minificado a partir de static/src/app.css."""
+    saida = os.path.join(static_folder, CSS_SAIDA)
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    subprocess.run(
+        _comando_tailwind(binario) + [
+            '-c', os.path.join(raiz, 'tailwind.config.js'),
+            '-i', os.path.join(static_folder, CSS_ENTRADA),
+            '-o', saida,
+            '--minify',
+        ],
+        cwd=raiz, check=True
+    )
+    return saida
+
+
+def _nome_versionado(relativo, conteudo):
+    base, extensao = os.path.splitext(relativo)
+    return f'{base}.{hashlib.sha256(conteudo).hexdigest()[:10]}{extensao}'
+
+
+def versionar_estaticos(static_folder):
+    """Copia os estáticos para dist/ com hash no nome e grava o manifest."""
+    destino = os.path.join(static_folder, PASTA_DIST)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino)
+
+    manifesto = {}
+    for pasta, subpastas, arquivos in os.walk(static_folder):
+        relativa = os.path.relpath(pasta, static_folder)
+        if relativa.split(os.sep)[0] in (PASTA_DIST, PASTA_FONTES):
+            subpastas[:] = []
+            continue
+        for nome in sorted(arquivos):
+            relativo = os.path.normpath(os.path.join(relativa, nome)).replace(os.sep, '/')
+            with open(os.path.join(pasta, nome), 'rb') as f:
+                conteudo = f.read()
+            versionado = _nome_versionado(relativo, conteudo)
+            caminho = os.path.join(destino, versionado)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, 'wb') as f:
+                f.write(conteudo)
+            manifesto[relativo] = f'{PASTA_DIST}/{versionado}'
+
+    with open(os.path.join(destino, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    return manifesto
+
+
+def construir_assets(app, compilar=True, log=print):
+    """Executa o build completo: CSS do Tailwind e versionamento."""
+    raiz = os.path.dirname(app.root_path)
+    if compilar:
+        saida = compilar_css(app.static_folder, raiz, app.config.get('TAILWIND_BIN'))
+        log(f'🎨 CSS gerado: {os.path.relpath(saida, raiz)} ({os.path.getsize(saida)} bytes)')
+    manifesto = versionar_estaticos(app.static_folder)
+    log(f'📦 {len(manifesto)} arquivo(s) versionado(s) em static/{PASTA_DIST}')
+    app.extensions['i9_assets'] = manifesto
+    return manifesto
+
+
+# ============================================================================
+# RUNTIME
+# ============================================================================
+
+def carregar_manifesto(static_folder):
+    """Lê static/dist/manifest.json (vazio se o build não foi executado)."""
+    try:
+        with open(os.path.join(static_folder, PASTA_DIST, MANIFESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _manifesto():
+    if current_app.debug:
+        # Em desenvolvimento um novo build é visto sem reiniciar o servidor
+        return carregar_manifesto(current_app.static_folder)
+    return current_app.extensions.get('i9_assets', {})
+
+
+def static_url(filename):
+    """URL versionada do arquivo estático (sem build, a URL comum do Flask)."""
+    return url_for('static', filename=_manifesto().get(filename, filename))
+
+
+def asset_compilado(filename):
+    """Indica se o arquivo foi gerado pelo build (ex.: o CSS do Tailwind)."""
+    return filename in _manifesto()
+
+
+def configurar_assets(app):
+    """Registra static_url nos templates e o cache imutável de static/dist."""
+    app.extensions['i9_assets'] = carregar_manifesto(app.static_folder)
+    if not app.extensions['i9_assets']:
+        app.logger.warning('Estáticos sem build: execute "flask i9 build-assets" '
+                           '(até lá o Tailwind é carregado do CDN)')
+
+    app.add_template_global(static_url)
+    app.add_template_global(asset_compilado)
+
+    @app.after_request
+    def _cache_estaticos(resp):
+        filename = (request.view_args or {}).get('filename', '')
+        if request.endpoint == 'static' and resp.status_code in (200, 304) \
+                and filename.startswith(PASTA_DIST + '/') and not filename.endswith(MANIFESTO):
+            resp.headers['Cache-Control'] = CACHE_IMUTAVEL
+        return resp
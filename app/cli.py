@@ -0,0 +1,188 @@
+"""
+Sistema I9 - Comandos de Linha de Comando (flask i9 ...)
+"""
+
+import click
+from flask.cli import AppGroup
+
+i9_cli = AppGroup('i9', help='Comandos administrativos do Sistema I9.')
+
+
+@i9_cli.command('importar-legado')
+@click.argument('caminho', default='sistema_i9.db', type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', default=1000, show_default=True, help='Linhas por lote de INSERT.')
+@click.option('--usuario-padrao', type=int, help='ID do usuário para nomes não encontrados.')
+@click.option('--filial-padrao', type=int, help='ID da filial para nomes não encontrados.')
+@click.option('--manter-tabela', is_flag=True, help='Não renomeia a tabela legada após importar.')
+def importar_legado(caminho, lote, usuario_padrao, filial_padrao, manter_tabela):
+    """Importa o historico_consultas do app.py legado para auditorias."""
+    from app.database.legado import importar_historico_legado
+
+    totais = importar_historico_legado(
+        caminho,
+        tamanho_lote=lote,
+        usuario_padrao_id=usuario_padrao,
+        filial_padrao_id=filial_padrao,
+        renomear=not manter_tabela,
+        log=click.echo
+    )
+    click.echo(f"✅ {totais['importados']} importados, {totais['ignorados']} já existentes "
+               f"({totais['lidos']} lidos)")
+
+
+@i9_cli.command('atualizar-esquema')
+def atualizar_esquema():
+    """Cria as colunas e índices novos dos modelos em tabelas existentes (uma vez por deploy)."""
+    from app.extensions import db
+    from app.database.esquema import atualizar_esquema as executar
+
+    db.create_all()
+    criados = executar(db.engine, db.metadata)
+    if criados:
+        click.echo('✅ Esquema atualizado: ' + ', '.join(criados))
+    else:
+        click.echo('✅ Esquema já atualizado.')
+
+
+@i9_cli.command('manutencao-sqlite')
+@click.option('--sem-vacuum', is_flag=True, help='Executa apenas ANALYZE/optimize e checkpoint.')
+def manutencao_sqlite(sem_vacuum):
+    """Executa VACUUM/ANALYZE no banco SQLite (para agendar via cron)."""
+    from app.extensions import db
+    from app.database.sqlite import manutencao_sqlite as executar
+
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Banco atual não é SQLite; nada a fazer.')
+        return
+    tempos = executar(db.engine, vacuum=not sem_vacuum)
+    click.echo('✅ Manutenção concluída: ' + ', '.join(f'{k} {v}s' for k, v in tempos.items()))
+
+
+@i9_cli.command('limpar-idempotencia')
+def limpar_idempotencia():
+    """Remove as chaves de idempotência vencidas (para agendar via cron)."""
+    from app.models import ChaveIdempotencia
+
+    click.echo(f'✅ {ChaveIdempotencia.limpar_expiradas()} chave(s) vencida(s) removida(s)')
+
+
+@i9_cli.command('build-assets')
+@click.option('--sem-css', is_flag=True, help='Apenas versiona os estáticos, sem rodar o Tailwind.')
+def build_assets(sem_css):
+    """Gera o CSS do Tailwind e os estáticos versionados em static/dist."""
+    import subprocess
+    from flask import current_app
+    from app.assets import construir_assets
+
+    try:
+        construir_assets(current_app, compilar=not sem_css, log=click.echo)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        raise click.ClickException(str(e))
+    click.echo('✅ Build concluído')
+
+
+@i9_cli.command('compilar-templates')
+def compilar_templates():
+    """Pré-compila os templates no cache de bytecode (TEMPLATE_CACHE_DIR)."""
+    from flask import current_app
+    from app.renderizacao import compilar_templates as compilar
+
+    if not current_app.jinja_env.bytecode_cache:
+        raise click.ClickException('TEMPLATE_CACHE_DIR não configurado')
+    click.echo(f'✅ {compilar(current_app)} template(s) compilado(s)')
+
+
+@i9_cli.command('monitorar')
+@click.option('--limite', type=int, help='Máximo de placas neste ciclo (padrão: MONITOR_LOTE).')
+@click.option('--ignorar-janela', is_flag=True, help='Verifica mesmo fora de MONITOR_JANELA.')
+def monitorar(limite, ignorar_janela):
+    """Verifica as placas monitoradas vencidas (para agendar via cron)."""
+    from flask import current_app
+
+    totais = current_app.extensions['i9_monitor'].executar_ciclo(limite=limite, ignorar_janela=ignorar_janela)
+    click.echo(f"✅ {totais['verificados']} verificada(s), {totais['alertas']} alerta(s), "
+               f"{totais['erros']} erro(s)")
+
+
+@i9_cli.command('preaquecer')
+@click.option('--orcamento', type=int, help='Consultas em 24 horas (padrão: PREAQUECIMENTO_ORCAMENTO).')
+@click.option('--ignorar-janela', is_flag=True, help='Executa mesmo fora de MONITOR_JANELA.')
+@click.option('--simular', is_flag=True, help='Apenas lista as placas que seriam consultadas.')
+def preaquecer(orcamento, ignorar_janela, simular):
+    """Renova os snapshots das placas de provável nova consulta (para agendar via cron)."""
+    from flask import current_app
+
+    preaquecedor = current_app.extensions['i9_preaquecimento']
+    orcamento = preaquecedor.orcamento if orcamento is None else orcamento
+    if simular:
+        candidatos = preaquecedor.candidatos(max(orcamento - preaquecedor.gastos(), 0))
+        for c in candidatos:
+            click.echo(f"{c['placa']}  {c['consultas']} consulta(s), última {c['ultima_consulta']}  "
+                       f"pontos {c['pontos']}")
+        click.echo(f'{len(candidatos)} placa(s) dentro do orçamento')
+        return
+    totais = preaquecedor.executar_ciclo(orcamento=orcamento, ignorar_janela=ignorar_janela)
+    click.echo(f"✅ {totais['atualizadas']} renovada(s), {totais['erros']} erro(s), "
+               f"orçamento restante {totais['restante']}")
+
+
+@i9_cli.command('worker')
+@click.option('--concorrencia', '-c', default=4, show_default=True, help='Tarefas executadas em paralelo.')
+@click.option('--ate-esvaziar', is_flag=True, help='Encerra quando não houver tarefa pronta (cron).')
+def worker(concorrencia, ate_esvaziar):
+    """Executa as tarefas da fila (processo dedicado; Ctrl+C encerra após as tarefas em andamento)."""
+    import signal
+    import time
+    from flask import current_app
+
+    trabalhador = current_app.extensions['i9_tarefas']
+    if ate_esvaziar:
+        total = 0
+        while trabalhador.executar_proxima():
+            total += 1
+        click.echo(f'✅ {total} tarefa(s) executada(s)')
+        return
+
+    # Sem requisições neste processo: a escuta dos avisos (i9_tarefas) sobe aqui
+    current_app.extensions['i9_coordenacao'].iniciar()
+    signal.signal(signal.SIGTERM, lambda *_: trabalhador.parar())
+    trabalhador.iniciar(concorrencia)
+    click.echo(f'Worker {trabalhador.nome} com {concorrencia} thread(s); Ctrl+C encerra')
+    try:
+        while trabalhador.ativo():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    click.echo('Encerrando após as tarefas em andamento...')
+    trabalhador.parar(aguardar_s=trabalhador.reserva_s)
+    click.echo(f'✅ {trabalhador.executadas} tarefa(s) executada(s)')
+
+
+@i9_cli.command('enfileirar')
+@click.argument('tipo')
+@click.option('--parametros', default='{}', help='Parâmetros da tarefa em JSON.')
+@click.option('--prioridade', type=int, help='Maior sai antes (padrão: a do tipo).')
+@click.option('--em', 'executar_em', help='Horário local de execução (AAAA-MM-DD HH:MM; padrão: agora).')
+def enfileirar_tarefa(tipo, parametros, prioridade, executar_em):
+    """Enfileira uma tarefa (agendamentos via cron, ex.: validar_certificado)."""
+    import json
+    from datetime import datetime, timezone
+    from app.tarefas import enfileirar
+
+    try:
+        parametros = json.loads(parametros)
+        if executar_em:
+            executar_em = datetime.fromisoformat(executar_em).astimezone(timezone.utc).replace(tzinfo=None)
+        tarefa = enfileirar(tipo, parametros, prioridade=prioridade, executar_em=executar_em)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'✅ Tarefa #{tarefa.id} ({tipo}) para {tarefa.executar_em:%Y-%m-%d %H:%M} UTC')
+
+
+@i9_cli.command('limpar-tarefas')
+@click.option('--dias', default=7, show_default=True, help='Idade mínima das tarefas finalizadas removidas.')
+def limpar_tarefas(dias):
+    """Remove tarefas concluídas ou que falharam há mais de N dias (para agendar via cron)."""
+    from app.models import Tarefa
+
+    click.echo(f'✅ {Tarefa.limpar(dias)} tarefa(s) removida(s)')
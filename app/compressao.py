@@ -0,0 +1,97 @@
+"""
+Sistema I9 - Compressão, ETag e Cache-Control das Respostas
+"""
+
+import gzip
+import hashlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Brotli é opcional; sem ele só gzip é oferecido
+    brotli = None
+
+# Tipos de conteúdo que valem a pena comprimir
+TIPOS_COMPRIMIVEIS = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+# Cache-Control e ETag por endpoint. Endpoints ausentes usam REGRA_PADRAO.
+REGRA_PADRAO = {'cache_control': 'private, no-cache', 'etag': False}
+REGRAS_CACHE = {
+    # Listas JSON/CSV: revalidação barata via ETag forte
+    'admin.auditoria_json': {'cache_control': 'private, no-cache', 'etag': True},
+    'admin.auditoria_excel': {'cache_control': 'private, no-cache', 'etag': True},
+    'admin.pool_json': {'cache_control': 'no-store', 'etag': False},
+    'admin.templates_json': {'cache_control': 'no-store', 'etag': False},
+    'admin.detran_json': {'cache_control': 'no-store', 'etag': False},
+    'consulta.historico': {'cache_control': 'private, no-cache', 'etag': True},
+    # Operações e dados de veículo nunca devem ficar em cache
+    'consulta.consultar': {'cache_control': 'no-store', 'etag': False},
+    'consulta.consultar_stream': {'cache_control': 'no-store', 'etag': False},
+    'consulta.conectar_filial': {'cache_control': 'no-store', 'etag': False},
+    'consulta.desconectar_filial': {'cache_control': 'no-store', 'etag': False},
+    'consulta.desde_ultima_consulta': {'cache_control': 'no-store', 'etag': False},
+    'auth.login': {'cache_control': 'no-store', 'etag': False},
+}
+
+
+def _escolher_codificacao(algoritmos):
+    """Escolhe a codificação aceita pelo cliente, na ordem de preferência."""
+    for algoritmo in algoritmos:
+        if algoritmo == 'br' and brotli is None:
+            continue
+        if request.accept_encodings[algoritmo] > 0:
+            return algoritmo
+    return None
+
+
+def _comprimir(dados, algoritmo, nivel):
+    if algoritmo == 'br':
+        return brotli.compress(dados, quality=min(nivel, 11))
+    return gzip.compress(dados, compresslevel=min(nivel, 9), mtime=0)
+
+
+def configurar_respostas(app):
+    """Registra o after_request de ETag, Cache-Control e compressão."""
+    tamanho_minimo = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    nivel = app.config.get('COMPRESS_LEVEL', 6)
+    algoritmos = [a.strip() for a in app.config.get('COMPRESS_ALGORITMOS', 'br,gzip').split(',') if a.strip()]
+
+    @app.after_request
+    def _ajustar_resposta(resp):
+        regra = REGRAS_CACHE.get(request.endpoint, REGRA_PADRAO)
+        if request.endpoint == 'static':
+            return resp
+        resp.headers.setdefault('Cache-Control', regra['cache_control'])
+
+        if resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed:
+            return resp
+
+        # ETag forte da representação não comprimida
+        if regra['etag'] and request.method in ('GET', 'HEAD') and not resp.get_etag()[0]:
+            resp.set_etag(hashlib.sha1(resp.get_data()).hexdigest())
+        etag, _ = resp.get_etag()
+        if etag and request.if_none_match.contains_weak(etag):
+            resp.status_code = 304
+            resp.set_data(b'')
+            return resp
+
+        if 'Content-Encoding' in resp.headers or resp.mimetype not in TIPOS_COMPRIMIVEIS:
+            return resp
+        resp.vary.add('Accept-Encoding')
+        if resp.content_length is not None and resp.content_length < tamanho_minimo:
+            return resp
+
+        algoritmo = _escolher_codificacao(algoritmos)
+        if algoritmo is None:
+            return resp
+
+        resp.set_data(_comprimir(resp.get_data(), algoritmo, nivel))
+        resp.headers['Content-Encoding'] = algoritmo
+        # A representação comprimida não é idêntica byte a byte: ETag passa a fraca
+        if etag:
+            resp.set_etag(etag, weak=True)
+        return resp
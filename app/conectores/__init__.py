@@ -0,0 +1,15 @@
+"""
+Sistema I9 - Conectores com Serviços Externos
+"""
+
+from app.conectores.detran import ConectorDetran, ErroCertificado, ErroDetran, configurar_detran
+from app.conectores.provedores import (
+    Consulta, ErroProvedor, Provedor, RoteadorProvedores, configurar_provedores
+)
+from app.conectores.relatorio import Fonte, MotorRelatorio, Relatorio, configurar_relatorio
+from app.conectores.retentativas import PoliticaRetentativa, configurar_retentativas
+
+__all__ = ['ConectorDetran', 'ErroCertificado', 'ErroDetran', 'configurar_detran',
+           'Consulta', 'ErroProvedor', 'Provedor', 'RoteadorProvedores', 'configurar_provedores',
+           'Fonte', 'MotorRelatorio', 'Relatorio', 'configurar_relatorio',
+           'PoliticaRetentativa', 'configurar_retentativas']
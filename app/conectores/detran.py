@@ -0,0 +1,358 @@
+"""
+Sistema I9 - Conector mTLS com os DETRANs
+
+Cada filial autentica com o próprio certificado A1 (PKCS#12). O SSLContext é
+montado uma única vez por certificado (e refeito se o arquivo mudar), e cada
+filial mantém um pool de conexões HTTPS persistentes com o DETRAN da sua UF,
+de modo que o handshake TLS mútuo só acontece ao abrir novas conexões.
+
+Os endpoints vêm de DETRAN_ENDPOINTS ("SP=https://host/api,RJ=https://...").
+UFs sem endpoint continuam no modo Infosimples, em que o certificado é
+enviado junto com cada consulta.
+"""
+
+import logging
+import os
+import secrets
+import ssl
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import urllib3
+from urllib3.connection import HTTPSConnection
+
+from app.rastreamento import span, traceparent_atual
+
+logger = logging.getLogger(__name__)
+
+
+class ErroCertificado(Exception):
+    """Certificado da filial ausente, ilegível, com senha errada ou vencido."""
+
+
+class ErroDetran(Exception):
+    """Falha de comunicação com o DETRAN (`timeout` indica estouro de tempo)."""
+
+    def __init__(self, mensagem, timeout=False):
+        super().__init__(mensagem)
+        self.timeout = timeout
+
+
+# ============================================================================
+# CERTIFICADOS
+# ============================================================================
+
+def parse_endpoints(valor):
+    """Converte "SP=https://a,RJ=https://b" em {'SP': 'https://a', ...}."""
+    endpoints = {}
+    for item in (valor or '').split(','):
+        if '=' in item:
+            uf, url = item.split('=', 1)
+            endpoints[uf.strip().upper()] = url.strip().rstrip('/')
+    return endpoints
+
+
+def criar_contexto_pkcs12(caminho, senha, ca_bundle=None):
+    """
+    Monta o SSLContext cliente a partir de um arquivo .pfx/.p12.
+
+    O ssl da biblioteca padrão só lê certificados de arquivos PEM, então a
+    chave é regravada num arquivo temporário cifrado com uma senha aleatória
+    e removido logo após o carregamento. Retorna (contexto, validade).
+    """
+    try:
+        from cryptography.hazmat.primitives.serialization import (
+            BestAvailableEncryption, Encoding, PrivateFormat, pkcs12
+        )
+    except ImportError:
+        raise ErroCertificado('Pacote "cryptography" não instalado (necessário para certificados A1)')
+
+    try:
+        with open(caminho, 'rb') as f:
+            chave, certificado, cadeia = pkcs12.load_key_and_certificates(
+                f.read(), senha.encode('utf-8') if senha else None
+            )
+    except FileNotFoundError:
+        raise ErroCertificado(f'Certificado não encontrado: {caminho}')
+    except ValueError:
+        raise ErroCertificado('Senha do certificado inválida ou arquivo corrompido')
+
+    if chave is None or certificado is None:
+        raise ErroCertificado('O arquivo PKCS#12 não contém chave privada e certificado')
+
+    validade = certificado.not_valid_after_utc.replace(tzinfo=None)
+    if validade < datetime.utcnow():
+        raise ErroCertificado(f'Certificado vencido em {validade:%d/%m/%Y}')
+
+    contexto = ssl.create_default_context(cafile=ca_bundle or None)
+    contexto.minimum_version = ssl.TLSVersion.TLSv1_2
+
+    senha_temporaria = secrets.token_bytes(32)
+    pem = certificado.public_bytes(Encoding.PEM)
+    pem += b''.join(c.public_bytes(Encoding.PEM) for c in cadeia or [])
+    pem += chave.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, BestAvailableEncryption(senha_temporaria))
+
+    descritor, temporario = tempfile.mkstemp(prefix='i9_cert_', suffix='.pem')
+    try:
+        with os.fdopen(descritor, 'wb') as f:
+            f.write(pem)
+        contexto.load_cert_chain(temporario, password=senha_temporaria)
+    finally:
+        os.remove(temporario)
+
+    return contexto, validade
+
+
+# ============================================================================
+# MÉTRICAS
+# ============================================================================
+
+class MetricasFilial:
+    """Handshakes, requisições e última verificação de saúde de uma filial."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.handshakes = 0
+        self.handshake_total_ms = 0.0
+        self.handshake_max_ms = 0.0
+        self.ultimo_handshake_ms = None
+        self.requisicoes = 0
+        self.erros = 0
+        self.saude = None
+
+    def registrar_handshake(self, ms):
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_total_ms += ms
+            self.handshake_max_ms = max(self.handshake_max_ms, ms)
+            self.ultimo_handshake_ms = ms
+
+    def registrar_requisicao(self, erro=False):
+        with self._lock:
+            self.requisicoes += 1
+            if erro:
+                self.erros += 1
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'handshakes': self.handshakes,
+                'handshake_medio_ms': round(self.handshake_total_ms / self.handshakes, 2) if self.handshakes else None,
+                'handshake_max_ms': round(self.handshake_max_ms, 2),
+                'requisicoes': self.requisicoes,
+                'reuso_conexoes': round(1 - self.handshakes / self.requisicoes, 3) if self.requisicoes else None,
+                'erros': self.erros,
+                'saude': self.saude
+            }
+
+
+def _classe_conexao(metricas):
+    """HTTPSConnection que mede o tempo de conexão TCP + handshake TLS."""
+    class ConexaoMedida(HTTPSConnection):
+        def connect(self):
+            inicio = time.perf_counter()
+            super().connect()
+            metricas.registrar_handshake((time.perf_counter() - inicio) * 1000)
+    return ConexaoMedida
+
+
+# ============================================================================
+# CONECTOR
+# ============================================================================
+
+class _PoolFilial:
+    def __init__(self, pool, base, assinatura, metricas, validade):
+        self.pool = pool
+        self.base = base
+        self.assinatura = assinatura
+        self.metricas = metricas
+        self.validade = validade
+
+
+class ConectorDetran:
+    """Pools mTLS por filial, com verificação de saúde em segundo plano."""
+
+    def __init__(self, endpoints, ca_bundle=None, tamanho_pool=4, timeout=15.0,
+                 timeout_conexao=5.0, caminho_saude='/health', intervalo_saude=60.0):
+        self.endpoints = endpoints
+        self.ca_bundle = ca_bundle
+        self.tamanho_pool = tamanho_pool
+        self.timeout = urllib3.Timeout(connect=timeout_conexao, read=timeout)
+        self.caminho_saude = caminho_saude
+        self.intervalo_saude = intervalo_saude
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._parar = threading.Event()
+
+    def endpoint(self, uf):
+        return self.endpoints.get((uf or '').upper())
+
+    def _assinatura(self, filial, url):
+        try:
+            mtime = os.path.getmtime(filial.cert_path)
+        except (OSError, TypeError):
+            mtime = None
+        return (filial.cert_path, mtime, url)
+
+    def _pool(self, filial):
+        """Retorna o pool da filial, criando-o (e o SSLContext) na primeira vez."""
+        url = self.endpoint(filial.uf)
+        if not url:
+            raise ErroDetran(f'Nenhum endpoint DETRAN configurado para {filial.uf}')
+        assinatura = self._assinatura(filial, url)
+
+        with self._lock:
+            atual = self._pools.get(filial.id)
+            if atual is not None and atual.assinatura == assinatura:
+                return atual
+
+            if not filial.cert_path:
+                raise ErroCertificado('Filial sem certificado configurado')
+            with span('certificado.pkcs12', filial_id=filial.id):
+                contexto, validade = criar_contexto_pkcs12(filial.cert_path, filial.get_cert_senha(),
+                                                           self.ca_bundle)
+
+            partes = urlsplit(url)
+            metricas = atual.metricas if atual is not None else MetricasFilial()
+            pool = urllib3.HTTPSConnectionPool(
+                partes.hostname, port=partes.port or 443,
+                ssl_context=contexto,
+                maxsize=self.tamanho_pool, block=True,
+                timeout=self.timeout, retries=False
+            )
+            pool.ConnectionCls = _classe_conexao(metricas)
+
+            if atual is not None:
+                atual.pool.close()  # certificado ou endpoint mudou
+            novo = _PoolFilial(pool, partes.path, assinatura, metricas, validade)
+            self._pools[filial.id] = novo
+
+        self._iniciar_saude()
+        return novo
+
+    def requisitar(self, filial, metodo, caminho, **kwargs):
+        """Executa uma requisição HTTP no pool mTLS da filial."""
+        entrada = self._pool(filial)
+        with span('http.detran', **{'http.method': metodo, 'http.url': entrada.base + caminho}) as atual:
+            headers = dict(kwargs.pop('headers', None) or {})
+            traceparent = traceparent_atual()
+            if traceparent:
+                headers['traceparent'] = traceparent
+            try:
+                resposta = entrada.pool.request(metodo, entrada.base + caminho, headers=headers, **kwargs)
+            except urllib3.exceptions.HTTPError as e:
+                entrada.metricas.registrar_requisicao(erro=True)
+                raise ErroDetran(f'Falha na conexão com o DETRAN-{filial.uf}: {e}',
+                                 timeout=isinstance(e, urllib3.exceptions.TimeoutError))
+            if atual is not None:
+                atual.definir(**{'http.status_code': resposta.status})
+        entrada.metricas.registrar_requisicao(erro=resposta.status >= 500)
+        return resposta
+
+    def conectar(self, filial):
+        """
+        Valida certificado e canal mTLS da filial (substitui a simulação).
+        Sem endpoint para a UF, mantém a verificação do modo Infosimples.
+        """
+        if not self.endpoint(filial.uf):
+            return filial.simular_conexao_detran()
+        if not filial.get_cert_senha():
+            return filial.simular_conexao_detran()
+
+        try:
+            resposta = self.requisitar(filial, 'GET', self.caminho_saude)
+        except (ErroCertificado, ErroDetran) as e:
+            return {'sucesso': False, 'erro': str(e)}
+
+        entrada = self._pools[filial.id]
+        if resposta.status >= 400:
+            return {'sucesso': False, 'erro': f'DETRAN-{filial.uf} respondeu HTTP {resposta.status}'}
+        return {
+            'sucesso': True,
+            'mensagem': f'Conexão com DETRAN-{filial.uf} estabelecida',
+            'filial': filial.nome,
+            'uf': filial.uf,
+            'handshake_ms': entrada.metricas.ultimo_handshake_ms,
+            'certificado_valido_ate': entrada.validade.strftime('%d/%m/%Y')
+        }
+
+    # ------------------------------------------------------------------
+    # Saúde
+    # ------------------------------------------------------------------
+
+    def verificar_saude(self):
+        """Faz GET em caminho_saude por todos os pools abertos."""
+        with self._lock:
+            pools = list(self._pools.items())
+        for filial_id, entrada in pools:
+            inicio = time.perf_counter()
+            try:
+                resposta = entrada.pool.request('GET', entrada.base + self.caminho_saude)
+                ok, detalhe = resposta.status < 500, resposta.status
+            except urllib3.exceptions.HTTPError as e:
+                ok, detalhe = False, str(e)
+            entrada.metricas.saude = {
+                'ok': ok,
+                'detalhe': detalhe,
+                'ms': round((time.perf_counter() - inicio) * 1000, 2),
+                'em': datetime.utcnow().isoformat(timespec='seconds')
+            }
+            if not ok:
+                logger.warning('DETRAN indisponível para a filial %s: %s', filial_id, detalhe)
+
+    def _iniciar_saude(self):
+        # Iniciada com o primeiro pool, já dentro do processo worker
+        if self._thread is not None or not self.intervalo_saude:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop_saude, name='i9-detran-saude', daemon=True)
+                self._thread.start()
+
+    def _loop_saude(self):
+        while not self._parar.wait(self.intervalo_saude):
+            try:
+                self.verificar_saude()
+            except Exception:
+                logger.exception('Falha na verificação de saúde do DETRAN')
+
+    def fechar(self):
+        self._parar.set()
+        with self._lock:
+            for entrada in self._pools.values():
+                entrada.pool.close()
+            self._pools.clear()
+
+    def resumo(self):
+        with self._lock:
+            pools = list(self._pools.items())
+        return {
+            'endpoints': sorted(self.endpoints),
+            'filiais': {
+                str(filial_id): {
+                    **entrada.metricas.resumo(),
+                    'pool': self.tamanho_pool,
+                    'certificado_valido_ate': entrada.validade.strftime('%Y-%m-%d')
+                }
+                for filial_id, entrada in pools
+            }
+        }
+
+
+def configurar_detran(app):
+    """Cria o conector a partir da configuração da aplicação."""
+    conector = ConectorDetran(
+        parse_endpoints(app.config.get('DETRAN_ENDPOINTS')),
+        ca_bundle=app.config.get('DETRAN_CA_BUNDLE') or None,
+        tamanho_pool=app.config.get('DETRAN_POOL_SIZE', 4),
+        timeout=app.config.get('DETRAN_TIMEOUT', 15.0),
+        timeout_conexao=app.config.get('DETRAN_CONNECT_TIMEOUT', 5.0),
+        caminho_saude=app.config.get('DETRAN_HEALTH_PATH', '/health'),
+        intervalo_saude=app.config.get('DETRAN_HEALTH_INTERVAL', 60.0)
+    )
+    app.extensions['i9_detran'] = conector
+    return conector
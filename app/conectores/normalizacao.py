@@ -0,0 +1,359 @@
+"""
+Sistema I9 - Normalização das Respostas dos Provedores
+
+Cada resposta externa (Infosimples, DETRAN, mock) é validada e convertida uma
+única vez em objetos tipados e compactos (dataclasses com __slots__). Daí em
+diante o código trabalha com atributos, não com cadeias de .get(), e a
+serialização para o JSON de /api/consultar é feita direto pelo orjson, que
+reconhece dataclasses (ver app.serializacao).
+
+Campos de texto desconhecidos valem 'N/A' (o marcador que o dashboard já
+exibe); números e datas desconhecidos valem None.
+"""
+
+import re
+from dataclasses import dataclass, field, fields, is_dataclass, replace
+from typing import List, Optional
+
+NA = 'N/A'
+
+
+class ErroFormato(ValueError):
+    """Resposta de provedor fora do formato esperado."""
+
+
+# ============================================================================
+# MODELO
+# ============================================================================
+
+@dataclass(slots=True)
+class DadosVeiculo:
+    placa: str
+    chassi: str = NA
+    renavam: str = NA
+    modelo: str = NA
+    ano_fabricacao: str = NA
+    ano_modelo: str = NA
+    cor: str = NA
+    combustivel: str = NA
+    categoria: str = NA
+    uf: str = NA
+
+
+@dataclass(slots=True)
+class Restricao:
+    tipo: str
+    instituicao: Optional[str] = None
+    data_inclusao: Optional[str] = None
+    boletim_ocorrencia: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Restricoes:
+    possui_restricoes: bool = False
+    detalhes: List[Restricao] = field(default_factory=list)
+    erro: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Multa:
+    data: str = NA
+    descricao: str = NA
+    local: str = NA
+    valor: float = 0.0
+
+
+@dataclass(slots=True)
+class Multas:
+    possui_multas: bool = False
+    quantidade: int = 0
+    valor_total: float = 0.0
+    detalhes: List[Multa] = field(default_factory=list)
+    erro: Optional[str] = None
+
+    @staticmethod
+    def de_lista(detalhes):
+        return Multas(
+            possui_multas=bool(detalhes),
+            quantidade=len(detalhes),
+            valor_total=round(sum((m.valor for m in detalhes), 0.0), 2),
+            detalhes=detalhes
+        )
+
+
+@dataclass(slots=True)
+class Ipva:
+    situacao: str = NA
+    ano_referencia: Optional[int] = None
+    valor: float = 0.0
+    vencimento: str = NA
+    erro: Optional[str] = None
+
+
+@dataclass(slots=True)
+class DetalheLeilao:
+    leiloeiro: str = NA
+    data_leilao: str = NA
+    motivo: str = NA
+
+
+@dataclass(slots=True)
+class Leilao:
+    possui_historico_leilao: bool = False
+    detalhes: Optional[DetalheLeilao] = None
+    erro: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Proprietario:
+    tipo: str = NA
+    uf: str = NA
+    periodo: str = NA
+
+
+@dataclass(slots=True)
+class Proprietarios:
+    quantidade: int = 0
+    historico: List[Proprietario] = field(default_factory=list)
+    erro: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ConsultaRestricoes:
+    """Resultado de um provedor de restrições (seção obrigatória do relatório)."""
+    dados_veiculo: DadosVeiculo
+    restricoes: Restricoes
+    site_receipt: str = ''
+    provedor: Optional[str] = None
+    encontrado: bool = True
+
+
+@dataclass(slots=True)
+class RelatorioVeiculo:
+    """Resultado completo de /api/consultar."""
+    encontrado: bool = False
+    dados_veiculo: Optional[DadosVeiculo] = None
+    multas: Multas = field(default_factory=Multas)
+    ipva: Ipva = field(default_factory=Ipva)
+    restricoes: Restricoes = field(default_factory=Restricoes)
+    leilao: Leilao = field(default_factory=Leilao)
+    proprietarios: Proprietarios = field(default_factory=Proprietarios)
+    site_receipt: str = ''
+    provedor: Optional[str] = None
+
+    SECOES = ('multas', 'ipva', 'restricoes', 'leilao', 'proprietarios')
+
+    def aplicar_restricoes(self, consulta):
+        self.encontrado = consulta.encontrado
+        self.dados_veiculo = consulta.dados_veiculo
+        self.restricoes = consulta.restricoes
+        self.site_receipt = consulta.site_receipt
+        self.provedor = consulta.provedor
+
+    def marcar_erro(self, secao, erro):
+        setattr(self, secao, replace(getattr(self, secao), erro=erro))
+
+    @property
+    def completo(self):
+        """Todas as seções responderam (nenhuma ficou com 'erro')."""
+        return all(getattr(self, secao).erro is None for secao in self.SECOES)
+
+
+# ============================================================================
+# SERIALIZAÇÃO
+# ============================================================================
+
+_CAMPOS = {}
+
+
+def para_dict(obj):
+    """Converte os objetos normalizados em dict/list (mesmo formato do orjson)."""
+    if isinstance(obj, list):
+        return [para_dict(item) for item in obj]
+    campos = _CAMPOS.get(type(obj))
+    if campos is None:
+        if not is_dataclass(obj):
+            return obj
+        campos = _CAMPOS[type(obj)] = tuple(f.name for f in fields(obj))
+    return {campo: para_dict(getattr(obj, campo)) for campo in campos}
+
+
+# ============================================================================
+# VALIDAÇÃO DE CAMPOS
+# ============================================================================
+
+def _texto(valor, campo, padrao=NA):
+    if valor is None or valor == '':
+        return padrao
+    if isinstance(valor, (str, int, float)) and not isinstance(valor, bool):
+        return str(valor).strip() or padrao
+    raise ErroFormato(f'{campo}: esperado texto, recebido {type(valor).__name__}')
+
+
+def _opcional(valor, campo):
+    return _texto(valor, campo, padrao=None)
+
+
+def _numero(valor, campo):
+    """Aceita número, "R$ 1.234,56" ou "1234.56"; vazio vale 0."""
+    if valor is None or valor == '':
+        return 0.0
+    if isinstance(valor, bool):
+        raise ErroFormato(f'{campo}: esperado número, recebido bool')
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if not isinstance(valor, str):
+        raise ErroFormato(f'{campo}: esperado número, recebido {type(valor).__name__}')
+    limpo = re.sub(r'[^0-9,.-]', '', valor)
+    if ',' in limpo:
+        limpo = limpo.replace('.', '').replace(',', '.')
+    try:
+        return float(limpo)
+    except ValueError:
+        raise ErroFormato(f'{campo}: valor inválido "{valor}"')
+
+
+def _inteiro(valor, campo):
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(str(valor).strip())
+    except ValueError:
+        raise ErroFormato(f'{campo}: esperado inteiro, recebido "{valor}"')
+
+
+def _booleano(valor, campo):
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().upper() in ('S', 'SIM', 'TRUE', 'N', 'NAO', 'NÃO', 'FALSE'):
+        return valor.strip().upper() in ('S', 'SIM', 'TRUE')
+    raise ErroFormato(f'{campo}: esperado booleano, recebido "{valor}"')
+
+
+def _registro(dados, campo='data'):
+    if not isinstance(dados, dict):
+        raise ErroFormato(f'{campo}: esperado objeto, recebido {type(dados).__name__}')
+    return dados
+
+
+def _registros(dados, chave):
+    """Itens de `chave` no primeiro registro, ou os próprios registros."""
+    if not isinstance(dados, list):
+        raise ErroFormato(f'data: esperado lista, recebido {type(dados).__name__}')
+    if dados and isinstance(dados[0], dict) and chave in dados[0]:
+        dados = dados[0][chave]
+        if dados is None:
+            return []
+        if not isinstance(dados, list):
+            raise ErroFormato(f'{chave}: esperado lista, recebido {type(dados).__name__}')
+    return [_registro(item, chave) for item in dados]
+
+
+# ============================================================================
+# PARSERS
+# ============================================================================
+
+def _restricao(item):
+    if isinstance(item, str):
+        return Restricao(tipo=item.strip())
+    item = _registro(item, 'restricoes')
+    return Restricao(
+        tipo=_texto(item.get('tipo') or item.get('descricao'), 'restricoes.tipo'),
+        instituicao=_opcional(item.get('instituicao') or item.get('financeira'), 'restricoes.instituicao'),
+        data_inclusao=_opcional(item.get('data_inclusao') or item.get('data'), 'restricoes.data_inclusao'),
+        boletim_ocorrencia=_opcional(item.get('boletim_ocorrencia'), 'restricoes.boletim_ocorrencia')
+    )
+
+
+def parse_restricoes(registro, consulta):
+    """
+    Registro de restrições da Infosimples (data[0]) ou do DETRAN direto.
+    `restricoes` pode vir como texto único ou lista de textos/objetos.
+    """
+    registro = _registro(registro or {})
+    lista = registro.get('restricoes') or []
+    if isinstance(lista, str):
+        lista = [lista]
+    elif not isinstance(lista, list):
+        raise ErroFormato(f'restricoes: esperado lista, recebido {type(lista).__name__}')
+    detalhes = [_restricao(item) for item in lista if item]
+
+    existe = registro.get('existe_restricao')
+    possui = _booleano(existe, 'existe_restricao') if existe is not None else bool(detalhes)
+
+    return ConsultaRestricoes(
+        dados_veiculo=DadosVeiculo(
+            placa=_texto(registro.get('placa'), 'placa', consulta.placa),
+            chassi=_texto(registro.get('chassi') or registro.get('normalizado_chassi'), 'chassi'),
+            renavam=_texto(registro.get('renavam') or registro.get('normalizado_renavam'), 'renavam'),
+            modelo=_texto(registro.get('modelo') or registro.get('marca_modelo'), 'modelo'),
+            ano_fabricacao=_texto(registro.get('ano_fabricacao'), 'ano_fabricacao'),
+            ano_modelo=_texto(registro.get('ano_modelo'), 'ano_modelo'),
+            cor=_texto(registro.get('cor'), 'cor'),
+            combustivel=_texto(registro.get('combustivel'), 'combustivel'),
+            categoria=_texto(registro.get('categoria'), 'categoria'),
+            uf=consulta.uf or NA
+        ),
+        restricoes=Restricoes(possui_restricoes=possui, detalhes=detalhes),
+        site_receipt=_texto(registro.get('site_receipt'), 'site_receipt', '')
+    )
+
+
+def parse_multas(dados):
+    return Multas.de_lista([
+        Multa(
+            data=_texto(m.get('data') or m.get('data_infracao'), 'multas.data'),
+            descricao=_texto(m.get('descricao') or m.get('infracao'), 'multas.descricao'),
+            local=_texto(m.get('local') or m.get('municipio'), 'multas.local'),
+            valor=_numero(m.get('valor'), 'multas.valor')
+        )
+        for m in _registros(dados, 'multas')
+    ])
+
+
+def parse_ipva(dados):
+    registros = _registros(dados, 'ipva')
+    if not registros:
+        return Ipva()
+    ipva = registros[0]
+    return Ipva(
+        situacao=_texto(ipva.get('situacao'), 'ipva.situacao').upper(),
+        ano_referencia=_inteiro(ipva.get('exercicio') or ipva.get('ano_referencia'), 'ipva.ano_referencia'),
+        valor=_numero(ipva.get('valor'), 'ipva.valor'),
+        vencimento=_texto(ipva.get('vencimento'), 'ipva.vencimento')
+    )
+
+
+def parse_leilao(dados):
+    leiloes = _registros(dados, 'leiloes')
+    if not leiloes:
+        return Leilao()
+    ultimo = leiloes[0]
+    return Leilao(
+        possui_historico_leilao=True,
+        detalhes=DetalheLeilao(
+            leiloeiro=_texto(ultimo.get('leiloeiro'), 'leilao.leiloeiro'),
+            data_leilao=_texto(ultimo.get('data') or ultimo.get('data_leilao'), 'leilao.data'),
+            motivo=_texto(ultimo.get('motivo') or ultimo.get('condicao'), 'leilao.motivo')
+        )
+    )
+
+
+def parse_proprietarios(dados):
+    historico = [
+        Proprietario(
+            tipo=_texto(p.get('tipo') or p.get('tipo_documento'), 'proprietarios.tipo'),
+            uf=_texto(p.get('uf'), 'proprietarios.uf'),
+            periodo=_texto(p.get('periodo') or p.get('data'), 'proprietarios.periodo')
+        )
+        for p in _registros(dados, 'proprietarios')
+    ]
+    return Proprietarios(quantidade=len(historico), historico=historico)
+
+
+PARSERS_SECAO = {
+    'multas': parse_multas,
+    'ipva': parse_ipva,
+    'leilao': parse_leilao,
+    'proprietarios': parse_proprietarios,
+}
@@ -0,0 +1,417 @@
+"""
+Sistema I9 - Provedores de Consulta Veicular
+
+Cada provedor (Infosimples, DETRAN direto, mock) recebe uma Consulta e
+devolve um ConsultaRestricoes (app.conectores.normalizacao). O
+RoteadorProvedores escolhe os provedores pela UF (UPSTREAM_ROTAS) e, com
+hedging ativo, dispara o segundo provedor quando o primeiro passa da própria
+latência p90, ficando com a primeira resposta válida. Erros do primeiro caem no seguinte da rota.
+
+As chamadas rodam em threads: nada aqui acessa a sessão Flask ou o banco.
+"""
+
+import base64
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.conectores.normalizacao import ErroFormato, parse_restricoes
+from app.perfilamento import registrar_chamada
+from app.rastreamento import span, traceparent_atual
+
+logger = logging.getLogger(__name__)
+
+
+class ErroProvedor(Exception):
+    """
+    Falha de um provedor (a mensagem é exibida ao consultor). `classe`
+    identifica o tipo de erro para as regras de retentativa: 'timeout',
+    'conexao', 'http_5xx', 'infosimples:<code>' ou None (não repetir).
+    """
+
+    def __init__(self, mensagem, classe=None):
+        super().__init__(mensagem)
+        self.classe = classe
+
+
+# ============================================================================
+# CONSULTA
+# ============================================================================
+
+@dataclass
+class DadosFilial:
+    """Dados da filial conectada, copiados do modelo para uso fora da requisição."""
+    id: int
+    nome: str
+    uf: str
+    cert_path: Optional[str] = None
+    cert_senha: str = ''
+
+    def get_cert_senha(self):
+        return self.cert_senha
+
+    def simular_conexao_detran(self):
+        return {'sucesso': False, 'erro': 'Filial sem conexão direta com o DETRAN'}
+
+    @staticmethod
+    def de_filial(filial):
+        return DadosFilial(id=filial.id, nome=filial.nome, uf=filial.uf,
+                           cert_path=filial.cert_path, cert_senha=filial.get_cert_senha())
+
+
+@dataclass
+class Consulta:
+    placa: str
+    uf: str
+    renavam: str = ''
+    chassi: str = ''
+    filial: Optional[DadosFilial] = None
+    extras: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.placa = re.sub(r'[^A-Z0-9]', '', (self.placa or '').upper())
+        self.uf = (self.uf or '').upper()
+
+
+# ============================================================================
+# PROVEDORES
+# ============================================================================
+
+class Provedor:
+    """Interface dos provedores de consulta."""
+
+    nome = 'base'
+
+    def disponivel(self, consulta):
+        """Indica se o provedor pode atender a consulta (credenciais, UF...)."""
+        return True
+
+    def consultar(self, consulta):
+        raise NotImplementedError
+
+
+class ProvedorInfosimples(Provedor):
+    """API Infosimples (detran/restricoes). Para SP envia o certificado da filial."""
+
+    nome = 'infosimples'
+    URL_PADRAO = 'https://api.infosimples.com/api/v2/consultas/detran/restricoes'
+
+    def __init__(self, api_key, url=None, timeout=120):
+        import requests
+        self.api_key = api_key
+        self.url = url or self.URL_PADRAO
+        self.timeout = timeout
+        self._requests = requests
+        self._sessao = requests.Session()  # mantém a conexão HTTPS aberta entre consultas
+        self._certificados = {}
+
+    def disponivel(self, consulta):
+        return bool(self.api_key)
+
+    def _certificado_b64(self, caminho):
+        """Conteúdo do .pfx em base64, relido só quando o arquivo muda."""
+        with span('certificado.ler') as atual:
+            mtime = os.path.getmtime(caminho)
+            cache = self._certificados.get(caminho)
+            if atual is not None:
+                atual.definir(cache=cache is not None and cache[0] == mtime)
+            if cache is None or cache[0] != mtime:
+                with open(caminho, 'rb') as f:
+                    cache = (mtime, base64.b64encode(f.read()).decode('utf-8'))
+                self._certificados[caminho] = cache
+            return cache[1]
+
+    def dados(self, consulta):
+        """Executa a consulta e retorna a lista `data` da resposta."""
+        data = {
+            'token': self.api_key,
+            'uf': consulta.uf,
+            'placa': consulta.placa,
+            'renavam': consulta.renavam or '00000000000',
+            'chassi': consulta.chassi or 'XXXXXXXXXXXXXXXXX',
+            'timeout': 300
+        }
+
+        # Para SP, precisa de certificado digital
+        filial = consulta.filial
+        if consulta.uf == 'SP' and filial and filial.cert_path and os.path.exists(filial.cert_path):
+            data['pkcs12_cert'] = self._certificado_b64(filial.cert_path)
+            data['pkcs12_pass'] = filial.cert_senha
+
+        traceparent = traceparent_atual()
+        try:
+            with span('http.infosimples', **{'http.method': 'POST', 'http.url': self.url}) as atual:
+                response = self._sessao.post(self.url, data=data, timeout=self.timeout,
+                                             headers={'traceparent': traceparent} if traceparent else None)
+                if atual is not None:
+                    atual.definir(**{'http.status_code': response.status_code})
+            resp_data = response.json()
+        except self._requests.exceptions.Timeout:
+            raise ErroProvedor('Timeout na consulta. Tente novamente.', classe='timeout')
+        except self._requests.exceptions.RequestException as e:
+            raise ErroProvedor(f'Erro de conexão: {str(e)}', classe='conexao')
+        except ValueError:
+            raise ErroProvedor(f'Resposta inválida da Infosimples (HTTP {response.status_code})',
+                               classe='http_5xx' if response.status_code >= 500 else None)
+
+        code = resp_data.get('code', 0)
+        if code != 200:
+            raise ErroProvedor(f"API: {resp_data.get('code_message', 'Erro na consulta')}",
+                               classe=f'infosimples:{code}')
+
+        return resp_data.get('data') or []
+
+    def consultar(self, consulta):
+        dados = self.dados(consulta)
+        try:
+            return parse_restricoes(dados[0] if dados else {}, consulta)
+        except ErroFormato as e:
+            raise ErroProvedor(f'Resposta inválida da Infosimples: {e}')
+
+
+class ProvedorDetran(Provedor):
+    """Consulta direta ao DETRAN da UF pelo pool mTLS da filial."""
+
+    nome = 'detran'
+
+    def __init__(self, conector, caminho='/restricoes'):
+        self.conector = conector
+        self.caminho = caminho
+
+    def disponivel(self, consulta):
+        return bool(self.conector.endpoint(consulta.uf) and consulta.filial
+                    and consulta.filial.cert_path and consulta.filial.cert_senha)
+
+    def consultar(self, consulta):
+        from app.conectores.detran import ErroCertificado, ErroDetran
+
+        campos = {'placa': consulta.placa}
+        if consulta.renavam:
+            campos['renavam'] = consulta.renavam
+        if consulta.chassi:
+            campos['chassi'] = consulta.chassi
+        try:
+            resposta = self.conector.requisitar(consulta.filial, 'GET', self.caminho, fields=campos)
+        except ErroCertificado as e:
+            raise ErroProvedor(str(e))
+        except ErroDetran as e:
+            raise ErroProvedor(str(e), classe='timeout' if e.timeout else 'conexao')
+        if resposta.status != 200:
+            raise ErroProvedor(f'DETRAN-{consulta.uf}: HTTP {resposta.status}',
+                               classe='http_5xx' if resposta.status >= 500 else None)
+        try:
+            return parse_restricoes(resposta.json(), consulta)
+        except ErroFormato as e:
+            raise ErroProvedor(f'DETRAN-{consulta.uf}: resposta inválida ({e})')
+        except ValueError:
+            raise ErroProvedor(f'DETRAN-{consulta.uf}: resposta inválida')
+
+
+class ProvedorMock(Provedor):
+    """Resultado determinístico por placa, para desenvolvimento e testes de carga."""
+
+    nome = 'mock'
+
+    def __init__(self, latencia_ms=0):
+        self.latencia_ms = latencia_ms
+
+    def consultar(self, consulta):
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        semente = int(hashlib.sha1(consulta.placa.encode()).hexdigest(), 16)
+        restricoes = ['ALIENACAO FIDUCIARIA'] if semente % 5 == 0 else []
+        return parse_restricoes({
+            'placa': consulta.placa,
+            'chassi': consulta.chassi or f'9BW{semente % 10 ** 14:014d}',
+            'renavam': consulta.renavam or f'{semente % 10 ** 11:011d}',
+            'existe_restricao': bool(restricoes),
+            'restricoes': restricoes
+        }, consulta)
+
+
+# ============================================================================
+# ESTATÍSTICAS
+# ============================================================================
+
+class EstatisticasProvedor:
+    """Latências recentes (janela deslizante), erros e hedges de um provedor."""
+
+    def __init__(self, janela=200):
+        self._lock = threading.Lock()
+        self.latencias = deque(maxlen=janela)
+        self.chamadas = 0
+        self.erros = 0
+        self.hedges = 0    # vezes em que este provedor foi disparado como hedge
+        self.vitorias = 0  # respostas usadas
+
+    def registrar(self, ms, erro=False):
+        with self._lock:
+            self.chamadas += 1
+            if erro:
+                self.erros += 1
+            else:
+                self.latencias.append(ms)
+
+    def percentil(self, p):
+        with self._lock:
+            amostras = sorted(self.latencias)
+        if not amostras:
+            return None
+        return amostras[min(int(len(amostras) * p), len(amostras) - 1)]
+
+    def resumo(self):
+        p50, p90, p99 = self.percentil(0.5), self.percentil(0.9), self.percentil(0.99)
+        return {
+            'chamadas': self.chamadas,
+            'erros': self.erros,
+            'taxa_erro': round(self.erros / self.chamadas, 3) if self.chamadas else None,
+            'hedges': self.hedges,
+            'vitorias': self.vitorias,
+            'p50_ms': round(p50, 1) if p50 is not None else None,
+            'p90_ms': round(p90, 1) if p90 is not None else None,
+            'p99_ms': round(p99, 1) if p99 is not None else None
+        }
+
+
+# ============================================================================
+# ROTEADOR
+# ============================================================================
+
+def parse_rotas(valor):
+    """Converte "SP=detran,infosimples;*=infosimples" em {'SP': [...], '*': [...]}."""
+    rotas = {}
+    for item in (valor or '').split(';'):
+        if '=' in item:
+            uf, nomes = item.split('=', 1)
+            rotas[uf.strip().upper()] = [n.strip() for n in nomes.split(',') if n.strip()]
+    return rotas
+
+
+class RoteadorProvedores:
+    """Escolhe provedores por UF, com hedging pelo p90 e fallback em erro."""
+
+    def __init__(self, provedores, rotas, hedge=True, min_amostras=20, workers=16, politica=None):
+        self.provedores = {p.nome: p for p in provedores}
+        self.rotas = rotas or {'*': ['infosimples']}
+        self.hedge = hedge
+        self.min_amostras = min_amostras
+        self.politica = politica  # PoliticaRetentativa (None = sem retentativas)
+        self.estatisticas = {nome: EstatisticasProvedor() for nome in self.provedores}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='i9-provedor')
+
+    def candidatos(self, consulta):
+        nomes = self.rotas.get(consulta.uf, self.rotas.get('*', []))
+        return [self.provedores[n] for n in nomes
+                if n in self.provedores and self.provedores[n].disponivel(consulta)]
+
+    def _chamar(self, provedor, consulta, prazo=None):
+        inicio = time.perf_counter()
+        try:
+            with span(f'provedor.{provedor.nome}', uf=consulta.uf):
+                if self.politica is not None:
+                    resultado = self.politica.executar(provedor.consultar, consulta, prazo=prazo)
+                else:
+                    resultado = provedor.consultar(consulta)
+        except Exception as e:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.estatisticas[provedor.nome].registrar(ms, erro=True)
+            registrar_chamada(f'provedor:{provedor.nome}', ms, erro=str(e) or e.__class__.__name__)
+            raise
+        ms = (time.perf_counter() - inicio) * 1000
+        self.estatisticas[provedor.nome].registrar(ms)
+        registrar_chamada(f'provedor:{provedor.nome}', ms)
+        return resultado
+
+    def _limite_hedge(self, provedor):
+        """Segundos até disparar o hedge (None se ainda não há amostras suficientes)."""
+        estatisticas = self.estatisticas[provedor.nome]
+        if len(estatisticas.latencias) < self.min_amostras:
+            return None
+        return estatisticas.percentil(0.9) / 1000
+
+    def consultar(self, consulta):
+        candidatos = self.candidatos(consulta)
+        if not candidatos:
+            raise ErroProvedor(f'Nenhum provedor disponível para {consulta.uf} '
+                               '(configure INFOSIMPLES_API_KEY ou DETRAN_ENDPOINTS)')
+
+        pendentes = {}
+        fila = list(candidatos)
+        ultimo_erro = None
+        # Prazo único para as retentativas de todos os provedores desta consulta
+        prazo = time.monotonic() + self.politica.prazo_total_s if self.politica is not None else None
+
+        def disparar(hedge=False):
+            provedor = fila.pop(0)
+            if hedge:
+                self.estatisticas[provedor.nome].hedges += 1
+            # copy_context: captura de perfil e trace da requisição acompanham a chamada na thread
+            futuro = self._executor.submit(contextvars.copy_context().run, self._chamar, provedor, consulta, prazo)
+            pendentes[futuro] = provedor
+
+        disparar()
+        while pendentes:
+            limite = self._limite_hedge(next(iter(pendentes.values()))) \
+                if self.hedge and fila and len(pendentes) == 1 else None
+            prontos, _ = wait(list(pendentes), timeout=limite, return_when=FIRST_COMPLETED)
+
+            if not prontos:
+                # Primeiro provedor passou do p90: dispara o próximo em paralelo
+                disparar(hedge=True)
+                continue
+
+            for futuro in prontos:
+                provedor = pendentes.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    ultimo_erro = e
+                    logger.warning('Provedor %s falhou para %s: %s', provedor.nome, consulta.placa, e)
+                    continue
+                self.estatisticas[provedor.nome].vitorias += 1
+                # A resposta do outro provedor, se houver, é descartada
+                resultado.provedor = provedor.nome
+                return resultado
+
+            if not pendentes and fila:
+                disparar()
+
+        if isinstance(ultimo_erro, ErroProvedor):
+            raise ultimo_erro
+        raise ErroProvedor(f'Erro na consulta: {ultimo_erro}')
+
+    def resumo(self):
+        return {
+            'rotas': self.rotas,
+            'hedge': self.hedge,
+            'provedores': {nome: e.resumo() for nome, e in self.estatisticas.items()}
+        }
+
+
+def configurar_provedores(app):
+    """Monta os provedores e o roteador a partir da configuração."""
+    provedores = [
+        ProvedorInfosimples(app.config.get('INFOSIMPLES_API_KEY'), app.config.get('INFOSIMPLES_URL')),
+        ProvedorMock(app.config.get('UPSTREAM_MOCK_LATENCIA_MS', 0)),
+    ]
+    if app.extensions.get('i9_detran') is not None:
+        provedores.append(ProvedorDetran(app.extensions['i9_detran'], app.config.get('DETRAN_CONSULTA_PATH', '/restricoes')))
+
+    roteador = RoteadorProvedores(
+        provedores,
+        parse_rotas(app.config.get('UPSTREAM_ROTAS')),
+        hedge=app.config.get('UPSTREAM_HEDGE', True),
+        min_amostras=app.config.get('UPSTREAM_HEDGE_MIN_AMOSTRAS', 20),
+        workers=app.config.get('UPSTREAM_WORKERS', 16),
+        politica=app.extensions.get('i9_retentativas')
+    )
+    app.extensions['i9_provedores'] = roteador
+    return roteador
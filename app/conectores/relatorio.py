@@ -0,0 +1,289 @@
+"""
+Sistema I9 - Relatório Veicular com Fontes em Paralelo
+
+Cada seção do relatório (restrições, multas, IPVA, leilão, proprietários) vem
+de uma fonte própria. O MotorRelatorio dispara todas ao mesmo tempo, cada uma
+com seu prazo (RELATORIO_DEADLINES), e entrega as seções na ordem em que
+ficam prontas: a consulta demora o tempo da fonte mais lenta, não a soma.
+
+Fonte que falha ou estoura o prazo não derruba o relatório: a seção fica com
+os valores padrão e a chave 'erro'. Só as restrições são obrigatórias.
+
+RELATORIO_FONTES: "multas=infosimples:detran/multas;ipva=mock;..." (tipo e,
+para a Infosimples, o caminho da consulta). As restrições sempre usam o
+RoteadorProvedores.
+"""
+
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.conectores.normalizacao import PARSERS_SECAO, ErroFormato, RelatorioVeiculo
+from app.conectores.provedores import ErroProvedor, ProvedorInfosimples
+from app.perfilamento import registrar_chamada
+from app.rastreamento import span
+
+logger = logging.getLogger(__name__)
+
+SECAO_OBRIGATORIA = 'restricoes'
+DEADLINE_RESTRICOES = 130.0  # cobre o timeout de 120s da Infosimples
+
+
+# ============================================================================
+# FONTES
+# ============================================================================
+
+class Fonte:
+    """Origem de uma seção do relatório. consultar() retorna o objeto da seção."""
+
+    secao = ''
+    tipo = 'base'
+    retentavel = True  # erros transitórios repetidos pela PoliticaRetentativa do motor
+
+    def consultar(self, consulta):
+        raise NotImplementedError
+
+
+class FonteRestricoes(Fonte):
+    """Restrições (e dados do veículo) pelo roteador de provedores."""
+
+    secao = SECAO_OBRIGATORIA
+    tipo = 'provedores'
+    retentavel = False  # o roteador já repete e troca de provedor
+
+    def __init__(self, roteador):
+        self.roteador = roteador
+
+    def consultar(self, consulta):
+        return self.roteador.consultar(consulta)
+
+
+class FonteInfosimples(Fonte):
+    """Uma consulta da Infosimples (ex.: detran/multas) normalizada para a seção."""
+
+    tipo = 'infosimples'
+    URL_BASE = 'https://api.infosimples.com/api/v2/consultas/'
+
+    def __init__(self, secao, caminho, api_key, url_base=None, timeout=60):
+        self.secao = secao
+        self.parser = PARSERS_SECAO[secao]
+        self.cliente = ProvedorInfosimples(api_key, (url_base or self.URL_BASE).rstrip('/') + '/' + caminho,
+                                           timeout=timeout)
+
+    def consultar(self, consulta):
+        if not self.cliente.api_key:
+            raise ErroProvedor('INFOSIMPLES_API_KEY não configurada')
+        try:
+            return self.parser(self.cliente.dados(consulta))
+        except ErroFormato as e:
+            raise ErroProvedor(f'Resposta inválida da Infosimples: {e}')
+
+
+class FonteMock(Fonte):
+    """Seção determinística por placa, para desenvolvimento e testes de carga."""
+
+    tipo = 'mock'
+
+    def __init__(self, secao, latencia_ms=0):
+        self.secao = secao
+        self.latencia_ms = latencia_ms
+
+    def consultar(self, consulta):
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        semente = int(hashlib.sha1(f'{self.secao}:{consulta.placa}'.encode()).hexdigest(), 16)
+        if self.secao == 'multas':
+            dados = [{'data': '10/03/2024', 'descricao': 'Excesso de velocidade', 'local': 'SAO PAULO',
+                      'valor': 130.16}] * (semente % 3)
+        elif self.secao == 'ipva':
+            dados = [{'situacao': 'PAGO' if semente % 4 else 'PENDENTE', 'exercicio': 2024,
+                      'valor': 1000 + semente % 2000, 'vencimento': '15/03/2024'}]
+        elif self.secao == 'leilao':
+            dados = [{'leiloeiro': 'LEILOEIRO TESTE', 'data': '01/02/2020', 'motivo': 'RECUPERAVEL'}] \
+                if semente % 10 == 0 else []
+        else:
+            dados = [{'tipo': 'PF', 'uf': consulta.uf or 'SP', 'periodo': f'{2015 + i}-{2016 + i}'}
+                     for i in range(1 + semente % 3)]
+        return PARSERS_SECAO[self.secao](dados)
+
+
+# ============================================================================
+# MOTOR
+# ============================================================================
+
+class EstatisticasFonte:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.erros = 0
+        self.prazos_estourados = 0
+        self.total_ms = 0.0
+
+    def registrar(self, ms, erro=False):
+        with self._lock:
+            self.chamadas += 1
+            self.erros += erro
+            self.total_ms += ms if not erro else 0
+
+    def registrar_prazo(self):
+        # A chamada continua e é contada em registrar() quando terminar
+        with self._lock:
+            self.prazos_estourados += 1
+
+    def resumo(self):
+        concluidas = self.chamadas - self.erros
+        return {
+            'chamadas': self.chamadas,
+            'erros': self.erros,
+            'prazos_estourados': self.prazos_estourados,
+            'media_ms': round(self.total_ms / concluidas, 1) if concluidas > 0 else None
+        }
+
+
+class Relatorio:
+    """Acumula as seções num RelatorioVeiculo à medida que chegam."""
+
+    def __init__(self):
+        self.resultado = RelatorioVeiculo()
+
+    def aplicar(self, secao, dados, erro):
+        if erro is not None:
+            if secao == SECAO_OBRIGATORIA:
+                raise ErroProvedor(erro)
+            self.resultado.marcar_erro(secao, erro)
+        elif secao == SECAO_OBRIGATORIA:
+            self.resultado.aplicar_restricoes(dados)
+        else:
+            setattr(self.resultado, secao, dados)
+
+
+class MotorRelatorio:
+    """Consulta todas as fontes em paralelo, cada uma com seu prazo."""
+
+    def __init__(self, fontes, deadlines=None, deadline_padrao=20.0, workers=16, politica=None):
+        self.fontes = fontes
+        self.politica = politica
+        self.deadlines = {SECAO_OBRIGATORIA: DEADLINE_RESTRICOES, **(deadlines or {})}
+        self.deadline_padrao = deadline_padrao
+        self.estatisticas = {f.secao: EstatisticasFonte() for f in fontes}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='i9-relatorio')
+
+    def _chamar(self, fonte, consulta, prazo):
+        inicio = time.perf_counter()
+        try:
+            with span(f'fonte.{fonte.secao}', tipo=fonte.tipo):
+                if self.politica is not None and fonte.retentavel:
+                    # Retentativas só enquanto a seção ainda pode entrar no relatório
+                    dados = self.politica.executar(fonte.consultar, consulta, prazo=prazo)
+                else:
+                    dados = fonte.consultar(consulta)
+        except Exception as e:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.estatisticas[fonte.secao].registrar(ms, erro=True)
+            registrar_chamada(f'fonte:{fonte.secao}', ms, erro=str(e) or e.__class__.__name__)
+            raise
+        ms = (time.perf_counter() - inicio) * 1000
+        self.estatisticas[fonte.secao].registrar(ms)
+        registrar_chamada(f'fonte:{fonte.secao}', ms)
+        return dados
+
+    def executar(self, consulta):
+        """
+        Gera (secao, dados, erro) na ordem em que as fontes terminam.
+        Fontes que passam do prazo geram um erro e a resposta tardia é descartada.
+        """
+        inicio = time.monotonic()
+        pendentes = {}
+        for fonte in self.fontes:
+            prazo = inicio + self.deadlines.get(fonte.secao, self.deadline_padrao)
+            futuro = self._executor.submit(contextvars.copy_context().run, self._chamar, fonte, consulta, prazo)
+            pendentes[futuro] = (fonte, prazo)
+
+        while pendentes:
+            proximo_prazo = min(prazo for _, prazo in pendentes.values())
+            prontos, _ = wait(list(pendentes), timeout=max(proximo_prazo - time.monotonic(), 0),
+                              return_when=FIRST_COMPLETED)
+
+            for futuro in prontos:
+                fonte, _ = pendentes.pop(futuro)
+                try:
+                    yield fonte.secao, futuro.result(), None
+                except Exception as e:
+                    logger.warning('Fonte %s falhou para %s: %s', fonte.secao, consulta.placa, e)
+                    yield fonte.secao, None, str(e) or e.__class__.__name__
+
+            agora = time.monotonic()
+            for futuro, (fonte, prazo) in list(pendentes.items()):
+                if prazo <= agora:
+                    del pendentes[futuro]
+                    futuro.cancel()
+                    self.estatisticas[fonte.secao].registrar_prazo()
+                    limite = self.deadlines.get(fonte.secao, self.deadline_padrao)
+                    yield fonte.secao, None, f'Tempo esgotado ({limite:g}s)'
+
+    def montar(self, consulta):
+        """Relatório completo (bloqueia até a última fonte responder ou expirar)."""
+        with span('relatorio.montar', uf=consulta.uf):
+            relatorio = Relatorio()
+            for secao, dados, erro in self.executar(consulta):
+                relatorio.aplicar(secao, dados, erro)
+            return relatorio.resultado
+
+    def resumo(self):
+        return {
+            secao: {
+                **e.resumo(),
+                'tipo': next(f.tipo for f in self.fontes if f.secao == secao),
+                'deadline_s': self.deadlines.get(secao, self.deadline_padrao)
+            }
+            for secao, e in self.estatisticas.items()
+        }
+
+
+def parse_fontes(valor):
+    """Converte "multas=infosimples:detran/multas;ipva=mock" em {'multas': ('infosimples', 'detran/multas'), ...}."""
+    fontes = {}
+    for item in (valor or '').split(';'):
+        if '=' in item:
+            secao, origem = item.split('=', 1)
+            tipo, _, caminho = origem.strip().partition(':')
+            fontes[secao.strip().lower()] = (tipo.strip().lower(), caminho.strip())
+    return fontes
+
+
+def parse_deadlines(valor):
+    """Converte "restricoes=60,multas=15" em {'restricoes': 60.0, 'multas': 15.0}."""
+    deadlines = {}
+    for item in (valor or '').split(','):
+        if '=' in item:
+            secao, segundos = item.split('=', 1)
+            deadlines[secao.strip().lower()] = float(segundos)
+    return deadlines
+
+
+def configurar_relatorio(app):
+    """Monta as fontes e o motor do relatório (requer configurar_provedores)."""
+    fontes = [FonteRestricoes(app.extensions['i9_provedores'])]
+    for secao, (tipo, caminho) in parse_fontes(app.config.get('RELATORIO_FONTES')).items():
+        if secao not in PARSERS_SECAO:
+            logger.warning('RELATORIO_FONTES: seção desconhecida "%s" ignorada', secao)
+        elif tipo == 'infosimples' and caminho:
+            fontes.append(FonteInfosimples(secao, caminho, app.config.get('INFOSIMPLES_API_KEY'),
+                                           url_base=app.config.get('INFOSIMPLES_URL_BASE') or None))
+        elif tipo == 'mock':
+            fontes.append(FonteMock(secao, app.config.get('UPSTREAM_MOCK_LATENCIA_MS', 0)))
+        else:
+            logger.warning('RELATORIO_FONTES: fonte inválida para "%s": %s:%s', secao, tipo, caminho)
+
+    motor = MotorRelatorio(
+        fontes,
+        deadlines=parse_deadlines(app.config.get('RELATORIO_DEADLINES')),
+        deadline_padrao=app.config.get('RELATORIO_DEADLINE_PADRAO', 20.0),
+        workers=app.config.get('RELATORIO_WORKERS', 16),
+        politica=app.extensions.get('i9_retentativas')
+    )
+    app.extensions['i9_relatorio'] = motor
+    return motor
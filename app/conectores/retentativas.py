@@ -0,0 +1,118 @@
+"""
+Sistema I9 - Retentativas das Chamadas Externas
+
+Falhas transitórias (timeout, conexão recusada, HTTP 5xx, códigos de erro
+temporário da Infosimples) são repetidas com backoff exponencial e jitter
+("full jitter": espera aleatória entre 0 e base * 2^n, limitada a max), sem
+nunca passar do prazo total da consulta. Cada classe de erro tem sua regra.
+
+UPSTREAM_RETRY_REGRAS: "timeout=2;conexao=3;http_5xx=2;infosimples:605,609=2",
+onde o número é quantas vezes repetir. Erros sem regra (certificado,
+parâmetros inválidos, "não encontrado") falham na hora.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from app.conectores.provedores import ErroProvedor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RegraRetentativa:
+    tentativas: int        # repetições além da primeira chamada
+    base_s: float = 0.2
+    max_s: float = 2.0
+
+    def espera(self, tentativa, aleatorio=random):
+        """Full jitter: uniforme entre 0 e min(max, base * 2^tentativa)."""
+        return aleatorio.uniform(0, min(self.max_s, self.base_s * (2 ** tentativa)))
+
+
+def parse_regras(valor, base_s=0.2, max_s=2.0):
+    """Converte "timeout=2;infosimples:605,609=2" em {'timeout': Regra, 'infosimples:605': Regra, ...}."""
+    regras = {}
+    for item in (valor or '').split(';'):
+        if '=' not in item:
+            continue
+        classes, tentativas = item.rsplit('=', 1)
+        classes = classes.strip().lower()
+        regra = RegraRetentativa(int(tentativas), base_s, max_s)
+        if ':' in classes:
+            prefixo, codigos = classes.split(':', 1)
+            for codigo in codigos.split(','):
+                if codigo.strip():
+                    regras[f'{prefixo}:{codigo.strip()}'] = regra
+        else:
+            regras[classes] = regra
+    return regras
+
+
+class PoliticaRetentativa:
+    """Executa chamadas repetindo os erros transitórios dentro do prazo."""
+
+    def __init__(self, regras, prazo_total_s=30.0, aleatorio=None):
+        self.regras = regras
+        self.prazo_total_s = prazo_total_s
+        self._aleatorio = aleatorio or random.Random()
+        self._lock = threading.Lock()
+        self.retentativas = Counter()   # por classe de erro
+        self.recuperadas = 0            # chamadas que deram certo após repetir
+        self.esgotadas = Counter()      # desistências (tentativas ou prazo), por classe
+
+    def executar(self, funcao, *args, prazo=None, **kwargs):
+        """
+        Chama funcao(*args, **kwargs). `prazo` é o instante (time.monotonic)
+        a partir do qual não se tenta mais; sem ele vale prazo_total_s.
+        """
+        prazo = prazo if prazo is not None else time.monotonic() + self.prazo_total_s
+        tentativa = 0
+        while True:
+            try:
+                resultado = funcao(*args, **kwargs)
+            except ErroProvedor as e:
+                regra = self.regras.get(e.classe) if e.classe else None
+                if regra is None:
+                    raise
+                espera = regra.espera(tentativa, self._aleatorio)
+                if tentativa >= regra.tentativas or time.monotonic() + espera >= prazo:
+                    with self._lock:
+                        self.esgotadas[e.classe] += 1
+                    raise
+                with self._lock:
+                    self.retentativas[e.classe] += 1
+                logger.info('Erro transitório (%s), nova tentativa em %.0f ms: %s', e.classe, espera * 1000, e)
+                time.sleep(espera)
+                tentativa += 1
+                continue
+            if tentativa:
+                with self._lock:
+                    self.recuperadas += 1
+            return resultado
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'prazo_total_s': self.prazo_total_s,
+                'regras': {classe: regra.tentativas for classe, regra in sorted(self.regras.items())},
+                'retentativas': dict(self.retentativas),
+                'recuperadas': self.recuperadas,
+                'esgotadas': dict(self.esgotadas)
+            }
+
+
+def configurar_retentativas(app):
+    """Cria a política de retentativas compartilhada por provedores e fontes."""
+    politica = PoliticaRetentativa(
+        parse_regras(app.config.get('UPSTREAM_RETRY_REGRAS'),
+                     base_s=app.config.get('UPSTREAM_RETRY_BASE_MS', 200) / 1000,
+                     max_s=app.config.get('UPSTREAM_RETRY_MAX_MS', 2000) / 1000),
+        prazo_total_s=app.config.get('UPSTREAM_RETRY_PRAZO_S', 30.0)
+    )
+    app.extensions['i9_retentativas'] = politica
+    return politica
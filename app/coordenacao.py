@@ -0,0 +1,318 @@
+"""
+Sistema I9 - Coordenação entre Instâncias
+
+Locks nomeados e avisos entre processos, para várias instâncias da
+aplicação atrás do balanceador sem serviço externo:
+
+- PostgreSQL: advisory locks (pg_try_advisory_lock numa conexão dedicada;
+  liberados sozinhos se o processo cair) e LISTEN/NOTIFY. O NOTIFY entra
+  na transação de quem publica e só é entregue no commit;
+- memória: mesmo contrato dentro de um único processo (SQLite, testes).
+
+Filas de trabalho usam SELECT ... FOR UPDATE SKIP LOCKED direto na query
+(with_for_update(skip_locked=True); no SQLite é ignorado e vale a escrita
+serializada do banco).
+
+    coordenacao = current_app.extensions['i9_coordenacao']
+    with coordenacao.bloqueio('i9:monitoramento') as obtido:
+        if obtido:
+            ...
+    coordenacao.assinar('i9_versoes', lambda mensagem: ...)
+    coordenacao.publicar('i9_versoes', 'usuarios')   # entregue no commit
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CANAL_VALIDO = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+_PENDENTES = 'i9_avisos_pendentes'
+
+
+def chave_lock(nome):
+    """Chave bigint (com sinal) do advisory lock de um nome."""
+    return int.from_bytes(hashlib.blake2b(nome.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+# ============================================================================
+# AVISOS APÓS O COMMIT
+# ============================================================================
+# Como o NOTIFY do PostgreSQL, um aviso publicado dentro de uma transação só
+# chega aos assinantes deste processo depois do commit (e some no rollback):
+# quem lê o banco ao receber o aviso já vê a alteração.
+
+@event.listens_for(Session, 'after_commit')
+def _entregar_pendentes(sessao):
+    for coordenacao, canal, mensagem in sessao.info.pop(_PENDENTES, ()):
+        coordenacao._entregar(canal, mensagem)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(sessao):
+    sessao.info.pop(_PENDENTES, None)
+
+
+# ============================================================================
+# MEMÓRIA (UM PROCESSO)
+# ============================================================================
+
+class CoordenacaoMemoria:
+    """Locks e avisos dentro do processo (instância única e testes)."""
+
+    backend = 'memoria'
+    entre_processos = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._assinantes = {}
+        self.obtidos = 0
+        self.recusados = 0
+        self.publicados = 0
+        self.entregues = 0
+
+    # ------------------------------------------------------------------ locks
+
+    @contextmanager
+    def bloqueio(self, nome, espera_s=0):
+        """
+        Lock exclusivo `nome` entre as instâncias. Entrega True se obtido (em
+        até `espera_s` segundos) ou False; quem não obteve não deve executar.
+        """
+        with self._lock:
+            trava = self._locks.setdefault(nome, threading.Lock())
+        obtido = trava.acquire(timeout=espera_s) if espera_s > 0 else trava.acquire(blocking=False)
+        self._contar(obtido)
+        try:
+            yield obtido
+        finally:
+            if obtido:
+                trava.release()
+
+    def _contar(self, obtido):
+        with self._lock:
+            if obtido:
+                self.obtidos += 1
+            else:
+                self.recusados += 1
+
+    # ----------------------------------------------------------------- avisos
+
+    def assinar(self, canal, callback):
+        """
+        Chama callback(mensagem) a cada aviso no canal. Com mensagem None,
+        avisos podem ter se perdido (reconexão): descarte tudo do canal.
+        """
+        if not CANAL_VALIDO.match(canal):
+            raise ValueError(f'Canal inválido: {canal!r}')
+        with self._lock:
+            self._assinantes.setdefault(canal, []).append(callback)
+
+    def publicar(self, canal, mensagem=''):
+        """Avisa os assinantes do canal no commit da sessão atual (na hora, sem transação aberta)."""
+        from app.extensions import db
+
+        sessao = db.session()
+        with self._lock:
+            self.publicados += 1
+        if sessao.in_transaction():
+            sessao.info.setdefault(_PENDENTES, []).append((self, canal, mensagem))
+        else:
+            self._entregar(canal, mensagem)
+
+    def _entregar(self, canal, mensagem):
+        with self._lock:
+            assinantes = list(self._assinantes.get(canal, ()))
+            self.entregues += 1
+        for callback in assinantes:
+            try:
+                callback(mensagem)
+            except Exception:
+                logger.exception('Falha no assinante do canal %s', canal)
+
+    def _entregar_todos(self, mensagem):
+        with self._lock:
+            canais = list(self._assinantes)
+        for canal in canais:
+            self._entregar(canal, mensagem)
+
+    def iniciar(self):
+        pass
+
+    def fechar(self):
+        pass
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'entre_processos': self.entre_processos,
+                'canais': sorted(self._assinantes),
+                'locks_obtidos': self.obtidos,
+                'locks_recusados': self.recusados,
+                'avisos_publicados': self.publicados,
+                'avisos_entregues': self.entregues
+            }
+
+
+# ============================================================================
+# POSTGRESQL (VÁRIAS INSTÂNCIAS)
+# ============================================================================
+
+class CoordenacaoPostgres(CoordenacaoMemoria):
+    """
+    Advisory locks e LISTEN/NOTIFY. Usa conexões próprias, em autocommit e
+    fora do pool da aplicação (COORDENACAO_URL permite apontar direto para o
+    PostgreSQL quando o banco principal passa pelo PgBouncer em modo
+    transação, que não suporta LISTEN nem locks de sessão).
+    """
+
+    backend = 'postgres'
+    entre_processos = True
+
+    def __init__(self, url, reconexao_s=5.0):
+        from sqlalchemy import create_engine
+
+        super().__init__()
+        self.engine = create_engine(url, isolation_level='AUTOCOMMIT', pool_size=2, max_overflow=10,
+                                    pool_pre_ping=True)
+        self.reconexao_s = reconexao_s
+        self.origem = uuid.uuid4().hex[:12]  # ignora os próprios avisos (já entregues no commit)
+        self._parar = threading.Event()
+        self._reassinar = threading.Event()
+        self._thread = None
+        self.reconexoes = 0
+
+    @contextmanager
+    def bloqueio(self, nome, espera_s=0):
+        from sqlalchemy import text
+
+        chave = chave_lock(nome)
+        with self.engine.connect() as conexao:
+            limite = time.monotonic() + espera_s
+            obtido = conexao.execute(text('SELECT pg_try_advisory_lock(:k)'), {'k': chave}).scalar()
+            while not obtido and time.monotonic() < limite:
+                time.sleep(min(0.2, max(limite - time.monotonic(), 0)))
+                obtido = conexao.execute(text('SELECT pg_try_advisory_lock(:k)'), {'k': chave}).scalar()
+            self._contar(obtido)
+            try:
+                yield obtido
+            finally:
+                if obtido:
+                    conexao.execute(text('SELECT pg_advisory_unlock(:k)'), {'k': chave})
+
+    def assinar(self, canal, callback):
+        super().assinar(canal, callback)
+        self._reassinar.set()
+
+    def publicar(self, canal, mensagem=''):
+        """NOTIFY na transação da sessão atual (entregue às outras instâncias no commit)."""
+        from sqlalchemy import text
+        from app.extensions import db
+
+        db.session.execute(text('SELECT pg_notify(:canal, :mensagem)'),
+                           {'canal': canal, 'mensagem': f'{self.origem}|{mensagem}'})
+        super().publicar(canal, mensagem)
+
+    # ---------------------------------------------------------------- escuta
+
+    def iniciar(self):
+        # Iniciada na primeira requisição, já dentro do processo worker (após o fork)
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._escutar, name='i9-coordenacao', daemon=True)
+                self._thread.start()
+
+    def _escutar(self):
+        import select
+
+        primeira = True
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                conexao = self.engine.raw_connection()
+                pg = conexao.driver_connection
+                pg.autocommit = True
+                self._reassinar.clear()
+                with self._lock:
+                    canais = list(self._assinantes)
+                with pg.cursor() as cursor:
+                    for canal in canais:
+                        cursor.execute(f'LISTEN {canal}')
+                if not primeira:
+                    # Avisos enviados enquanto a escuta estava fora se perderam
+                    self.reconexoes += 1
+                    self._entregar_todos(None)
+                primeira = False
+
+                while not self._parar.is_set() and not self._reassinar.is_set():
+                    if select.select([pg], [], [], 5) == ([], [], []):
+                        continue
+                    pg.poll()
+                    while pg.notifies:
+                        aviso = pg.notifies.pop(0)
+                        origem, _, mensagem = aviso.payload.partition('|')
+                        if origem != self.origem:
+                            self._entregar(aviso.channel, mensagem)
+            except Exception:
+                logger.exception('Falha na escuta LISTEN/NOTIFY; nova conexão em %.0fs', self.reconexao_s)
+                self._parar.wait(self.reconexao_s)
+            finally:
+                if conexao is not None:
+                    try:
+                        conexao.close()
+                    except Exception:
+                        pass
+
+    def fechar(self):
+        self._parar.set()
+        self.engine.dispose()
+
+    def resumo(self):
+        dados = super().resumo()
+        dados['escutando'] = self._thread is not None and self._thread.is_alive()
+        dados['reconexoes'] = self.reconexoes
+        return dados
+
+
+def configurar_coordenacao(app):
+    """
+    Escolhe o backend (COORDENACAO: auto, postgres ou memoria) e mantém em
+    cache as versões de VersaoDados quando os avisos alcançam todas as
+    instâncias.
+    """
+    from sqlalchemy.engine import make_url
+
+    escolha = app.config.get('COORDENACAO', 'auto')
+    url = app.config.get('COORDENACAO_URL') or app.config['SQLALCHEMY_DATABASE_URI']
+    if escolha == 'postgres' or (escolha == 'auto' and make_url(url).get_backend_name() == 'postgresql'):
+        coordenacao = CoordenacaoPostgres(url)
+    else:
+        coordenacao = CoordenacaoMemoria()
+    app.extensions['i9_coordenacao'] = coordenacao
+
+    # Versões dos dados em memória, invalidadas pelo NOTIFY (TTL como rede de segurança)
+    ttl = app.config.get('COORDENACAO_VERSOES_TTL_S', 60)
+    if coordenacao.entre_processos and ttl > 0:
+        from app.models.versao_dados import CacheVersoes
+        cache = CacheVersoes(ttl)
+        app.extensions['i9_versoes'] = cache
+        coordenacao.assinar('i9_versoes', cache.invalidar)
+
+    if coordenacao.entre_processos and not app.testing:
+        @app.before_request
+        def iniciar_coordenacao():
+            coordenacao.iniciar()
+
+    return coordenacao
@@ -0,0 +1,15 @@
+"""
+Sistema I9 - Camada de Banco de Dados
+"""
+
+from app.database.metricas_sql import MetricasSQL, configurar_metricas_sql, esperar_consultas, registrar_consultas
+from app.database.pool import PERFIS_POOL, MetricasPool, opcoes_engine, instrumentar_pool
+from app.database.replica import SessaoRoteada, configurar_replica, leitura_replica
+from app.database.sqlite import PRAGMAS_SQLITE, configurar_sqlite
+
+__all__ = [
+    'MetricasSQL', 'configurar_metricas_sql', 'esperar_consultas', 'registrar_consultas',
+    'PERFIS_POOL', 'MetricasPool', 'opcoes_engine', 'instrumentar_pool',
+    'SessaoRoteada', 'configurar_replica', 'leitura_replica',
+    'PRAGMAS_SQLITE', 'configurar_sqlite'
+]
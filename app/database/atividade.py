@@ -0,0 +1,141 @@
+"""
+Sistema I9 - Registro de Atividade de Login em Lotes
+
+O login não abre transação de escrita: registrar() só guarda o evento em
+memória. Uma thread grava a cada LOGIN_FLUSH_INTERVAL segundos, numa única
+transação, o último login de cada usuário (vários logins do mesmo usuário no
+intervalo viram um UPDATE) e as linhas do historico_logins.
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, or_, update
+
+logger = logging.getLogger(__name__)
+
+
+class RegistradorLogins:
+    """Acumula logins e grava em lote, no máximo a cada `intervalo` segundos."""
+
+    def __init__(self, app, intervalo=5.0, max_pendentes=1000):
+        self.app = app
+        self.intervalo = intervalo
+        self.max_pendentes = max_pendentes
+        self._lock = threading.Lock()
+        self._ultimo = {}
+        self._historico = []
+        self._acordar = threading.Event()
+        self._thread = None
+        self.lotes = 0
+        self.logins = 0
+        self.falhas = 0
+
+    def registrar(self, usuario_id, ip_origem=None, user_agent=None, quando=None):
+        """Enfileira um login; não acessa o banco (exceto com intervalo 0)."""
+        from app.models import HistoricoLogin
+
+        quando = quando or datetime.utcnow()
+        with self._lock:
+            if quando > self._ultimo.get(usuario_id, quando.min):
+                self._ultimo[usuario_id] = quando
+            self._historico.append({
+                'usuario_id': usuario_id,
+                'data_login': quando,
+                'ip_origem': ip_origem,
+                'user_agent': (user_agent or '')[:HistoricoLogin.TAMANHO_USER_AGENT] or None
+            })
+            cheio = len(self._historico) >= self.max_pendentes
+
+        if self.intervalo <= 0:
+            self.descarregar()
+            return
+        self._iniciar()
+        if cheio:
+            self._acordar.set()
+
+    def _iniciar(self):
+        # Iniciada no primeiro login, já dentro do processo worker (após o fork)
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='i9-logins', daemon=True)
+                self._thread.start()
+                atexit.register(self.descarregar)
+
+    def _loop(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            self.descarregar()
+
+    def descarregar(self):
+        """Grava os logins pendentes. Retorna quantos foram gravados."""
+        from app.extensions import db
+        from app.models import HistoricoLogin, Usuario
+
+        with self._lock:
+            ultimo, historico = self._ultimo, self._historico
+            self._ultimo, self._historico = {}, []
+        if not historico:
+            return 0
+
+        usuarios = Usuario.__table__
+        with self.app.app_context():
+            try:
+                db.session.execute(
+                    update(usuarios)
+                    .where(usuarios.c.id == bindparam('uid'))
+                    .where(or_(usuarios.c.ultimo_login.is_(None),
+                               usuarios.c.ultimo_login < bindparam('quando')))
+                    .values(ultimo_login=bindparam('quando')),
+                    [{'uid': uid, 'quando': quando} for uid, quando in ultimo.items()]
+                )
+                db.session.execute(insert(HistoricoLogin), historico)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.falhas += 1
+                logger.exception('Falha ao gravar %d login(s); nova tentativa no próximo lote', len(historico))
+                self._devolver(ultimo, historico)
+                return 0
+            finally:
+                db.session.remove()
+
+        self.lotes += 1
+        self.logins += len(historico)
+        return len(historico)
+
+    def _devolver(self, ultimo, historico):
+        """Recoloca um lote que falhou na fila, sem passar de max_pendentes."""
+        with self._lock:
+            for uid, quando in ultimo.items():
+                if quando > self._ultimo.get(uid, quando.min):
+                    self._ultimo[uid] = quando
+            espaco = max(self.max_pendentes - len(self._historico), 0)
+            self._historico[:0] = historico[-espaco:] if espaco else []
+
+    def resumo(self):
+        with self._lock:
+            pendentes = len(self._historico)
+        return {
+            'intervalo_s': self.intervalo,
+            'pendentes': pendentes,
+            'lotes': self.lotes,
+            'logins': self.logins,
+            'falhas': self.falhas
+        }
+
+
+def configurar_registro_logins(app):
+    """Cria o registrador de logins da aplicação."""
+    registrador = RegistradorLogins(
+        app,
+        intervalo=app.config.get('LOGIN_FLUSH_INTERVAL', 5.0),
+        max_pendentes=app.config.get('LOGIN_FLUSH_MAX', 1000)
+    )
+    app.extensions['i9_logins'] = registrador
+    return registrador
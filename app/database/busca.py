@@ -0,0 +1,25 @@
+"""
+Sistema I9 - Critérios de Busca por Placa/Chassi
+"""
+
+from flask import current_app
+from sqlalchemy import Integer, column, text
+
+from app.database.sqlite import FTS_TAMANHO_MINIMO, termo_fts
+from app.models import Auditoria
+
+_SQL_FTS = text(
+    'SELECT rowid FROM auditorias_fts WHERE auditorias_fts MATCH :termo'
+).columns(column('rowid', Integer))
+
+
+def filtro_placa_chassi(busca):
+    """
+    Critério de busca por trecho de placa/chassi.
+
+    Usa o índice FTS5 (trigram) quando disponível no SQLite; nos demais casos,
+    ou com termos curtos demais para trigram, usa ILIKE.
+    """
+    if current_app.extensions.get('i9_fts') and len(busca) >= FTS_TAMANHO_MINIMO:
+        return Auditoria.id.in_(_SQL_FTS.bindparams(termo=termo_fts(busca)))
+    return Auditoria.placa_chassi.ilike(f'%{busca}%')
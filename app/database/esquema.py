@@ -0,0 +1,77 @@
+"""
+Sistema I9 - Atualização Aditiva do Esquema
+
+O db.create_all() só cria tabelas inexistentes. Esta rotina complementa as
+tabelas já existentes com colunas anuláveis e índices novos declarados nos
+modelos, sem nunca remover ou alterar o que já existe.
+
+Não roda na inicialização da aplicação: é executada uma vez por deploy com
+`flask i9 atualizar-esquema` (o quiosque a chama ao subir, num único
+processo). No PostgreSQL os índices são criados com CREATE INDEX
+CONCURRENTLY, sem bloquear as gravações na tabela.
+"""
+
+import logging
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+
+def atualizar_esquema(engine, metadata, lock_timeout_s=5):
+    """
+    Adiciona colunas anuláveis e índices ausentes. Retorna o que foi criado.
+
+    No PostgreSQL, cada ALTER TABLE desiste após `lock_timeout_s` segundos
+    esperando o lock da tabela (em vez de enfileirar as gravações atrás de
+    si) e os índices saem com CONCURRENTLY, fora de transação.
+    """
+    inspetor = inspect(engine)
+    tabelas = set(inspetor.get_table_names())
+    preparador = engine.dialect.identifier_preparer
+    postgres = engine.dialect.name == 'postgresql'
+    existentes = [t for t in metadata.sorted_tables if t.name in tabelas]
+    criados = []
+
+    with engine.begin() as conn:
+        if postgres:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout_s)}s'"))
+        for tabela in existentes:
+            colunas = {c['name'] for c in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in colunas:
+                    continue
+                if not coluna.nullable:
+                    logger.warning('Coluna obrigatória %s.%s ausente: requer migração manual',
+                                   tabela.name, coluna.name)
+                    continue
+                tipo = coluna.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE {preparador.quote(tabela.name)} '
+                    f'ADD COLUMN {preparador.quote(coluna.name)} {tipo}'
+                ))
+                criados.append(f'{tabela.name}.{coluna.name}')
+
+    with engine.connect() as conn:
+        if postgres:
+            # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        for tabela in existentes:
+            indices = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name in indices:
+                    continue
+                if postgres:
+                    sql = str(CreateIndex(indice).compile(dialect=engine.dialect))
+                    conn.execute(text(re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', sql)))
+                else:
+                    indice.create(conn, checkfirst=True)
+                criados.append(indice.name)
+        if not postgres:
+            conn.commit()
+
+    if criados:
+        logger.info('Esquema atualizado: %s', ', '.join(criados))
+    return criados
@@ -0,0 +1,136 @@
+"""
+Sistema I9 - Importação do Histórico Legado (app.py / sistema_i9.db)
+"""
+
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import Auditoria, Filial, Usuario
+
+TABELA_LEGADA = 'historico_consultas'
+TABELA_IMPORTADA = 'historico_consultas_importado'
+
+
+def _tabela_existe(conn, nome):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)
+    ).fetchone() is not None
+
+
+def _parse_data(valor):
+    """Converte o CURRENT_TIMESTAMP do SQLite legado em datetime."""
+    if isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+class _Mapeador:
+    """Resolve usuário e filial legados (texto livre) para IDs do banco novo."""
+
+    def __init__(self, usuario_padrao_id, filial_padrao_id):
+        self.usuario_padrao_id = usuario_padrao_id
+        self.filial_padrao_id = filial_padrao_id
+        self._usuarios = {}
+        for u in Usuario.query.all():
+            self._usuarios.setdefault(u.email.lower(), u.id)
+            self._usuarios.setdefault(u.email.split('@')[0].lower(), u.id)
+            self._usuarios.setdefault(u.nome.lower(), u.id)
+        self._filiais = {f.nome.lower(): f.id for f in Filial.query.all()}
+
+    def usuario(self, nome):
+        return self._usuarios.get((nome or '').strip().lower(), self.usuario_padrao_id)
+
+    def filial(self, nome):
+        return self._filiais.get((nome or '').strip().lower(), self.filial_padrao_id)
+
+
+def importar_historico_legado(caminho, tamanho_lote=1000, usuario_padrao_id=None,
+                              filial_padrao_id=None, renomear=True, log=print):
+    """
+    Importa `historico_consultas` de um banco SQLite legado para `auditorias`.
+
+    As linhas são inseridas em lotes (um INSERT multi-linha e um commit por
+    lote). Linhas já presentes (mesma placa, usuário e data) são ignoradas,
+    então a importação pode ser repetida. Ao final, a tabela legada é renomeada
+    para `historico_consultas_importado`, a menos que `renomear` seja falso.
+
+    Retorna um dicionário com os totais lidos, importados e ignorados.
+    """
+    totais = {'lidos': 0, 'importados': 0, 'ignorados': 0}
+
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _tabela_existe(conn, TABELA_LEGADA):
+            log(f'Nenhuma tabela {TABELA_LEGADA} em {caminho}; nada a importar.')
+            return totais
+
+        if usuario_padrao_id is None:
+            admin = Usuario.query.filter_by(role='admin').order_by(Usuario.id).first()
+            usuario_padrao_id = admin.id if admin else None
+        if filial_padrao_id is None:
+            filial = Filial.query.order_by(Filial.id).first()
+            filial_padrao_id = filial.id if filial else None
+        if usuario_padrao_id is None or filial_padrao_id is None:
+            raise ValueError('Cadastre ao menos um admin e uma filial antes de importar.')
+
+        mapeador = _Mapeador(usuario_padrao_id, filial_padrao_id)
+        colunas = {c[1] for c in conn.execute(f'PRAGMA table_info({TABELA_LEGADA})')}
+        tem_filial = 'filial' in colunas
+
+        cursor = conn.execute(f'SELECT * FROM {TABELA_LEGADA} ORDER BY id')
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            totais['lidos'] += len(linhas)
+
+            lote = [
+                {
+                    'usuario_id': mapeador.usuario(l['usuario']),
+                    'filial_id': mapeador.filial(l['filial'] if tem_filial else None),
+                    'placa_chassi': (l['placa_chassi'] or '').upper(),
+                    'tipo_busca': l['tipo_busca'] or 'placa',
+                    'resultado': l['resultado_resumido'],
+                    'status': l['status_consulta'] or 'sucesso',
+                    'ip_origem': None,
+                    'data_consulta': _parse_data(l['data_consulta']),
+                }
+                for l in linhas
+            ]
+
+            # Descarta o que já foi importado numa execução anterior
+            datas = [r['data_consulta'] for r in lote]
+            existentes = set(
+                db.session.query(Auditoria.placa_chassi, Auditoria.usuario_id, Auditoria.data_consulta)
+                .filter(Auditoria.data_consulta.in_(datas))
+                .all()
+            )
+            novos = [
+                r for r in lote
+                if (r['placa_chassi'], r['usuario_id'], r['data_consulta']) not in existentes
+            ]
+            totais['ignorados'] += len(lote) - len(novos)
+
+            if novos:
+                db.session.execute(insert(Auditoria), novos)
+                db.session.commit()
+                totais['importados'] += len(novos)
+            log(f"Lote processado: {totais['lidos']} lidos, {totais['importados']} importados")
+
+        if renomear and _tabela_existe(conn, TABELA_IMPORTADA):
+            log(f'{TABELA_IMPORTADA} já existe; tabela legada mantida com o nome original.')
+        elif renomear:
+            conn.execute(f'ALTER TABLE {TABELA_LEGADA} RENAME TO {TABELA_IMPORTADA}')
+            conn.commit()
+            log(f'Tabela legada renomeada para {TABELA_IMPORTADA}.')
+    finally:
+        conn.close()
+
+    return totais
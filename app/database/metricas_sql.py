@@ -0,0 +1,265 @@
+"""
+Sistema I9 - Tempos de SQL por Endpoint e Detecção de N+1
+
+Os comandos executados são agrupados por "fingerprint" (o SQL com literais,
+parâmetros e listas IN/VALUES normalizados), com contagem, tempo total e
+máximo por endpoint. Uma requisição que repete o mesmo fingerprint mais de
+SQL_N_MAIS_UM_LIMITE vezes é marcada como N+1.
+
+Para testes e benchmarks, esperar_consultas() falha se um bloco executar
+SQL demais:
+
+    with esperar_consultas(maximo=3, repeticoes_max=1):
+        cliente.get('/api/historico')
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Contagem por fingerprint da requisição atual: {fingerprint: [execuções, total_ms, max_ms]}
+_requisicao = ContextVar('i9_sql_requisicao', default=None)
+
+FORA_DE_REQUISICAO = '(segundo plano)'
+
+_COMENTARIOS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_TEXTOS = re.compile(r"'(?:[^']|'')*'")
+_PARAMETROS = re.compile(r'%\(\w+\)s|%s|\$\d+|(?<!:):\w+')
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_LINHAS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_ESPACOS = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Normaliza o SQL para agrupar comandos iguais com valores diferentes:
+    literais e parâmetros viram ?, "IN (?, ?, ?)" vira "IN (?)" e várias
+    linhas de VALUES viram uma só.
+    """
+    sql = _COMENTARIOS.sub(' ', sql)
+    sql = _TEXTOS.sub('?', sql)
+    sql = _PARAMETROS.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    sql = _LISTAS.sub('(?)', sql)
+    sql = _LINHAS.sub('(?)', sql)
+    return _ESPACOS.sub(' ', sql).strip()
+
+
+# ============================================================================
+# MÉTRICAS
+# ============================================================================
+
+class MetricasSQL:
+    """Fingerprints por endpoint (execuções, tempo total e máximo) e N+1 detectados."""
+
+    MAX_FINGERPRINTS = 300  # por endpoint; os demais somam em "(outros)"
+
+    def __init__(self, limite_n_mais_um=10, lento_ms=200):
+        self.limite_n_mais_um = limite_n_mais_um
+        self.lento_ms = lento_ms
+        self._lock = threading.Lock()
+        self.endpoints = {}     # endpoint -> {fingerprint: [execuções, total_ms, max_ms]}
+        self.requisicoes = Counter()
+        self.n_mais_um = {}     # (endpoint, fingerprint) -> {'requisicoes', 'max_repeticoes'}
+        self.lentas = 0
+
+    def _somar(self, endpoint, fp, execucoes, total_ms, max_ms):
+        grupo = self.endpoints.setdefault(endpoint, {})
+        if fp not in grupo and len(grupo) >= self.MAX_FINGERPRINTS:
+            fp = '(outros)'
+        m = grupo.setdefault(fp, [0, 0.0, 0.0])
+        m[0] += execucoes
+        m[1] += total_ms
+        m[2] = max(m[2], max_ms)
+
+    def registrar_requisicao(self, endpoint, contagem):
+        """Soma as consultas de uma requisição e verifica N+1."""
+        suspeitos = []
+        with self._lock:
+            self.requisicoes[endpoint] += 1
+            for fp, (execucoes, total_ms, max_ms) in contagem.items():
+                self._somar(endpoint, fp, execucoes, total_ms, max_ms)
+                if self.limite_n_mais_um and execucoes > self.limite_n_mais_um:
+                    n1 = self.n_mais_um.setdefault((endpoint, fp), {'requisicoes': 0, 'max_repeticoes': 0})
+                    if not n1['requisicoes']:
+                        suspeitos.append((fp, execucoes))
+                    n1['requisicoes'] += 1
+                    n1['max_repeticoes'] = max(n1['max_repeticoes'], execucoes)
+        for fp, execucoes in suspeitos:
+            logger.warning('Possível N+1 em %s: %d execuções de "%s"', endpoint, execucoes, fp[:300])
+
+    def registrar_avulsa(self, fp, ms):
+        """Consulta fora de requisição (threads de segundo plano, CLI)."""
+        with self._lock:
+            self._somar(FORA_DE_REQUISICAO, fp, 1, ms, ms)
+
+    def registrar_lenta(self, fp, ms, endpoint):
+        with self._lock:
+            self.lentas += 1
+        logger.warning('SQL lento em %s (%.1f ms): %s', endpoint or FORA_DE_REQUISICAO, ms, fp[:300])
+
+    def limpar(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.requisicoes.clear()
+            self.n_mais_um.clear()
+            self.lentas = 0
+
+    def resumo(self, limite=20):
+        """Por endpoint, os `limite` fingerprints de maior tempo total."""
+        with self._lock:
+            endpoints = {}
+            for endpoint, grupo in sorted(self.endpoints.items()):
+                requisicoes = self.requisicoes.get(endpoint)
+                ordenados = sorted(grupo.items(), key=lambda item: item[1][1], reverse=True)[:limite]
+                endpoints[endpoint] = {
+                    'requisicoes': requisicoes,
+                    'comandos': sum(m[0] for m in grupo.values()),
+                    'total_ms': round(sum(m[1] for m in grupo.values()), 1),
+                    'fingerprints': [{
+                        'sql': fp,
+                        'execucoes': m[0],
+                        'por_requisicao': round(m[0] / requisicoes, 2) if requisicoes else None,
+                        'total_ms': round(m[1], 2),
+                        'media_ms': round(m[1] / m[0], 3),
+                        'max_ms': round(m[2], 2)
+                    } for fp, m in ordenados]
+                }
+            return {
+                'limite_n_mais_um': self.limite_n_mais_um,
+                'lento_ms': self.lento_ms,
+                'lentas': self.lentas,
+                'endpoints': endpoints,
+                'n_mais_um': [{'endpoint': endpoint, 'sql': fp, **n1}
+                              for (endpoint, fp), n1 in sorted(self.n_mais_um.items())]
+            }
+
+
+def instrumentar_sql(engine, metricas):
+    """Registra os listeners de tempo de execução no engine."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('i9_sql_inicio', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get('i9_sql_inicio')
+        if not inicios:
+            return
+        ms = (time.perf_counter() - inicios.pop()) * 1000
+        fp = fingerprint(statement)
+        contagem = _requisicao.get()
+        if contagem is None:
+            metricas.registrar_avulsa(fp, ms)
+        else:
+            m = contagem.setdefault(fp, [0, 0.0, 0.0])
+            m[0] += 1
+            m[1] += ms
+            m[2] = max(m[2], ms)
+        if metricas.lento_ms and ms >= metricas.lento_ms:
+            from flask import has_request_context, request
+            metricas.registrar_lenta(fp, ms, request.endpoint if has_request_context() else None)
+
+    return metricas
+
+
+def configurar_metricas_sql(app, db):
+    """Instrumenta os engines e agrupa os comandos por endpoint a cada requisição."""
+    if not app.config.get('SQL_METRICAS', True):
+        return None
+
+    from flask import g, request
+
+    metricas = MetricasSQL(
+        limite_n_mais_um=app.config.get('SQL_N_MAIS_UM_LIMITE', 10),
+        lento_ms=app.config.get('SQL_LENTO_MS', 200)
+    )
+    app.extensions['i9_sql'] = metricas
+    with app.app_context():
+        for engine in db.engines.values():
+            instrumentar_sql(engine, metricas)
+
+    @app.before_request
+    def iniciar_contagem_sql():
+        contagem = {}
+        g.i9_sql = contagem
+        _requisicao.set(contagem)
+
+    @app.teardown_request
+    def registrar_contagem_sql(exc):
+        contagem = g.pop('i9_sql', None)
+        _requisicao.set(None)
+        if contagem is not None:
+            metricas.registrar_requisicao(request.endpoint or '(sem rota)', contagem)
+
+    return metricas
+
+
+# ============================================================================
+# VERIFICAÇÃO (TESTES E BENCHMARKS)
+# ============================================================================
+
+class ConsultasExecutadas:
+    """SQL executado dentro de esperar_consultas()/registrar_consultas()."""
+
+    def __init__(self):
+        self.comandos = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.comandos.append(statement)
+
+    @property
+    def total(self):
+        return len(self.comandos)
+
+    def por_fingerprint(self):
+        return Counter(fingerprint(sql) for sql in self.comandos)
+
+    def verificar(self, maximo=None, repeticoes_max=None):
+        """AssertionError se passou de `maximo` comandos ou de `repeticoes_max` por fingerprint."""
+        problemas = []
+        if maximo is not None and self.total > maximo:
+            problemas.append(f'{self.total} comandos SQL (máximo {maximo})')
+        if repeticoes_max is not None:
+            for fp, n in self.por_fingerprint().most_common():
+                if n <= repeticoes_max:
+                    break
+                problemas.append(f'{n}x (máximo {repeticoes_max}): {fp}')
+        if problemas:
+            raise AssertionError('SQL além do esperado:\n  ' + '\n  '.join(problemas))
+
+
+@contextmanager
+def registrar_consultas(engine=None):
+    """Coleta os comandos SQL executados no bloco (engine padrão: db.engine)."""
+    if engine is None:
+        from app.extensions import db
+        engine = db.engine
+    executadas = ConsultasExecutadas()
+    event.listen(engine, 'after_cursor_execute', executadas._registrar)
+    try:
+        yield executadas
+    finally:
+        event.remove(engine, 'after_cursor_execute', executadas._registrar)
+
+
+@contextmanager
+def esperar_consultas(maximo=None, repeticoes_max=None, engine=None):
+    """Falha (AssertionError) se o bloco executar SQL demais ou repetir um comando (N+1)."""
+    with registrar_consultas(engine) as executadas:
+        yield executadas
+    executadas.verificar(maximo, repeticoes_max)
@@ -0,0 +1,213 @@
+"""
+Sistema I9 - Perfis e Instrumentação do Pool de Conexões
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.database.sqlite import eh_sqlite_arquivo, opcoes_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# PERFIS DE IMPLANTAÇÃO
+# ==============================================================================
+
+# Cada perfil define tamanho, overflow, timeouts e estratégia de pre-ping juntos.
+# - padrao: comportamento histórico (pre-ping em todo checkout)
+# - vm_pequena: um único processo numa VM pequena; poucas conexões, pre-ping
+#   mantido porque o PostgreSQL local costuma reiniciar junto com a VM
+# - multi_worker: vários workers gunicorn; sem pre-ping (evita um round-trip por
+#   checkout), conexões recicladas antes do idle timeout do servidor e conexões
+#   quebradas invalidadas pelo próprio SQLAlchemy ao detectar desconexão
+# - pgbouncer: o PgBouncer já faz o pool; a aplicação não retém conexões
+PERFIS_POOL = {
+    'padrao': {
+        'pool_pre_ping': True,
+        'pool_recycle': 300,
+    },
+    'vm_pequena': {
+        'pool_size': 3,
+        'max_overflow': 2,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    },
+    'multi_worker': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 5,
+        'pool_recycle': 900,
+        'pool_pre_ping': False,
+        'pool_use_lifo': True,
+    },
+    'pgbouncer': {
+        'poolclass': NullPool,
+        'pool_pre_ping': False,
+    },
+}
+
+# Variáveis de ambiente que sobrescrevem valores individuais do perfil
+_SOBRESCRITAS_ENV = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+}
+_SOBRESCRITAS_SQLITE = {
+    'SQLITE_POOL_SIZE': ('pool_size', int),
+    'SQLITE_MAX_OVERFLOW': ('max_overflow', int),
+}
+
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que mede o tempo de espera por uma conexão livre."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metricas = getattr(self, '_i9_metricas', None)
+            if metricas is not None:
+                metricas.registrar_espera(time.perf_counter() - inicio)
+
+
+def opcoes_engine(uri, perfil='padrao', env=None, medir_espera=True):
+    """
+    Monta o SQLALCHEMY_ENGINE_OPTIONS para o perfil informado.
+
+    Para SQLite em arquivo usa um pool comum próprio (SQLITE_POOL_SIZE e
+    SQLITE_MAX_OVERFLOW, independente do perfil). Para SQLite em memória
+    retorna vazio e o SQLALCHEMY_ENGINE_OPTIONS da configuração é mantido.
+    """
+    if perfil not in PERFIS_POOL:
+        raise ValueError(f'Perfil de pool desconhecido: {perfil}')
+
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if not eh_sqlite_arquivo(url):
+            return {}
+        opcoes = opcoes_sqlite()
+        sobrescritas = _SOBRESCRITAS_SQLITE
+        usa_fila = True
+    else:
+        opcoes = dict(PERFIS_POOL[perfil])
+        sobrescritas = _SOBRESCRITAS_ENV
+        usa_fila = opcoes.get('poolclass') is None
+
+    if env and usa_fila:
+        for var, (chave, conversor) in sobrescritas.items():
+            valor = env.get(var)
+            if valor not in (None, ''):
+                opcoes[chave] = conversor(valor)
+
+    if medir_espera and usa_fila:
+        opcoes['poolclass'] = QueuePoolMedido
+
+    return opcoes
+
+
+# ==============================================================================
+# MÉTRICAS
+# ==============================================================================
+
+class MetricasPool:
+    """Contadores de uso do pool alimentados pelos eventos do SQLAlchemy."""
+
+    def __init__(self, limite_saturacao=0.8, limite_espera=0.1):
+        self.limite_saturacao = limite_saturacao
+        self.limite_espera = limite_espera
+        self._lock = threading.Lock()
+        self.capacidade = None
+        self.conexoes_abertas = 0
+        self.checkouts = 0
+        self.em_uso = 0
+        self.pico_em_uso = 0
+        self.eventos_saturacao = 0
+        self.invalidacoes = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.esperas_lentas = 0
+        self.esperas = 0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            if segundos > self.espera_max:
+                self.espera_max = segundos
+            lenta = segundos >= self.limite_espera
+            if lenta:
+                self.esperas_lentas += 1
+        if lenta:
+            logger.warning('Espera de %.1f ms por conexão do pool', segundos * 1000)
+
+    def _checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.em_uso += 1
+            if self.em_uso > self.pico_em_uso:
+                self.pico_em_uso = self.em_uso
+            saturado = self.capacidade and self.em_uso / self.capacidade >= self.limite_saturacao
+            if saturado:
+                self.eventos_saturacao += 1
+            em_uso = self.em_uso
+        if saturado:
+            logger.warning('Pool saturado: %d de %d conexões em uso', em_uso, self.capacidade)
+
+    def _checkin(self, *args):
+        with self._lock:
+            self.em_uso = max(0, self.em_uso - 1)
+
+    def _connect(self, *args):
+        with self._lock:
+            self.conexoes_abertas += 1
+
+    def _close(self, *args):
+        with self._lock:
+            self.conexoes_abertas = max(0, self.conexoes_abertas - 1)
+
+    def _invalidate(self, *args):
+        with self._lock:
+            self.invalidacoes += 1
+
+    def resumo(self):
+        """Retorna um snapshot das métricas como dicionário."""
+        with self._lock:
+            return {
+                'capacidade': self.capacidade,
+                'conexoes_abertas': self.conexoes_abertas,
+                'em_uso': self.em_uso,
+                'pico_em_uso': self.pico_em_uso,
+                'saturacao': round(self.em_uso / self.capacidade, 3) if self.capacidade else None,
+                'eventos_saturacao': self.eventos_saturacao,
+                'checkouts': self.checkouts,
+                'invalidacoes': self.invalidacoes,
+                'espera_media_ms': round(self.espera_total / self.esperas * 1000, 3) if self.esperas else 0.0,
+                'espera_max_ms': round(self.espera_max * 1000, 3),
+                'esperas_lentas': self.esperas_lentas,
+            }
+
+
+def instrumentar_pool(engine, metricas=None):
+    """Registra os listeners de pool no engine e retorna as métricas."""
+    metricas = metricas or MetricasPool()
+    pool = engine.pool
+
+    if isinstance(pool, QueuePool):
+        metricas.capacidade = pool.size() + max(pool._max_overflow, 0)
+    pool._i9_metricas = metricas
+
+    event.listen(engine, 'checkout', metricas._checkout)
+    event.listen(engine, 'checkin', metricas._checkin)
+    event.listen(engine, 'connect', metricas._connect)
+    event.listen(engine, 'close', metricas._close)
+    event.listen(engine, 'invalidate', metricas._invalidate)
+    return metricas
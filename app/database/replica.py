@@ -0,0 +1,172 @@
+"""
+Sistema I9 - Roteamento de Leituras para Réplica
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+BIND_REPLICA = 'replica'
+
+# Chave na sessão do usuário com o horário da última escrita (leitura após escrita)
+_CHAVE_ESCRITA = 'i9_ultima_escrita'
+
+# Tabelas cujas escritas o próprio usuário espera ver nas leituras seguintes
+TABELAS_LEITURA_APOS_ESCRITA = {'auditorias'}
+
+_SQL_ATRASO_POSTGRES = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() IS NULL
+          OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_SQL_ULTIMA_AUDITORIA = text('SELECT MAX(data_consulta) FROM auditorias')
+
+
+class RoteadorReplica:
+    """
+    Decide se as leituras podem ir para a réplica.
+
+    O atraso da réplica é medido no máximo a cada `intervalo` segundos; se
+    passar de `atraso_max` (ou a réplica estiver inacessível) as leituras
+    voltam para o primário até a próxima verificação.
+    """
+
+    def __init__(self, db, atraso_max=30.0, intervalo=10.0):
+        self.db = db
+        self.atraso_max = atraso_max
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._verificado_em = 0.0
+        self._saudavel = False
+        self.atraso = None
+        self.leituras_replica = 0
+        self.leituras_primario = 0
+
+    @property
+    def engine(self):
+        return self.db.engines.get(BIND_REPLICA)
+
+    def medir_atraso(self):
+        """Retorna o atraso estimado da réplica em segundos."""
+        replica = self.engine
+        with replica.connect() as conn:
+            if replica.dialect.name == 'postgresql':
+                return float(conn.execute(_SQL_ATRASO_POSTGRES).scalar() or 0)
+            ultima_replica = conn.execute(_SQL_ULTIMA_AUDITORIA).scalar()
+
+        # Sem função de atraso nativa: compara a última auditoria dos dois bancos
+        with self.db.engines[None].connect() as conn:
+            ultima_primario = conn.execute(_SQL_ULTIMA_AUDITORIA).scalar()
+        if not ultima_primario:
+            return 0.0
+        if not ultima_replica:
+            return float('inf')
+        if isinstance(ultima_primario, str):
+            ultima_primario = datetime.fromisoformat(ultima_primario)
+            ultima_replica = datetime.fromisoformat(ultima_replica)
+        return max((ultima_primario - ultima_replica).total_seconds(), 0.0)
+
+    def disponivel(self):
+        """Indica se a réplica está dentro do limite de atraso."""
+        if self.engine is None:
+            return False
+
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo:
+            return self._saudavel
+
+        with self._lock:
+            if agora - self._verificado_em < self.intervalo:
+                return self._saudavel
+            try:
+                self.atraso = self.medir_atraso()
+                self._saudavel = self.atraso <= self.atraso_max
+                if not self._saudavel:
+                    logger.warning('Réplica atrasada %.1fs; leituras no primário', self.atraso)
+            except Exception as e:
+                self.atraso = None
+                self._saudavel = False
+                logger.warning('Réplica indisponível (%s); leituras no primário', e)
+            self._verificado_em = agora
+        return self._saudavel
+
+    def resumo(self):
+        return {
+            'configurada': self.engine is not None,
+            'saudavel': self._saudavel,
+            'atraso_s': self.atraso if self.atraso != float('inf') else None,
+            'leituras_replica': self.leituras_replica,
+            'leituras_primario': self.leituras_primario,
+        }
+
+
+def _roteador():
+    if not has_request_context():
+        return None
+    return current_app.extensions.get('i9_replica')
+
+
+def _escrita_recente(roteador):
+    """Garante que o usuário leia as próprias escritas recentes no primário."""
+    ultima = session.get(_CHAVE_ESCRITA)
+    return ultima is not None and time.time() - ultima < roteador.atraso_max
+
+
+class SessaoRoteada(Session):
+    """Sessão que envia leituras de endpoints marcados para a réplica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and g.get('i9_leitura_replica'):
+            roteador = _roteador()
+            if roteador is not None:
+                if not _escrita_recente(roteador) and roteador.disponivel():
+                    roteador.leituras_replica += 1
+                    return roteador.engine
+                roteador.leituras_primario += 1
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def leitura_replica(f):
+    """Decorator que marca um endpoint somente leitura como elegível à réplica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.i9_leitura_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.i9_leitura_replica = False
+    return decorated_function
+
+
+@event.listens_for(SessaoRoteada, 'before_flush')
+def _marcar_escrita(sessao, contexto_flush, instancias):
+    if _roteador() is None:
+        return
+    if any(getattr(obj, '__tablename__', None) in TABELAS_LEITURA_APOS_ESCRITA for obj in sessao.new):
+        session[_CHAVE_ESCRITA] = time.time()
+
+
+def configurar_replica(app, db):
+    """Ativa o roteamento se DATABASE_REPLICA_URL estiver configurada."""
+    if not app.config.get('DATABASE_REPLICA_URL'):
+        return None
+
+    roteador = RoteadorReplica(
+        db,
+        atraso_max=app.config.get('DATABASE_REPLICA_MAX_LAG', 30.0),
+        intervalo=app.config.get('DATABASE_REPLICA_CHECK_INTERVAL', 10.0)
+    )
+    app.extensions['i9_replica'] = roteador
+    return roteador
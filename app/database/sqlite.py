@@ -0,0 +1,187 @@
+"""
+Sistema I9 - Modo SQLite (WAL, pool de conexões, pragmas, FTS5 e manutenção)
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+# Pragmas aplicados a cada nova conexão SQLite
+PRAGMAS_SQLITE = {
+    'journal_mode': 'WAL',       # leitores não bloqueiam o escritor
+    'synchronous': 'NORMAL',     # seguro com WAL, evita fsync a cada commit
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,        # ms esperando o lock antes de "database is locked"
+    'temp_store': 'MEMORY',
+}
+
+
+def eh_sqlite_arquivo(url):
+    """Indica se a URL aponta para um arquivo SQLite (não em memória)."""
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def opcoes_sqlite(pool_size=5, max_overflow=20, pool_timeout=30):
+    """
+    Opções de engine para o modo SQLite em arquivo.
+
+    Pool comum (QueuePool): as conexões são reaproveitadas entre requisições
+    e os pragmas só são aplicados ao abrir cada uma (ver configurar_sqlite).
+    Não depende do número de threads do servidor: o werkzeug de `python
+    app.py` cria uma thread por requisição, e acima de pool_size +
+    max_overflow as requisições esperam até pool_timeout por uma conexão.
+    """
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+    }
+
+
+def aplicar_pragmas(dbapi_conn, pragmas=None):
+    """Executa os PRAGMAs numa conexão DBAPI do sqlite3."""
+    cursor = dbapi_conn.cursor()
+    try:
+        for nome, valor in (pragmas or PRAGMAS_SQLITE).items():
+            cursor.execute(f'PRAGMA {nome}={valor}')
+    finally:
+        cursor.close()
+
+
+def pragmas_da_config(config):
+    """Pragmas base acrescidos de mmap e cache conforme a configuração."""
+    pragmas = dict(PRAGMAS_SQLITE)
+    if config.get('SQLITE_MMAP_SIZE'):
+        pragmas['mmap_size'] = int(config['SQLITE_MMAP_SIZE'])
+    if config.get('SQLITE_CACHE_SIZE'):
+        # Valor negativo = tamanho em KiB (independe do page_size)
+        pragmas['cache_size'] = int(config['SQLITE_CACHE_SIZE'])
+    return pragmas
+
+
+def configurar_sqlite(engine, pragmas=None):
+    """Registra a aplicação dos pragmas em toda nova conexão do engine."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(dbapi_conn, registro):
+        aplicar_pragmas(dbapi_conn, pragmas)
+
+
+# ==============================================================================
+# BUSCA DE PLACA/CHASSI (FTS5)
+# ==============================================================================
+
+# Índice trigram sobre auditorias.placa_chassi: atende buscas por trecho
+# (equivalente ao ILIKE '%termo%') sem varrer a tabela inteira.
+_DDL_FTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS auditorias_fts USING fts5(
+        placa_chassi, content='auditorias', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auditorias_fts_ai AFTER INSERT ON auditorias BEGIN
+        INSERT INTO auditorias_fts(rowid, placa_chassi) VALUES (new.id, new.placa_chassi);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auditorias_fts_ad AFTER DELETE ON auditorias BEGIN
+        INSERT INTO auditorias_fts(auditorias_fts, rowid, placa_chassi)
+        VALUES ('delete', old.id, old.placa_chassi);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auditorias_fts_au AFTER UPDATE OF placa_chassi ON auditorias BEGIN
+        INSERT INTO auditorias_fts(auditorias_fts, rowid, placa_chassi)
+        VALUES ('delete', old.id, old.placa_chassi);
+        INSERT INTO auditorias_fts(rowid, placa_chassi) VALUES (new.id, new.placa_chassi);
+    END
+    """,
+]
+
+# Trigram não indexa termos com menos de 3 caracteres
+FTS_TAMANHO_MINIMO = 3
+
+
+def criar_fts(engine):
+    """
+    Cria o índice FTS5 de placas e os triggers de sincronização.
+
+    Retorna False se o SQLite não tiver FTS5 com tokenizer trigram (>= 3.34);
+    nesse caso a busca continua usando LIKE.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with engine.begin() as conn:
+            existia = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'auditorias_fts'"
+            )).first() is not None
+            for ddl in _DDL_FTS:
+                conn.execute(text(ddl))
+            if not existia:
+                conn.execute(text("INSERT INTO auditorias_fts(auditorias_fts) VALUES ('rebuild')"))
+        return True
+    except Exception as e:
+        logger.warning('FTS5 indisponível, busca de placa usará LIKE: %s', e)
+        return False
+
+
+def termo_fts(busca):
+    """Escapa o termo digitado como frase FTS5."""
+    return '"' + busca.replace('"', '""') + '"'
+
+
+# ==============================================================================
+# MANUTENÇÃO PERIÓDICA (VACUUM / ANALYZE)
+# ==============================================================================
+
+def manutencao_sqlite(engine, vacuum=True):
+    """Executa ANALYZE, otimiza o FTS, faz checkpoint do WAL e VACUUM."""
+    if engine.dialect.name != 'sqlite':
+        return {}
+
+    tempos = {}
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        etapas = [
+            ('analyze', 'ANALYZE'),
+            ('optimize', 'PRAGMA optimize'),
+        ]
+        if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'auditorias_fts'")).first():
+            etapas.append(('fts', "INSERT INTO auditorias_fts(auditorias_fts) VALUES ('optimize')"))
+        if vacuum:
+            etapas.append(('vacuum', 'VACUUM'))
+        etapas.append(('checkpoint', 'PRAGMA wal_checkpoint(TRUNCATE)'))
+
+        for nome, sql in etapas:
+            inicio = time.perf_counter()
+            conn.execute(text(sql))
+            tempos[nome] = round(time.perf_counter() - inicio, 3)
+
+    logger.info('Manutenção SQLite concluída: %s', tempos)
+    return tempos
+
+
+def iniciar_manutencao_periodica(engine, intervalo_horas):
+    """Agenda a manutenção numa thread daemon a cada `intervalo_horas`."""
+    if engine.dialect.name != 'sqlite' or not intervalo_horas:
+        return None
+
+    parar = threading.Event()
+
+    def loop():
+        while not parar.wait(intervalo_horas * 3600):
+            try:
+                manutencao_sqlite(engine)
+            except Exception as e:
+                logger.warning('Falha na manutenção SQLite: %s', e)
+
+    thread = threading.Thread(target=loop, name='i9-manutencao-sqlite', daemon=True)
+    thread.start()
+    return parar
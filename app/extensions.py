@@ -5,9 +5,10 @@ Sistema I9 - Extensões Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from app.database.replica import SessaoRoteada
 
 # Instâncias das extensões
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 login_manager = LoginManager()
 migrate = Migrate()
 
@@ -6,5 +6,13 @@ from app.models.usuario import Usuario
 from app.models.filial import Filial
 from app.models.usuario_filial import UsuarioFilial
 from app.models.auditoria import Auditoria
+from app.models.snapshot_veiculo import SnapshotVeiculo
+from app.models.versao_dados import VersaoDados
+from app.models.historico_login import HistoricoLogin
+from app.models.chave_idempotencia import ChaveIdempotencia
+from app.models.veiculo_monitorado import VeiculoMonitorado
+from app.models.alerta_veiculo import AlertaVeiculo
+from app.models.tarefa import Tarefa
 
-__all__ = ['Usuario', 'Filial', 'UsuarioFilial', 'Auditoria']
+__all__ = ['Usuario', 'Filial', 'UsuarioFilial', 'Auditoria', 'SnapshotVeiculo', 'VersaoDados',
+           'HistoricoLogin', 'ChaveIdempotencia', 'VeiculoMonitorado', 'AlertaVeiculo', 'Tarefa']
@@ -0,0 +1,105 @@
+"""
+Sistema I9 - Modelo de Alerta de Veículo Monitorado
+"""
+
+import json
+from datetime import datetime
+from sqlalchemy import update
+from app.extensions import db
+
+
+class AlertaVeiculo(db.Model):
+    """Mudança encontrada pelo monitoramento de frota numa placa monitorada."""
+
+    __tablename__ = 'alertas_veiculo'
+    __table_args__ = (
+        # Alertas não lidos da filial (badge do dashboard)
+        db.Index('ix_alertas_veiculo_filial_lido', 'filial_id', 'lido_em', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    monitorado_id = db.Column(db.Integer, db.ForeignKey('veiculos_monitorados.id'), nullable=False)
+    filial_id = db.Column(db.Integer, db.ForeignKey('filiais.id'), nullable=False)
+    placa = db.Column(db.String(10), nullable=False)
+    resumo = db.Column(db.String(255), nullable=False)
+    grave = db.Column(db.Boolean, default=False, nullable=False)  # restrição nova
+    mudancas = db.Column(db.Text, nullable=False)  # JSON do diff (SnapshotVeiculo.diff)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    lido_em = db.Column(db.DateTime)
+    lido_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+
+    @staticmethod
+    def resumir(mudancas):
+        """Texto curto das mudanças e se há restrição nova."""
+        partes = []
+        novas = mudancas.get('restricoes_novas') or []
+        levantadas = mudancas.get('restricoes_levantadas') or []
+        if novas:
+            partes.append('Nova restrição: ' + ', '.join(str(r.get('tipo') if isinstance(r, dict) else r)
+                                                        for r in novas))
+        if levantadas:
+            partes.append('Restrição levantada: ' + ', '.join(str(r.get('tipo') if isinstance(r, dict) else r)
+                                                              for r in levantadas))
+        for campo, (antes, depois) in (mudancas.get('alteracoes') or {}).items():
+            if campo != 'restricoes.possui_restricoes':
+                partes.append(f'{campo}: {antes} → {depois}')
+        return ('; '.join(partes) or 'Dados alterados')[:255], bool(novas)
+
+    @staticmethod
+    def criar(monitorado, mudancas):
+        """Cria o alerta (sem commit: gravado junto com a auditoria da verificação)."""
+        resumo, grave = AlertaVeiculo.resumir(mudancas)
+        alerta = AlertaVeiculo(
+            monitorado_id=monitorado.id,
+            filial_id=monitorado.filial_id,
+            placa=monitorado.placa,
+            resumo=resumo,
+            grave=grave,
+            mudancas=json.dumps(mudancas, ensure_ascii=False)
+        )
+        db.session.add(alerta)
+        return alerta
+
+    @staticmethod
+    def nao_lidos(filiais_ids, limite=50):
+        """Alertas não lidos das filiais, mais recentes primeiro."""
+        if not filiais_ids:
+            return []
+        return AlertaVeiculo.query\
+            .filter(AlertaVeiculo.filial_id.in_(filiais_ids), AlertaVeiculo.lido_em.is_(None))\
+            .order_by(AlertaVeiculo.id.desc())\
+            .limit(limite)\
+            .all()
+
+    @staticmethod
+    def marcar_lidos(filiais_ids, usuario_id, ids=None):
+        """Marca como lidos os alertas (todos das filiais, sem `ids`). Retorna quantos."""
+        if not filiais_ids:
+            return 0
+        comando = update(AlertaVeiculo)\
+            .where(AlertaVeiculo.filial_id.in_(filiais_ids), AlertaVeiculo.lido_em.is_(None))\
+            .values(lido_em=datetime.utcnow(), lido_por=usuario_id)
+        if ids is not None:
+            comando = comando.where(AlertaVeiculo.id.in_(ids))
+        resultado = db.session.execute(comando)
+        db.session.commit()
+        return resultado.rowcount
+
+    def get_mudancas(self):
+        try:
+            return json.loads(self.mudancas) if self.mudancas else {}
+        except ValueError:
+            return {}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'placa': self.placa,
+            'resumo': self.resumo,
+            'grave': self.grave,
+            'mudancas': self.get_mudancas(),
+            'criado_em': self.criado_em.strftime('%d/%m/%Y %H:%M') if self.criado_em else None
+        }
+
+    def __repr__(self):
+        return f'<AlertaVeiculo {self.placa} {self.resumo[:30]}>'
@@ -10,33 +10,49 @@ class Auditoria(db.Model):
     """Modelo de log de auditoria de consultas."""
     
     __tablename__ = 'auditorias'
+    __table_args__ = (
+        # Histórico do usuário ordenado por data (filtros e paginação por cursor)
+        db.Index('ix_auditorias_usuario_data', 'usuario_id', 'data_consulta', 'id'),
+        db.Index('ix_auditorias_filial_data', 'filial_id', 'data_consulta'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     filial_id = db.Column(db.Integer, db.ForeignKey('filiais.id'), nullable=False)
     placa_chassi = db.Column(db.String(50), nullable=False)
     tipo_busca = db.Column(db.String(20), nullable=False)  # placa, chassi
+    chassi = db.Column(db.String(17), index=True)
+    renavam = db.Column(db.String(11), index=True)
     resultado = db.Column(db.Text)  # JSON com resumo do resultado
-    status = db.Column(db.String(20), default='sucesso')  # sucesso, erro, nao_encontrado
+    status = db.Column(db.String(20), default='sucesso')  # sucesso, erro, nao_encontrado, cache
     ip_origem = db.Column(db.String(45))  # IPv4 ou IPv6
+    trace_id = db.Column(db.String(32))  # trace da requisição (ver app.rastreamento)
     data_consulta = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    CABECALHO_CSV = ['Data/Hora', 'Usuario', 'Filial', 'Placa/Chassi', 'Tipo', 'Status', 'IP', 'Resultado']
+    
     @staticmethod
-    def registrar(usuario_id, filial_id, placa_chassi, tipo_busca, resultado, status='sucesso', ip_origem=None):
-        """Registra uma nova entrada de auditoria."""
+    def registrar(usuario_id, filial_id, placa_chassi, tipo_busca, resultado, status='sucesso', ip_origem=None,
+                  chassi=None, renavam=None):
+        """Registra uma nova entrada de auditoria (com o trace id da requisição atual)."""
         import json
+        from app.rastreamento import span, trace_id_atual
         
         auditoria = Auditoria(
             usuario_id=usuario_id,
             filial_id=filial_id,
             placa_chassi=placa_chassi.upper(),
             tipo_busca=tipo_busca,
+            chassi=chassi.upper() if chassi else None,
+            renavam=renavam or None,
             resultado=json.dumps(resultado, ensure_ascii=False) if isinstance(resultado, dict) else resultado,
             status=status,
-            ip_origem=ip_origem
+            ip_origem=ip_origem,
+            trace_id=trace_id_atual()
         )
-        db.session.add(auditoria)
-        db.session.commit()
+        with span('auditoria.registrar', status=status):
+            db.session.add(auditoria)
+            db.session.commit()
         return auditoria
     
     def get_resultado_dict(self):
@@ -47,5 +63,18 @@ class Auditoria(db.Model):
         except:
             return {}
     
+    def linha_csv(self):
+        """Linha da exportação em CSV (colunas de CABECALHO_CSV)."""
+        return [
+            self.data_consulta.strftime('%d/%m/%Y %H:%M:%S'),
+            self.usuario.nome if self.usuario else 'N/A',
+            self.filial.nome if self.filial else 'N/A',
+            self.placa_chassi,
+            self.tipo_busca,
+            self.status,
+            self.ip_origem or '',
+            self.resultado or ''
+        ]
+    
     def __repr__(self):
         return f'<Auditoria {self.id} - {self.placa_chassi}>'
@@ -0,0 +1,129 @@
+"""
+Sistema I9 - Modelo de Chave de Idempotência
+"""
+
+import hashlib
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+
+# Validade da reserva enquanto a consulta original roda (acima do prazo das
+# restrições); se o worker cair no meio, a chave fica livre depois disso
+RESERVA_S = 180
+
+FORMATO_CHAVE = re.compile(r'^[A-Za-z0-9_.:-]{8,64}$')
+
+
+class ChaveIdempotencia(db.Model):
+    """
+    Consulta identificada pela chave enviada pelo cliente (header
+    Idempotency-Key). Repetições da mesma chave recebem a resposta gravada,
+    ou aguardam a original, em vez de disparar outra consulta cobrada.
+    """
+
+    __tablename__ = 'chaves_idempotencia'
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'chave', name='uq_chaves_idempotencia_usuario_chave'),
+    )
+
+    EM_ANDAMENTO = 'em_andamento'
+    CONCLUIDA = 'concluida'
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    chave = db.Column(db.String(64), nullable=False)
+    impressao = db.Column(db.String(64), nullable=False)  # hash dos parâmetros da consulta
+    status = db.Column(db.String(20), nullable=False, default=EM_ANDAMENTO)
+    resposta = db.Column(db.Text)  # JSON da resposta concluída
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+
+    @staticmethod
+    def chave_valida(chave):
+        return bool(chave and FORMATO_CHAVE.match(chave))
+
+    @staticmethod
+    def calcular_impressao(*partes):
+        """Hash dos parâmetros: a mesma chave com outra consulta é rejeitada."""
+        return hashlib.sha256('|'.join(str(p or '') for p in partes).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def reservar(usuario_id, chave, impressao):
+        """
+        Reserva a chave para uma nova consulta. Retorna (registro, nova):
+        com nova=True quem chamou executa a consulta; senão `registro` é a
+        consulta já concluída ou em andamento com essa chave.
+        """
+        agora = datetime.utcnow()
+        valores = {
+            'impressao': impressao,
+            'status': ChaveIdempotencia.EM_ANDAMENTO,
+            'resposta': None,
+            'criado_em': agora,
+            'expira_em': agora + timedelta(seconds=RESERVA_S),
+        }
+
+        # Chave vencida (ou reserva abandonada): retoma com compare-and-set
+        retomada = db.session.execute(
+            update(ChaveIdempotencia)
+            .where(ChaveIdempotencia.usuario_id == usuario_id,
+                   ChaveIdempotencia.chave == chave,
+                   ChaveIdempotencia.expira_em <= agora)
+            .values(**valores)
+        )
+        if retomada.rowcount == 0:
+            try:
+                db.session.add(ChaveIdempotencia(usuario_id=usuario_id, chave=chave, **valores))
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                existente = ChaveIdempotencia.query\
+                    .filter_by(usuario_id=usuario_id, chave=chave)\
+                    .execution_options(populate_existing=True)\
+                    .first()
+                if existente is not None:
+                    return existente, False
+                # Liberada entre o INSERT e a leitura: tenta de novo
+                return ChaveIdempotencia.reservar(usuario_id, chave, impressao)
+        db.session.commit()
+
+        registro = ChaveIdempotencia.query\
+            .filter_by(usuario_id=usuario_id, chave=chave)\
+            .execution_options(populate_existing=True)\
+            .first()
+        return registro, True
+
+    @staticmethod
+    def concluir(registro_id, resposta, ttl_s):
+        """Grava a resposta (JSON) e mantém a chave válida por ttl_s segundos."""
+        db.session.execute(
+            update(ChaveIdempotencia)
+            .where(ChaveIdempotencia.id == registro_id)
+            .values(status=ChaveIdempotencia.CONCLUIDA, resposta=resposta,
+                    expira_em=datetime.utcnow() + timedelta(seconds=ttl_s))
+        )
+        db.session.commit()
+
+    @staticmethod
+    def liberar(registro_id):
+        """Descarta a reserva de uma consulta que falhou (a repetição consulta de novo)."""
+        db.session.execute(
+            delete(ChaveIdempotencia)
+            .where(ChaveIdempotencia.id == registro_id,
+                   ChaveIdempotencia.status == ChaveIdempotencia.EM_ANDAMENTO)
+        )
+        db.session.commit()
+
+    @staticmethod
+    def limpar_expiradas():
+        """Remove chaves vencidas. Retorna quantas foram removidas."""
+        resultado = db.session.execute(
+            delete(ChaveIdempotencia).where(ChaveIdempotencia.expira_em <= datetime.utcnow())
+        )
+        db.session.commit()
+        return resultado.rowcount
+
+    def __repr__(self):
+        return f'<ChaveIdempotencia {self.usuario_id}:{self.chave} {self.status}>'
@@ -45,8 +45,9 @@ class Filial(db.Model):
     
     def simular_conexao_detran(self):
         """
-        Simula conexão com o DETRAN usando o certificado.
-        Em produção, aqui seria feita a autenticação mTLS real.
+        Verificação do modo Infosimples (UF sem DETRAN_ENDPOINTS): não há
+        conexão direta, o certificado segue junto com cada consulta.
+        A conexão mTLS real fica em app.conectores.detran.
         """
         # Verificação básica
         senha = self.get_cert_senha()
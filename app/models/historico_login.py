@@ -0,0 +1,27 @@
+"""
+Sistema I9 - Modelo de Histórico de Login
+"""
+
+from datetime import datetime
+from app.extensions import db
+
+
+class HistoricoLogin(db.Model):
+    """Registro de login bem-sucedido (somente inserção, para análise de segurança)."""
+    
+    __tablename__ = 'historico_logins'
+    __table_args__ = (
+        db.Index('ix_historico_logins_usuario_data', 'usuario_id', 'data_login'),
+        db.Index('ix_historico_logins_ip_data', 'ip_origem', 'data_login'),
+    )
+    
+    TAMANHO_USER_AGENT = 255
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    data_login = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    ip_origem = db.Column(db.String(45))  # IPv4 ou IPv6
+    user_agent = db.Column(db.String(255))
+    
+    def __repr__(self):
+        return f'<HistoricoLogin {self.usuario_id} {self.data_login}>'
@@ -0,0 +1,156 @@
+"""
+Sistema I9 - Modelo de Snapshot de Veículo
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime
+from app.extensions import db
+
+# Campos que mudam a cada consulta sem representar mudança no veículo
+CAMPOS_VOLATEIS = {'site_receipt', 'provedor'}
+
+
+class SnapshotVeiculo(db.Model):
+    """
+    Versão distinta do resultado de consulta de um veículo, por filial: o
+    resultado obtido com o certificado de uma filial só é lido (histórico,
+    cache, comparação) por quem consulta pela mesma filial.
+    """
+
+    __tablename__ = 'snapshots_veiculo'
+    __table_args__ = (
+        db.Index('ix_snapshots_veiculo_chave_filial', 'chave', 'filial_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(50), nullable=False, index=True)  # placa ou chassi normalizado
+    filial_id = db.Column(db.Integer, db.ForeignKey('filiais.id'))  # certificado usado na consulta
+    tipo_chave = db.Column(db.String(20), nullable=False, default='placa')
+    hash_resultado = db.Column(db.String(64), nullable=False)
+    dados = db.Column(db.Text, nullable=False)  # JSON compacto do resultado
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)  # primeira vez visto
+    verificado_em = db.Column(db.DateTime, default=datetime.utcnow)  # última confirmação
+    consultas = db.Column(db.Integer, default=1)
+
+    @staticmethod
+    def normalizar_chave(valor):
+        """Remove formatação de placa/chassi."""
+        return re.sub(r'[^A-Z0-9]', '', (valor or '').upper())
+
+    @staticmethod
+    def _serializar(resultado):
+        """JSON canônico (chaves ordenadas, sem espaços) sem campos voláteis."""
+        estavel = {k: v for k, v in resultado.items() if k not in CAMPOS_VOLATEIS}
+        return json.dumps(estavel, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+    @staticmethod
+    def versoes(chave, filial_id, limite=2):
+        """Retorna as versões mais recentes do veículo na filial (a primeira é a atual)."""
+        return SnapshotVeiculo.query\
+            .filter_by(chave=SnapshotVeiculo.normalizar_chave(chave), filial_id=filial_id)\
+            .order_by(SnapshotVeiculo.id.desc())\
+            .limit(limite)\
+            .all()
+
+    @staticmethod
+    def ultimo(chave, filial_id):
+        """Retorna o snapshot mais recente do veículo na filial."""
+        versoes = SnapshotVeiculo.versoes(chave, filial_id, limite=1)
+        return versoes[0] if versoes else None
+
+    @staticmethod
+    def registrar(chave, filial_id, resultado, tipo_chave='placa', commit=True):
+        """
+        Registra o resultado de uma consulta feita pela filial.
+
+        Se o resultado for igual à última versão conhecida, apenas atualiza
+        `verificado_em`; caso contrário grava uma nova versão. Retorna o
+        snapshot e o diff em relação à versão anterior (None na primeira).
+        """
+        chave = SnapshotVeiculo.normalizar_chave(chave)
+        dados = SnapshotVeiculo._serializar(resultado)
+        hash_resultado = hashlib.sha256(dados.encode('utf-8')).hexdigest()
+        agora = datetime.utcnow()
+
+        anterior = SnapshotVeiculo.ultimo(chave, filial_id)
+        if anterior is not None and anterior.hash_resultado == hash_resultado:
+            anterior.verificado_em = agora
+            anterior.consultas = (anterior.consultas or 0) + 1
+            snapshot, diff = anterior, SnapshotVeiculo.diff(anterior.get_dados(), resultado)
+        else:
+            snapshot = SnapshotVeiculo(
+                chave=chave,
+                filial_id=filial_id,
+                tipo_chave=tipo_chave,
+                hash_resultado=hash_resultado,
+                dados=dados,
+                criado_em=agora,
+                verificado_em=agora
+            )
+            db.session.add(snapshot)
+            diff = SnapshotVeiculo.diff(anterior.get_dados(), resultado) if anterior else None
+
+        if commit:
+            db.session.commit()
+        return snapshot, diff
+
+    @staticmethod
+    def _chave_restricao(restricao):
+        if isinstance(restricao, dict):
+            return (restricao.get('tipo') or '', restricao.get('instituicao') or '')
+        return (str(restricao), '')
+
+    @staticmethod
+    def diff(anterior, atual):
+        """
+        Compara dois resultados de consulta.
+
+        Retorna restrições novas e levantadas e as alterações de situação
+        (multas, IPVA, leilão) no formato {campo: [antes, depois]}.
+        """
+        anterior = anterior or {}
+        atual = atual or {}
+
+        rest_antes = {SnapshotVeiculo._chave_restricao(r): r
+                      for r in (anterior.get('restricoes') or {}).get('detalhes') or []}
+        rest_depois = {SnapshotVeiculo._chave_restricao(r): r
+                       for r in (atual.get('restricoes') or {}).get('detalhes') or []}
+
+        campos = {
+            'restricoes.possui_restricoes': ('restricoes', 'possui_restricoes'),
+            'multas.quantidade': ('multas', 'quantidade'),
+            'multas.valor_total': ('multas', 'valor_total'),
+            'ipva.situacao': ('ipva', 'situacao'),
+            'leilao.possui_historico_leilao': ('leilao', 'possui_historico_leilao'),
+            'proprietarios.quantidade': ('proprietarios', 'quantidade'),
+        }
+        alteracoes = {}
+        for nome, (secao, campo) in campos.items():
+            antes = (anterior.get(secao) or {}).get(campo)
+            depois = (atual.get(secao) or {}).get(campo)
+            if antes != depois:
+                alteracoes[nome] = [antes, depois]
+
+        return {
+            'restricoes_novas': [r for k, r in rest_depois.items() if k not in rest_antes],
+            'restricoes_levantadas': [r for k, r in rest_antes.items() if k not in rest_depois],
+            'alteracoes': alteracoes,
+            'mudou': bool(alteracoes) or rest_antes.keys() != rest_depois.keys()
+        }
+
+    def idade_horas(self, agora=None):
+        """Horas desde a última confirmação deste snapshot."""
+        agora = agora or datetime.utcnow()
+        return (agora - self.verificado_em).total_seconds() / 3600
+
+    def get_dados(self):
+        """Retorna o resultado armazenado como dicionário."""
+        try:
+            return json.loads(self.dados) if self.dados else {}
+        except ValueError:
+            return {}
+
+    def __repr__(self):
+        return f'<SnapshotVeiculo {self.chave} {self.hash_resultado[:8]}>'
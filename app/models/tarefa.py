@@ -0,0 +1,260 @@
+"""
+Sistema I9 - Modelo de Tarefa (fila de trabalhos em segundo plano)
+"""
+
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import deferred
+from app.extensions import db
+
+
+class Tarefa(db.Model):
+    """
+    Trabalho enfileirado para os workers (ver app.tarefas): consultas em
+    lote, exportações, verificações de placas monitoradas e validação de
+    certificados. A fila é a própria tabela: cada worker reserva linhas com
+    FOR UPDATE SKIP LOCKED (PostgreSQL) e um compare-and-set em status e
+    reservada_ate, como o monitoramento de frota.
+    """
+
+    __tablename__ = 'tarefas'
+    __table_args__ = (
+        # Próximas da fila: pendentes por prioridade e horário
+        db.Index('ix_tarefas_fila', 'status', 'prioridade', 'executar_em'),
+        db.Index('ix_tarefas_grupo', 'grupo'),
+        db.Index('ix_tarefas_chave', 'chave'),
+    )
+
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    prioridade = db.Column(db.Integer, nullable=False, default=0)  # maior sai antes
+    status = db.Column(db.String(20), nullable=False, default=PENDENTE)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    criada_em = db.Column(db.DateTime, default=datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime)   # última tentativa
+    concluida_em = db.Column(db.DateTime)
+    reservada_ate = db.Column(db.DateTime)  # vence se o worker cair no meio
+    worker = db.Column(db.String(100))
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    filial_id = db.Column(db.Integer, db.ForeignKey('filiais.id'))
+    grupo = db.Column(db.String(36))   # tarefas enfileiradas juntas (ex.: um lote de placas)
+    chave = db.Column(db.String(100))  # evita duplicar a mesma tarefa pendente
+    erro = db.Column(db.String(500))
+    resultado = db.Column(db.Text)  # JSON
+    arquivo_nome = db.Column(db.String(100))
+    arquivo = deferred(db.Column(db.LargeBinary))  # gzip (exportações), no banco: nenhum nó guarda estado
+
+    @staticmethod
+    def criar(tipo, parametros=None, prioridade=0, executar_em=None, max_tentativas=3,
+              usuario_id=None, filial_id=None, grupo=None, chave=None):
+        """
+        Enfileira a tarefa (sem commit). Com `chave`, devolve a tarefa
+        pendente ou em execução de mesma chave em vez de criar outra.
+        Retorna (tarefa, nova).
+        """
+        if chave:
+            existente = Tarefa.query.filter(Tarefa.chave == chave,
+                                            Tarefa.status.in_((Tarefa.PENDENTE, Tarefa.EXECUTANDO))).first()
+            if existente is not None:
+                return existente, False
+
+        tarefa = Tarefa(
+            tipo=tipo,
+            parametros=json.dumps(parametros or {}, ensure_ascii=False),
+            prioridade=prioridade,
+            executar_em=executar_em or datetime.utcnow(),
+            max_tentativas=max_tentativas,
+            usuario_id=usuario_id,
+            filial_id=filial_id,
+            grupo=grupo,
+            chave=chave
+        )
+        db.session.add(tarefa)
+        return tarefa, True
+
+    @staticmethod
+    def reservar(worker, limite, reserva_s, agora=None):
+        """
+        Reserva até `limite` tarefas prontas (pendentes no horário, ou em
+        execução com reserva vencida), da maior prioridade para a menor.
+        Conta a tentativa. Retorna os IDs reservados.
+        """
+        agora = agora or datetime.utcnow()
+        pronta = or_(
+            and_(Tarefa.status == Tarefa.PENDENTE, Tarefa.executar_em <= agora),
+            and_(Tarefa.status == Tarefa.EXECUTANDO, Tarefa.reservada_ate <= agora)
+        )
+        candidatas = db.session.query(Tarefa.id)\
+            .filter(pronta)\
+            .order_by(Tarefa.prioridade.desc(), Tarefa.executar_em)\
+            .limit(limite)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        reservadas = []
+        for (tarefa_id,) in candidatas:
+            resultado = db.session.execute(
+                update(Tarefa)
+                .where(Tarefa.id == tarefa_id, pronta)
+                .values(status=Tarefa.EXECUTANDO, worker=worker, iniciada_em=agora,
+                        reservada_ate=agora + timedelta(seconds=reserva_s),
+                        tentativas=Tarefa.tentativas + 1)
+            )
+            if resultado.rowcount:
+                reservadas.append(tarefa_id)
+        db.session.commit()
+        return reservadas
+
+    def concluir(self, worker, resultado=None, arquivo=None, arquivo_nome=None):
+        """Grava o resultado se a reserva ainda é deste worker. Retorna se gravou."""
+        valores = {'status': Tarefa.CONCLUIDA, 'concluida_em': datetime.utcnow(), 'reservada_ate': None,
+                   'erro': None, 'resultado': json.dumps(resultado, ensure_ascii=False, default=str)}
+        if arquivo is not None:
+            valores.update(arquivo=arquivo, arquivo_nome=arquivo_nome)
+        return self._finalizar(worker, valores)
+
+    def falhar(self, worker, erro, espera_s=None):
+        """
+        Registra a falha: volta para a fila daqui a `espera_s` segundos ou,
+        sem tentativas restantes (ou espera_s None), falha de vez.
+        Retorna se gravou.
+        """
+        agora = datetime.utcnow()
+        if espera_s is not None and self.tentativas < self.max_tentativas:
+            valores = {'status': Tarefa.PENDENTE, 'executar_em': agora + timedelta(seconds=espera_s)}
+        else:
+            valores = {'status': Tarefa.FALHOU, 'concluida_em': agora}
+        valores.update(reservada_ate=None, erro=(erro or '')[:500])
+        return self._finalizar(worker, valores)
+
+    def _finalizar(self, worker, valores):
+        # Compare-and-set: uma reserva vencida pode ter passado a outro worker
+        resultado = db.session.execute(
+            update(Tarefa)
+            .where(Tarefa.id == self.id, Tarefa.status == Tarefa.EXECUTANDO, Tarefa.worker == worker)
+            .values(**valores)
+        )
+        db.session.commit()
+        return bool(resultado.rowcount)
+
+    @staticmethod
+    def do_grupo(grupo, usuario_id=None):
+        query = Tarefa.query.filter_by(grupo=grupo)
+        if usuario_id is not None:
+            query = query.filter_by(usuario_id=usuario_id)
+        return query.order_by(Tarefa.id).all()
+
+    @staticmethod
+    def estatisticas(horas=24, agora=None):
+        """
+        Profundidade da fila (por status e tipo) e latência das concluídas
+        nas últimas `horas`: espera (executar_em → início da tentativa que
+        concluiu) e duração, em p50/p95/máximo por tipo.
+        """
+        agora = agora or datetime.utcnow()
+        desde = agora - timedelta(hours=horas)
+
+        fila = {}
+        abertas = db.session.query(Tarefa.tipo, Tarefa.status, Tarefa.executar_em <= agora,
+                                   func.count(Tarefa.id), func.min(Tarefa.executar_em))\
+            .filter(Tarefa.status.in_((Tarefa.PENDENTE, Tarefa.EXECUTANDO)))\
+            .group_by(Tarefa.tipo, Tarefa.status, Tarefa.executar_em <= agora)\
+            .all()
+        for tipo, status, pronta, total, mais_antiga in abertas:
+            dados = fila.setdefault(tipo, {'prontas': 0, 'agendadas': 0, 'executando': 0, 'atraso_s': 0})
+            if status == Tarefa.EXECUTANDO:
+                dados['executando'] += total
+            elif pronta:
+                dados['prontas'] += total
+                dados['atraso_s'] = round(max(dados['atraso_s'], (agora - mais_antiga).total_seconds()), 1)
+            else:
+                dados['agendadas'] += total
+
+        finalizadas = db.session.query(Tarefa.tipo, Tarefa.status, Tarefa.executar_em,
+                                       Tarefa.iniciada_em, Tarefa.concluida_em)\
+            .filter(Tarefa.status.in_((Tarefa.CONCLUIDA, Tarefa.FALHOU)), Tarefa.concluida_em >= desde)\
+            .all()
+        tempos = {}
+        for tipo, status, executar_em, iniciada_em, concluida_em in finalizadas:
+            dados = tempos.setdefault(tipo, {'concluidas': 0, 'falharam': 0, 'espera': [], 'duracao': []})
+            if status == Tarefa.FALHOU:
+                dados['falharam'] += 1
+                continue
+            dados['concluidas'] += 1
+            if iniciada_em and executar_em:
+                dados['espera'].append(max((iniciada_em - executar_em).total_seconds(), 0))
+            if iniciada_em and concluida_em:
+                dados['duracao'].append((concluida_em - iniciada_em).total_seconds())
+
+        latencia = {}
+        for tipo, dados in tempos.items():
+            latencia[tipo] = {
+                'concluidas': dados['concluidas'],
+                'falharam': dados['falharam'],
+                'espera_s': _percentis(dados['espera']),
+                'duracao_s': _percentis(dados['duracao'])
+            }
+        return {'horas': horas, 'fila': fila, 'latencia': latencia}
+
+    @staticmethod
+    def limpar(dias=7):
+        """Remove concluídas e falhas com mais de `dias` dias. Retorna quantas."""
+        limite = datetime.utcnow() - timedelta(days=dias)
+        total = Tarefa.query\
+            .filter(Tarefa.status.in_((Tarefa.CONCLUIDA, Tarefa.FALHOU)), Tarefa.concluida_em < limite)\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return total
+
+    def get_parametros(self):
+        try:
+            return json.loads(self.parametros) if self.parametros else {}
+        except ValueError:
+            return {}
+
+    def get_resultado(self):
+        try:
+            return json.loads(self.resultado) if self.resultado else None
+        except ValueError:
+            return None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'prioridade': self.prioridade,
+            'tentativas': self.tentativas,
+            'max_tentativas': self.max_tentativas,
+            'parametros': self.get_parametros(),
+            'executar_em': self.executar_em.isoformat(timespec='seconds') if self.executar_em else None,
+            'criada_em': self.criada_em.isoformat(timespec='seconds') if self.criada_em else None,
+            'concluida_em': self.concluida_em.isoformat(timespec='seconds') if self.concluida_em else None,
+            'grupo': self.grupo,
+            'erro': self.erro,
+            'resultado': self.get_resultado(),
+            'arquivo': self.arquivo_nome
+        }
+
+    def __repr__(self):
+        return f'<Tarefa {self.id} {self.tipo} {self.status}>'
+
+
+def _percentis(valores):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return {
+        'p50': round(valores[len(valores) // 2], 2),
+        'p95': round(valores[min(int(len(valores) * 0.95), len(valores) - 1)], 2),
+        'max': round(valores[-1], 2)
+    }
@@ -4,7 +4,6 @@ Sistema I9 - Modelo de Usuário
 
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.extensions import db
 
 
@@ -29,11 +28,21 @@ class Usuario(UserMixin, db.Model):
     
     def set_senha(self, senha):
         """Define a senha do usuário."""
-        self.senha_hash = generate_password_hash(senha)
+        from app.senhas import gerar_hash
+        self.senha_hash = gerar_hash(senha)
     
     def verificar_senha(self, senha):
-        """Verifica se a senha está correta."""
-        return check_password_hash(self.senha_hash, senha)
+        """
+        Verifica se a senha está correta.
+        
+        Se o hash usa uma política antiga, ele é refeito em segundo plano.
+        """
+        from app.senhas import verificar, precisa_rehash, rehash_em_segundo_plano
+        if not verificar(self.senha_hash, senha):
+            return False
+        if precisa_rehash(self.senha_hash):
+            rehash_em_segundo_plano(self.id, self.senha_hash, senha)
+        return True
     
     def is_admin(self):
         """Verifica se o usuário é administrador."""
@@ -52,10 +61,20 @@ class Usuario(UserMixin, db.Model):
             return Filial.query.filter_by(ativa=True).all()
         return [f for f in self.filiais if f.ativa]
     
-    def registrar_login(self):
-        """Registra o horário do último login."""
-        self.ultimo_login = datetime.utcnow()
-        db.session.commit()
+    def registrar_login(self, ip_origem=None, user_agent=None):
+        """
+        Registra o login (último acesso e histórico).
+        
+        A gravação é feita em lote pelo registrador de logins, fora da
+        requisição; ultimo_login no banco pode atrasar alguns segundos.
+        """
+        from flask import current_app
+        registrador = current_app.extensions.get('i9_logins')
+        if registrador is None:
+            self.ultimo_login = datetime.utcnow()
+            db.session.commit()
+            return
+        registrador.registrar(self.id, ip_origem=ip_origem, user_agent=user_agent)
     
     def __repr__(self):
         return f'<Usuario {self.email}>'
@@ -0,0 +1,145 @@
+"""
+Sistema I9 - Modelo de Veículo Monitorado
+"""
+
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, update
+from app.extensions import db
+
+
+class VeiculoMonitorado(db.Model):
+    """
+    Placa do estoque de uma filial, consultada de novo periodicamente pelo
+    monitoramento de frota (ver app.monitoramento). Mudanças em relação ao
+    último snapshot viram AlertaVeiculo.
+    """
+
+    __tablename__ = 'veiculos_monitorados'
+    __table_args__ = (
+        db.UniqueConstraint('filial_id', 'placa', name='uq_veiculos_monitorados_filial_placa'),
+        # Fila do monitoramento: ativos com verificação vencida, mais antigos primeiro
+        db.Index('ix_veiculos_monitorados_fila', 'ativo', 'proxima_verificacao'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    filial_id = db.Column(db.Integer, db.ForeignKey('filiais.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)  # quem incluiu
+    placa = db.Column(db.String(10), nullable=False)
+    uf = db.Column(db.String(2), nullable=False, default='SP')
+    renavam = db.Column(db.String(11))
+    chassi = db.Column(db.String(17))
+    ativo = db.Column(db.Boolean, default=True, nullable=False)
+    intervalo_horas = db.Column(db.Float, nullable=False, default=24)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    proxima_verificacao = db.Column(db.DateTime, nullable=False)
+    ultima_verificacao = db.Column(db.DateTime)
+    ultimo_status = db.Column(db.String(20))  # sucesso, nao_encontrado, incompleto, erro
+    ultimo_erro = db.Column(db.String(255))
+    falhas = db.Column(db.Integer, default=0, nullable=False)  # erros seguidos
+    reservado_ate = db.Column(db.DateTime)  # verificação em andamento num processo
+
+    filial = db.relationship('Filial')
+    usuario = db.relationship('Usuario')
+
+    @staticmethod
+    def normalizar_placa(placa):
+        return re.sub(r'[^A-Z0-9]', '', (placa or '').upper())
+
+    @staticmethod
+    def incluir(filial_id, usuario_id, placa, uf, proxima_verificacao, intervalo_horas=24, renavam=None,
+                chassi=None):
+        """
+        Inclui a placa no monitoramento da filial (reativa se já existia).
+        Retorna (registro, novo).
+        """
+        placa = VeiculoMonitorado.normalizar_placa(placa)
+        registro = VeiculoMonitorado.query.filter_by(filial_id=filial_id, placa=placa).first()
+        novo = registro is None or not registro.ativo
+        if registro is None:
+            registro = VeiculoMonitorado(filial_id=filial_id, placa=placa)
+            db.session.add(registro)
+        if novo:
+            registro.usuario_id = usuario_id
+            registro.uf = (uf or 'SP').upper()
+            registro.renavam = renavam or None
+            registro.chassi = chassi.upper() if chassi else None
+            registro.intervalo_horas = intervalo_horas
+            registro.proxima_verificacao = proxima_verificacao
+            registro.ativo = True
+            registro.falhas = 0
+            registro.reservado_ate = None
+        db.session.commit()
+        return registro, novo
+
+    @staticmethod
+    def da_filial(filial_id):
+        """Placas monitoradas da filial, em ordem de inclusão."""
+        return VeiculoMonitorado.query\
+            .filter_by(filial_id=filial_id, ativo=True)\
+            .order_by(VeiculoMonitorado.criado_em.desc(), VeiculoMonitorado.id.desc())\
+            .all()
+
+    @staticmethod
+    def reservar_vencidos(limite, reserva_s, agora=None):
+        """
+        Reserva até `limite` placas com verificação vencida. A reserva é um
+        compare-and-set em reservado_ate: outro processo com o monitoramento
+        ligado não pega a mesma placa, e uma reserva abandonada (processo
+        encerrado no meio) vence depois de `reserva_s` segundos. No
+        PostgreSQL, FOR UPDATE SKIP LOCKED faz instâncias concorrentes
+        pularem as linhas que outra está reservando em vez de esperar.
+        Retorna os IDs reservados.
+        """
+        agora = agora or datetime.utcnow()
+        livre = or_(VeiculoMonitorado.reservado_ate.is_(None), VeiculoMonitorado.reservado_ate <= agora)
+        candidatos = db.session.query(VeiculoMonitorado.id)\
+            .filter(and_(VeiculoMonitorado.ativo.is_(True),
+                         VeiculoMonitorado.proxima_verificacao <= agora,
+                         livre))\
+            .order_by(VeiculoMonitorado.proxima_verificacao)\
+            .limit(limite)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        reservados = []
+        for (monitorado_id,) in candidatos:
+            resultado = db.session.execute(
+                update(VeiculoMonitorado)
+                .where(VeiculoMonitorado.id == monitorado_id, livre)
+                .values(reservado_ate=agora + timedelta(seconds=reserva_s))
+            )
+            if resultado.rowcount:
+                reservados.append(monitorado_id)
+        db.session.commit()
+        return reservados
+
+    @staticmethod
+    def reservar(monitorado_id, reserva_s, agora=None):
+        """Reserva uma placa ativa (verificação imediata), se livre. Retorna se reservou."""
+        agora = agora or datetime.utcnow()
+        resultado = db.session.execute(
+            update(VeiculoMonitorado)
+            .where(VeiculoMonitorado.id == monitorado_id, VeiculoMonitorado.ativo.is_(True),
+                   or_(VeiculoMonitorado.reservado_ate.is_(None), VeiculoMonitorado.reservado_ate <= agora))
+            .values(reservado_ate=agora + timedelta(seconds=reserva_s))
+        )
+        db.session.commit()
+        return bool(resultado.rowcount)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'placa': self.placa,
+            'uf': self.uf,
+            'intervalo_horas': self.intervalo_horas,
+            'incluido_em': self.criado_em.strftime('%d/%m/%Y %H:%M') if self.criado_em else None,
+            'ultima_verificacao': self.ultima_verificacao.strftime('%d/%m/%Y %H:%M')
+            if self.ultima_verificacao else None,
+            'proxima_verificacao': self.proxima_verificacao.strftime('%d/%m/%Y %H:%M'),
+            'ultimo_status': self.ultimo_status,
+            'ultimo_erro': self.ultimo_erro
+        }
+
+    def __repr__(self):
+        return f'<VeiculoMonitorado {self.filial_id}:{self.placa}>'
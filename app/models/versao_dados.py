@@ -0,0 +1,98 @@
+"""
+Sistema I9 - Modelo de Versão dos Dados
+"""
+
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import update
+from app.extensions import db
+
+
+class VersaoDados(db.Model):
+    """
+    Contador de versão por conjunto de dados (ex.: 'usuarios', 'filiais').
+
+    É incrementado na mesma transação das alterações e compõe a chave dos
+    fragmentos de template em cache, o que mantém todos os workers
+    coerentes sem invalidação explícita. Com coordenação entre processos
+    (PostgreSQL), as versões lidas ficam em memória (CacheVersoes) e cada
+    incremento avisa as instâncias por NOTIFY no commit.
+    """
+
+    __tablename__ = 'versoes_dados'
+
+    nome = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def atual(*nomes):
+        """Retorna as versões dos conjuntos pedidos (0 se nunca alterados)."""
+        cache = current_app.extensions.get('i9_versoes') if has_app_context() else None
+        if cache is not None:
+            return cache.obter(nomes, VersaoDados._ler)
+        return VersaoDados._ler(nomes)
+
+    @staticmethod
+    def _ler(nomes):
+        versoes = dict(db.session.query(VersaoDados.nome, VersaoDados.versao)
+                       .filter(VersaoDados.nome.in_(nomes)).all())
+        return tuple(versoes.get(nome, 0) for nome in nomes)
+
+    @staticmethod
+    def incrementar(nome):
+        """Incrementa a versão do conjunto; o commit fica com quem chamou."""
+        resultado = db.session.execute(
+            update(VersaoDados)
+            .where(VersaoDados.nome == nome)
+            .values(versao=VersaoDados.versao + 1, atualizado_em=datetime.utcnow())
+        )
+        if resultado.rowcount == 0:
+            db.session.add(VersaoDados(nome=nome, versao=1))
+
+        coordenacao = current_app.extensions.get('i9_coordenacao') if has_app_context() else None
+        if coordenacao is not None:
+            coordenacao.publicar('i9_versoes', nome)
+
+    def __repr__(self):
+        return f'<VersaoDados {self.nome}={self.versao}>'
+
+
+class CacheVersoes:
+    """
+    Versões lidas do banco, em memória até o aviso de incremento (canal
+    i9_versoes) ou o TTL, que cobre avisos perdidos numa queda da escuta.
+    """
+
+    def __init__(self, ttl_s=60):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._versoes = {}  # nome -> (versão, expira_em)
+        self._geracao = 0   # leituras iniciadas antes de uma invalidação não entram no cache
+
+    def obter(self, nomes, ler):
+        agora = time.monotonic()
+        with self._lock:
+            encontradas = [self._versoes.get(nome) for nome in nomes]
+            if all(v is not None and v[1] > agora for v in encontradas):
+                return tuple(v[0] for v in encontradas)
+            geracao = self._geracao
+
+        versoes = ler(nomes)
+        with self._lock:
+            if geracao == self._geracao:
+                expira = agora + self.ttl_s
+                for nome, versao in zip(nomes, versoes):
+                    self._versoes[nome] = (versao, expira)
+        return versoes
+
+    def invalidar(self, nome=None):
+        """Descarta a versão de `nome` (todas, com None ou vazio)."""
+        with self._lock:
+            self._geracao += 1
+            if nome:
+                self._versoes.pop(nome, None)
+            else:
+                self._versoes.clear()
@@ -0,0 +1,355 @@
+"""
+Sistema I9 - Monitoramento de Frota
+
+Placas do estoque das filiais (VeiculoMonitorado) são consultadas de novo
+periodicamente por uma thread de segundo plano, sem o consultor repetir
+/api/consultar. O resultado é comparado com o último snapshot do veículo e
+cada mudança vira um AlertaVeiculo, exibido no dashboard.
+
+Para não competir com as consultas dos consultores:
+- as verificações são espaçadas (no máximo MONITOR_POR_MINUTO por minuto);
+- com MONITOR_JANELA (ex.: "20-7", hora local), só rodam fora do expediente,
+  e os horários são espalhados pela janela conforme a placa, para a frota
+  incluída de uma vez não vencer toda no mesmo minuto;
+- erros seguidos adiam a placa (backoff) e pausam o ciclo se o provedor cair.
+
+Cada verificação é reservada no banco antes de consultar: vários processos
+com o monitoramento ligado não repetem a mesma placa. O comando
+`flask i9 monitorar` executa um ciclo avulso (para agendar via cron).
+"""
+
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Adiamento após erro: 15 min, 30 min, 1 h... até o intervalo da placa
+BACKOFF_BASE_MIN = 15
+# Erros seguidos no mesmo ciclo que indicam provedor fora do ar (encerra o ciclo)
+MAX_ERROS_CICLO = 5
+# Lock entre instâncias dos ciclos que consultam os provedores em segundo plano
+# (monitoramento e pré-aquecimento): um ciclo por vez no conjunto, o que torna
+# global o limite de MONITOR_POR_MINUTO
+LOCK_SEGUNDO_PLANO = 'i9:provedores-segundo-plano'
+
+
+# ============================================================================
+# AGENDA
+# ============================================================================
+
+def ler_janela(texto):
+    """'20-7' -> (20, 7): horas locais de início e fim. Vazio ou inválido -> None."""
+    try:
+        inicio, fim = (int(parte) % 24 for parte in (texto or '').split('-'))
+    except ValueError:
+        return None
+    return None if inicio == fim else (inicio, fim)
+
+
+def _local(utc):
+    return utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def _utc(local):
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def na_janela(quando, janela):
+    """Se o horário (UTC) cai na janela (horas locais, pode cruzar a meia-noite)."""
+    if janela is None:
+        return True
+    inicio, fim = janela
+    hora = _local(quando).hour
+    return inicio <= hora < fim if inicio < fim else hora >= inicio or hora < fim
+
+
+def _deslocamento(chave, segundos):
+    """Posição estável da placa dentro de um intervalo de `segundos`."""
+    return zlib.crc32(chave.encode('utf-8')) % max(int(segundos), 1)
+
+
+def proxima_verificacao(agora, intervalo_horas, janela=None, chave=''):
+    """
+    Horário (UTC) da próxima verificação: `intervalo_horas` depois de agora;
+    se cair fora da janela, vai para a próxima janela, numa posição que
+    depende da placa (placas incluídas juntas ficam espalhadas pela janela).
+    """
+    base = agora + timedelta(hours=intervalo_horas)
+    if janela is None or na_janela(base, janela):
+        return base
+    inicio, fim = janela
+    local = _local(base)
+    abertura = local.replace(hour=inicio, minute=0, second=0, microsecond=0)
+    if abertura < local:
+        abertura += timedelta(days=1)
+    duracao_s = ((fim - inicio) % 24) * 3600
+    # Última hora da janela fica livre para as verificações atrasadas
+    return _utc(abertura + timedelta(seconds=_deslocamento(chave, max(duracao_s - 3600, 3600))))
+
+
+# ============================================================================
+# MONITOR
+# ============================================================================
+
+class MonitorFrota:
+    """Verifica as placas vencidas em segundo plano e gera os alertas de mudança."""
+
+    def __init__(self, app, intervalo_s=60, por_minuto=6, janela=None, lote=20, intervalo_horas=24,
+                 reserva_s=600):
+        self.app = app
+        self.intervalo_s = intervalo_s
+        self.espaco_s = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self.janela = janela
+        self.lote = lote
+        self.intervalo_horas = intervalo_horas
+        # A reserva cobre o lote inteiro, mesmo com as verificações espaçadas
+        self.reserva_s = max(reserva_s, lote * self.espaco_s * 2)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._proxima_vez = 0.0
+        self.ciclos = 0
+        self.verificacoes = 0
+        self.alertas = 0
+        self.erros = 0
+        self.ultimo_ciclo = None
+
+    # ------------------------------------------------------------------ agenda
+
+    def agendar(self, agora, placa, intervalo_horas=None):
+        """Horário da próxima verificação de uma placa (usado na inclusão e após cada verificação)."""
+        horas = self.intervalo_horas if intervalo_horas is None else intervalo_horas
+        return proxima_verificacao(agora, horas, self.janela, placa)
+
+    def _adiamento(self, monitorado, agora):
+        """Próxima tentativa após erro: backoff exponencial, no máximo o intervalo da placa."""
+        minutos = min(BACKOFF_BASE_MIN * 2 ** max(monitorado.falhas - 1, 0), monitorado.intervalo_horas * 60)
+        return agora + timedelta(minutes=minutos)
+
+    def aguardar_vez(self):
+        """
+        Espaça as chamadas de segundo plano aos provedores (limite por minuto,
+        compartilhado com o pré-aquecimento). False se o monitor foi parado.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            vez = max(agora, self._proxima_vez)
+            self._proxima_vez = vez + self.espaco_s
+        return not self._parar.wait(vez - agora) if vez > agora else not self._parar.is_set()
+
+    # ----------------------------------------------------------------- thread
+
+    def iniciar(self):
+        # Iniciada na primeira requisição, já dentro do processo worker (após o fork)
+        if self._thread is not None or not self.intervalo_s:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='i9-monitoramento', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                self.executar_ciclo()
+            except Exception:
+                logger.exception('Falha no ciclo do monitoramento de frota')
+
+    def parar(self):
+        self._parar.set()
+
+    # ------------------------------------------------------------ verificação
+
+    def executar_ciclo(self, limite=None, ignorar_janela=False):
+        """
+        Verifica as placas vencidas (até `limite`, padrão: o lote). Fora da
+        janela não faz nada, exceto com ignorar_janela. Retorna os totais.
+        """
+        from app.extensions import db
+        from app.models import VeiculoMonitorado
+
+        totais = {'verificados': 0, 'alertas': 0, 'erros': 0}
+        if not ignorar_janela and not na_janela(datetime.utcnow(), self.janela):
+            return totais
+
+        coordenacao = self.app.extensions['i9_coordenacao']
+        with self.app.app_context(), coordenacao.bloqueio(LOCK_SEGUNDO_PLANO) as obtido:
+            if not obtido:
+                # Outra instância (ou o pré-aquecimento) está consultando os provedores
+                return totais
+            try:
+                ids = VeiculoMonitorado.reservar_vencidos(limite or self.lote, self.reserva_s)
+                erros_seguidos = 0
+                for monitorado_id in ids:
+                    if erros_seguidos >= MAX_ERROS_CICLO:
+                        # Provedor provavelmente fora do ar: o restante fica para o próximo ciclo
+                        self._liberar(ids[ids.index(monitorado_id):])
+                        logger.warning('Monitoramento interrompido após %d erros seguidos', erros_seguidos)
+                        break
+                    if not self.aguardar_vez():
+                        self._liberar(ids[ids.index(monitorado_id):])
+                        break
+                    status, alerta = self.verificar(monitorado_id)
+                    totais['verificados'] += 1
+                    totais['alertas'] += alerta is not None
+                    totais['erros'] += status == 'erro'
+                    erros_seguidos = erros_seguidos + 1 if status == 'erro' else 0
+            finally:
+                db.session.remove()
+
+        with self._lock:
+            self.ciclos += 1
+            self.verificacoes += totais['verificados']
+            self.alertas += totais['alertas']
+            self.erros += totais['erros']
+            self.ultimo_ciclo = {'em': datetime.utcnow().isoformat(timespec='seconds'), **totais}
+        if totais['verificados']:
+            logger.info('Monitoramento: %(verificados)d verificado(s), %(alertas)d alerta(s), %(erros)d erro(s)',
+                        totais)
+        return totais
+
+    def _liberar(self, ids):
+        """Desfaz a reserva das placas não verificadas neste ciclo."""
+        from sqlalchemy import update
+        from app.extensions import db
+        from app.models import VeiculoMonitorado
+
+        db.session.execute(
+            update(VeiculoMonitorado).where(VeiculoMonitorado.id.in_(ids)).values(reservado_ate=None)
+        )
+        db.session.commit()
+
+    def verificar(self, monitorado_id):
+        """
+        Consulta a placa, registra o snapshot e, se mudou, o alerta; grava a
+        auditoria (tipo_busca 'monitoramento', em nome de quem incluiu a
+        placa) e agenda a próxima verificação. Retorna (status, alerta).
+        """
+        from app.extensions import db
+        from app.models import VeiculoMonitorado
+
+        monitorado = db.session.get(VeiculoMonitorado, monitorado_id)
+        if monitorado is None or not monitorado.ativo:
+            return None, None
+
+        rastreador = self.app.extensions.get('i9_rastreio')
+        raiz = rastreador.iniciar('monitoramento.verificar', placa=monitorado.placa,
+                                  filial_id=monitorado.filial_id) if rastreador else None
+        try:
+            status, alerta, erro = self._verificar(monitorado)
+            if raiz is not None and erro:
+                raiz.erro = erro
+            return status, alerta
+        finally:
+            if raiz is not None:
+                rastreador.finalizar(raiz)
+
+    def _verificar(self, monitorado):
+        from app.conectores.normalizacao import para_dict
+        from app.conectores.provedores import Consulta, DadosFilial
+        from app.extensions import db
+        from app.models import AlertaVeiculo, Auditoria, SnapshotVeiculo
+
+        agora = datetime.utcnow()
+        try:
+            filial = monitorado.filial
+            if filial is None or not filial.ativa:
+                raise RuntimeError('Filial inativa')
+            consulta = Consulta(placa=monitorado.placa, uf=monitorado.uf, renavam=monitorado.renavam or '',
+                                chassi=monitorado.chassi or '', filial=DadosFilial.de_filial(filial))
+            resultado = self.app.extensions['i9_relatorio'].montar(consulta)
+        except Exception as e:
+            db.session.rollback()
+            erro = str(e) or e.__class__.__name__
+            monitorado.falhas = (monitorado.falhas or 0) + 1
+            monitorado.ultimo_status, monitorado.ultimo_erro = 'erro', erro[:255]
+            monitorado.ultima_verificacao = agora
+            monitorado.proxima_verificacao = self._adiamento(monitorado, agora)
+            monitorado.reservado_ate = None
+            Auditoria.registrar(
+                usuario_id=monitorado.usuario_id,
+                filial_id=monitorado.filial_id,
+                placa_chassi=monitorado.placa,
+                tipo_busca='monitoramento',
+                resultado=erro,
+                status='erro'
+            )
+            logger.warning('Monitoramento de %s falhou: %s', monitorado.placa, erro)
+            return 'erro', None, erro
+
+        # Relatório com seções faltando não vira snapshot (geraria mudanças falsas)
+        alerta = None
+        if not resultado.encontrado:
+            status, texto = 'nao_encontrado', 'Veículo não encontrado'
+        elif not resultado.completo:
+            status, texto = 'incompleto', 'Relatório incompleto (sem comparação)'
+        else:
+            _, mudancas = SnapshotVeiculo.registrar(monitorado.placa, monitorado.filial_id, para_dict(resultado),
+                                                    'placa', commit=False)
+            if mudancas and mudancas['mudou']:
+                alerta = AlertaVeiculo.criar(monitorado, mudancas)
+            status, texto = 'sucesso', alerta.resumo if alerta else 'Sem mudanças'
+
+        monitorado.falhas = 0
+        monitorado.ultimo_status, monitorado.ultimo_erro = status, None
+        monitorado.ultima_verificacao = agora
+        monitorado.proxima_verificacao = self.agendar(agora, monitorado.placa, monitorado.intervalo_horas)
+        monitorado.reservado_ate = None
+        # Grava também o snapshot, o alerta e a agenda da placa
+        Auditoria.registrar(
+            usuario_id=monitorado.usuario_id,
+            filial_id=monitorado.filial_id,
+            placa_chassi=monitorado.placa,
+            tipo_busca='monitoramento',
+            resultado=texto,
+            status='sucesso' if status == 'incompleto' else status,
+            chassi=monitorado.chassi,
+            renavam=monitorado.renavam
+        )
+        return status, alerta, None
+
+    def resumo(self):
+        from app.extensions import db
+        from app.models import VeiculoMonitorado
+
+        with self._lock:
+            dados = {
+                'ativo': self._thread is not None and not self._parar.is_set(),
+                'intervalo_s': self.intervalo_s,
+                'por_minuto': round(60 / self.espaco_s, 2) if self.espaco_s else None,
+                'janela': '-'.join(map(str, self.janela)) if self.janela else None,
+                'ciclos': self.ciclos,
+                'verificacoes': self.verificacoes,
+                'alertas': self.alertas,
+                'erros': self.erros,
+                'ultimo_ciclo': self.ultimo_ciclo
+            }
+        dados['vencidos'] = VeiculoMonitorado.query\
+            .filter(VeiculoMonitorado.ativo.is_(True),
+                    VeiculoMonitorado.proxima_verificacao <= datetime.utcnow())\
+            .count()
+        dados['monitorados'] = db.session.query(VeiculoMonitorado.id).filter_by(ativo=True).count()
+        return dados
+
+
+def configurar_monitoramento(app):
+    """Cria o monitor de frota; a thread sobe na primeira requisição (MONITOR_INTERVALO_S 0 desliga)."""
+    monitor = MonitorFrota(
+        app,
+        intervalo_s=app.config.get('MONITOR_INTERVALO_S', 60),
+        por_minuto=app.config.get('MONITOR_POR_MINUTO', 6),
+        janela=ler_janela(app.config.get('MONITOR_JANELA', '')),
+        lote=app.config.get('MONITOR_LOTE', 20),
+        intervalo_horas=app.config.get('MONITOR_INTERVALO_HORAS', 24)
+    )
+    app.extensions['i9_monitor'] = monitor
+
+    if monitor.intervalo_s and not app.testing:
+        @app.before_request
+        def iniciar_monitoramento():
+            monitor.iniciar()
+
+    return monitor
@@ -0,0 +1,392 @@
+"""
+Sistema I9 - Perfilamento de Requisições
+
+- Captura automática das requisições lentas (acima de PERFIL_LIMIAR_MS): SQL
+  executado com tempos, chamadas aos provedores/fontes e pilhas amostradas
+  no formato "folded" (flamegraph.pl, speedscope, inferno);
+- Amostrador de pilhas que o admin liga e desliga em tempo de execução;
+- cProfile da requisição inteira para administradores, com o header
+  X-I9-Perfil: cprofile (gera um .pstats, aberto com snakeviz ou pstats).
+
+As capturas ficam em PERFIL_DIR com espaço limitado: as mais antigas são
+apagadas primeiro.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Captura da requisição atual (propagada às threads dos conectores com copy_context)
+_captura = ContextVar('i9_captura', default=None)
+
+FORMATO_ID = re.compile(r'^\d{8}-\d{9}-[0-9a-f]{6}$')  # AAAAMMDD-HHMMSSmmm-aleatório
+EXTENSOES = ('json', 'folded', 'pstats')
+
+
+# ============================================================================
+# CAPTURA DE UMA REQUISIÇÃO
+# ============================================================================
+
+class Captura:
+    """SQL, chamadas externas e amostras de pilha de uma requisição."""
+
+    MAX_SQL = 500          # comandos guardados com texto (os demais só contam)
+    MAX_SQL_TEXTO = 2000   # caracteres por comando
+
+    def __init__(self, metodo, caminho, cprofile=False):
+        self.id = f'{datetime.now():%Y%m%d-%H%M%S%f}'[:-3] + f'-{secrets.token_hex(3)}'
+        self.metodo = metodo
+        self.caminho = caminho
+        self.inicio = time.perf_counter()
+        self.sql = []
+        self.sql_total = 0
+        self.sql_ms = 0.0
+        self.chamadas = []
+        self.amostras = Counter()
+        self.status = None
+        self.perfil = None
+        self._lock = threading.Lock()  # chamadas chegam das threads dos conectores
+        if cprofile:
+            self.perfil = cProfile.Profile()
+            try:
+                self.perfil.enable()
+            except ValueError:  # outro profiler já ativo nesta thread
+                self.perfil = None
+
+    def registrar_sql(self, comando, ms):
+        with self._lock:
+            self.sql_total += 1
+            self.sql_ms += ms
+            if len(self.sql) < self.MAX_SQL:
+                self.sql.append({'ms': round(ms, 3), 'sql': comando[:self.MAX_SQL_TEXTO]})
+
+    def registrar_chamada(self, nome, ms, erro=None):
+        with self._lock:
+            self.chamadas.append({'nome': nome, 'ms': round(ms, 1), 'erro': erro})
+
+    def encerrar(self):
+        """Para o cProfile e retorna a duração da requisição (ms)."""
+        if self.perfil is not None:
+            self.perfil.disable()
+        return (time.perf_counter() - self.inicio) * 1000
+
+
+def captura_atual():
+    """Captura da requisição em andamento (None fora de requisição ou desligado)."""
+    return _captura.get()
+
+
+def registrar_chamada(nome, ms, erro=None):
+    """Registra uma chamada externa (provedor, fonte do relatório) na captura atual."""
+    captura = _captura.get()
+    if captura is not None:
+        captura.registrar_chamada(nome, ms, erro)
+
+
+def _top_cprofile(perfil, limite=30):
+    """Funções com maior tempo acumulado, para ler sem abrir o .pstats."""
+    estatisticas = pstats.Stats(perfil).stats
+    linhas = sorted(estatisticas.items(), key=lambda item: item[1][3], reverse=True)[:limite]
+    return [{
+        'funcao': f'{funcao} ({os.path.basename(arquivo)}:{linha})',
+        'chamadas': nc,
+        'proprio_ms': round(tt * 1000, 2),
+        'acumulado_ms': round(ct * 1000, 2)
+    } for (arquivo, linha, funcao), (cc, nc, tt, ct, _) in linhas]
+
+
+def _nome_frame(frame):
+    codigo = frame.f_code
+    return f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})'
+
+
+def _pilha_folded(frame, limite=200):
+    nomes = []
+    while frame is not None and len(nomes) < limite:
+        nomes.append(_nome_frame(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(nomes))
+
+
+# ============================================================================
+# PERFILADOR
+# ============================================================================
+
+class Perfilador:
+    """Cria as capturas, amostra as pilhas e grava as requisições lentas."""
+
+    def __init__(self, pasta, limiar_ms=2000, amostragem=False, intervalo_ms=20,
+                 max_mb=100, max_capturas=500):
+        self.pasta = pasta
+        self.limiar_ms = limiar_ms
+        self.amostragem = amostragem
+        self.intervalo_s = max(intervalo_ms, 1) / 1000
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_capturas = max_capturas
+        self._ativas = {}  # ident da thread -> Captura
+        self._lock = threading.Lock()
+        self._thread = None
+        self.requisicoes = 0
+        self.gravadas = 0
+        self.removidas = 0
+        self.amostras = 0
+
+    # ----- Amostrador ---------------------------------------------------------
+
+    def ligar_amostragem(self, ligar):
+        self.amostragem = bool(ligar)
+        if self.amostragem:
+            self._iniciar_amostrador()
+
+    def _iniciar_amostrador(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._amostrar, name='i9-perfil-amostrador', daemon=True)
+            self._thread.start()
+
+    def _amostrar(self):
+        while self.amostragem:
+            time.sleep(self.intervalo_s)
+            with self._lock:
+                ativas = dict(self._ativas)
+            if not ativas:
+                continue
+            frames = sys._current_frames()
+            for ident, captura in ativas.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    captura.amostras[_pilha_folded(frame)] += 1
+                    self.amostras += 1
+            del frames
+
+    # ----- Ciclo da requisição ------------------------------------------------
+
+    def iniciar(self, metodo, caminho, cprofile=False):
+        captura = Captura(metodo, caminho, cprofile)
+        _captura.set(captura)
+        with self._lock:
+            self._ativas[threading.get_ident()] = captura
+            self.requisicoes += 1
+        if self.amostragem and self._thread is None:
+            self._iniciar_amostrador()
+        return captura
+
+    def finalizar(self, captura, **meta):
+        """Encerra a captura; grava se passou do limiar ou se houve cProfile. Retorna o ID gravado."""
+        ms = captura.encerrar()
+        _captura.set(None)
+        with self._lock:
+            self._ativas.pop(threading.get_ident(), None)
+        if captura.perfil is None and (not self.limiar_ms or ms < self.limiar_ms):
+            return None
+        try:
+            self.gravar(captura, ms, meta)
+        except OSError as e:
+            logger.error('Falha ao gravar o perfil %s: %s', captura.id, e)
+            return None
+        return captura.id
+
+    # ----- Disco --------------------------------------------------------------
+
+    def gravar(self, captura, ms, meta):
+        os.makedirs(self.pasta, exist_ok=True)
+        base = os.path.join(self.pasta, captura.id)
+        with captura._lock:
+            sql = list(captura.sql)
+            chamadas = list(captura.chamadas)
+            amostras = dict(captura.amostras)
+
+        dados = {
+            'id': captura.id,
+            'metodo': captura.metodo,
+            'caminho': captura.caminho,
+            'status': captura.status,
+            'duracao_ms': round(ms, 1),
+            **meta,
+            'sql': {
+                'comandos': captura.sql_total,
+                'total_ms': round(captura.sql_ms, 1),
+                'lista': sql
+            },
+            'chamadas': chamadas,
+            'amostras': sum(amostras.values()),
+            'arquivos': ['json']
+        }
+        if amostras:
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                f.writelines(f'{pilha} {n}\n' for pilha, n in amostras.items())
+            dados['arquivos'].append('folded')
+        if captura.perfil is not None:
+            captura.perfil.dump_stats(base + '.pstats')
+            dados['arquivos'].append('pstats')
+            dados['cprofile'] = _top_cprofile(captura.perfil)
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=1, default=str)
+
+        self.gravadas += 1
+        logger.warning('Requisição lenta: %s %s (%.0f ms, %d SQL) -> perfil %s',
+                       captura.metodo, captura.caminho, ms, captura.sql_total, captura.id)
+        self._podar()
+
+    def _grupos(self):
+        """{id: [caminhos]} das capturas em disco."""
+        grupos = {}
+        try:
+            nomes = os.listdir(self.pasta)
+        except OSError:
+            return grupos
+        for nome in nomes:
+            captura_id, _, extensao = nome.partition('.')
+            if FORMATO_ID.match(captura_id) and extensao in EXTENSOES:
+                grupos.setdefault(captura_id, []).append(os.path.join(self.pasta, nome))
+        return grupos
+
+    def _podar(self):
+        """Apaga as capturas mais antigas além de PERFIL_MAX_MB ou PERFIL_MAX_CAPTURAS."""
+        grupos = self._grupos()
+        tamanhos = {cid: sum(os.path.getsize(c) for c in caminhos if os.path.exists(c))
+                    for cid, caminhos in grupos.items()}
+        total = sum(tamanhos.values())
+        # O ID começa pela data/hora: a ordem alfabética é a cronológica
+        for captura_id in sorted(grupos):
+            if total <= self.max_bytes and len(grupos) <= self.max_capturas:
+                break
+            for caminho in grupos.pop(captura_id):
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+            total -= tamanhos[captura_id]
+            self.removidas += 1
+
+    def listar(self, limite=100):
+        """Capturas mais recentes (apenas os metadados, sem a lista de SQL)."""
+        capturas = []
+        for captura_id in sorted(self._grupos(), reverse=True)[:limite]:
+            try:
+                with open(os.path.join(self.pasta, captura_id + '.json'), encoding='utf-8') as f:
+                    dados = json.load(f)
+            except (OSError, ValueError):
+                continue
+            dados['sql'] = {k: v for k, v in dados.get('sql', {}).items() if k != 'lista'}
+            dados.pop('cprofile', None)
+            capturas.append(dados)
+        return capturas
+
+    def resumo(self):
+        grupos = self._grupos()
+        return {
+            'pasta': self.pasta,
+            'limiar_ms': self.limiar_ms,
+            'amostragem': self.amostragem,
+            'intervalo_ms': round(self.intervalo_s * 1000),
+            'requisicoes': self.requisicoes,
+            'em_andamento': len(self._ativas),
+            'amostras': self.amostras,
+            'gravadas': self.gravadas,
+            'removidas': self.removidas,
+            'em_disco': len(grupos),
+            'em_disco_mb': round(sum(os.path.getsize(c) for caminhos in grupos.values()
+                                     for c in caminhos if os.path.exists(c)) / 1024 / 1024, 2),
+            'max_mb': round(self.max_bytes / 1024 / 1024),
+            'max_capturas': self.max_capturas
+        }
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+def _instrumentar_sql(engine):
+    """Tempo de cada comando SQL executado dentro de uma captura."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        if _captura.get() is not None:
+            conn.info.setdefault('i9_perfil_inicio', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conn, cursor, statement, parameters, context, executemany):
+        captura = _captura.get()
+        inicios = conn.info.get('i9_perfil_inicio')
+        if captura is not None and inicios:
+            captura.registrar_sql(statement, (time.perf_counter() - inicios.pop()) * 1000)
+
+
+def _pediu_cprofile(app):
+    if request.headers.get(app.config.get('PERFIL_HEADER', 'X-I9-Perfil'), '').lower() != 'cprofile':
+        return False
+    from flask_login import current_user
+    return current_user.is_authenticated and current_user.is_admin()
+
+
+def configurar_perfilamento(app):
+    """Liga a captura de requisições lentas, o amostrador e o cProfile sob demanda."""
+    if not app.config.get('PERFIL_CAPTURA', True):
+        return None
+
+    from app.extensions import db
+
+    perfilador = Perfilador(
+        app.config.get('PERFIL_DIR'),
+        limiar_ms=app.config.get('PERFIL_LIMIAR_MS', 2000),
+        amostragem=app.config.get('PERFIL_AMOSTRAGEM', False),
+        intervalo_ms=app.config.get('PERFIL_AMOSTRAGEM_MS', 20),
+        max_mb=app.config.get('PERFIL_MAX_MB', 100),
+        max_capturas=app.config.get('PERFIL_MAX_CAPTURAS', 500)
+    )
+    app.extensions['i9_perfilador'] = perfilador
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrumentar_sql(engine)
+
+    @app.before_request
+    def iniciar_captura():
+        if request.endpoint == 'static':
+            return
+        g.i9_captura = perfilador.iniciar(request.method, request.full_path.rstrip('?'),
+                                          cprofile=_pediu_cprofile(app))
+
+    @app.after_request
+    def identificar_captura(resposta):
+        captura = g.get('i9_captura')
+        if captura is None:
+            return resposta
+        captura.status = resposta.status_code
+        if captura.perfil is not None:
+            resposta.headers['X-I9-Perfil-Id'] = captura.id
+        return resposta
+
+    # teardown: com stream_with_context roda depois do último pedaço enviado
+    @app.teardown_request
+    def finalizar_captura(exc):
+        captura = g.pop('i9_captura', None)
+        if captura is None:
+            return
+        usuario = g.get('_login_user')
+        perfilador.finalizar(
+            captura,
+            endpoint=request.endpoint,
+            usuario_id=getattr(usuario, 'id', None),
+            erro=repr(exc) if exc is not None else None,
+            quando=datetime.now().isoformat(timespec='seconds')
+        )
+
+    return perfilador
@@ -0,0 +1,281 @@
+"""
+Sistema I9 - Pré-aquecimento do Cache de Consultas
+
+Placas consultadas várias vezes em poucos dias (veículos em negociação)
+tendem a ser consultadas de novo. Na janela de baixo movimento
+(MONITOR_JANELA), o pré-aquecedor escolhe na auditoria as placas com mais
+consultas recentes cujo snapshot venceria antes do fim do próximo
+expediente e as consulta de novo, até PREAQUECIMENTO_ORCAMENTO consultas em
+24 horas. Com CACHE_CONSULTA_HORAS, /api/consultar responde com o snapshot
+na hora.
+
+As consultas do pré-aquecimento entram na auditoria com tipo_busca
+'preaquecimento' (em nome do último consultor da placa) e dividem o limite
+por minuto do monitoramento de frota. relatorio() mostra quantas foram
+aproveitadas por um consultor enquanto válidas e a taxa de acerto do cache.
+"""
+
+import bisect
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from app.monitoramento import LOCK_SEGUNDO_PLANO, MAX_ERROS_CICLO, na_janela
+
+logger = logging.getLogger(__name__)
+
+TIPO_BUSCA = 'preaquecimento'
+# Consultas de consultores (exclui monitoramento e o próprio pré-aquecimento)
+TIPOS_CONSULTOR = ('placa', 'chassi')
+
+
+def fim_do_expediente(agora, janela):
+    """
+    Quando termina o próximo expediente: a janela de baixo movimento abre
+    de novo depois de fechar. Sem janela, 24 horas depois de agora.
+    """
+    if janela is None:
+        return agora + timedelta(days=1)
+    hora = agora.replace(minute=0, second=0, microsecond=0)
+    for _ in range(48):
+        if not na_janela(hora, janela):
+            break
+        hora += timedelta(hours=1)
+    for _ in range(48):
+        hora += timedelta(hours=1)
+        if na_janela(hora, janela):
+            return hora
+    return agora + timedelta(days=1)
+
+
+class Preaquecedor:
+    """Escolhe as placas de provável nova consulta e renova o snapshot delas fora do expediente."""
+
+    def __init__(self, app, monitor, orcamento=0, min_consultas=2, dias=5, intervalo_s=300, validade_horas=24):
+        self.app = app
+        self.monitor = monitor
+        self.orcamento = orcamento
+        self.min_consultas = min_consultas
+        self.dias = dias
+        self.intervalo_s = intervalo_s
+        self.validade_horas = validade_horas
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.ciclos = 0
+        self.atualizadas = 0
+        self.erros = 0
+        self.ultimo_ciclo = None
+
+    # --------------------------------------------------------------- previsão
+
+    def candidatos(self, limite, agora=None):
+        """
+        Placas consultadas ao menos `min_consultas` vezes nos últimos `dias`,
+        da maior para a menor pontuação (consultas / (1 + dias desde a
+        última)). Ficam de fora as monitoradas e as que têm snapshot válido
+        até o fim do próximo expediente, ambos na filial que consultou a
+        placa por último.
+        """
+        from sqlalchemy import func
+        from app.extensions import db
+        from app.models import Auditoria, Filial, SnapshotVeiculo, VeiculoMonitorado
+
+        agora = agora or datetime.utcnow()
+        linhas = db.session.query(Auditoria.placa_chassi, func.count(Auditoria.id), func.max(Auditoria.data_consulta))\
+            .filter(Auditoria.data_consulta >= agora - timedelta(days=self.dias),
+                    Auditoria.tipo_busca == 'placa',
+                    Auditoria.status.in_(('sucesso', 'cache')))\
+            .group_by(Auditoria.placa_chassi)\
+            .all()
+
+        # "ABC-1234" e "ABC1234" são a mesma placa
+        placas = {}
+        for placa_chassi, consultas, ultima in linhas:
+            placa = SnapshotVeiculo.normalizar_chave(placa_chassi)
+            total, mais_recente = placas.get(placa, (0, ultima))
+            placas[placa] = (total + consultas, max(mais_recente, ultima))
+        placas = {p: v for p, v in placas.items() if v[0] >= self.min_consultas}
+        if not placas:
+            return []
+
+        # Filial e consultor da consulta mais recente de cada placa: o snapshot
+        # renovado é o dessa filial (cada filial lê só os próprios)
+        origem = {}
+        for placa_chassi, filial_id, usuario_id in db.session.query(
+                Auditoria.placa_chassi, Auditoria.filial_id, Auditoria.usuario_id)\
+                .join(Filial, Filial.id == Auditoria.filial_id)\
+                .filter(Auditoria.data_consulta >= agora - timedelta(days=self.dias),
+                        Auditoria.tipo_busca == 'placa',
+                        Auditoria.status.in_(('sucesso', 'cache')),
+                        Filial.ativa.is_(True))\
+                .order_by(Auditoria.data_consulta):
+            origem[SnapshotVeiculo.normalizar_chave(placa_chassi)] = (filial_id, usuario_id)
+        placas = {p: v for p, v in placas.items() if p in origem}
+        if not placas:
+            return []
+
+        monitoradas = {(placa, filial_id) for placa, filial_id in
+                       db.session.query(VeiculoMonitorado.placa, VeiculoMonitorado.filial_id)
+                       .filter(VeiculoMonitorado.ativo.is_(True), VeiculoMonitorado.placa.in_(placas))}
+        verificados = {(chave, filial_id): verificado_em for chave, filial_id, verificado_em in
+                       db.session.query(SnapshotVeiculo.chave, SnapshotVeiculo.filial_id,
+                                        func.max(SnapshotVeiculo.verificado_em))
+                       .filter(SnapshotVeiculo.chave.in_(placas))
+                       .group_by(SnapshotVeiculo.chave, SnapshotVeiculo.filial_id)}
+        # Snapshot que não chega válido ao fim do próximo expediente; com validade curta
+        # demais para isso, a placa é renovada no máximo a cada meia validade
+        vence_antes_de = min(fim_do_expediente(agora, self.monitor.janela) - timedelta(hours=self.validade_horas),
+                             agora - timedelta(hours=self.validade_horas / 2))
+
+        pontuadas = sorted((
+            (consultas / (1 + (agora - ultima).total_seconds() / 86400), placa, consultas, ultima)
+            for placa, (consultas, ultima) in placas.items()
+            if (placa, origem[placa][0]) not in monitoradas
+            and (verificados.get((placa, origem[placa][0])) or datetime.min) < vence_antes_de
+        ), reverse=True)[:limite]
+
+        return [{
+            'placa': placa,
+            'consultas': consultas,
+            'ultima_consulta': ultima.isoformat(timespec='seconds'),
+            'pontos': round(pontos, 3),
+            'filial_id': origem[placa][0],
+            'usuario_id': origem[placa][1]
+        } for pontos, placa, consultas, ultima in pontuadas]
+
+    def atualizar(self, candidato):
+        """
+        Consulta a placa e renova o snapshot. Retorna o status da auditoria,
+        ou None se outro processo já renovou o snapshot.
+        """
+        from app.conectores.normalizacao import para_dict
+        from app.conectores.provedores import Consulta, DadosFilial
+        from app.extensions import db
+        from app.models import Auditoria, Filial, SnapshotVeiculo
+
+        placa = candidato['placa']
+        ultimo = SnapshotVeiculo.ultimo(placa, candidato['filial_id'])
+        if ultimo is not None and ultimo.idade_horas() < 1:
+            return None
+
+        rastreador = self.app.extensions.get('i9_rastreio')
+        raiz = rastreador.iniciar('preaquecimento.atualizar', placa=placa) if rastreador else None
+        try:
+            try:
+                filial = db.session.get(Filial, candidato['filial_id'])
+                consulta = Consulta(placa=placa, uf=filial.uf, filial=DadosFilial.de_filial(filial))
+                resultado = self.app.extensions['i9_relatorio'].montar(consulta)
+            except Exception as e:
+                db.session.rollback()
+                erro = str(e) or e.__class__.__name__
+                if raiz is not None:
+                    raiz.erro = erro
+                Auditoria.registrar(usuario_id=candidato['usuario_id'], filial_id=candidato['filial_id'],
+                                    placa_chassi=placa, tipo_busca=TIPO_BUSCA, resultado=erro, status='erro')
+                logger.warning('Pré-aquecimento de %s falhou: %s', placa, erro)
+                return 'erro'
+
+            # Relatório com seções faltando não vira snapshot (não serviria o cache)
+            if resultado.encontrado and resultado.completo:
+                SnapshotVeiculo.registrar(placa, candidato['filial_id'], para_dict(resultado), 'placa', commit=False)
+                status, texto = 'sucesso', 'Snapshot renovado'
+            elif resultado.encontrado:
+                status, texto = 'erro', 'Relatório incompleto (snapshot não renovado)'
+            else:
+                status, texto = 'nao_encontrado', 'Veículo não encontrado'
+            Auditoria.registrar(usuario_id=candidato['usuario_id'], filial_id=candidato['filial_id'],
+                                placa_chassi=placa, tipo_busca=TIPO_BUSCA, resultado=texto, status=status)
+            return status
+        finally:
+            if raiz is not None:
+                rastreador.finalizar(raiz)
+
+    # -------------------------------------------------------------- relatório
+
+    def relatorio(self, dias=7, agora=None):
+        """
+        Eficácia do orçamento nos últimos `dias`: pré-aquecimentos
+        aproveitados (placa consultada por um consultor enquanto o snapshot
+        renovado valia) e taxa de acerto do cache nas consultas dos consultores.
+        """
+        from app.extensions import db
+        from app.models import Auditoria, SnapshotVeiculo
+
+        agora = agora or datetime.utcnow()
+        inicio = agora - timedelta(days=dias)
+        validade = timedelta(hours=self.validade_horas)
+
+        preaquecidas = db.session.query(Auditoria.placa_chassi, Auditoria.data_consulta, Auditoria.status)\
+            .filter(Auditoria.tipo_busca == TIPO_BUSCA, Auditoria.data_consulta >= inicio)\
+            .all()
+        consultas = db.session.query(Auditoria.placa_chassi, Auditoria.data_consulta, Auditoria.status)\
+            .filter(Auditoria.tipo_busca.in_(TIPOS_CONSULTOR), Auditoria.data_consulta >= inicio,
+                    Auditoria.status != 'erro')\
+            .all()
+
+        por_placa = {}
+        for placa_chassi, data, status in sorted(consultas, key=lambda c: c[1]):
+            datas, situacoes = por_placa.setdefault(SnapshotVeiculo.normalizar_chave(placa_chassi), ([], []))
+            datas.append(data)
+            situacoes.append(status)
+
+        renovadas = aproveitadas = evitadas = 0
+        for placa_chassi, data, status in preaquecidas:
+            if status != 'sucesso':
+                continue
+            renovadas += 1
+            datas, situacoes = por_placa.get(SnapshotVeiculo.normalizar_chave(placa_chassi), ([], []))
+            validas = situacoes[bisect.bisect_right(datas, data):bisect.bisect_right(datas, data + validade)]
+            aproveitadas += bool(validas)
+            evitadas += validas.count('cache')
+
+        servidas_cache = sum(status == 'cache' for _, _, status in consultas)
+        return {
+            'dias': dias,
+            'orcamento_diario': self.orcamento,
+            'gastos_24h': self.gastos(agora),
+            'preaquecidas': len(preaquecidas),
+            'renovadas': renovadas,
+            'aproveitadas': aproveitadas,
+            'taxa_aproveitamento': round(aproveitadas / renovadas, 3) if renovadas else None,
+            'consultas_evitadas': evitadas,
+            'consultas': len(consultas),
+            'servidas_cache': servidas_cache,
+            'taxa_acerto_cache': round(servidas_cache / len(consultas), 3) if consultas else None
+        }
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'ativo': self._thread is not None and not self._parar.is_set(),
+                'orcamento_diario': self.orcamento,
+                'min_consultas': self.min_consultas,
+                'dias': self.dias,
+                'validade_horas': self.validade_horas,
+                'ciclos': self.ciclos,
+                'atualizadas': self.atualizadas,
+                'erros': self.erros,
+                'ultimo_ciclo': self.ultimo_ciclo
+            }
+
+
+def configurar_preaquecimento(app):
+    """Cria o pré-aquecedor; a thread sobe na primeira requisição se houver orçamento."""
+    preaquecedor = Preaquecedor(
+        app,
+        app.extensions['i9_monitor'],
+        orcamento=app.config.get('PREAQUECIMENTO_ORCAMENTO', 0),
+        min_consultas=app.config.get('PREAQUECIMENTO_MIN_CONSULTAS', 2),
+        dias=app.config.get('PREAQUECIMENTO_DIAS', 5),
+        intervalo_s=app.config.get('PREAQUECIMENTO_INTERVALO_S', 300),
+        validade_horas=app.config.get('CACHE_CONSULTA_HORAS') or app.config.get('SNAPSHOT_MAX_IDADE_HORAS', 24)
+    )
+    app.extensions['i9_preaquecimento'] = preaquecedor
+
+    if preaquecedor.orcamento and preaquecedor.intervalo_s and not app.testing:
+        @app.before_request
+        def iniciar_preaquecimento():
+            preaquecedor.iniciar()
+
+    return preaquecedor
@@ -0,0 +1,497 @@
+"""
+Sistema I9 - Rastreamento de Requisições (Traces)
+
+Cada requisição vira um trace com spans das etapas (roteamento, carga do
+usuário, permissão, filial, certificado, provedores e fontes, chamadas HTTP,
+SQL e auditoria). O trace id segue nos logs, nas auditorias, no header
+X-Trace-Id da resposta e no traceparent (W3C) enviado aos provedores.
+
+Os traces são exportados em lote, em segundo plano, no formato OTLP/JSON:
+- arquivo: uma linha JSON por lote em RASTREIO_ARQUIVO;
+- otlp: POST em RASTREIO_OTLP_URL (Jaeger, OpenTelemetry Collector ou o
+  coletor local benchmarks/coletor_traces.py).
+
+Os últimos traces ficam em memória para /admin/traces/json, com a quebra do
+tempo por etapa de cada endpoint.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Span ativo (propagado às threads dos conectores com copy_context)
+_span_atual = ContextVar('i9_span', default=None)
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class Rastro:
+    """Um trace: os spans já encerrados de uma requisição."""
+
+    MAX_SPANS = 500
+
+    def __init__(self, trace_id=None, amostrado=True):
+        self.trace_id = trace_id or f'{random.getrandbits(128):032x}'
+        self.amostrado = amostrado
+        self.spans = []
+        self.descartados = 0
+        self._lock = threading.Lock()  # spans chegam das threads dos conectores
+
+    def adicionar(self, span):
+        with self._lock:
+            if len(self.spans) < self.MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.descartados += 1
+
+    @property
+    def raiz(self):
+        return next((s for s in self.spans if s.raiz), None)
+
+
+class Span:
+    """Uma etapa com início, fim, atributos e erro (se houver)."""
+
+    __slots__ = ('rastro', 'span_id', 'pai_id', 'nome', 'inicio_ns', 'fim_ns', 'atributos', 'erro', 'raiz')
+
+    def __init__(self, rastro, nome, pai_id=None, atributos=None, inicio_ns=None, raiz=False):
+        self.rastro = rastro
+        self.span_id = f'{random.getrandbits(64):016x}'  # como o SDK do OpenTelemetry
+        self.pai_id = pai_id
+        self.nome = nome
+        self.inicio_ns = inicio_ns or time.time_ns()
+        self.fim_ns = None
+        self.atributos = dict(atributos or {})
+        self.erro = None
+        self.raiz = raiz
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+    def encerrar(self, fim_ns=None):
+        self.fim_ns = fim_ns or time.time_ns()
+        self.rastro.adicionar(self)
+
+    @property
+    def duracao_ms(self):
+        return ((self.fim_ns or time.time_ns()) - self.inicio_ns) / 1e6
+
+
+def trace_id_atual():
+    """Trace id da requisição em andamento (None fora de requisição)."""
+    atual = _span_atual.get()
+    return atual.rastro.trace_id if atual is not None else None
+
+
+def traceparent_atual():
+    """Header traceparent (W3C) para propagar o trace a um serviço externo."""
+    atual = _span_atual.get()
+    if atual is None:
+        return None
+    return f"00-{atual.rastro.trace_id}-{atual.span_id}-{'01' if atual.rastro.amostrado else '00'}"
+
+
+@contextmanager
+def span(nome, **atributos):
+    """
+    Span filho do span atual; não faz nada fora de um trace amostrado.
+
+        with span('filial.buscar', filial_id=filial_id):
+            filial = Filial.query.get(filial_id)
+    """
+    pai = _span_atual.get()
+    if pai is None or not pai.rastro.amostrado:
+        yield None
+        return
+    atual = Span(pai.rastro, nome, pai.span_id, atributos)
+    token = _span_atual.set(atual)
+    try:
+        yield atual
+    except BaseException as e:
+        atual.erro = str(e) or e.__class__.__name__
+        raise
+    finally:
+        _span_atual.reset(token)
+        atual.encerrar()
+
+
+# ============================================================================
+# EXPORTAÇÃO (OTLP/JSON)
+# ============================================================================
+
+def _atributos_otlp(atributos):
+    convertidos = []
+    for chave, valor in atributos.items():
+        if valor is None:
+            continue
+        if isinstance(valor, bool):
+            convertido = {'boolValue': valor}
+        elif isinstance(valor, int):
+            convertido = {'intValue': str(valor)}
+        elif isinstance(valor, float):
+            convertido = {'doubleValue': valor}
+        else:
+            convertido = {'stringValue': str(valor)}
+        convertidos.append({'key': chave, 'value': convertido})
+    return convertidos
+
+
+def para_otlp(rastros, servico):
+    """Corpo OTLP/JSON (ExportTraceServiceRequest) com os spans dos rastros."""
+    spans = []
+    for rastro in rastros:
+        with rastro._lock:
+            lista = list(rastro.spans)
+        for s in lista:
+            dados = {
+                'traceId': rastro.trace_id,
+                'spanId': s.span_id,
+                'name': s.nome,
+                'kind': 2 if s.raiz else 1,  # SERVER / INTERNAL
+                'startTimeUnixNano': str(s.inicio_ns),
+                'endTimeUnixNano': str(s.fim_ns),
+                'attributes': _atributos_otlp(s.atributos),
+                'status': {'code': 2, 'message': s.erro} if s.erro else {'code': 0}
+            }
+            if s.pai_id:
+                dados['parentSpanId'] = s.pai_id
+            spans.append(dados)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _atributos_otlp({'service.name': servico})},
+        'scopeSpans': [{'scope': {'name': 'app.rastreamento'}, 'spans': spans}]
+    }]}
+
+
+class ExportadorArquivo:
+    """Acrescenta uma linha OTLP/JSON por lote; roda para .1 ao passar de max_mb."""
+
+    def __init__(self, caminho, servico, max_mb=50):
+        self.caminho = caminho
+        self.servico = servico
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    def exportar(self, rastros):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        if os.path.exists(self.caminho) and os.path.getsize(self.caminho) >= self.max_bytes:
+            os.replace(self.caminho, self.caminho + '.1')
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(para_otlp(rastros, self.servico), ensure_ascii=False) + '\n')
+
+
+class ExportadorOTLP:
+    """POST OTLP/HTTP com JSON (porta 4318 do Jaeger/OpenTelemetry Collector)."""
+
+    def __init__(self, url, servico, timeout=5):
+        import requests
+        self.url = url.rstrip('/')
+        if not self.url.endswith('/v1/traces'):
+            self.url += '/v1/traces'
+        self.servico = servico
+        self.timeout = timeout
+        self._sessao = requests.Session()
+
+    def exportar(self, rastros):
+        resposta = self._sessao.post(self.url, json=para_otlp(rastros, self.servico), timeout=self.timeout)
+        resposta.raise_for_status()
+
+
+# ============================================================================
+# RASTREADOR
+# ============================================================================
+
+class Rastreador:
+    """Abre e fecha os traces das requisições e exporta os amostrados em lote."""
+
+    def __init__(self, exportador=None, amostragem=1.0, memoria=200, intervalo_s=2.0, lote=100):
+        self.exportador = exportador
+        self.amostragem = amostragem
+        self.intervalo_s = intervalo_s
+        self.lote = lote
+        self.recentes = deque(maxlen=memoria)
+        self._fila = queue.Queue(maxsize=lote * 20)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.rastros = 0
+        self.exportados = 0
+        self.descartados = 0
+        self.falhas_exportacao = 0
+
+    def iniciar(self, nome, traceparent=None, **atributos):
+        """Abre o span raiz (continua o trace do traceparent recebido, se válido)."""
+        pai_id = None
+        encontrado = TRACEPARENT.match((traceparent or '').strip().lower())
+        if encontrado:
+            trace_id, pai_id, flags = encontrado.groups()
+            rastro = Rastro(trace_id, amostrado=bool(int(flags, 16) & 1))
+        else:
+            rastro = Rastro(amostrado=random.random() < self.amostragem)
+        raiz = Span(rastro, nome, pai_id, atributos, raiz=True)
+        _span_atual.set(raiz)
+        return raiz
+
+    def finalizar(self, raiz):
+        raiz.encerrar()
+        _span_atual.set(None)
+        if not raiz.rastro.amostrado:
+            return
+        with self._lock:
+            self.rastros += 1
+            self.recentes.append(raiz.rastro)
+        if self.exportador is None:
+            return
+        try:
+            self._fila.put_nowait(raiz.rastro)
+        except queue.Full:
+            with self._lock:
+                self.descartados += 1
+            return
+        if self._thread is None:
+            self._iniciar_exportacao()
+
+    def _iniciar_exportacao(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._exportar_periodicamente, name='i9-rastreio',
+                                            daemon=True)
+            self._thread.start()
+
+    def _exportar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo_s)
+            self.descarregar()
+
+    def descarregar(self):
+        """Exporta o que estiver na fila (também usado ao encerrar e em scripts)."""
+        while True:
+            lote = []
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            if not lote:
+                return
+            try:
+                self.exportador.exportar(lote)
+            except Exception as e:
+                with self._lock:
+                    self.falhas_exportacao += 1
+                    self.descartados += len(lote)
+                logger.warning('Falha ao exportar %d trace(s): %s', len(lote), e)
+                return
+            with self._lock:
+                self.exportados += len(lote)
+
+    def quebra(self, endpoint=None):
+        """
+        Por endpoint (nome do span raiz): tempo médio da requisição e, por etapa,
+        chamadas, tempo médio e fração do tempo total da requisição. Etapas
+        aninhadas ou paralelas se sobrepõem: as frações não somam 1.
+        """
+        with self._lock:
+            rastros = list(self.recentes)
+
+        grupos = {}
+        for rastro in rastros:
+            raiz = rastro.raiz
+            if raiz is None or (endpoint and raiz.nome != endpoint):
+                continue
+            grupo = grupos.setdefault(raiz.nome, {'requisicoes': 0, 'total_ms': 0.0, 'etapas': {}})
+            grupo['requisicoes'] += 1
+            grupo['total_ms'] += raiz.duracao_ms
+            with rastro._lock:
+                spans = [s for s in rastro.spans if not s.raiz]
+            for s in spans:
+                etapa = grupo['etapas'].setdefault(s.nome, {'chamadas': 0, 'total_ms': 0.0, 'erros': 0})
+                etapa['chamadas'] += 1
+                etapa['total_ms'] += s.duracao_ms
+                etapa['erros'] += bool(s.erro)
+
+        return {
+            nome: {
+                'requisicoes': g['requisicoes'],
+                'media_ms': round(g['total_ms'] / g['requisicoes'], 2),
+                'etapas': {
+                    etapa: {
+                        'chamadas': e['chamadas'],
+                        'media_ms': round(e['total_ms'] / e['chamadas'], 2),
+                        'por_requisicao_ms': round(e['total_ms'] / g['requisicoes'], 2),
+                        'fracao': round(e['total_ms'] / g['total_ms'], 3) if g['total_ms'] else None,
+                        'erros': e['erros']
+                    }
+                    for etapa, e in sorted(g['etapas'].items(), key=lambda item: -item[1]['total_ms'])
+                }
+            }
+            for nome, g in sorted(grupos.items())
+        }
+
+    def buscar(self, trace_id):
+        """Spans de um trace ainda em memória, em ordem de início."""
+        with self._lock:
+            rastro = next((r for r in self.recentes if r.trace_id == trace_id), None)
+        if rastro is None:
+            return None
+        with rastro._lock:
+            spans = sorted(rastro.spans, key=lambda s: s.inicio_ns)
+        inicio = spans[0].inicio_ns if spans else 0
+        return [{
+            'span_id': s.span_id,
+            'pai_id': s.pai_id,
+            'nome': s.nome,
+            'inicio_ms': round((s.inicio_ns - inicio) / 1e6, 3),
+            'duracao_ms': round(s.duracao_ms, 3),
+            'atributos': s.atributos,
+            'erro': s.erro
+        } for s in spans]
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'exportador': self.exportador.__class__.__name__ if self.exportador else None,
+                'amostragem': self.amostragem,
+                'rastros': self.rastros,
+                'em_memoria': len(self.recentes),
+                'na_fila': self._fila.qsize(),
+                'exportados': self.exportados,
+                'descartados': self.descartados,
+                'falhas_exportacao': self.falhas_exportacao
+            }
+
+
+# ============================================================================
+# INTEGRAÇÃO (WSGI, LOGS E SQL)
+# ============================================================================
+
+class MiddlewareRastreio:
+    """
+    Abre o span raiz antes do Flask (o roteamento e a sessão entram no trace)
+    e o fecha só quando a resposta termina de ser enviada (inclusive streams).
+    """
+
+    def __init__(self, wsgi_app, rastreador, ignorar=('/static/',)):
+        self.wsgi_app = wsgi_app
+        self.rastreador = rastreador
+        self.ignorar = ignorar
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        caminho = environ.get('PATH_INFO', '')
+        if caminho.startswith(self.ignorar):
+            return self.wsgi_app(environ, start_response)
+
+        metodo = environ.get('REQUEST_METHOD', 'GET')
+        raiz = self.rastreador.iniciar(f'{metodo} {caminho}', environ.get('HTTP_TRACEPARENT'),
+                                       **{'http.method': metodo, 'http.target': caminho})
+
+        def iniciar_resposta(status, headers, exc_info=None):
+            raiz.definir(**{'http.status_code': int(status.split(' ', 1)[0])})
+            headers.append(('X-Trace-Id', raiz.rastro.trace_id))
+            return start_response(status, headers, exc_info)
+
+        try:
+            resposta = self.wsgi_app(environ, iniciar_resposta)
+        except BaseException as e:
+            raiz.erro = str(e) or e.__class__.__name__
+            self.rastreador.finalizar(raiz)
+            raise
+        return ClosingIterator(resposta, lambda: self.rastreador.finalizar(raiz))
+
+
+class FiltroRastreio(logging.Filter):
+    """Acrescenta %(trace_id)s aos registros de log ('-' fora de requisição)."""
+
+    def filter(self, record):
+        record.trace_id = trace_id_atual() or '-'
+        return True
+
+
+def _instrumentar_sql(engine):
+    """Um span por comando SQL, com o fingerprint (sem valores) como atributo."""
+    from app.database.metricas_sql import fingerprint
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        pai = _span_atual.get()
+        if pai is not None and pai.rastro.amostrado:
+            conn.info.setdefault('i9_rastreio_spans', []).append(
+                Span(pai.rastro, 'sql', pai.span_id, {'db.system': engine.dialect.name})
+            )
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get('i9_rastreio_spans')
+        if spans:
+            atual = spans.pop()
+            atual.definir(**{'db.statement': fingerprint(statement)[:500]})
+            atual.encerrar()
+
+
+def configurar_rastreamento(app):
+    """Middleware do span raiz, spans de SQL, trace id nos logs e exportação."""
+    exportacao = (app.config.get('RASTREIO_EXPORTADOR') or '').lower()
+    if exportacao == 'desligado':
+        return None
+
+    from flask import request
+    from flask.logging import default_handler
+    from app.extensions import db
+
+    servico = app.config.get('RASTREIO_SERVICO', 'sistema-i9')
+    exportador = None
+    if exportacao == 'arquivo':
+        exportador = ExportadorArquivo(app.config.get('RASTREIO_ARQUIVO'), servico,
+                                       app.config.get('RASTREIO_ARQUIVO_MAX_MB', 50))
+    elif exportacao == 'otlp':
+        exportador = ExportadorOTLP(app.config.get('RASTREIO_OTLP_URL'), servico)
+
+    rastreador = Rastreador(
+        exportador,
+        amostragem=app.config.get('RASTREIO_AMOSTRAGEM', 1.0),
+        memoria=app.config.get('RASTREIO_MEMORIA', 200)
+    )
+    app.extensions['i9_rastreio'] = rastreador
+    app.wsgi_app = MiddlewareRastreio(app.wsgi_app, rastreador)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrumentar_sql(engine)
+
+    if not any(isinstance(f, FiltroRastreio) for f in default_handler.filters):
+        default_handler.addFilter(FiltroRastreio())
+        default_handler.setFormatter(logging.Formatter(
+            '[%(asctime)s] %(levelname)s in %(module)s [%(trace_id)s]: %(message)s'
+        ))
+
+    @app.before_request
+    def nomear_span_raiz():
+        raiz = _span_atual.get()
+        if raiz is None or not raiz.raiz:
+            return
+        # Do início da requisição até aqui: contexto, sessão e roteamento
+        if raiz.rastro.amostrado:
+            Span(raiz.rastro, 'flask.roteamento', raiz.span_id, inicio_ns=raiz.inicio_ns).encerrar()
+        if request.url_rule is not None:
+            raiz.nome = f'{request.method} {request.url_rule.rule}'
+            raiz.definir(**{'http.route': request.url_rule.rule, 'flask.endpoint': request.endpoint})
+
+    return rastreador
@@ -0,0 +1,155 @@
+"""
+Sistema I9 - Desempenho de Templates
+
+- Cache persistente de bytecode do Jinja (templates compilados uma vez por
+  deploy, não a cada processo);
+- Cache de fragmentos HTML por versão dos dados (ver VersaoDados);
+- Tempo de renderização por template.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import before_render_template, current_app, g, template_rendered
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CACHE DE FRAGMENTOS
+# ============================================================================
+
+class CacheFragmentos:
+    """LRU em memória de fragmentos HTML, por (nome, versão)."""
+
+    def __init__(self, tamanho_max=128):
+        self.tamanho_max = tamanho_max
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, nome, versao, gerar):
+        chave = (nome, versao)
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+
+        html = Markup(gerar())
+        if self.tamanho_max <= 0:
+            return html
+        with self._lock:
+            # Versões antigas do mesmo fragmento nunca mais serão usadas
+            for antiga in [c for c in self._itens if c[0] == nome]:
+                del self._itens[antiga]
+            self._itens[chave] = html
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+        return html
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def resumo(self):
+        total = self.acertos + self.falhas
+        return {
+            'fragmentos': len(self._itens),
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': round(self.acertos / total, 3) if total else None
+        }
+
+
+def fragmento(nome, versao, gerar):
+    """
+    Retorna o HTML do fragmento `nome` na `versao` dada, gerando-o com
+    `gerar()` apenas quando não estiver em cache. A versão deve mudar sempre
+    que os dados exibidos mudarem.
+    """
+    cache = current_app.extensions.get('i9_fragmentos')
+    if cache is None:
+        return Markup(gerar())
+    return cache.obter(nome, versao, gerar)
+
+
+# ============================================================================
+# TEMPO DE RENDERIZAÇÃO
+# ============================================================================
+
+class MetricasTemplates:
+    """Contagem e tempos (ms) de renderização por template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.templates = {}
+
+    def registrar(self, nome, ms):
+        with self._lock:
+            m = self.templates.setdefault(nome, {'renderizacoes': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            m['renderizacoes'] += 1
+            m['total_ms'] += ms
+            m['max_ms'] = max(m['max_ms'], ms)
+
+    def resumo(self):
+        with self._lock:
+            return {
+                nome: {
+                    'renderizacoes': m['renderizacoes'],
+                    'media_ms': round(m['total_ms'] / m['renderizacoes'], 2),
+                    'max_ms': round(m['max_ms'], 2)
+                }
+                for nome, m in sorted(self.templates.items())
+            }
+
+
+def _instrumentar(app, metricas, lento_ms):
+    def inicio(sender, template, context, **extra):
+        g.setdefault('i9_templates', []).append(time.perf_counter())
+
+    def fim(sender, template, context, **extra):
+        pilha = g.get('i9_templates')
+        if not pilha:
+            return
+        ms = (time.perf_counter() - pilha.pop()) * 1000
+        metricas.registrar(template.name, ms)
+        if lento_ms and ms >= lento_ms:
+            logger.warning('Template lento: %s (%.1f ms)', template.name, ms)
+
+    # weak=False: as funções locais precisam viver enquanto a aplicação existir
+    before_render_template.connect(inicio, app, weak=False)
+    template_rendered.connect(fim, app, weak=False)
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+def compilar_templates(app):
+    """Carrega todos os templates para gravar o bytecode em cache."""
+    nomes = app.jinja_env.list_templates()
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return len(nomes)
+
+
+def configurar_renderizacao(app):
+    """Ativa o cache de bytecode, o cache de fragmentos e as métricas."""
+    pasta = app.config.get('TEMPLATE_CACHE_DIR')
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(pasta, '__i9_jinja_%s.cache')
+
+    app.extensions['i9_fragmentos'] = CacheFragmentos(app.config.get('TEMPLATE_FRAGMENT_CACHE_SIZE', 128))
+
+    metricas = MetricasTemplates()
+    app.extensions['i9_templates'] = metricas
+    _instrumentar(app, metricas, app.config.get('TEMPLATE_LENTO_MS', 200))
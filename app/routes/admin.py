@@ -5,9 +5,12 @@ Sistema I9 - Rotas de Administração
 from functools import wraps
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from werkzeug.security import generate_password_hash
 from app.extensions import db
-from app.models import Usuario, Filial, UsuarioFilial, Auditoria
+from app.database import leitura_replica
+from app.database.busca import filtro_placa_chassi
+from app.models import Usuario, Filial, UsuarioFilial, Auditoria, VersaoDados
+from app.renderizacao import fragmento
+from app.senhas import gerar_hash
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -32,9 +35,15 @@ def admin_required(f):
 @admin_required
 def listar_usuarios():
     """Lista todos os usuários."""
-    usuarios = Usuario.query.order_by(Usuario.nome).all()
+    from sqlalchemy.orm import selectinload
+
     filiais = Filial.query.filter_by(ativa=True).order_by(Filial.nome).all()
-    return render_template('admin/usuarios.html', usuarios=usuarios, filiais=filiais)
+    # A tabela só é renderizada de novo quando usuários ou filiais mudam
+    tabela = fragmento('admin/usuarios', VersaoDados.atual('usuarios', 'filiais'), lambda: render_template(
+        'admin/_tabela_usuarios.html',
+        usuarios=Usuario.query.options(selectinload(Usuario.filiais)).order_by(Usuario.nome).all()
+    ))
+    return render_template('admin/usuarios.html', tabela_usuarios=tabela, filiais=filiais)
 
 
 @admin_bp.route('/usuarios/criar', methods=['POST'])
@@ -58,7 +67,7 @@ def criar_usuario():
     usuario = Usuario(
         nome=nome,
         email=email,
-        senha_hash=generate_password_hash(senha),
+        senha_hash=gerar_hash(senha),
         role=role,
         ativo=True
     )
@@ -71,6 +80,7 @@ def criar_usuario():
                 usuario.filiais.append(filial)
     
     db.session.add(usuario)
+    VersaoDados.incrementar('usuarios')
     db.session.commit()
     
     flash(f'Usuário {nome} criado com sucesso!', 'success')
@@ -102,6 +112,7 @@ def editar_usuario(id):
             if filial:
                 usuario.filiais.append(filial)
     
+    VersaoDados.incrementar('usuarios')
     db.session.commit()
     flash(f'Usuário {usuario.nome} atualizado!', 'success')
     return redirect(url_for('admin.listar_usuarios'))
@@ -118,6 +129,7 @@ def excluir_usuario(id):
         return redirect(url_for('admin.listar_usuarios'))
     
     usuario.ativo = False
+    VersaoDados.incrementar('usuarios')
     db.session.commit()
     flash(f'Usuário {usuario.nome} desativado.', 'info')
     return redirect(url_for('admin.listar_usuarios'))
@@ -132,8 +144,14 @@ def excluir_usuario(id):
 def listar_filiais():
     """Lista todas as filiais."""
     from datetime import date
-    filiais = Filial.query.order_by(Filial.nome).all()
-    return render_template('admin/filiais.html', filiais=filiais, now=date.today())
+    hoje = date.today()
+    # A situação do certificado depende da data: ela também compõe a versão
+    tabela = fragmento('admin/filiais', VersaoDados.atual('filiais') + (hoje,), lambda: render_template(
+        'admin/_tabela_filiais.html',
+        filiais=Filial.query.order_by(Filial.nome).all(),
+        now=hoje
+    ))
+    return render_template('admin/filiais.html', tabela_filiais=tabela)
 
 
 @admin_bp.route('/filiais/criar', methods=['POST'])
@@ -167,6 +185,7 @@ def criar_filial():
     )
     
     db.session.add(filial)
+    VersaoDados.incrementar('filiais')
     db.session.commit()
     
     flash(f'Filial {nome} criada! Configure CERT_FILIAL_{filial.id}_PASS no .env', 'success')
@@ -195,17 +214,38 @@ def editar_filial(id):
         except ValueError:
             pass
 
+    VersaoDados.incrementar('filiais')
     db.session.commit()
     flash(f'Filial {filial.nome} atualizada!', 'success')
     return redirect(url_for('admin.listar_filiais'))
 
 
+@admin_bp.route('/filiais/<int:id>/validar_certificado', methods=['POST'])
+@admin_required
+def validar_certificado(id):
+    """Enfileira a validação do certificado e do canal mTLS da filial (atualiza a validade)."""
+    from app.tarefas import enfileirar
+
+    filial = Filial.query.get_or_404(id)
+    enfileirar('validar_certificado', {'filial_id': filial.id}, usuario_id=current_user.id,
+               filial_id=filial.id, chave=f'certificado:{filial.id}')
+    flash(f'Validação do certificado de {filial.nome} na fila.', 'success')
+    return redirect(url_for('admin.listar_filiais'))
+
+
 # ==============================================================================
 # AUDITORIA
 # ==============================================================================
 
+def _carregar_usuario_filial():
+    """Usuário e filial das auditorias numa consulta cada, em vez de uma por linha (N+1)."""
+    from sqlalchemy.orm import selectinload
+    return selectinload(Auditoria.usuario), selectinload(Auditoria.filial)
+
+
 @admin_bp.route('/auditoria')
 @admin_required
+@leitura_replica
 def listar_auditoria():
     """Lista o log de auditoria."""
     from datetime import datetime, timedelta
@@ -221,7 +261,7 @@ def listar_auditoria():
 
     # Filtro de busca por placa
     if busca:
-        query = query.filter(Auditoria.placa_chassi.ilike(f'%{busca}%'))
+        query = query.filter(filtro_placa_chassi(busca))
 
     # Filtro por usuário
     if usuario_id:
@@ -243,6 +283,7 @@ def listar_auditoria():
             pass
 
     auditorias = query\
+        .options(*_carregar_usuario_filial())\
         .order_by(Auditoria.data_consulta.desc())\
         .paginate(page=page, per_page=per_page, error_out=False)
 
@@ -255,11 +296,13 @@ def listar_auditoria():
 
 @admin_bp.route('/auditoria/json')
 @admin_required
+@leitura_replica
 def auditoria_json():
     """Retorna auditoria em JSON (para relatórios)."""
     limit = request.args.get('limit', 100, type=int)
     
     auditorias = Auditoria.query\
+        .options(*_carregar_usuario_filial())\
         .order_by(Auditoria.data_consulta.desc())\
         .limit(limit)\
         .all()
@@ -275,7 +318,8 @@ def auditoria_json():
                 'placa_chassi': a.placa_chassi,
                 'tipo_busca': a.tipo_busca,
                 'status': a.status,
-                'data': a.data_consulta.isoformat()
+                'data': a.data_consulta.isoformat(),
+                'trace_id': a.trace_id
             }
             for a in auditorias
         ]
@@ -284,6 +328,7 @@ def auditoria_json():
 
 @admin_bp.route('/auditoria/excel')
 @admin_required
+@leitura_replica
 def auditoria_excel():
     """Exporta auditoria em Excel (CSV)."""
     from flask import Response
@@ -291,6 +336,7 @@ def auditoria_excel():
     from io import StringIO
 
     auditorias = Auditoria.query\
+        .options(*_carregar_usuario_filial())\
         .order_by(Auditoria.data_consulta.desc())\
         .limit(1000)\
         .all()
@@ -298,24 +344,9 @@ def auditoria_excel():
     output = StringIO()
     writer = csv.writer(output, delimiter=';')
 
-    # Header
-    writer.writerow([
-        'Data/Hora', 'Usuario', 'Filial', 'Placa/Chassi',
-        'Tipo', 'Status', 'IP', 'Resultado'
-    ])
-
-    # Dados
+    writer.writerow(Auditoria.CABECALHO_CSV)
     for a in auditorias:
-        writer.writerow([
-            a.data_consulta.strftime('%d/%m/%Y %H:%M:%S'),
-            a.usuario.nome if a.usuario else 'N/A',
-            a.filial.nome if a.filial else 'N/A',
-            a.placa_chassi,
-            a.tipo_busca,
-            a.status,
-            a.ip_origem or '',
-            a.resultado or ''
-        ])
+        writer.writerow(a.linha_csv())
 
     output.seek(0)
     return Response(
@@ -325,3 +356,253 @@ def auditoria_excel():
             'Content-Disposition': 'attachment; filename=auditoria_i9.csv'
         }
     )
+
+
+@admin_bp.route('/auditoria/exportar', methods=['POST'])
+@admin_required
+def auditoria_exportar():
+    """Enfileira a exportação em CSV de toda a auditoria filtrada (sem o limite de 1000 linhas)."""
+    from app.tarefas import enfileirar
+
+    tarefa = enfileirar('exportar_auditoria', {
+        'data_inicio': request.form.get('data_inicio', ''),
+        'data_fim': request.form.get('data_fim', ''),
+        'busca': request.form.get('busca', '').strip(),
+        'usuario_id': request.form.get('usuario_id', type=int)
+    }, usuario_id=current_user.id)
+    flash(f'Exportação #{tarefa.id} na fila; o arquivo fica disponível em Tarefas.', 'success')
+    return redirect(url_for('admin.listar_tarefas'))
+
+
+# ==============================================================================
+# TAREFAS
+# ==============================================================================
+
+@admin_bp.route('/tarefas')
+@admin_required
+def listar_tarefas():
+    """Profundidade da fila, latência por tipo e últimas tarefas."""
+    from flask import current_app
+    from app.models import Tarefa
+
+    trabalhador = current_app.extensions.get('i9_tarefas')
+    tarefas = Tarefa.query.order_by(Tarefa.id.desc()).limit(50).all()
+    return render_template('admin/tarefas.html', resumo=trabalhador.resumo() if trabalhador else None,
+                           tarefas=tarefas)
+
+
+@admin_bp.route('/tarefas/json')
+@admin_required
+def tarefas_json():
+    """Fila de tarefas (?horas=24 para a latência): prontas, agendadas, em execução, p50/p95."""
+    from app.models import Tarefa
+
+    return jsonify({'sucesso': True, 'tarefas': Tarefa.estatisticas(horas=request.args.get('horas', 24, type=float))})
+
+
+# ==============================================================================
+# DIAGNÓSTICO
+# ==============================================================================
+
+@admin_bp.route('/pool/json')
+@admin_required
+def pool_json():
+    """Retorna as métricas do pool de conexões."""
+    from flask import current_app
+
+    metricas = current_app.extensions.get('i9_pool')
+    replica = current_app.extensions.get('i9_replica')
+    return jsonify({
+        'sucesso': True,
+        'perfil': current_app.config.get('DB_POOL_PROFILE', 'padrao'),
+        'metricas': metricas.resumo() if metricas else None,
+        'replica': replica.resumo() if replica else None
+    })
+
+
+@admin_bp.route('/templates/json')
+@admin_required
+def templates_json():
+    """Retorna os tempos de renderização e o uso do cache de fragmentos."""
+    from flask import current_app
+
+    metricas = current_app.extensions.get('i9_templates')
+    fragmentos = current_app.extensions.get('i9_fragmentos')
+    return jsonify({
+        'sucesso': True,
+        'templates': metricas.resumo() if metricas else None,
+        'fragmentos': fragmentos.resumo() if fragmentos else None,
+        'bytecode_cache': bool(current_app.jinja_env.bytecode_cache)
+    })
+
+
+@admin_bp.route('/detran/json')
+@admin_required
+def detran_json():
+    """Retorna os pools mTLS por filial e as estatísticas de provedores, fontes e retentativas."""
+    from flask import current_app
+
+    conector = current_app.extensions.get('i9_detran')
+    provedores = current_app.extensions.get('i9_provedores')
+    relatorio = current_app.extensions.get('i9_relatorio')
+    retentativas = current_app.extensions.get('i9_retentativas')
+    return jsonify({
+        'sucesso': True,
+        'detran': conector.resumo() if conector else None,
+        'provedores': provedores.resumo() if provedores else None,
+        'relatorio': relatorio.resumo() if relatorio else None,
+        'retentativas': retentativas.resumo() if retentativas else None
+    })
+
+
+@admin_bp.route('/sql')
+@admin_required
+def sql_diagnostico():
+    """Página com os fingerprints de SQL por endpoint e os N+1 detectados."""
+    from flask import current_app
+
+    metricas = current_app.extensions.get('i9_sql')
+    return render_template('admin/sql.html', resumo=metricas.resumo() if metricas else None)
+
+
+@admin_bp.route('/sql/json')
+@admin_required
+def sql_json():
+    """Retorna os fingerprints de SQL por endpoint (contagem, total e máximo) e os N+1."""
+    from flask import current_app
+
+    metricas = current_app.extensions.get('i9_sql')
+    return jsonify({
+        'sucesso': True,
+        'sql': metricas.resumo(request.args.get('limite', 20, type=int)) if metricas else None
+    })
+
+
+@admin_bp.route('/sql/limpar', methods=['POST'])
+@admin_required
+def sql_limpar():
+    """Zera as métricas de SQL (para medir depois de um deploy ou correção)."""
+    from flask import current_app
+
+    metricas = current_app.extensions.get('i9_sql')
+    if metricas:
+        metricas.limpar()
+    flash('Métricas de SQL zeradas.', 'success')
+    return redirect(url_for('admin.sql_diagnostico'))
+
+
+@admin_bp.route('/traces/json')
+@admin_required
+def traces_json():
+    """Quebra do tempo por etapa de cada endpoint nos traces em memória (?endpoint=POST /api/consultar)."""
+    from flask import current_app
+
+    rastreador = current_app.extensions.get('i9_rastreio')
+    if rastreador is None:
+        return jsonify({'sucesso': False, 'erro': 'Rastreamento desligado (RASTREIO_EXPORTADOR=desligado)'})
+    return jsonify({
+        'sucesso': True,
+        'rastreador': rastreador.resumo(),
+        'endpoints': rastreador.quebra(request.args.get('endpoint'))
+    })
+
+
+@admin_bp.route('/traces/<trace_id>')
+@admin_required
+def trace_json(trace_id):
+    """Spans de um trace (por exemplo, o trace_id de uma auditoria), se ainda em memória."""
+    from flask import current_app
+
+    rastreador = current_app.extensions.get('i9_rastreio')
+    spans = rastreador.buscar(trace_id.lower()) if rastreador else None
+    if spans is None:
+        return jsonify({'sucesso': False, 'erro': 'Trace não encontrado em memória (consulte o exportador).'})
+    return jsonify({'sucesso': True, 'trace_id': trace_id.lower(), 'spans': spans})
+
+
+@admin_bp.route('/perfil/json')
+@admin_required
+def perfil_json():
+    """Retorna o estado do perfilador e as últimas requisições capturadas."""
+    from flask import current_app
+
+    perfilador = current_app.extensions.get('i9_perfilador')
+    if perfilador is None:
+        return jsonify({'sucesso': False, 'erro': 'Perfilamento desligado (PERFIL_CAPTURA=0)'})
+    return jsonify({
+        'sucesso': True,
+        'perfilador': perfilador.resumo(),
+        'capturas': perfilador.listar(request.args.get('limite', 100, type=int))
+    })
+
+
+@admin_bp.route('/perfil', methods=['POST'])
+@admin_required
+def perfil_configurar():
+    """Liga/desliga o amostrador de pilhas e ajusta o limiar de captura (até reiniciar)."""
+    from flask import current_app
+
+    perfilador = current_app.extensions.get('i9_perfilador')
+    if perfilador is None:
+        return jsonify({'sucesso': False, 'erro': 'Perfilamento desligado (PERFIL_CAPTURA=0)'})
+
+    if 'amostragem' in request.form:
+        perfilador.ligar_amostragem(request.form['amostragem'] in ('1', 'true', 'on'))
+    if 'limiar_ms' in request.form:
+        limiar = request.form.get('limiar_ms', type=float)
+        if limiar is None or limiar < 0:
+            return jsonify({'sucesso': False, 'erro': 'limiar_ms inválido'})
+        perfilador.limiar_ms = limiar
+    return jsonify({'sucesso': True, 'perfilador': perfilador.resumo()})
+
+
+@admin_bp.route('/perfil/<captura_id>.<extensao>')
+@admin_required
+def perfil_arquivo(captura_id, extensao):
+    """Baixa uma captura: .json (detalhes), .folded (flamegraph) ou .pstats (cProfile)."""
+    from flask import current_app, send_from_directory
+    from app.perfilamento import EXTENSOES, FORMATO_ID
+
+    perfilador = current_app.extensions.get('i9_perfilador')
+    if perfilador is None or not FORMATO_ID.match(captura_id) or extensao not in EXTENSOES:
+        return jsonify({'sucesso': False, 'erro': 'Captura não encontrada'})
+    return send_from_directory(perfilador.pasta, f'{captura_id}.{extensao}', as_attachment=extensao != 'json')
+
+
+@admin_bp.route('/monitoramento/json')
+@admin_required
+def monitoramento_json():
+    """Estado do monitoramento de frota (ciclos, verificações, alertas e placas vencidas)."""
+    from flask import current_app
+
+    monitor = current_app.extensions.get('i9_monitor')
+    return jsonify({'sucesso': True, 'monitoramento': monitor.resumo() if monitor else None})
+
+
+@admin_bp.route('/coordenacao/json')
+@admin_required
+def coordenacao_json():
+    """Backend de coordenação entre instâncias, locks obtidos/recusados e avisos."""
+    from flask import current_app
+
+    coordenacao = current_app.extensions.get('i9_coordenacao')
+    return jsonify({'sucesso': True, 'coordenacao': coordenacao.resumo() if coordenacao else None})
+
+
+@admin_bp.route('/preaquecimento/json')
+@admin_required
+def preaquecimento_json():
+    """Eficácia do pré-aquecimento (?dias=7): renovações aproveitadas e taxa de acerto do cache."""
+    from flask import current_app
+
+    preaquecedor = current_app.extensions.get('i9_preaquecimento')
+    if preaquecedor is None:
+        return jsonify({'sucesso': False, 'erro': 'Pré-aquecimento não configurado'})
+    resposta = {
+        'sucesso': True,
+        'preaquecimento': preaquecedor.resumo(),
+        'relatorio': preaquecedor.relatorio(dias=min(max(request.args.get('dias', 7, type=int), 1), 90))
+    }
+    if request.args.get('candidatos') == '1':
+        resposta['candidatos'] = preaquecedor.candidatos(max(preaquecedor.orcamento, 20))
+    return jsonify(resposta)
@@ -32,7 +32,8 @@ def login():
                 return render_template('login.html')
             
             login_user(usuario, remember=lembrar)
-            usuario.registrar_login()
+            usuario.registrar_login(ip_origem=request.remote_addr,
+                                    user_agent=request.user_agent.string)
             
             flash(f'Bem-vindo(a), {usuario.nome}!', 'success')
             
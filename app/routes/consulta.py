@@ -4,10 +4,13 @@ Sistema I9 - Rotas de Consulta Veicular (API)
 
 import re
 from datetime import datetime
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, current_app, request, jsonify, session
 from flask_login import login_required, current_user
 from app.extensions import db
-from app.models import Filial, Auditoria
+from app.database import leitura_replica
+from app.database.busca import filtro_placa_chassi
+from app.models import Filial, Auditoria, SnapshotVeiculo, ChaveIdempotencia
+from app.rastreamento import span
 
 consulta_bp = Blueprint('consulta', __name__)
 
@@ -33,8 +36,8 @@ def conectar_filial():
     if not filial or not filial.ativa:
         return jsonify({'sucesso': False, 'erro': 'Filial não encontrada ou inativa.'})
     
-    # Simula conexão com DETRAN
-    resultado = filial.simular_conexao_detran()
+    # Valida certificado e canal mTLS com o DETRAN da UF
+    resultado = current_app.extensions['i9_detran'].conectar(filial)
     
     if resultado['sucesso']:
         # Armazena na sessão
@@ -45,7 +48,8 @@ def conectar_filial():
             'sucesso': True,
             'mensagem': resultado['mensagem'],
             'filial': filial.nome,
-            'uf': filial.uf
+            'uf': filial.uf,
+            'handshake_ms': resultado.get('handshake_ms')
         })
     else:
         return jsonify({'sucesso': False, 'erro': resultado.get('erro', 'Erro na conexão')})
@@ -67,97 +71,243 @@ def desconectar_filial():
 @consulta_bp.route('/consultar', methods=['POST'])
 @login_required
 def consultar():
-    """Processa a consulta de veículo."""
-    # Verifica conexão com filial
-    filial_id = session.get('filial_conectada_id')
-    if not filial_id:
-        return jsonify({
-            'sucesso': False,
-            'erro': 'É necessário conectar a uma filial antes de consultar.'
-        })
-    
-    # Verifica permissão
-    if not current_user.pode_acessar_filial(filial_id):
-        session.pop('filial_conectada_id', None)
-        return jsonify({
-            'sucesso': False,
-            'erro': 'Você não tem mais permissão para esta filial.'
-        })
-    
-    placa = request.form.get('placa_chassi', '').strip()
-    uf = request.form.get('uf', 'SP').strip()
-    renavam = request.form.get('renavam', '').strip()
-    chassi = request.form.get('chassi', '').strip()
-    tipo_busca = request.form.get('tipo_busca', 'placa')
+    """
+    Processa a consulta de veículo.
+
+    Com o header Idempotency-Key (ou o campo chave_idempotencia), uma
+    repetição da mesma consulta devolve a resposta já gravada, ou aguarda a
+    original em andamento, sem nova chamada cobrada aos provedores.
+    Com CACHE_CONSULTA_HORAS, um snapshot recente do veículo é devolvido na
+    hora (com `cache`), exceto com forcar=1.
+    """
+    dados, erro = _ler_consulta()
+    if erro:
+        return jsonify({'sucesso': False, 'erro': erro})
     
-    if not placa:
-        return jsonify({
-            'sucesso': False,
-            'erro': 'Por favor, informe a placa do veículo.'
-        })
+    corpo = _resposta_em_cache(dados)
+    if corpo is not None:
+        return jsonify(corpo)
     
-    # Validação
-    if not validar_placa(placa):
-        return jsonify({
-            'sucesso': False,
-            'erro': 'Formato de placa inválido. Use: ABC-1234 ou ABC1D23 (Mercosul).'
-        })
+    chave, corpo = _reservar_chave(dados)
+    if corpo is not None:
+        resp = jsonify(corpo)
+        if corpo['sucesso']:
+            resp.headers['Idempotent-Replayed'] = 'true'
+        return resp
     
     # Realiza consulta
     try:
-        resultado = consultar_veiculo_api(placa, uf, renavam, chassi)
-        
-        # Registra auditoria
-        Auditoria.registrar(
-            usuario_id=current_user.id,
-            filial_id=filial_id,
-            placa_chassi=placa,
-            tipo_busca=tipo_busca,
-            resultado=_resumo_resultado(resultado),
-            status='sucesso' if resultado.get('encontrado') else 'nao_encontrado',
-            ip_origem=request.remote_addr
-        )
-        
-        return jsonify({
+        resultado = consultar_veiculo_api(dados['placa'], dados['uf'], dados['renavam'], dados['chassi'])
+        mudancas = _registrar_consulta(dados, resultado)
+        corpo = {
             'sucesso': True,
-            'dados': resultado
-        })
+            'dados': resultado,
+            'mudancas': mudancas
+        }
+        _concluir_chave(chave, corpo)
+        return jsonify(corpo)
         
     except Exception as e:
-        # Registra erro na auditoria
-        Auditoria.registrar(
-            usuario_id=current_user.id,
-            filial_id=filial_id,
-            placa_chassi=placa,
-            tipo_busca=tipo_busca,
-            resultado=str(e),
-            status='erro',
-            ip_origem=request.remote_addr
-        )
-        
+        _registrar_erro(dados, e)
+        _liberar_chave(chave)
         return jsonify({
             'sucesso': False,
             'erro': f'Erro ao consultar veículo: {str(e)}'
         })
 
 
+@consulta_bp.route('/consultar/stream', methods=['POST'])
+@login_required
+def consultar_stream():
+    """
+    Mesma consulta de /consultar, em NDJSON: uma linha por seção assim que a
+    fonte responde ({"secao", "dados"} ou {"secao", "erro"}) e uma linha final
+    {"fim": true, "sucesso", "mudancas"|"erro"}. Em "restricoes", `dados` traz
+    também dados_veiculo; nas demais, é o conteúdo da própria seção.
+    Aceita Idempotency-Key e o cache de snapshots como /consultar (a
+    repetição e o snapshot são enviados inteiros, com `cache` na linha final).
+    """
+    from flask import Response, stream_with_context
+    from app.conectores.relatorio import Relatorio
+    from app.serializacao import dumps
+
+    dados, erro = _ler_consulta()
+    if erro:
+        return jsonify({'sucesso': False, 'erro': erro})
+    
+    def linha(evento):
+        return dumps(evento) + b'\n'
+
+    corpo = _resposta_em_cache(dados)
+    if corpo is not None:
+        return Response(b''.join(linha(evento) for evento in _eventos_repetidos(corpo)),
+                        mimetype='application/x-ndjson')
+
+    chave, corpo = _reservar_chave(dados)
+    if corpo is not None:
+        if not corpo['sucesso']:
+            return jsonify(corpo)
+        eventos = b''.join(linha(evento) for evento in _eventos_repetidos(corpo))
+        return Response(eventos, mimetype='application/x-ndjson', headers={'Idempotent-Replayed': 'true'})
+
+    consulta = _montar_consulta(dados['placa'], dados['uf'], dados['renavam'], dados['chassi'])
+    motor = current_app.extensions['i9_relatorio']
+
+    def gerar():
+        relatorio = Relatorio()
+        registrada = False
+        try:
+            for secao, parcial, erro_fonte in motor.executar(consulta):
+                relatorio.aplicar(secao, parcial, erro_fonte)
+                yield linha({'secao': secao, 'erro': erro_fonte} if erro_fonte else {'secao': secao, 'dados': parcial})
+            mudancas = _registrar_consulta(dados, relatorio.resultado)
+            _concluir_chave(chave, {'sucesso': True, 'dados': relatorio.resultado, 'mudancas': mudancas})
+            registrada = True
+            yield linha({'fim': True, 'sucesso': True, 'mudancas': mudancas})
+        except Exception as e:
+            registrada = True
+            _registrar_erro(dados, e)
+            _liberar_chave(chave)
+            yield linha({'fim': True, 'sucesso': False, 'erro': f'Erro ao consultar veículo: {str(e)}'})
+        finally:
+            if not registrada:
+                # Cliente desconectou no meio (GeneratorExit num yield): audita e
+                # libera a chave para a repetição não esperar a reserva vencer
+                _registrar_erro(dados, 'Conexão encerrada pelo cliente antes do fim do relatório')
+                _liberar_chave(chave)
+
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+@consulta_bp.route('/desde_ultima_consulta')
+@login_required
+def desde_ultima_consulta():
+    """
+    Retorna o último snapshot do veículo na filial conectada e o que mudou,
+    sem nova consulta externa.
+    """
+    from flask import current_app
+
+    filial_id = session.get('filial_conectada_id')
+    if not filial_id or not current_user.pode_acessar_filial(filial_id):
+        return jsonify({
+            'sucesso': False,
+            'erro': 'É necessário conectar a uma filial antes de consultar.'
+        })
+    
+    placa = request.args.get('placa_chassi', '').strip()
+    if not placa:
+        return jsonify({'sucesso': False, 'erro': 'Por favor, informe a placa do veículo.'})
+    
+    versoes = SnapshotVeiculo.versoes(placa, filial_id, limite=2)
+    if not versoes:
+        return jsonify({'sucesso': True, 'encontrado': False})
+    
+    atual = versoes[0]
+    dados = atual.get_dados()
+    idade = atual.idade_horas()
+    
+    Auditoria.registrar(
+        usuario_id=current_user.id,
+        filial_id=filial_id,
+        placa_chassi=placa,
+        tipo_busca=atual.tipo_chave,
+        resultado=f'Snapshot de {atual.verificado_em.strftime("%d/%m/%Y %H:%M")}',
+        status='cache',
+        ip_origem=request.remote_addr
+    )
+    
+    return jsonify({
+        'sucesso': True,
+        'encontrado': True,
+        'fresco': idade <= current_app.config.get('SNAPSHOT_MAX_IDADE_HORAS', 24),
+        'verificado_em': atual.verificado_em.strftime('%d/%m/%Y %H:%M'),
+        'alterado_em': atual.criado_em.strftime('%d/%m/%Y %H:%M'),
+        'idade_horas': round(idade, 1),
+        'dados': dados,
+        'mudancas': SnapshotVeiculo.diff(versoes[1].get_dados(), dados) if len(versoes) > 1 else None
+    })
+
+
 @consulta_bp.route('/historico')
 @login_required
+@leitura_replica
 def historico():
-    """Retorna o histórico de consultas do usuário."""
-    busca = request.args.get('busca', '').strip()
+    """
+    Retorna o histórico de consultas do usuário.
+
+    Filtros (todos opcionais): data_inicio, data_fim (YYYY-MM-DD), status,
+    filial_id, placa, chassi, renavam e busca (trecho de placa/chassi).
+    Paginação por cursor: envie `cursor` com o `proximo_cursor` da página anterior.
+    """
+    from datetime import timedelta
+    from flask import make_response
+    from sqlalchemy import and_, func, or_
+    from sqlalchemy.orm import selectinload
+
+    args = request.args
+    limite = min(max(args.get('limite', 50, type=int), 1), 200)
+    filtros = {
+        chave: args.get(chave, '').strip()
+        for chave in ('busca', 'placa', 'chassi', 'renavam', 'status', 'filial_id',
+                      'data_inicio', 'data_fim', 'cursor')
+    }
+
+    # Auditorias nunca são alteradas: o maior ID do usuário identifica a versão
+    ultimo_id = db.session.query(func.max(Auditoria.id))\
+        .filter(Auditoria.usuario_id == current_user.id)\
+        .scalar()
+    etag = _etag_historico(current_user.id, ultimo_id, limite, filtros)
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response('', 304)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'private, no-cache'
+        return resp
+
+    query = Auditoria.query.filter(Auditoria.usuario_id == current_user.id)
 
-    query = Auditoria.query.filter_by(usuario_id=current_user.id)
+    for chave in ('busca', 'placa'):
+        if filtros[chave]:
+            query = query.filter(filtro_placa_chassi(filtros[chave]))
+    if filtros['chassi']:
+        query = query.filter(Auditoria.chassi == filtros['chassi'].upper())
+    if filtros['renavam']:
+        query = query.filter(Auditoria.renavam == filtros['renavam'])
+    if filtros['status']:
+        query = query.filter(Auditoria.status == filtros['status'])
+    if filtros['filial_id'].isdigit():
+        query = query.filter(Auditoria.filial_id == int(filtros['filial_id']))
 
-    if busca:
-        query = query.filter(Auditoria.placa_chassi.ilike(f'%{busca}%'))
+    try:
+        if filtros['data_inicio']:
+            query = query.filter(Auditoria.data_consulta >= datetime.strptime(filtros['data_inicio'], '%Y-%m-%d'))
+        if filtros['data_fim']:
+            fim = datetime.strptime(filtros['data_fim'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(Auditoria.data_consulta < fim)
+    except ValueError:
+        return jsonify({'sucesso': False, 'erro': 'Data inválida. Use o formato AAAA-MM-DD.'})
+
+    cursor = _decodificar_cursor(filtros['cursor'])
+    if cursor:
+        data_cursor, id_cursor = cursor
+        query = query.filter(or_(
+            Auditoria.data_consulta < data_cursor,
+            and_(Auditoria.data_consulta == data_cursor, Auditoria.id < id_cursor)
+        ))
 
     auditorias = query\
-        .order_by(Auditoria.data_consulta.desc())\
-        .limit(100)\
+        .options(selectinload(Auditoria.filial))\
+        .order_by(Auditoria.data_consulta.desc(), Auditoria.id.desc())\
+        .limit(limite + 1)\
         .all()
 
-    return jsonify({
+    proximo_cursor = None
+    if len(auditorias) > limite:
+        auditorias = auditorias[:limite]
+        proximo_cursor = _codificar_cursor(auditorias[-1])
+
+    resp = jsonify({
         'sucesso': True,
         'consultas': [
             {
@@ -170,14 +320,45 @@ def historico():
                 'filial': a.filial.nome if a.filial else 'N/A'
             }
             for a in auditorias
-        ]
+        ],
+        'proximo_cursor': proximo_cursor
     })
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
 
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES
 # ==============================================================================
 
+def _codificar_cursor(auditoria):
+    """Cursor opaco com a posição (data, id) do último item da página."""
+    import base64
+    valor = f'{auditoria.data_consulta.isoformat()}|{auditoria.id}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    """Retorna (data, id) do cursor ou None se ausente/inválido."""
+    import base64
+    if not cursor:
+        return None
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, id_ = valor.split('|')
+        return datetime.fromisoformat(data), int(id_)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _etag_historico(usuario_id, ultimo_id, limite, filtros):
+    """ETag forte do histórico: muda quando o usuário registra nova consulta."""
+    import hashlib
+    chave = f'{usuario_id}:{ultimo_id}:{limite}:' + '&'.join(f'{k}={v}' for k, v in sorted(filtros.items()))
+    return hashlib.sha1(chave.encode()).hexdigest()
+
+
 def validar_placa(placa):
     """Valida o formato da placa brasileira."""
     placa_limpa = re.sub(r'[^A-Z0-9]', '', placa.upper())
@@ -194,126 +375,241 @@ def validar_chassi(chassi):
     return bool(re.match(r'^[A-HJ-NPR-Z0-9]{17}$', chassi_limpo))
 
 
+def validar_renavam(renavam):
+    """Valida o formato do renavam (9 a 11 dígitos)."""
+    return bool(re.match(r'^[0-9]{9,11}$', renavam.strip()))
+
+
+def _identificador(valor):
+    """Chassi/renavam retornado pela API, ignorando placeholders."""
+    if not valor or valor == 'N/A' or set(str(valor)) <= {'0', 'X'}:
+        return None
+    return str(valor)
+
+
 def _resumo_resultado(resultado):
-    """Cria um resumo do resultado para auditoria."""
-    if not resultado.get('encontrado'):
+    """Cria um resumo do resultado (RelatorioVeiculo) para auditoria."""
+    if not resultado.encontrado or resultado.dados_veiculo is None:
         return 'Veículo não encontrado'
     
-    dados = resultado.get('dados_veiculo', {})
-    return f"{dados.get('modelo', 'N/A')} | {dados.get('cor', 'N/A')} | {dados.get('ano_modelo', 'N/A')}"
+    dados = resultado.dados_veiculo
+    return f"{dados.modelo} | {dados.cor} | {dados.ano_modelo}"
 
 
-def consultar_veiculo_api(placa, uf, renavam=None, chassi=None):
-    """Consulta restrições via API Infosimples."""
-    import requests
-    import base64
-    import os
-    from flask import current_app, session
-    from app.models import Filial
+def _ler_consulta():
+    """Valida filial conectada e placa do formulário. Retorna (dados, erro)."""
+    # Verifica conexão com filial
+    filial_id = session.get('filial_conectada_id')
+    if not filial_id:
+        return None, 'É necessário conectar a uma filial antes de consultar.'
+    
+    # Verifica permissão
+    with span('permissao.filial', filial_id=filial_id):
+        permitido = current_user.pode_acessar_filial(filial_id)
+    if not permitido:
+        session.pop('filial_conectada_id', None)
+        return None, 'Você não tem mais permissão para esta filial.'
+    
+    dados = {
+        'filial_id': filial_id,
+        'placa': request.form.get('placa_chassi', '').strip(),
+        'uf': request.form.get('uf', 'SP').strip(),
+        'renavam': request.form.get('renavam', '').strip(),
+        'chassi': request.form.get('chassi', '').strip().upper(),
+        'tipo_busca': request.form.get('tipo_busca', 'placa')
+    }
     
-    api_key = current_app.config.get('INFOSIMPLES_API_KEY')
-    if not api_key:
-        raise Exception('API Key Infosimples não configurada')
+    if not dados['placa']:
+        return None, 'Por favor, informe a placa do veículo.'
     
-    # Normaliza placa
-    placa_normalizada = re.sub(r'[^A-Z0-9]', '', placa.upper())
+    # Validação
+    if not validar_placa(dados['placa']):
+        return None, 'Formato de placa inválido. Use: ABC-1234 ou ABC1D23 (Mercosul).'
+    if dados['chassi'] and not validar_chassi(dados['chassi']):
+        return None, 'Formato de chassi inválido. Informe os 17 caracteres (sem I, O ou Q).'
+    if dados['renavam'] and not validar_renavam(dados['renavam']):
+        return None, 'Formato de renavam inválido. Informe de 9 a 11 dígitos.'
     
-    # Endpoint correto
-    url = 'https://api.infosimples.com/api/v2/consultas/detran/restricoes'
+    return dados, None
+
+
+def _registrar_consulta(dados, resultado):
+    """Grava snapshot e auditoria de uma consulta concluída. Retorna as mudanças."""
+    from app.conectores.normalizacao import para_dict
+
+    # Guarda a versão do resultado e compara com a consulta anterior. Relatórios
+    # com seções faltando não viram snapshot (gerariam mudanças falsas).
+    mudancas = None
+    if resultado.encontrado and resultado.completo:
+        with span('snapshot.registrar'):
+            _, mudancas = SnapshotVeiculo.registrar(dados['placa'], dados['filial_id'], para_dict(resultado),
+                                                    dados['tipo_busca'], commit=False)
     
-    # Parâmetros obrigatórios
-    data = {
-        'token': api_key,
-        'uf': uf.upper(),
-        'placa': placa_normalizada,
-        'renavam': renavam or '00000000000',
-        'chassi': chassi or 'XXXXXXXXXXXXXXXXX',
-        'timeout': 300
+    # Registra auditoria (grava também o snapshot)
+    dados_veiculo = resultado.dados_veiculo
+    Auditoria.registrar(
+        usuario_id=current_user.id,
+        filial_id=dados['filial_id'],
+        placa_chassi=dados['placa'],
+        tipo_busca=dados['tipo_busca'],
+        resultado=_resumo_resultado(resultado),
+        status='sucesso' if resultado.encontrado else 'nao_encontrado',
+        ip_origem=request.remote_addr,
+        chassi=dados['chassi'] or _identificador(dados_veiculo and dados_veiculo.chassi),
+        renavam=dados['renavam'] or _identificador(dados_veiculo and dados_veiculo.renavam)
+    )
+    return mudancas
+
+
+def _registrar_erro(dados, erro):
+    """Desfaz a transação e registra a falha na auditoria."""
+    db.session.rollback()
+    Auditoria.registrar(
+        usuario_id=current_user.id,
+        filial_id=dados['filial_id'],
+        placa_chassi=dados['placa'],
+        tipo_busca=dados['tipo_busca'],
+        resultado=str(erro),
+        status='erro',
+        ip_origem=request.remote_addr,
+        chassi=dados['chassi'],
+        renavam=dados['renavam']
+    )
+
+
+def _resposta_em_cache(dados):
+    """
+    Resposta a partir do snapshot do veículo na filial verificado há menos
+    de CACHE_CONSULTA_HORAS (renovado pelo pré-aquecimento ou por outra
+    consulta da filial), sem chamada externa. None se desligado, vencido ou forcar=1.
+    """
+    horas = current_app.config.get('CACHE_CONSULTA_HORAS', 0)
+    if not horas or dados['tipo_busca'] != 'placa' or request.form.get('forcar') == '1':
+        return None
+    
+    snapshot = SnapshotVeiculo.ultimo(dados['placa'], dados['filial_id'])
+    if snapshot is None or snapshot.idade_horas() > horas:
+        return None
+    
+    verificado_em = snapshot.verificado_em.strftime('%d/%m/%Y %H:%M')
+    Auditoria.registrar(
+        usuario_id=current_user.id,
+        filial_id=dados['filial_id'],
+        placa_chassi=dados['placa'],
+        tipo_busca=dados['tipo_busca'],
+        resultado=f'Snapshot de {verificado_em}',
+        status='cache',
+        ip_origem=request.remote_addr,
+        chassi=dados['chassi'] or None,
+        renavam=dados['renavam'] or None
+    )
+    return {
+        'sucesso': True,
+        'dados': snapshot.get_dados(),
+        'mudancas': None,
+        'cache': {'verificado_em': verificado_em, 'idade_horas': round(snapshot.idade_horas(), 1)}
     }
+
+
+def _reservar_chave(dados):
+    """
+    Reserva a chave de idempotência da requisição. Retorna (id da reserva,
+    corpo): sem chave, (None, None); chave nova, (id, None) e a consulta
+    segue; repetição, (None, resposta gravada) ou (None, erro) se a chave foi
+    usada com outra consulta ou a original não terminou a tempo.
+    """
+    import time
+
+    chave = (request.headers.get('Idempotency-Key') or request.form.get('chave_idempotencia', '')).strip()
+    if not chave:
+        return None, None
+    if not ChaveIdempotencia.chave_valida(chave):
+        return None, {'sucesso': False, 'erro': 'Chave de idempotência inválida (8 a 64 caracteres).'}
     
-    # Para SP, precisa de certificado digital
-    if uf.upper() == 'SP':
-        filial_id = session.get('filial_conectada_id')
-        if filial_id:
-            filial = Filial.query.get(filial_id)
-            if filial and filial.cert_path:
-                cert_path = filial.cert_path
-                cert_pass = filial.get_cert_senha()
-                
-                # Lê e codifica certificado em base64
-                if os.path.exists(cert_path):
-                    with open(cert_path, 'rb') as f:
-                        cert_data = base64.b64encode(f.read()).decode('utf-8')
-                    data['pkcs12_cert'] = cert_data
-                    data['pkcs12_pass'] = cert_pass
+    impressao = ChaveIdempotencia.calcular_impressao(
+        dados['filial_id'], dados['placa'].upper(), dados['uf'].upper(),
+        dados['renavam'], dados['chassi'].upper(), dados['tipo_busca']
+    )
+    limite = time.monotonic() + current_app.config.get('IDEMPOTENCIA_ESPERA_S', 30)
+    while True:
+        with span('idempotencia.reservar'):
+            registro, nova = ChaveIdempotencia.reservar(current_user.id, chave, impressao)
+        if nova:
+            return registro.id, None
+        if registro.impressao != impressao:
+            return None, {'sucesso': False, 'erro': 'Chave de idempotência já usada em outra consulta.'}
+        if registro.status == ChaveIdempotencia.CONCLUIDA:
+            Auditoria.registrar(
+                usuario_id=current_user.id,
+                filial_id=dados['filial_id'],
+                placa_chassi=dados['placa'],
+                tipo_busca=dados['tipo_busca'],
+                resultado='Repetição da consulta (chave de idempotência)',
+                status='cache',
+                ip_origem=request.remote_addr
+            )
+            return None, current_app.json.loads(registro.resposta)
+        # A consulta original ainda está em andamento: aguarda o resultado dela
+        if time.monotonic() >= limite:
+            return None, {'sucesso': False, 'erro': 'Consulta com esta chave ainda em andamento. Tente novamente.'}
+        db.session.rollback()
+        time.sleep(0.25)
+
+
+def _concluir_chave(chave_id, corpo):
+    """Grava a resposta da consulta para as repetições com a mesma chave."""
+    from app.serializacao import dumps
+
+    if chave_id is not None:
+        ChaveIdempotencia.concluir(chave_id, dumps(corpo).decode('utf-8'),
+                                   current_app.config.get('IDEMPOTENCIA_TTL_S', 600))
+
+
+def _liberar_chave(chave_id):
+    """Libera a chave de uma consulta que falhou: a repetição consulta de novo."""
+    if chave_id is not None:
+        ChaveIdempotencia.liberar(chave_id)
+
+
+def _eventos_repetidos(corpo):
+    """Eventos NDJSON de /consultar/stream reconstruídos de uma resposta gravada."""
+    from app.conectores.normalizacao import RelatorioVeiculo
+
+    relatorio = corpo['dados']
+    yield {'secao': 'restricoes', 'dados': {
+        campo: relatorio.get(campo)
+        for campo in ('dados_veiculo', 'restricoes', 'site_receipt', 'provedor', 'encontrado')
+    }}
+    for secao in RelatorioVeiculo.SECOES:
+        if secao == 'restricoes':
+            continue
+        parcial = relatorio.get(secao) or {}
+        yield {'secao': secao, 'erro': parcial['erro']} if parcial.get('erro') else {'secao': secao, 'dados': parcial}
+    fim = {'fim': True, 'sucesso': True, 'mudancas': corpo.get('mudancas')}
+    if corpo.get('cache'):
+        fim['cache'] = corpo['cache']
+    yield fim
+
+
+def _montar_consulta(placa, uf, renavam=None, chassi=None):
+    """Consulta com os dados da filial conectada (usáveis fora da requisição)."""
+    from app.conectores.provedores import Consulta, DadosFilial
     
-    try:
-        response = requests.post(url, data=data, timeout=120)
-        resp_data = response.json()
-        
-        # Debug: mostra resposta
-        print(f"API Response: {resp_data}")
-        
-        # Verifica sucesso da API
-        code = resp_data.get('code', 0)
-        if code != 200:
-            error_msg = resp_data.get('code_message', 'Erro na consulta')
-            raise Exception(f'API: {error_msg}')
-        
-        # Extrai dados da resposta
-        veiculo = resp_data.get('data', [{}])[0] if resp_data.get('data') else {}
-        
-        # Formata resposta
-        restricoes_lista = veiculo.get('restricoes', [])
-        if isinstance(restricoes_lista, str):
-            restricoes_lista = [restricoes_lista]
-        
-        resultado = {
-            'encontrado': True,
-            'dados_veiculo': {
-                'placa': veiculo.get('placa', placa_normalizada),
-                'chassi': veiculo.get('chassi', veiculo.get('normalizado_chassi', 'N/A')),
-                'renavam': veiculo.get('renavam', veiculo.get('normalizado_renavam', 'N/A')),
-                'modelo': 'Consulta de Restrições',
-                'ano_fabricacao': 'N/A',
-                'ano_modelo': 'N/A',
-                'cor': 'N/A',
-                'combustivel': 'N/A',
-                'categoria': 'N/A',
-                'uf': uf.upper()
-            },
-            'multas': {
-                'possui_multas': False,
-                'quantidade': 0,
-                'valor_total': 0,
-                'detalhes': []
-            },
-            'ipva': {
-                'situacao': 'N/A',
-                'ano_referencia': 2024,
-                'valor': 0,
-                'vencimento': 'N/A'
-            },
-            'restricoes': {
-                'possui_restricoes': veiculo.get('existe_restricao', bool(restricoes_lista)),
-                'detalhes': [{'tipo': r} for r in restricoes_lista] if restricoes_lista else []
-            },
-            'leilao': {
-                'possui_historico_leilao': False,
-                'detalhes': None
-            },
-            'proprietarios': {
-                'quantidade': 0,
-                'historico': []
-            },
-            'site_receipt': veiculo.get('site_receipt', '')
-        }
-        
-        return resultado
-        
-    except requests.exceptions.Timeout:
-        raise Exception('Timeout na consulta. Tente novamente.')
-    except requests.exceptions.RequestException as e:
-        raise Exception(f'Erro de conexão: {str(e)}')
+    filial_id = session.get('filial_conectada_id')
+    with span('filial.buscar', filial_id=filial_id):
+        filial = Filial.query.get(filial_id) if filial_id else None
+        dados_filial = DadosFilial.de_filial(filial) if filial else None
+    
+    return Consulta(
+        placa=placa,
+        uf=uf,
+        renavam=renavam or '',
+        chassi=chassi or '',
+        filial=dados_filial
+    )
 
 
+def consultar_veiculo_api(placa, uf, renavam=None, chassi=None):
+    """Relatório completo (RelatorioVeiculo): restrições e demais seções em paralelo."""
+    consulta = _montar_consulta(placa, uf, renavam, chassi)
+    return current_app.extensions['i9_relatorio'].montar(consulta)
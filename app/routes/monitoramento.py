@@ -0,0 +1,154 @@
+"""
+Sistema I9 - Rotas do Monitoramento de Frota (API)
+"""
+
+import re
+from datetime import datetime
+from flask import Blueprint, current_app, request, jsonify, session
+from flask_login import login_required, current_user
+from app.models import VeiculoMonitorado, AlertaVeiculo
+from app.routes.consulta import validar_placa
+
+monitoramento_bp = Blueprint('monitoramento', __name__)
+
+
+# ==============================================================================
+# PLACAS MONITORADAS
+# ==============================================================================
+
+@monitoramento_bp.route('')
+@login_required
+def listar():
+    """Placas monitoradas da filial conectada."""
+    filial_id, erro = _filial_conectada()
+    if erro:
+        return jsonify({'sucesso': False, 'erro': erro})
+
+    return jsonify({
+        'sucesso': True,
+        'veiculos': [m.to_dict() for m in VeiculoMonitorado.da_filial(filial_id)]
+    })
+
+
+@monitoramento_bp.route('/incluir', methods=['POST'])
+@login_required
+def incluir():
+    """
+    Inclui placas no monitoramento da filial conectada. `placas` aceita
+    várias, separadas por espaço, vírgula ou linha; a primeira verificação
+    entra na agenda do monitoramento (janela fora do expediente).
+    """
+    from app.extensions import db
+
+    filial_id, erro = _filial_conectada()
+    if erro:
+        return jsonify({'sucesso': False, 'erro': erro})
+
+    placas = [p for p in re.split(r'[\s,;]+', request.form.get('placas', '').upper()) if p]
+    if not placas:
+        return jsonify({'sucesso': False, 'erro': 'Informe ao menos uma placa.'})
+    invalidas = [p for p in placas if not validar_placa(p)]
+    if invalidas:
+        return jsonify({'sucesso': False, 'erro': 'Placa(s) inválida(s): ' + ', '.join(invalidas[:10])})
+
+    maximo = current_app.config.get('MONITOR_MAX_POR_FILIAL', 500)
+    atuais = db.session.query(VeiculoMonitorado.id).filter_by(filial_id=filial_id, ativo=True).count()
+    if atuais + len(placas) > maximo:
+        return jsonify({'sucesso': False, 'erro': f'Limite de {maximo} placas monitoradas por filial.'})
+
+    monitor = current_app.extensions['i9_monitor']
+    uf = request.form.get('uf', 'SP').strip().upper()
+    intervalo = request.form.get('intervalo_horas', type=float) or monitor.intervalo_horas
+    intervalo = min(max(intervalo, 1), 24 * 30)
+    agora = datetime.utcnow()
+    incluidas = 0
+    for placa in dict.fromkeys(placas):
+        _, novo = VeiculoMonitorado.incluir(
+            filial_id, current_user.id, placa, uf,
+            proxima_verificacao=monitor.agendar(agora, VeiculoMonitorado.normalizar_placa(placa), 0),
+            intervalo_horas=intervalo
+        )
+        incluidas += novo
+
+    return jsonify({
+        'sucesso': True,
+        'mensagem': f'{incluidas} placa(s) incluída(s) no monitoramento.',
+        'veiculos': [m.to_dict() for m in VeiculoMonitorado.da_filial(filial_id)]
+    })
+
+
+@monitoramento_bp.route('/<int:monitorado_id>/remover', methods=['POST'])
+@login_required
+def remover(monitorado_id):
+    """Retira a placa do monitoramento (os alertas já gerados são mantidos)."""
+    from app.extensions import db
+
+    monitorado = db.session.get(VeiculoMonitorado, monitorado_id)
+    if monitorado is None or not monitorado.ativo or not current_user.pode_acessar_filial(monitorado.filial_id):
+        return jsonify({'sucesso': False, 'erro': 'Placa monitorada não encontrada.'})
+
+    monitorado.ativo = False
+    db.session.commit()
+    return jsonify({'sucesso': True, 'mensagem': f'{monitorado.placa} removida do monitoramento.'})
+
+
+@monitoramento_bp.route('/<int:monitorado_id>/verificar', methods=['POST'])
+@login_required
+def verificar(monitorado_id):
+    """
+    Enfileira a verificação imediata da placa (fora da janela do
+    monitoramento); o resultado aparece na lista e nos alertas.
+    """
+    from app.extensions import db
+    from app.tarefas import enfileirar
+
+    monitorado = db.session.get(VeiculoMonitorado, monitorado_id)
+    if monitorado is None or not monitorado.ativo or not current_user.pode_acessar_filial(monitorado.filial_id):
+        return jsonify({'sucesso': False, 'erro': 'Placa monitorada não encontrada.'})
+
+    tarefa = enfileirar('verificar_monitorado', {'monitorado_id': monitorado.id}, usuario_id=current_user.id,
+                        filial_id=monitorado.filial_id, chave=f'monitorado:{monitorado.id}')
+    return jsonify({'sucesso': True, 'mensagem': f'Verificação de {monitorado.placa} na fila.',
+                    'tarefa_id': tarefa.id})
+
+
+# ==============================================================================
+# ALERTAS
+# ==============================================================================
+
+@monitoramento_bp.route('/alertas')
+@login_required
+def alertas():
+    """Alertas não lidos das filiais do usuário (mais recentes primeiro)."""
+    lista = AlertaVeiculo.nao_lidos(_filiais_ids(), limite=request.args.get('limite', 50, type=int))
+    return jsonify({
+        'sucesso': True,
+        'alertas': [a.to_dict() for a in lista]
+    })
+
+
+@monitoramento_bp.route('/alertas/lidos', methods=['POST'])
+@login_required
+def marcar_lidos():
+    """Marca como lidos os alertas em `ids` (todos, se ausente)."""
+    ids = request.form.getlist('ids', type=int) or None
+    total = AlertaVeiculo.marcar_lidos(_filiais_ids(), current_user.id, ids)
+    return jsonify({'sucesso': True, 'marcados': total})
+
+
+# ==============================================================================
+# FUNÇÕES AUXILIARES
+# ==============================================================================
+
+def _filial_conectada():
+    """Filial conectada na sessão, se o usuário ainda tem permissão. Retorna (id, erro)."""
+    filial_id = session.get('filial_conectada_id')
+    if not filial_id:
+        return None, 'É necessário conectar a uma filial.'
+    if not current_user.pode_acessar_filial(filial_id):
+        return None, 'Você não tem mais permissão para esta filial.'
+    return filial_id, None
+
+
+def _filiais_ids():
+    return [f.id for f in current_user.get_filiais_permitidas()]
@@ -0,0 +1,125 @@
+"""
+Sistema I9 - Rotas da Fila de Tarefas (API)
+"""
+
+import re
+import uuid
+from flask import Blueprint, Response, current_app, request, jsonify, session
+from flask_login import login_required, current_user
+from app.models import Tarefa
+from app.routes.consulta import validar_placa
+from app.tarefas import enfileirar
+
+tarefas_bp = Blueprint('tarefas', __name__)
+
+
+# ==============================================================================
+# CONSULTA EM LOTE
+# ==============================================================================
+
+@tarefas_bp.route('/consulta_lote', methods=['POST'])
+@login_required
+def consulta_lote():
+    """
+    Enfileira uma consulta por placa em `placas` (separadas por espaço,
+    vírgula ou linha) na filial conectada. Os resultados chegam em
+    /api/tarefas?grupo=<grupo>.
+    """
+    from app.extensions import db
+
+    filial_id = session.get('filial_conectada_id')
+    if not filial_id:
+        return jsonify({'sucesso': False, 'erro': 'É necessário conectar a uma filial.'})
+    if not current_user.pode_acessar_filial(filial_id):
+        return jsonify({'sucesso': False, 'erro': 'Você não tem mais permissão para esta filial.'})
+
+    placas = list(dict.fromkeys(p for p in re.split(r'[\s,;]+', request.form.get('placas', '').upper()) if p))
+    if not placas:
+        return jsonify({'sucesso': False, 'erro': 'Informe ao menos uma placa.'})
+    invalidas = [p for p in placas if not validar_placa(p)]
+    if invalidas:
+        return jsonify({'sucesso': False, 'erro': 'Placa(s) inválida(s): ' + ', '.join(invalidas[:10])})
+    maximo = current_app.config.get('TAREFAS_LOTE_MAX', 200)
+    if len(placas) > maximo:
+        return jsonify({'sucesso': False, 'erro': f'Limite de {maximo} placas por lote.'})
+
+    uf = request.form.get('uf', 'SP').strip().upper()
+    grupo = uuid.uuid4().hex
+    for placa in placas:
+        enfileirar('consulta_placa', {'placa': placa, 'uf': uf}, usuario_id=current_user.id,
+                   filial_id=filial_id, grupo=grupo, commit=False)
+    db.session.commit()
+
+    return jsonify({
+        'sucesso': True,
+        'mensagem': f'{len(placas)} consulta(s) na fila.',
+        'grupo': grupo,
+        'tarefas': len(placas)
+    })
+
+
+# ==============================================================================
+# ACOMPANHAMENTO
+# ==============================================================================
+
+@tarefas_bp.route('')
+@login_required
+def listar():
+    """Tarefas do usuário (mais recentes primeiro) ou, com ?grupo=, as de um lote."""
+    grupo = request.args.get('grupo')
+    if grupo:
+        tarefas = Tarefa.do_grupo(grupo, usuario_id=None if current_user.is_admin() else current_user.id)
+    else:
+        tarefas = Tarefa.query.filter_by(usuario_id=current_user.id)\
+            .order_by(Tarefa.id.desc())\
+            .limit(request.args.get('limite', 50, type=int))\
+            .all()
+
+    contagem = {}
+    for tarefa in tarefas:
+        contagem[tarefa.status] = contagem.get(tarefa.status, 0) + 1
+    return jsonify({
+        'sucesso': True,
+        'status': contagem,
+        'tarefas': [t.to_dict() for t in tarefas]
+    })
+
+
+@tarefas_bp.route('/<int:tarefa_id>')
+@login_required
+def detalhar(tarefa_id):
+    """Status, tentativas e resultado da tarefa."""
+    tarefa, erro = _tarefa_permitida(tarefa_id)
+    if erro:
+        return jsonify({'sucesso': False, 'erro': erro})
+    return jsonify({'sucesso': True, 'tarefa': tarefa.to_dict()})
+
+
+@tarefas_bp.route('/<int:tarefa_id>/arquivo')
+@login_required
+def arquivo(tarefa_id):
+    """Arquivo gerado pela tarefa (exportações)."""
+    import gzip
+
+    tarefa, erro = _tarefa_permitida(tarefa_id)
+    if erro or tarefa.status != Tarefa.CONCLUIDA or not tarefa.arquivo_nome:
+        return jsonify({'sucesso': False, 'erro': erro or 'Arquivo não disponível.'})
+    return Response(
+        gzip.decompress(tarefa.arquivo),
+        mimetype='text/csv' if tarefa.arquivo_nome.endswith('.csv') else 'application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename={tarefa.arquivo_nome}'}
+    )
+
+
+# ==============================================================================
+# FUNÇÕES AUXILIARES
+# ==============================================================================
+
+def _tarefa_permitida(tarefa_id):
+    """Tarefa do usuário (admins veem todas). Retorna (tarefa, erro)."""
+    from app.extensions import db
+
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    if tarefa is None or (tarefa.usuario_id != current_user.id and not current_user.is_admin()):
+        return None, 'Tarefa não encontrada.'
+    return tarefa, None
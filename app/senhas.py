@@ -0,0 +1,100 @@
+"""
+Sistema I9 - Política de Hash de Senhas
+
+O algoritmo e o custo vêm de PASSWORD_HASH_METHOD, no formato do werkzeug
+(ex.: 'scrypt:32768:8:1', 'pbkdf2:sha256:600000'). Hashes gravados com outra
+política são refeitos em segundo plano no próximo login bem-sucedido.
+
+A verificação roda num pool de PASSWORD_HASH_WORKERS threads: scrypt e
+PBKDF2 liberam o GIL, e o pool limita quantos núcleos os logins simultâneos
+(troca de turno) podem ocupar, deixando o restante para as consultas.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+METODO_PADRAO = 'scrypt:32768:8:1'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _config(chave, padrao):
+    if has_app_context():
+        return current_app.config.get(chave, padrao)
+    return padrao
+
+
+def metodo_atual():
+    """Método de hash da política em vigor."""
+    return _config('PASSWORD_HASH_METHOD', METODO_PADRAO) or METODO_PADRAO
+
+
+@lru_cache(maxsize=16)
+def _prefixo(metodo):
+    """Prefixo gravado pelo werkzeug para o método (com os custos padrão preenchidos)."""
+    return generate_password_hash('', method=metodo).split('$', 1)[0]
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(_config('PASSWORD_HASH_WORKERS', 0)) or (os.cpu_count() or 1)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='i9-senha')
+    return _executor
+
+
+def gerar_hash(senha, metodo=None):
+    """Gera o hash da senha com a política atual."""
+    return generate_password_hash(senha, method=metodo or metodo_atual())
+
+
+def verificar(senha_hash, senha):
+    """Verifica a senha no pool de hashing (bloqueia só a requisição atual)."""
+    if not senha_hash:
+        return False
+    return _pool().submit(check_password_hash, senha_hash, senha).result()
+
+
+def precisa_rehash(senha_hash, metodo=None):
+    """Indica se o hash foi gerado com algoritmo ou custo diferente da política."""
+    return senha_hash.split('$', 1)[0] != _prefixo(metodo or metodo_atual())
+
+
+def rehash_em_segundo_plano(usuario_id, senha_hash, senha):
+    """
+    Refaz o hash com a política atual sem atrasar a resposta do login.
+
+    A gravação só acontece se o hash ainda for o antigo, para não desfazer
+    uma troca de senha feita nesse meio tempo.
+    """
+    app = current_app._get_current_object()
+    metodo = metodo_atual()
+
+    def tarefa():
+        novo = generate_password_hash(senha, method=metodo)
+        with app.app_context():
+            from app.extensions import db
+            from app.models import Usuario
+            try:
+                db.session.query(Usuario)\
+                    .filter(Usuario.id == usuario_id, Usuario.senha_hash == senha_hash)\
+                    .update({Usuario.senha_hash: novo}, synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Falha ao atualizar o hash da senha do usuário %s', usuario_id)
+            finally:
+                db.session.remove()
+
+    return _pool().submit(tarefa)
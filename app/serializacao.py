@@ -0,0 +1,65 @@
+"""
+Sistema I9 - Serialização JSON
+
+Com o orjson instalado, jsonify() passa a usá-lo (JSON_ORJSON=1): ele
+serializa os objetos normalizados (dataclasses com __slots__) sem montar
+dicionários intermediários. O formato continua o do Flask: chaves ordenadas
+conforme app.json.sort_keys e datas no padrão HTTP. Sem orjson, nada muda.
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele vale o json da biblioteca padrão
+    orjson = None
+
+
+def dumps(obj):
+    """JSON compacto em bytes (UTF-8), aceitando os objetos normalizados."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    from app.conectores.normalizacao import para_dict
+    return json.dumps(obj, default=para_dict, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class ProvedorJSONOrjson(DefaultJSONProvider):
+    """DefaultJSONProvider do Flask com o orjson nas respostas e leituras."""
+
+    def _opcoes(self):
+        # Datas passam pelo default do Flask (formato HTTP), como antes
+        opcoes = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        return opcoes
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # opções do json padrão (ex.: separators da sessão)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._opcoes()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        opcoes = self._opcoes()
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            opcoes |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=opcoes) + b'\n', mimetype=self.mimetype
+        )
+
+
+def configurar_json(app):
+    """Troca o provedor JSON da aplicação pelo orjson, se disponível."""
+    if orjson is None or not app.config.get('JSON_ORJSON', True):
+        return
+    provedor = ProvedorJSONOrjson(app)
+    provedor.sort_keys = app.json.sort_keys
+    provedor.compact = app.json.compact
+    app.json = provedor
@@ -0,0 +1,348 @@
+/* Sistema I9 - Dashboard de consultas */
+
+async function conectarFilial() {
+    const filialId = document.getElementById('filialSelect').value;
+    if (!filialId) { alert('Selecione uma filial.'); return; }
+    const formData = new FormData();
+    formData.append('filial_id', filialId);
+    try {
+        const resp = await fetch('/api/conectar_filial', { method: 'POST', body: formData });
+        const data = await resp.json();
+        if (data.sucesso) { location.reload(); } else { alert('Erro: ' + data.erro); }
+    } catch (err) { alert('Erro: ' + err.message); }
+}
+
+async function desconectarFilial() {
+    if (!confirm('Desconectar?')) return;
+    try {
+        const resp = await fetch('/api/desconectar_filial', { method: 'POST' });
+        const data = await resp.json();
+        if (data.sucesso) { location.reload(); }
+    } catch (err) { alert('Erro: ' + err.message); }
+}
+
+const SECOES = {
+    restricoes: 'dadosRestricoes', multas: 'dadosMultas', ipva: 'dadosIPVA',
+    leilao: 'dadosLeilao', proprietarios: 'dadosProprietarios'
+};
+
+function mostrarErro(msg) {
+    document.getElementById('loading').classList.add('hidden');
+    document.getElementById('resultado').classList.add('hidden');
+    document.getElementById('erroMsg').textContent = msg;
+    document.getElementById('erro').classList.remove('hidden');
+}
+
+// Chave de idempotência: repetir a consulta que não terminou (erro de rede,
+// clique duplo) reaproveita a chave e não gera nova consulta cobrada
+let chaveConsulta = null;
+
+function chaveIdempotencia(placa) {
+    if (!chaveConsulta || chaveConsulta.placa !== placa) {
+        const id = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        chaveConsulta = { placa, chave: id };
+    }
+    return chaveConsulta.chave;
+}
+
+// Resultado recente vem do cache; "Consultar novamente" força a consulta externa
+let forcarConsulta = false;
+
+function consultarNovamente() {
+    forcarConsulta = true;
+    document.getElementById('formConsulta').requestSubmit();
+}
+
+// Cada seção é exibida assim que a fonte responde (NDJSON, uma linha por seção)
+document.getElementById('formConsulta').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const placa = document.getElementById('placa').value;
+    document.getElementById('loading').classList.remove('hidden');
+    document.getElementById('loading').classList.add('flex');
+    document.getElementById('resultado').classList.add('hidden');
+    document.getElementById('erro').classList.add('hidden');
+    exibirMudancas(null);
+    const formData = new FormData();
+    formData.append('placa_chassi', placa);
+    formData.append('tipo_busca', 'placa');
+    if (forcarConsulta) formData.append('forcar', '1');
+    forcarConsulta = false;
+    try {
+        const resp = await fetch('/api/consultar/stream', {
+            method: 'POST', body: formData, headers: { 'Idempotency-Key': chaveIdempotencia(placa) }
+        });
+        if (!(resp.headers.get('Content-Type') || '').includes('ndjson')) {
+            const data = await resp.json();
+            mostrarErro(data.erro);
+            return;
+        }
+        document.getElementById('dadosVeiculo').innerHTML = '';
+        Object.values(SECOES).forEach(id => {
+            document.getElementById(id).innerHTML = '<p class="text-blue-200/60 text-sm">⏳ Consultando...</p>';
+        });
+        document.getElementById('resultado').classList.remove('hidden');
+
+        const leitor = resp.body.getReader();
+        const decodificador = new TextDecoder();
+        let pendente = '';
+        while (true) {
+            const { value, done } = await leitor.read();
+            if (done) break;
+            pendente += decodificador.decode(value, { stream: true });
+            const linhas = pendente.split('\n');
+            pendente = linhas.pop();
+            linhas.filter(l => l.trim()).forEach(l => processarEvento(JSON.parse(l)));
+        }
+    } catch (err) {
+        mostrarErro('Erro de conexão');
+    }
+});
+
+function processarEvento(evento) {
+    if (evento.fim) {
+        chaveConsulta = null;
+        document.getElementById('loading').classList.add('hidden');
+        if (!evento.sucesso) { mostrarErro(evento.erro); return; }
+        const info = evento.cache ? `⚡ Resultado verificado em ${evento.cache.verificado_em}, sem nova consulta — <button onclick="consultarNovamente()" class="underline">consultar novamente</button>` : '';
+        exibirMudancas(evento.mudancas, info);
+    } else if (evento.erro) {
+        document.getElementById(SECOES[evento.secao]).innerHTML = `<p class="text-yellow-300 text-sm">⚠️ Indisponível: ${evento.erro}</p>`;
+    } else if (evento.secao === 'restricoes') {
+        exibirSecoes(evento.dados);  // traz também dados_veiculo
+    } else {
+        exibirSecoes({ [evento.secao]: evento.dados });
+    }
+}
+
+function exibirResultado(dados) {
+    document.getElementById('resultado').classList.remove('hidden');
+    exibirSecoes(dados);
+}
+
+function exibirSecoes(dados) {
+    if (dados.dados_veiculo) exibirVeiculo(dados.dados_veiculo);
+    if (dados.ipva) exibirIPVA(dados.ipva);
+    if (dados.multas) exibirMultas(dados.multas);
+    if (dados.restricoes) exibirRestricoes(dados.restricoes);
+    if (dados.leilao) exibirLeilao(dados.leilao);
+    if (dados.proprietarios) exibirProprietarios(dados.proprietarios);
+}
+
+function avisoSecao(secao) {
+    return secao.erro ? `<p class="text-yellow-300 text-xs mb-2">⚠️ Dados parciais: ${secao.erro}</p>` : '';
+}
+
+function exibirVeiculo(v) {
+    document.getElementById('dadosVeiculo').innerHTML = `
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Placa</p><p class="text-white font-bold">${v.placa}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Modelo</p><p class="text-white font-bold">${v.modelo}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Ano</p><p class="text-white font-bold">${v.ano_fabricacao}/${v.ano_modelo}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Cor</p><p class="text-white font-bold">${v.cor}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Chassi</p><p class="text-white font-bold text-sm">${v.chassi}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Renavam</p><p class="text-white font-bold">${v.renavam}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Combustível</p><p class="text-white font-bold">${v.combustivel}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">UF</p><p class="text-white font-bold">${v.uf}</p></div>
+`;
+}
+
+function exibirIPVA(ipva) {
+    const ipvaColor = ipva.situacao === 'PAGO' ? 'text-green-400' : ipva.situacao === 'PENDENTE' ? 'text-yellow-400' : 'text-red-400';
+    document.getElementById('dadosIPVA').innerHTML = avisoSecao(ipva) + `
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Situação</p><p class="${ipvaColor} font-bold">${ipva.situacao}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Valor</p><p class="text-white font-bold">R$ ${ipva.valor.toFixed(2)}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Ano Ref.</p><p class="text-white font-bold">${ipva.ano_referencia ?? 'N/A'}</p></div>
+    <div class="bg-white/5 p-3 rounded-lg"><p class="text-blue-200/60 text-xs">Vencimento</p><p class="text-white font-bold">${ipva.vencimento}</p></div>
+`;
+}
+
+function exibirMultas(multas) {
+    if (multas.possui_multas) {
+        let html = avisoSecao(multas) + `<p class="text-red-400 font-bold mb-3">${multas.quantidade} multa(s) - Total: R$ ${multas.valor_total.toFixed(2)}</p><div class="space-y-2">`;
+        multas.detalhes.forEach(m => { html += `<div class="bg-white/5 p-3 rounded-lg"><p class="text-white text-sm">${m.data} - ${m.descricao}</p><p class="text-blue-200/60 text-xs">${m.local} | R$ ${m.valor.toFixed(2)}</p></div>`; });
+        document.getElementById('dadosMultas').innerHTML = html + '</div>';
+    } else { document.getElementById('dadosMultas').innerHTML = avisoSecao(multas) + '<p class="text-green-400 font-bold">✓ Nenhuma multa</p>'; }
+}
+
+function exibirRestricoes(rest) {
+    if (rest.possui_restricoes) {
+        let html = '<div class="space-y-2">';
+        rest.detalhes.forEach(r => { html += `<div class="bg-red-500/20 p-3 rounded-lg border border-red-500/30"><p class="text-red-300 font-bold">${r.tipo}</p><p class="text-red-200/80 text-sm">${r.instituicao || r.boletim_ocorrencia || ''} - ${r.data_inclusao || ''}</p></div>`; });
+        document.getElementById('dadosRestricoes').innerHTML = html + '</div>';
+    } else { document.getElementById('dadosRestricoes').innerHTML = '<p class="text-green-400 font-bold">✓ Sem restrições</p>'; }
+}
+
+function exibirLeilao(leilao) {
+    if (leilao.possui_historico_leilao) {
+        const l = leilao.detalhes;
+        document.getElementById('dadosLeilao').innerHTML = avisoSecao(leilao) + `<div class="bg-yellow-500/20 p-4 rounded-lg border border-yellow-500/30"><p class="text-yellow-300 font-bold">⚠️ HISTÓRICO DE LEILÃO</p><p class="text-yellow-200/80 text-sm mt-2">Leiloeiro: ${l.leiloeiro}<br>Data: ${l.data_leilao}<br>Motivo: ${l.motivo}</p></div>`;
+    } else { document.getElementById('dadosLeilao').innerHTML = avisoSecao(leilao) + '<p class="text-green-400 font-bold">✓ Sem histórico de leilão</p>'; }
+}
+
+function exibirProprietarios(props) {
+    let html = avisoSecao(props) + `<p class="text-blue-200 mb-3">${props.quantidade} proprietário(s)</p><div class="space-y-2">`;
+    props.historico.forEach((p, i) => { html += `<div class="bg-white/5 p-3 rounded-lg flex justify-between"><span class="text-white">${i + 1}. ${p.tipo}</span><span class="text-blue-200/60 text-sm">${p.uf} | ${p.periodo}</span></div>`; });
+    document.getElementById('dadosProprietarios').innerHTML = html + '</div>';
+}
+
+async function verDesdeUltimaConsulta() {
+    const placa = document.getElementById('placa').value;
+    if (!placa) { alert('Informe a placa.'); return; }
+    document.getElementById('erro').classList.add('hidden');
+    const resp = await fetch('/api/desde_ultima_consulta?placa_chassi=' + encodeURIComponent(placa));
+    const data = await resp.json();
+    if (!data.sucesso || !data.encontrado) {
+        document.getElementById('erroMsg').textContent = data.erro || 'Nenhuma consulta anterior deste veículo.';
+        document.getElementById('erro').classList.remove('hidden');
+        return;
+    }
+    exibirResultado(data.dados);
+    const aviso = data.fresco ? '' : ' — ⚠️ dados antigos, recomenda-se nova consulta';
+    exibirMudancas(data.mudancas, `Última verificação: ${data.verificado_em} (sem alterações desde ${data.alterado_em})${aviso}`);
+}
+
+function exibirMudancas(mudancas, info) {
+    const div = document.getElementById('mudancas');
+    let html = info ? `<p class="text-blue-200 text-sm mb-2">${info}</p>` : '';
+    if (mudancas && mudancas.mudou) {
+        html += '<p class="text-yellow-300 font-bold mb-2">🔔 Mudanças desde a consulta anterior</p><ul class="text-sm space-y-1">';
+        mudancas.restricoes_novas.forEach(r => { html += `<li class="text-red-300">+ Nova restrição: ${r.tipo}</li>`; });
+        mudancas.restricoes_levantadas.forEach(r => { html += `<li class="text-green-300">− Restrição levantada: ${r.tipo}</li>`; });
+        Object.entries(mudancas.alteracoes).forEach(([campo, [antes, depois]]) => { html += `<li class="text-blue-200">${campo}: ${antes} → ${depois}</li>`; });
+        html += '</ul>';
+    } else if (mudancas) {
+        html += '<p class="text-green-300 text-sm">✓ Nenhuma mudança desde a consulta anterior</p>';
+    }
+    div.innerHTML = html;
+    div.className = html ? 'glass-effect bg-white/10 rounded-2xl p-6 border border-white/20' : 'hidden';
+}
+
+async function carregarHistorico() {
+    const div = document.getElementById('historico');
+    div.classList.toggle('hidden');
+    if (!div.classList.contains('hidden')) {
+        buscarHistorico();
+    }
+}
+
+let cursorHistorico = null;
+
+async function buscarHistorico(maisResultados) {
+    const params = new URLSearchParams();
+    const placa = document.getElementById('buscaPlaca').value.trim();
+    const chassi = document.getElementById('buscaChassi').value.trim();
+    const renavam = document.getElementById('buscaRenavam').value.trim();
+    const data = document.getElementById('buscaData').value;
+
+    if (placa) params.set('placa', placa);
+    if (chassi) params.set('chassi', chassi);
+    if (renavam) params.set('renavam', renavam);
+    if (data) { params.set('data_inicio', data); params.set('data_fim', data); }
+    if (maisResultados && cursorHistorico) params.set('cursor', cursorHistorico);
+
+    const resp = await fetch('/api/historico?' + params.toString());
+    const data2 = await resp.json();
+    if (data2.sucesso) {
+        let html = '';
+        data2.consultas.forEach(c => {
+            const statusColor = c.status_consulta === 'sucesso' ? 'bg-green-500/20 text-green-300' : c.status_consulta === 'cache' ? 'bg-blue-500/20 text-blue-300' : 'bg-red-500/20 text-red-300';
+            html += `<div class="bg-white/5 p-3 rounded-lg flex justify-between items-center">
+                <div>
+                    <p class="text-white font-bold">${c.placa_chassi}</p>
+                    <p class="text-blue-200/60 text-xs">${c.filial}</p>
+                </div>
+                <div class="text-right">
+                    <span class="text-blue-200/60 text-xs">${c.data_consulta}</span>
+                    <span class="px-2 py-1 rounded text-xs ${statusColor} ml-2">${c.status_consulta}</span>
+                </div>
+            </div>`;
+        });
+        const lista = document.getElementById('listaHistorico');
+        if (maisResultados) {
+            lista.insertAdjacentHTML('beforeend', html);
+        } else {
+            lista.innerHTML = html || '<p class="text-blue-200/60">Nenhuma consulta encontrada</p>';
+        }
+        cursorHistorico = data2.proximo_cursor;
+        document.getElementById('maisHistorico').classList.toggle('hidden', !cursorHistorico);
+    } else {
+        document.getElementById('listaHistorico').innerHTML = `<p class="text-red-300">${data2.erro}</p>`;
+    }
+}
+
+// Monitoramento de frota: alertas verificados a cada minuto
+async function buscarAlertas() {
+    try {
+        const resp = await fetch('/api/monitoramento/alertas');
+        const data = await resp.json();
+        if (!data.sucesso) return;
+        const div = document.getElementById('alertasMonitoramento');
+        div.classList.toggle('hidden', !data.alertas.length);
+        document.getElementById('totalAlertas').textContent = data.alertas.length;
+        document.getElementById('listaAlertas').innerHTML = data.alertas.map(a => {
+            const cor = a.grave ? 'bg-red-500/20 border-red-500/30 text-red-200' : 'bg-white/5 border-white/10 text-blue-100';
+            return `<div class="p-3 rounded-lg border ${cor} flex justify-between items-center">
+                <div><p class="font-bold">${a.placa}</p><p class="text-sm">${a.resumo}</p></div>
+                <div class="text-right"><span class="text-xs opacity-70">${a.criado_em}</span>
+                <button onclick="marcarAlertasLidos(${a.id})" class="ml-3 text-xs underline">Lido</button></div>
+            </div>`;
+        }).join('');
+    } catch (err) { /* tenta de novo no próximo intervalo */ }
+}
+
+async function marcarAlertasLidos(id) {
+    const formData = new FormData();
+    if (id) formData.append('ids', id);
+    await fetch('/api/monitoramento/alertas/lidos', { method: 'POST', body: formData });
+    buscarAlertas();
+}
+
+async function carregarMonitorados() {
+    const div = document.getElementById('monitoramento');
+    div.classList.toggle('hidden');
+    if (!div.classList.contains('hidden')) {
+        const resp = await fetch('/api/monitoramento');
+        exibirMonitorados(await resp.json());
+    }
+}
+
+async function incluirMonitorados() {
+    const placas = document.getElementById('placasMonitorar').value.trim();
+    if (!placas) { alert('Informe as placas.'); return; }
+    const formData = new FormData();
+    formData.append('placas', placas);
+    formData.append('uf', document.getElementById('uf').value || 'SP');
+    const resp = await fetch('/api/monitoramento/incluir', { method: 'POST', body: formData });
+    const data = await resp.json();
+    if (data.sucesso) { document.getElementById('placasMonitorar').value = ''; }
+    exibirMonitorados(data);
+}
+
+async function removerMonitorado(id) {
+    if (!confirm('Remover do monitoramento?')) return;
+    const resp = await fetch(`/api/monitoramento/${id}/remover`, { method: 'POST' });
+    const data = await resp.json();
+    if (!data.sucesso) { alert('Erro: ' + data.erro); return; }
+    exibirMonitorados(await (await fetch('/api/monitoramento')).json());
+}
+
+async function verificarMonitorado(id) {
+    const resp = await fetch(`/api/monitoramento/${id}/verificar`, { method: 'POST' });
+    const data = await resp.json();
+    alert(data.sucesso ? data.mensagem : 'Erro: ' + data.erro);
+}
+
+function exibirMonitorados(data) {
+    const lista = document.getElementById('listaMonitorados');
+    if (!data.sucesso) { lista.innerHTML = `<p class="text-red-300">${data.erro}</p>`; return; }
+    const cores = { sucesso: 'bg-green-500/20 text-green-300', erro: 'bg-red-500/20 text-red-300' };
+    lista.innerHTML = data.veiculos.map(v => `<div class="bg-white/5 p-3 rounded-lg flex justify-between items-center">
+        <div><p class="text-white font-bold">${v.placa} <span class="text-blue-200/60 text-xs">${v.uf}</span></p>
+        <p class="text-blue-200/60 text-xs">Última: ${v.ultima_verificacao || 'pendente'} · Próxima: ${v.proxima_verificacao}</p></div>
+        <div class="text-right">${v.ultimo_status ? `<span class="px-2 py-1 rounded text-xs ${cores[v.ultimo_status] || 'bg-blue-500/20 text-blue-300'}" title="${v.ultimo_erro || ''}">${v.ultimo_status}</span>` : ''}
+        <button onclick="verificarMonitorado(${v.id})" class="ml-3 text-blue-300 hover:text-blue-200 text-xs underline">Verificar agora</button>
+        <button onclick="removerMonitorado(${v.id})" class="ml-3 text-red-300 hover:text-red-200 text-xs underline">Remover</button></div>
+    </div>`).join('') || '<p class="text-blue-200/60">Nenhuma placa monitorada</p>';
+}
+
+buscarAlertas();
+setInterval(buscarAlertas, 60000);
@@ -0,0 +1,389 @@
+"""
+Sistema I9 - Fila de Tarefas em Segundo Plano
+
+Trabalhos que não devem rodar dentro da requisição (consultas em lote,
+exportações, verificação imediata de placa monitorada, validação de
+certificado) viram linhas da tabela `tarefas` no próprio banco. Os workers
+reservam as prontas com FOR UPDATE SKIP LOCKED no PostgreSQL (no SQLite,
+o compare-and-set da reserva basta), por prioridade e horário:
+
+    from app.tarefas import enfileirar
+    tarefa = enfileirar('exportar_auditoria', {'data_inicio': '2026-10-01'}, usuario_id=current_user.id)
+
+Falhas voltam para a fila com espera exponencial (TAREFAS_BACKOFF_S,
+2x a cada tentativa) até max_tentativas; ErroDefinitivo falha de vez.
+Uma reserva vencida (worker encerrado no meio) é retomada por outro.
+Os workers rodam em processo próprio (flask i9 worker --concorrencia N) ou,
+com TAREFAS_CONCORRENCIA > 0, como threads no processo web; um aviso no canal
+i9_tarefas acorda os que estão ociosos assim que algo é enfileirado.
+"""
+
+import gzip
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima entre tentativas (s)
+BACKOFF_MAX_S = 3600
+
+TIPOS = {}
+
+
+class ErroDefinitivo(Exception):
+    """Falha que não adianta tentar de novo (parâmetro inválido, filial inativa...)."""
+
+
+class Arquivo(NamedTuple):
+    """Retorno de tarefa que gera arquivo: guardado em gzip na própria tarefa."""
+    nome: str
+    conteudo: bytes
+    resultado: dict
+
+
+class TipoTarefa(NamedTuple):
+    funcao: object
+    max_tentativas: int
+    prioridade: int
+
+
+def tipo_tarefa(nome, max_tentativas=3, prioridade=0):
+    """Registra a função que executa as tarefas do tipo: funcao(tarefa, **parametros)."""
+    def registrar(funcao):
+        TIPOS[nome] = TipoTarefa(funcao, max_tentativas, prioridade)
+        return funcao
+    return registrar
+
+
+def enfileirar(tipo, parametros=None, prioridade=None, executar_em=None, usuario_id=None, filial_id=None,
+               grupo=None, chave=None, commit=True):
+    """
+    Enfileira uma tarefa do tipo registrado (executar_em em UTC; padrão:
+    agora). Com `chave`, não duplica uma tarefa pendente de mesma chave.
+    Retorna a tarefa.
+    """
+    from flask import current_app
+    from app.extensions import db
+    from app.models import Tarefa
+
+    definicao = TIPOS.get(tipo)
+    if definicao is None:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+
+    tarefa, nova = Tarefa.criar(
+        tipo, parametros,
+        prioridade=definicao.prioridade if prioridade is None else prioridade,
+        executar_em=executar_em,
+        max_tentativas=definicao.max_tentativas,
+        usuario_id=usuario_id,
+        filial_id=filial_id,
+        grupo=grupo,
+        chave=chave
+    )
+    if nova:
+        # Acorda os workers ociosos (entregue no commit)
+        coordenacao = current_app.extensions.get('i9_coordenacao')
+        if coordenacao is not None:
+            coordenacao.publicar('i9_tarefas', tipo)
+    if commit:
+        db.session.commit()
+    return tarefa
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+class Trabalhador:
+    """Threads que reservam e executam tarefas da fila."""
+
+    def __init__(self, app, concorrencia=1, espera_s=5.0, reserva_s=900, backoff_s=30.0):
+        self.app = app
+        self.concorrencia = concorrencia
+        self.espera_s = espera_s
+        self.reserva_s = reserva_s
+        self.backoff_s = backoff_s
+        self.nome = f'{socket.gethostname()}:{os.getpid()}'
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+        self._threads = []
+        self.executadas = 0
+        self.concluidas = 0
+        self.falhas = 0
+        self.ultima = None
+
+    def acordar(self, _mensagem=None):
+        self._acordar.set()
+
+    # ----------------------------------------------------------------- threads
+
+    def iniciar(self, concorrencia=None):
+        # Iniciadas na primeira requisição, já dentro do processo worker (após o fork)
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            if concorrencia is not None:
+                self.concorrencia = concorrencia
+            self.nome = f'{socket.gethostname()}:{os.getpid()}'  # pid do processo após o fork
+            for i in range(self.concorrencia):
+                thread = threading.Thread(target=self._loop, args=(f'{self.nome}:{i}',),
+                                          name=f'i9-tarefas-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _loop(self, worker):
+        while not self._parar.is_set():
+            try:
+                executou = self.executar_proxima(worker)
+            except Exception:
+                logger.exception('Falha no worker de tarefas')
+                executou = False
+            if not executou:
+                self._acordar.wait(self.espera_s)
+                self._acordar.clear()
+
+    def parar(self, aguardar_s=None):
+        self._parar.set()
+        self._acordar.set()
+        if aguardar_s is not None:
+            for thread in self._threads:
+                thread.join(aguardar_s)
+
+    def ativo(self):
+        return any(t.is_alive() for t in self._threads)
+
+    # ---------------------------------------------------------------- execução
+
+    def executar_proxima(self, worker=None):
+        """Reserva e executa a próxima tarefa pronta. False se a fila estava vazia."""
+        from app.extensions import db
+        from app.models import Tarefa
+
+        worker = worker or f'{self.nome}:avulso'
+        with self.app.app_context():
+            try:
+                ids = Tarefa.reservar(worker, 1, self.reserva_s)
+                if not ids:
+                    return False
+                self.executar(db.session.get(Tarefa, ids[0]), worker)
+                return True
+            finally:
+                db.session.remove()
+
+    def executar(self, tarefa, worker):
+        """
+        Executa a tarefa reservada e grava o resultado ou a falha. Retorna
+        o status: concluida, falhou ou erro (volta para a fila).
+        """
+        from app.models import Tarefa
+
+        rastreador = self.app.extensions.get('i9_rastreio')
+        raiz = rastreador.iniciar(f'tarefa.{tarefa.tipo}', tarefa_id=tarefa.id,
+                                  tentativa=tarefa.tentativas) if rastreador else None
+        try:
+            status, erro = self._executar(tarefa, worker)
+            if raiz is not None and erro:
+                raiz.erro = erro
+        finally:
+            if raiz is not None:
+                rastreador.finalizar(raiz)
+
+        with self._lock:
+            self.executadas += 1
+            self.concluidas += status == Tarefa.CONCLUIDA
+            self.falhas += status != Tarefa.CONCLUIDA
+            self.ultima = {'em': datetime.utcnow().isoformat(timespec='seconds'), 'id': tarefa.id,
+                           'tipo': tarefa.tipo, 'status': status}
+        return status
+
+    def _executar(self, tarefa, worker):
+        from app.extensions import db
+        from app.models import Tarefa
+
+        definicao = TIPOS.get(tarefa.tipo)
+        if definicao is None:
+            tarefa.falhar(worker, f'Tipo de tarefa desconhecido: {tarefa.tipo}')
+            return Tarefa.FALHOU, 'tipo desconhecido'
+        if tarefa.tentativas > tarefa.max_tentativas:
+            # Reserva vencida na última tentativa: o worker caiu no meio
+            tarefa.falhar(worker, tarefa.erro or 'Reserva vencida sem conclusão')
+            return Tarefa.FALHOU, 'reserva vencida'
+
+        try:
+            retorno = definicao.funcao(tarefa, **tarefa.get_parametros())
+        except ErroDefinitivo as e:
+            db.session.rollback()
+            tarefa.falhar(worker, str(e))
+            return Tarefa.FALHOU, str(e)
+        except Exception as e:
+            db.session.rollback()
+            erro = str(e) or e.__class__.__name__
+            espera = min(self.backoff_s * 2 ** max(tarefa.tentativas - 1, 0), BACKOFF_MAX_S)
+            logger.warning('Tarefa %s (%s) falhou na tentativa %d: %s', tarefa.id, tarefa.tipo,
+                           tarefa.tentativas, erro)
+            tarefa.falhar(worker, erro, espera_s=espera)
+            return 'erro', erro
+
+        if isinstance(retorno, Arquivo):
+            gravou = tarefa.concluir(worker, retorno.resultado, arquivo=gzip.compress(retorno.conteudo),
+                                     arquivo_nome=retorno.nome)
+        else:
+            gravou = tarefa.concluir(worker, retorno)
+        if not gravou:
+            logger.warning('Tarefa %s concluída após perder a reserva (outro worker a retomou)', tarefa.id)
+        return Tarefa.CONCLUIDA, None
+
+    def resumo(self):
+        from app.models import Tarefa
+
+        with self._lock:
+            dados = {
+                'worker': self.nome,
+                'concorrencia': self.concorrencia,
+                'ativo': self.ativo(),
+                'executadas': self.executadas,
+                'concluidas': self.concluidas,
+                'falhas': self.falhas,
+                'ultima': self.ultima,
+                'tipos': sorted(TIPOS)
+            }
+        dados.update(Tarefa.estatisticas())
+        return dados
+
+
+# ============================================================================
+# TIPOS DE TAREFA
+# ============================================================================
+
+@tipo_tarefa('consulta_placa', max_tentativas=3)
+def consultar_placa(tarefa, placa, uf='SP'):
+    """
+    Uma placa de consulta em lote: relatório completo, snapshot e auditoria
+    (tipo_busca 'lote') em nome de quem enfileirou.
+    """
+    from flask import current_app
+    from app.conectores.normalizacao import para_dict
+    from app.conectores.provedores import Consulta, DadosFilial
+    from app.extensions import db
+    from app.models import Auditoria, Filial, SnapshotVeiculo
+
+    filial = db.session.get(Filial, tarefa.filial_id) if tarefa.filial_id else None
+    if filial is None or not filial.ativa:
+        raise ErroDefinitivo('Filial inativa')
+
+    consulta = Consulta(placa=placa, uf=uf, filial=DadosFilial.de_filial(filial))
+    try:
+        resultado = current_app.extensions['i9_relatorio'].montar(consulta)
+    except Exception as e:
+        db.session.rollback()
+        Auditoria.registrar(tarefa.usuario_id, tarefa.filial_id, consulta.placa, 'lote',
+                            str(e) or e.__class__.__name__, status='erro')
+        raise
+
+    dados = para_dict(resultado)
+    if resultado.encontrado and resultado.completo:
+        SnapshotVeiculo.registrar(consulta.placa, tarefa.filial_id, dados, 'placa', commit=False)
+    Auditoria.registrar(tarefa.usuario_id, tarefa.filial_id, consulta.placa, 'lote',
+                        'Consulta em lote' if resultado.encontrado else 'Veículo não encontrado',
+                        status='sucesso' if resultado.encontrado else 'nao_encontrado')
+    return dados
+
+
+@tipo_tarefa('exportar_auditoria', max_tentativas=2)
+def exportar_auditoria(tarefa, data_inicio='', data_fim='', busca='', usuario_id=None):
+    """CSV da auditoria inteira no período (a exportação da página para em 1000 linhas)."""
+    import csv
+    from datetime import timedelta
+    from io import StringIO
+    from sqlalchemy.orm import selectinload
+    from app.database.busca import filtro_placa_chassi
+    from app.models import Auditoria
+
+    query = Auditoria.query.options(selectinload(Auditoria.usuario), selectinload(Auditoria.filial))
+    try:
+        if data_inicio:
+            query = query.filter(Auditoria.data_consulta >= datetime.strptime(data_inicio, '%Y-%m-%d'))
+        if data_fim:
+            query = query.filter(Auditoria.data_consulta <
+                                 datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        raise ErroDefinitivo('Data inválida (use AAAA-MM-DD)')
+    if busca:
+        query = query.filter(filtro_placa_chassi(busca))
+    if usuario_id:
+        query = query.filter(Auditoria.usuario_id == usuario_id)
+
+    saida = StringIO()
+    escritor = csv.writer(saida, delimiter=';')
+    escritor.writerow(Auditoria.CABECALHO_CSV)
+    linhas = 0
+    for auditoria in query.order_by(Auditoria.data_consulta.desc()).yield_per(1000):
+        escritor.writerow(auditoria.linha_csv())
+        linhas += 1
+    return Arquivo(f'auditoria_i9_{tarefa.id}.csv', saida.getvalue().encode('utf-8'), {'linhas': linhas})
+
+
+@tipo_tarefa('verificar_monitorado', max_tentativas=1, prioridade=10)
+def verificar_monitorado(tarefa, monitorado_id):
+    """Executa o "Verificar agora" de uma placa monitorada, fora da janela e do limite do monitoramento."""
+    from flask import current_app
+    from app.models import VeiculoMonitorado
+
+    monitor = current_app.extensions['i9_monitor']
+    if not VeiculoMonitorado.reservar(monitorado_id, monitor.reserva_s):
+        raise ErroDefinitivo('Placa em verificação pelo monitoramento ou fora do monitoramento')
+    status, alerta = monitor.verificar(monitorado_id)
+    return {'status': status, 'alerta': alerta.resumo if alerta else None}
+
+
+@tipo_tarefa('validar_certificado', max_tentativas=2, prioridade=5)
+def validar_certificado(tarefa, filial_id):
+    """Valida certificado e canal mTLS da filial e atualiza a validade do certificado."""
+    from flask import current_app
+    from app.extensions import db
+    from app.models import Filial, VersaoDados
+
+    filial = db.session.get(Filial, filial_id)
+    if filial is None:
+        raise ErroDefinitivo('Filial não encontrada')
+
+    resultado = current_app.extensions['i9_detran'].conectar(filial)
+    validade = resultado.get('certificado_valido_ate')
+    if validade:
+        validade = datetime.strptime(validade, '%d/%m/%Y').date()
+        if filial.cert_validade != validade:
+            filial.cert_validade = validade
+            VersaoDados.incrementar('filiais')
+            db.session.commit()
+    return resultado
+
+
+def configurar_tarefas(app):
+    """
+    Cria o worker de tarefas. Por padrão (TAREFAS_CONCORRENCIA=0) as tarefas
+    só rodam em flask i9 worker; com > 0 as threads também sobem no processo
+    web na primeira requisição.
+    """
+    trabalhador = Trabalhador(
+        app,
+        concorrencia=app.config.get('TAREFAS_CONCORRENCIA', 0),
+        espera_s=app.config.get('TAREFAS_ESPERA_S', 5),
+        reserva_s=app.config.get('TAREFAS_RESERVA_S', 900),
+        backoff_s=app.config.get('TAREFAS_BACKOFF_S', 30)
+    )
+    app.extensions['i9_tarefas'] = trabalhador
+    app.extensions['i9_coordenacao'].assinar('i9_tarefas', trabalhador.acordar)
+
+    if trabalhador.concorrencia and not app.testing:
+        @app.before_request
+        def iniciar_tarefas():
+            trabalhador.iniciar()
+
+    return trabalhador
@@ -0,0 +1,98 @@
+"""
+Sistema I9 - Benchmark de Bytes na Rede
+
+Popula um banco SQLite temporário com auditorias e compara o tamanho das
+respostas sem compressão, com gzip e com brotli nos endpoints mais pesados
+(listas JSON, exportação CSV e dashboard), além do efeito do ETag (304).
+
+Uso:
+    python benchmarks/bytes_na_rede.py --auditorias 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.sqlite_vs_postgres import RESULTADO_FIXO, _criar_app
+
+ENDPOINTS = [
+    ('auditoria_json', '/admin/auditoria/json?limit=500'),
+    ('historico', '/api/historico?limite=200'),
+    ('auditoria_csv', '/admin/auditoria/excel'),
+    ('dashboard', '/dashboard'),
+]
+
+CODIFICACOES = [('identity', 'identity'), ('gzip', 'gzip'), ('br', 'br')]
+
+
+def _popular(app, quantidade):
+    from app.conectores.normalizacao import para_dict
+    from app.extensions import db
+    from app.models import Auditoria, Filial, Usuario
+
+    with app.app_context():
+        usuario = Usuario.query.filter_by(role='admin').first()
+        filial = Filial.query.first()
+        for i in range(quantidade):
+            status = 'sucesso' if i % 7 else 'erro'
+            resultado = para_dict(RESULTADO_FIXO) if status == 'sucesso' else {'erro': 'Timeout na API'}
+            Auditoria.registrar(
+                usuario.id, filial.id, f'BRA{i % 10000:04d}', 'placa', resultado, status,
+                ip_origem=f'10.0.{i % 256}.{i % 100}'
+            )
+        email = usuario.email
+        db.session.remove()
+    return email
+
+
+def executar(quantidade):
+    caminho = os.path.join(tempfile.mkdtemp(prefix='i9_bytes_'), 'bench.db')
+    app = _criar_app(f'sqlite:///{caminho}')
+    email = _popular(app, quantidade)
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'email': email, 'senha': 'admin123'})
+
+    resultados = []
+    for nome, url in ENDPOINTS:
+        linha = {'endpoint': nome}
+        etag = None
+        for rotulo, cabecalho in CODIFICACOES:
+            resp = cliente.get(url, headers={'Accept-Encoding': cabecalho})
+            linha[rotulo] = len(resp.get_data())
+            if resp.headers.get('Content-Encoding', 'identity') != rotulo:
+                linha[rotulo + '_ignorado'] = True
+            etag = etag or resp.headers.get('ETag')
+        if etag:
+            resp = cliente.get(url, headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+            linha['revalidacao'] = len(resp.get_data()) if resp.status_code == 304 else None
+        resultados.append(linha)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede bytes na rede com e sem compressão.')
+    parser.add_argument('--auditorias', type=int, default=2000, help='Auditorias geradas')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    resultados = executar(args.auditorias)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'Endpoint':<16}{'sem':>10}{'gzip':>10}{'br':>10}{'redução':>10}{'304':>8}")
+    for r in resultados:
+        melhor = min(r['gzip'], r['br'])
+        reducao = f"{100 * (1 - melhor / r['identity']):.0f}%" if r['identity'] else '-'
+        revalidacao = '-' if r.get('revalidacao') is None else r['revalidacao']
+        print(f"{r['endpoint']:<16}{r['identity']:>10}{r['gzip']:>10}{r['br']:>10}{reducao:>10}{revalidacao:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Sistema I9 - Teste de Carga de Ponta a Ponta
+
+Usuários virtuais (threads, no estilo dos cenários do locust) executam o
+fluxo do consultor: login -> conectar_filial -> consultas e histórico, com
+pausa ("tempo de pensar") entre as ações. Ao final mostra, por endpoint,
+requisições, erros, vazão e latências p50/p95/p99.
+
+Sem --url, sobe localmente o simulador da Infosimples
+(benchmarks/simulador_upstream.py) e a aplicação num SQLite temporário
+apontada para ele: nenhuma chamada sai para a API paga.
+
+Uso:
+    python benchmarks/carga_consultas.py --usuarios 20 --duracao 60
+    python benchmarks/carga_consultas.py --perfis benchmarks/fixtures/simulador_perfis.json --escala 0.2
+    python benchmarks/carga_consultas.py --url http://127.0.0.1:5000 --email ... --senha ... --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.simulador_upstream import FONTES_SIMULADOR, carregar_perfis, contagem, iniciar_simulador
+
+UFS = ('SP', 'RJ', 'MG', 'PR')
+
+
+# ============================================================================
+# CENÁRIO
+# ============================================================================
+
+class Metricas:
+    """Latências (ms) e erros por endpoint, compartilhados entre os usuários."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(int)
+
+    def registrar(self, nome, ms, erro):
+        with self._lock:
+            self.latencias[nome].append(ms)
+            self.erros[nome] += erro
+
+    def resumo(self, decorrido):
+        def percentil(valores, p):
+            return round(valores[min(int(p / 100 * len(valores)), len(valores) - 1)], 1)
+
+        resumo = {}
+        with self._lock:
+            for nome, valores in sorted(self.latencias.items()):
+                valores = sorted(valores)
+                resumo[nome] = {
+                    'requisicoes': len(valores),
+                    'erros': self.erros[nome],
+                    'por_s': round(len(valores) / decorrido, 2),
+                    'p50_ms': percentil(valores, 50),
+                    'p95_ms': percentil(valores, 95),
+                    'p99_ms': percentil(valores, 99),
+                }
+        return resumo
+
+
+def _sucesso_json(resp):
+    return resp.json().get('sucesso', False)
+
+
+def _sucesso_ndjson(resp):
+    """Última linha do stream: {"fim": true, "sucesso": ...}."""
+    ultima = resp.content.strip().rsplit(b'\n', 1)[-1]
+    return json.loads(ultima or b'{}').get('sucesso', False)
+
+
+def _login_aceito(resp):
+    """Login certo redireciona para o dashboard; o errado volta ao formulário."""
+    return resp.is_redirect and '/login' not in resp.headers.get('Location', '')
+
+
+class UsuarioVirtual:
+    """Um consultor: entra, conecta a filial e alterna consultas e histórico."""
+
+    # Peso de cada tarefa após o login (como @task(peso) no locust)
+    TAREFAS = (('consultar', 3), ('historico', 1))
+
+    def __init__(self, url, email, senha, filial_id, placas, metricas, pensar_ms, stream, aleatorio):
+        self.url = url.rstrip('/')
+        self.email, self.senha, self.filial_id = email, senha, filial_id
+        self.placas = placas
+        self.metricas = metricas
+        self.pensar_ms = pensar_ms
+        self.stream = stream
+        self.aleatorio = aleatorio
+        self.sessao = requests.Session()
+
+    def _medir(self, nome, metodo, caminho, valida=None, **kwargs):
+        """Executa a requisição e registra latência e erro (HTTP >= 400 ou sucesso=false)."""
+        inicio = time.perf_counter()
+        try:
+            resp = self.sessao.request(metodo, self.url + caminho, timeout=300, **kwargs)
+            erro = resp.status_code >= 400 or not (valida or _sucesso_json)(resp)
+        except (requests.RequestException, ValueError):
+            erro = True
+        self.metricas.registrar(nome, (time.perf_counter() - inicio) * 1000, erro)
+
+    def iniciar(self):
+        self._medir('login', 'POST', '/login', valida=_login_aceito, allow_redirects=False,
+                    data={'email': self.email, 'senha': self.senha})
+        self._medir('conectar_filial', 'POST', '/api/conectar_filial', data={'filial_id': self.filial_id})
+
+    def consultar(self):
+        placa, uf = self.aleatorio.choice(self.placas)
+        dados = {'placa_chassi': placa, 'uf': uf, 'tipo_busca': 'placa'}
+        if self.stream:
+            self._medir('consultar_stream', 'POST', '/api/consultar/stream', valida=_sucesso_ndjson, data=dados)
+        else:
+            self._medir('consultar', 'POST', '/api/consultar', data=dados)
+
+    def historico(self):
+        self._medir('historico', 'GET', '/api/historico?limite=50')
+
+    def executar(self, fim):
+        self.iniciar()
+        nomes = [nome for nome, _ in self.TAREFAS]
+        pesos = [peso for _, peso in self.TAREFAS]
+        while time.perf_counter() < fim:
+            getattr(self, self.aleatorio.choices(nomes, pesos)[0])()
+            if self.pensar_ms:
+                time.sleep(self.aleatorio.expovariate(1000 / self.pensar_ms))
+
+
+def gerar_placas(n, semente=0):
+    """Placas (Mercosul) e UFs fixas por semente, para repetir a mesma carga."""
+    aleatorio = random.Random(semente)
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return [(''.join(aleatorio.choices(letras, k=3)) + str(aleatorio.randint(0, 9)) +
+             aleatorio.choice(letras) + f'{aleatorio.randint(0, 99):02d}', aleatorio.choice(UFS))
+            for _ in range(n)]
+
+
+def executar_carga(url, email, senha, filial_id, usuarios, duracao, pensar_ms, placas, stream, semente):
+    metricas = Metricas()
+    rampa = min(duracao / 4, usuarios * 0.1)  # entrada escalonada dos usuários
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+
+    def iniciar_usuario(i):
+        time.sleep(rampa * i / max(usuarios, 1))
+        UsuarioVirtual(url, email, senha, filial_id, placas, metricas, pensar_ms, stream,
+                       random.Random(semente * 1000 + i)).executar(fim)
+
+    threads = [threading.Thread(target=iniciar_usuario, args=(i,)) for i in range(usuarios)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return metricas.resumo(time.perf_counter() - inicio)
+
+
+# ============================================================================
+# AMBIENTE LOCAL (SIMULADOR + APLICAÇÃO)
+# ============================================================================
+
+def iniciar_local(perfis, escala, semente):
+    """Sobe simulador e aplicação (SQLite temporário). Retorna (url, simulador, servidor)."""
+
+    simulador, url_simulador = iniciar_simulador(perfis=perfis, escala=escala, semente=semente)
+    os.environ.setdefault('CERT_FILIAL_1_PASS', 'carga')
+
+    from config import DevelopmentConfig, config
+
+    class CargaConfig(DevelopmentConfig):
+        DEBUG = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='i9_carga_'), 'carga.db')
+        SQLITE_MANUTENCAO_HORAS = 0
+        INFOSIMPLES_API_KEY = 'simulador'
+        INFOSIMPLES_URL = url_simulador + 'detran/restricoes'
+        INFOSIMPLES_URL_BASE = url_simulador
+        UPSTREAM_ROTAS = '*=infosimples'
+        RELATORIO_FONTES = FONTES_SIMULADOR
+
+    config['carga'] = CargaConfig
+    from app import create_app
+    app = create_app('carga')
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # sem log por requisição
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{servidor.server_port}', simulador, servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do fluxo de consulta (p50/p95/p99 por endpoint).')
+    parser.add_argument('--url', help='Aplicação já em execução (sem ela, sobe simulador + app locais)')
+    parser.add_argument('--email', default='admin@i9sistema.com')
+    parser.add_argument('--senha', default='admin123')
+    parser.add_argument('--filial', type=int, default=1, help='ID da filial a conectar')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuários virtuais simultâneos')
+    parser.add_argument('--duracao', type=float, default=30.0, help='Duração (s)')
+    parser.add_argument('--pensar-ms', type=float, default=500.0, help='Pausa média entre ações (ms)')
+    parser.add_argument('--placas', type=int, default=200, help='Placas distintas consultadas')
+    parser.add_argument('--stream', action='store_true', help='Usa /api/consultar/stream')
+    parser.add_argument('--perfis', help='JSON de perfis por UF do simulador')
+    parser.add_argument('--latencia', default='lognormal:800:3000', help='Latência padrão do simulador (ms)')
+    parser.add_argument('--erros', type=float, default=0.02, help='Fração de erros do simulador')
+    parser.add_argument('--escala', type=float, default=1.0, help='Multiplica as latências do simulador')
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    simulador = servidor = None
+    url = args.url
+    if not url:
+        perfis = carregar_perfis(args.perfis, args.latencia, args.erros)
+        url, simulador, servidor = iniciar_local(perfis, args.escala, args.semente)
+
+    resultados = {
+        'usuarios': args.usuarios,
+        'duracao_s': args.duracao,
+        'endpoints': executar_carga(url, args.email, args.senha, args.filial, args.usuarios, args.duracao,
+                                    args.pensar_ms, gerar_placas(args.placas, args.semente), args.stream,
+                                    args.semente)
+    }
+    if simulador is not None:
+        resultados['simulador'] = contagem(simulador)
+        servidor.shutdown()
+        simulador.shutdown()
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{args.usuarios} usuários, {args.duracao:g}s ({url})\n")
+    print(f"{'Endpoint':<20}{'req':>8}{'erros':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nome, r in resultados['endpoints'].items():
+        print(f"{nome:<20}{r['requisicoes']:>8}{r['erros']:>8}{r['por_s']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    if 'simulador' in resultados:
+        print('\nSimulador: ' + ', '.join(f'{k}={v}' for k, v in resultados['simulador'].items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Sistema I9 - Teste de Carga dos Perfis de Pool
+
+Simula N workers executando consultas curtas com um intervalo de "trabalho"
+entre checkouts e compara a vazão de cada perfil de pool.
+
+Uso:
+    DATABASE_URL=postgresql://... python benchmarks/carga_pool.py --threads 32 --duracao 15
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from app.database.pool import PERFIS_POOL, instrumentar_pool, opcoes_engine
+
+
+def executar_perfil(url, perfil, threads, duracao, trabalho_ms):
+    """Executa a carga para um perfil e retorna o resumo."""
+    engine = create_engine(url, **opcoes_engine(url, perfil))
+    metricas = instrumentar_pool(engine)
+    total = [0] * threads
+    erros = [0] * threads
+    fim = time.perf_counter() + duracao
+
+    def worker(indice):
+        while time.perf_counter() < fim:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('SELECT 1')).scalar()
+                total[indice] += 1
+            except Exception:
+                erros[indice] += 1
+            if trabalho_ms:
+                time.sleep(trabalho_ms / 1000)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    inicio = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    decorrido = time.perf_counter() - inicio
+    engine.dispose()
+
+    return {
+        'perfil': perfil,
+        'consultas': sum(total),
+        'erros': sum(erros),
+        'consultas_por_segundo': round(sum(total) / decorrido, 1),
+        'pool': metricas.resumo(),
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Compara a vazão dos perfis de pool.')
+    parser.add_argument('--url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--perfis', nargs='+', default=list(PERFIS_POOL))
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duracao', type=float, default=10.0)
+    parser.add_argument('--trabalho-ms', type=float, default=2.0,
+                        help='Tempo simulado de processamento entre consultas')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    if not args.url:
+        parser.error('Informe --url ou configure DATABASE_URL')
+
+    resultados = [
+        executar_perfil(args.url, perfil, args.threads, args.duracao, args.trabalho_ms)
+        for perfil in args.perfis
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'Perfil':<14}{'req/s':>10}{'erros':>8}{'pico':>6}{'espera média':>14}{'espera máx':>12}")
+    for r in resultados:
+        p = r['pool']
+        print(f"{r['perfil']:<14}{r['consultas_por_segundo']:>10}{r['erros']:>8}"
+              f"{p['pico_em_uso']:>6}{p['espera_media_ms']:>12}ms{p['espera_max_ms']:>10}ms")
+
+
+if __name__ == '__main__':
+    main()
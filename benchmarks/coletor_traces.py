@@ -0,0 +1,132 @@
+"""
+Sistema I9 - Coletor Local de Traces
+
+Substituto do Jaeger/OpenTelemetry Collector para desenvolvimento: recebe
+OTLP/HTTP com JSON em /v1/traces (RASTREIO_EXPORTADOR=otlp) e imprime cada
+trace como cascata, com o tempo de cada etapa e a posição dela na linha do
+tempo da requisição. Também lê o arquivo do exportador "arquivo".
+
+Uso:
+    python benchmarks/coletor_traces.py --porta 4318 --saida /tmp/traces.jsonl
+    python benchmarks/coletor_traces.py --arquivo .cache/traces.jsonl --filtro "POST /api/consultar"
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LARGURA = 40
+
+
+def traces_do_lote(corpo):
+    """{trace_id: [spans]} de um ExportTraceServiceRequest em JSON."""
+    traces = defaultdict(list)
+    for recurso in corpo.get('resourceSpans', []):
+        for escopo in recurso.get('scopeSpans', []):
+            for span in escopo.get('spans', []):
+                traces[span['traceId']].append(span)
+    return traces
+
+
+def cascata(trace_id, spans):
+    """Linhas da cascata: etapa (indentada pela hierarquia), duração e barra na linha do tempo."""
+    inicio = min(int(s['startTimeUnixNano']) for s in spans)
+    fim = max(int(s['endTimeUnixNano']) for s in spans)
+    total = max(fim - inicio, 1)
+    filhos = defaultdict(list)
+    ids = {s['spanId'] for s in spans}
+    for s in spans:
+        filhos[s.get('parentSpanId') if s.get('parentSpanId') in ids else None].append(s)
+
+    linhas = [f'trace {trace_id}  ({total / 1e6:.1f} ms)']
+
+    def visitar(pai, nivel):
+        for s in sorted(filhos[pai], key=lambda s: int(s['startTimeUnixNano'])):
+            comeco = int(s['startTimeUnixNano']) - inicio
+            duracao = int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])
+            pos = int(comeco / total * LARGURA)
+            barra = ' ' * pos + '█' * max(1, int(duracao / total * LARGURA))
+            erro = ' ✖ ' + s['status'].get('message', '') if s.get('status', {}).get('code') == 2 else ''
+            nome = '  ' * nivel + s['name']
+            linhas.append(f'  {nome:<44}{duracao / 1e6:>10.1f} ms  |{barra:<{LARGURA}}|{erro}')
+            visitar(s['spanId'], nivel + 1)
+
+    visitar(None, 0)
+    return linhas
+
+
+def _raiz(spans):
+    ids = {s['spanId'] for s in spans}
+    return next((s for s in spans if s.get('parentSpanId') not in ids), spans[0])
+
+
+def mostrar(corpo, filtro=None, saida=sys.stdout):
+    for trace_id, spans in traces_do_lote(corpo).items():
+        if filtro and filtro not in _raiz(spans)['name']:
+            continue
+        print('\n'.join(cascata(trace_id, spans)) + '\n', file=saida, flush=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/traces':
+            self.send_error(404)
+            return
+        corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            dados = json.loads(corpo)
+        except ValueError:
+            self.send_error(400, 'Apenas OTLP/HTTP com JSON')
+            return
+        with self.server.lock:
+            if self.server.saida:
+                with open(self.server.saida, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(dados, ensure_ascii=False) + '\n')
+            mostrar(dados, self.server.filtro)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_coletor(porta=4318, filtro=None, saida=None):
+    """Sobe o coletor numa thread. Retorna o servidor."""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), _Handler)
+    servidor.filtro, servidor.saida, servidor.lock = filtro, saida, threading.Lock()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coletor OTLP/JSON local que imprime os traces em cascata.')
+    parser.add_argument('--porta', type=int, default=4318)
+    parser.add_argument('--arquivo', help='Lê o arquivo do exportador "arquivo" em vez de escutar na porta')
+    parser.add_argument('--filtro', help='Só traces cujo span raiz contém o texto (ex.: "POST /api/consultar")')
+    parser.add_argument('--saida', help='Também grava os lotes recebidos (uma linha JSON por lote)')
+    args = parser.parse_args()
+
+    if args.arquivo:
+        with open(args.arquivo, encoding='utf-8') as f:
+            for linha in f:
+                if linha.strip():
+                    mostrar(json.loads(linha), args.filtro)
+        return
+
+    servidor = iniciar_coletor(args.porta, args.filtro, args.saida)
+    print(f'Coletor em http://127.0.0.1:{args.porta}/v1/traces '
+          f'(RASTREIO_EXPORTADOR=otlp RASTREIO_OTLP_URL=http://127.0.0.1:{args.porta})', file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Sistema I9 - Servidor DETRAN Local (mTLS) para Testes
+
+Gera uma CA de teste, o certificado do servidor (localhost) e um certificado
+de cliente em PKCS#12 (como o A1 das filiais), e sobe um servidor HTTPS que
+exige certificado de cliente. Com --medir, executa o ConectorDetran contra o
+servidor e mostra o tempo de handshake e o reuso de conexões do pool.
+
+Uso:
+    python benchmarks/detran_stub.py --porta 8443            # só o servidor
+    python benchmarks/detran_stub.py --medir 500 --threads 4  # servidor + medição
+
+Para usar com a aplicação:
+    DETRAN_ENDPOINTS=SP=https://localhost:8443/api
+    DETRAN_CA_BUNDLE=<pasta>/ca.pem
+    (cert_path da filial = <pasta>/cliente.pfx, senha "teste")
+"""
+
+import argparse
+import json
+import os
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENHA_CLIENTE = 'teste'
+
+
+# ============================================================================
+# CERTIFICADOS DE TESTE
+# ============================================================================
+
+def _certificado(nome, chave_publica, emissor, chave_emissor, ca=False, sans=None):
+    import ipaddress
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.x509.oid import NameOID
+
+    agora = datetime.utcnow()
+    construtor = x509.CertificateBuilder()\
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, nome)]))\
+        .issuer_name(emissor)\
+        .public_key(chave_publica)\
+        .serial_number(x509.random_serial_number())\
+        .not_valid_before(agora - timedelta(minutes=5))\
+        .not_valid_after(agora + timedelta(days=30))\
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+    if sans:
+        construtor = construtor.add_extension(x509.SubjectAlternativeName(
+            [x509.DNSName('localhost'), x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]
+        ), critical=False)
+    return construtor.sign(chave_emissor, hashes.SHA256())
+
+
+def gerar_certificados(pasta):
+    """Cria ca.pem, servidor.pem/servidor.key e cliente.pfx em `pasta`."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.serialization import (
+        BestAvailableEncryption, Encoding, NoEncryption, PrivateFormat, pkcs12
+    )
+    from cryptography.x509.oid import NameOID
+
+    os.makedirs(pasta, exist_ok=True)
+    chave_ca = ec.generate_private_key(ec.SECP256R1())
+    nome_ca = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'I9 CA de Teste')])
+    ca = _certificado('I9 CA de Teste', chave_ca.public_key(), nome_ca, chave_ca, ca=True)
+
+    chave_servidor = ec.generate_private_key(ec.SECP256R1())
+    servidor = _certificado('localhost', chave_servidor.public_key(), nome_ca, chave_ca, sans=True)
+
+    chave_cliente = ec.generate_private_key(ec.SECP256R1())
+    cliente = _certificado('FILIAL TESTE:00000000000101', chave_cliente.public_key(), nome_ca, chave_ca)
+
+    arquivos = {
+        'ca.pem': ca.public_bytes(Encoding.PEM),
+        'servidor.pem': servidor.public_bytes(Encoding.PEM),
+        'servidor.key': chave_servidor.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()),
+        'cliente.pfx': pkcs12.serialize_key_and_certificates(
+            b'filial-teste', chave_cliente, cliente, [ca], BestAvailableEncryption(SENHA_CLIENTE.encode())
+        ),
+    }
+    for nome, conteudo in arquivos.items():
+        with open(os.path.join(pasta, nome), 'wb') as f:
+            f.write(conteudo)
+    return {nome: os.path.join(pasta, nome) for nome in arquivos}
+
+
+# ============================================================================
+# SERVIDOR
+# ============================================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # mantém a conexão aberta (keep-alive)
+    latencia = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        sujeito = dict(x[0] for x in self.connection.getpeercert().get('subject', ()))
+        if partes.path.endswith('/health'):
+            return self._responder(200, {'ok': True, 'cliente': sujeito.get('commonName')})
+        if partes.path.endswith('/restricoes'):
+            if self.latencia:
+                time.sleep(self.latencia)
+            placa = parse_qs(partes.query).get('placa', [''])[0]
+            return self._responder(200, {
+                'placa': placa, 'existe_restricao': False, 'restricoes': [],
+                'cliente': sujeito.get('commonName')
+            })
+        self._responder(404, {'erro': 'não encontrado'})
+
+
+def iniciar_stub(certificados, porta=0, latencia=0.0):
+    """Sobe o servidor mTLS numa thread. Retorna (servidor, url_base)."""
+    contexto = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, cafile=certificados['ca.pem'])
+    contexto.load_cert_chain(certificados['servidor.pem'], certificados['servidor.key'])
+    contexto.verify_mode = ssl.CERT_REQUIRED
+
+    handler = type('Handler', (_Handler,), {'latencia': latencia})
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), handler)
+    servidor.daemon_threads = True
+    servidor.socket = contexto.wrap_socket(servidor.socket, server_side=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'https://localhost:{servidor.server_address[1]}/api'
+
+
+# ============================================================================
+# MEDIÇÃO
+# ============================================================================
+
+def medir(certificados, url, n, threads, tamanho_pool):
+    """Compara o conector com pool contra uma conexão nova por requisição."""
+    from app.conectores.detran import ConectorDetran, criar_contexto_pkcs12
+
+    filial = SimpleNamespace(
+        id=1, nome='Filial Teste', uf='SP', cert_path=certificados['cliente.pfx'],
+        get_cert_senha=lambda: SENHA_CLIENTE, simular_conexao_detran=lambda: {'sucesso': False}
+    )
+    conector = ConectorDetran({'SP': url}, ca_bundle=certificados['ca.pem'],
+                              tamanho_pool=tamanho_pool, intervalo_saude=0)
+    print('conectar():', conector.conectar(filial))
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda i: conector.requisitar(
+            filial, 'GET', '/restricoes', fields={'placa': f'TST{i:04d}'}
+        ).data, range(n)))
+    com_pool = n / (time.perf_counter() - inicio)
+
+    import urllib3
+    contexto, _ = criar_contexto_pkcs12(filial.cert_path, SENHA_CLIENTE, certificados['ca.pem'])
+    partes = urlsplit(url)
+    inicio = time.perf_counter()
+    for i in range(max(n // 10, 1)):
+        pool = urllib3.HTTPSConnectionPool(partes.hostname, partes.port, ssl_context=contexto, maxsize=1)
+        pool.request('GET', partes.path + '/restricoes', fields={'placa': 'NOVA'})
+        pool.close()
+    sem_pool = max(n // 10, 1) / (time.perf_counter() - inicio)
+
+    resumo = conector.resumo()['filiais']['1']
+    conector.fechar()
+    return {
+        'requisicoes_s_pool': round(com_pool, 1),
+        'requisicoes_s_conexao_nova': round(sem_pool, 1),
+        **resumo
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor DETRAN local com mTLS.')
+    parser.add_argument('--porta', type=int, default=8443)
+    parser.add_argument('--pasta', default=os.path.join(tempfile.gettempdir(), 'i9_detran_stub'))
+    parser.add_argument('--latencia', type=float, default=0.0, help='Atraso (s) das consultas')
+    parser.add_argument('--medir', type=int, default=0, help='Requisições de medição (0 = só servidor)')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--pool', type=int, default=4, help='Conexões por filial')
+    args = parser.parse_args()
+
+    certificados = gerar_certificados(args.pasta)
+    servidor, url = iniciar_stub(certificados, 0 if args.medir else args.porta, args.latencia)
+
+    if args.medir:
+        print(json.dumps(medir(certificados, url, args.medir, args.threads, args.pool), indent=2))
+        servidor.shutdown()
+        return
+
+    print(f'🔐 DETRAN de teste em {url}')
+    print(f'   DETRAN_ENDPOINTS=SP={url}')
+    print(f"   DETRAN_CA_BUNDLE={certificados['ca.pem']}")
+    print(f"   Certificado da filial: {certificados['cliente.pfx']} (senha \"{SENHA_CLIENTE}\")")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
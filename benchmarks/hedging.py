@@ -0,0 +1,116 @@
+"""
+Sistema I9 - Benchmark de Hedging entre Provedores
+
+Sobe dois servidores locais no formato da Infosimples: o primário responde
+rápido mas tem cauda longa (uma fração das respostas demora muito); o
+secundário é mais lento porém estável. Compara a latência (p50/p95/p99) do
+RoteadorProvedores com e sem hedging e quantas chamadas extras o hedge gerou.
+
+Uso:
+    python benchmarks/hedging.py -n 300 --cauda 0.1
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.conectores.provedores import Consulta, ProvedorInfosimples, RoteadorProvedores
+
+
+def iniciar_stub(latencia_ms, cauda=0.0, cauda_ms=0.0, semente=0):
+    """Servidor HTTP local no formato da Infosimples. Retorna (servidor, url)."""
+    aleatorio = random.Random(semente)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with lock:
+                lento = aleatorio.random() < cauda
+            time.sleep((cauda_ms if lento else latencia_ms) / 1000)
+            dados = json.dumps({'code': 200, 'data': [{'existe_restricao': False, 'restricoes': []}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}/restricoes'
+
+
+def _percentis(latencias):
+    ordenadas = sorted(latencias)
+    return {f'p{int(p * 100)}_ms': round(ordenadas[min(int(len(ordenadas) * p), len(ordenadas) - 1)], 1)
+            for p in (0.5, 0.95, 0.99)}
+
+
+def executar(url_primario, url_secundario, n, concorrencia, hedge):
+    primario = ProvedorInfosimples('token', url_primario, timeout=30)
+    secundario = type('ProvedorSecundario', (ProvedorInfosimples,), {'nome': 'secundario'})(
+        'token', url_secundario, timeout=30
+    )
+    roteador = RoteadorProvedores([primario, secundario], {'*': ['infosimples', 'secundario']},
+                                  hedge=hedge, min_amostras=20, workers=concorrencia * 2)
+
+    def consultar(i):
+        inicio = time.perf_counter()
+        roteador.consultar(Consulta(placa=f'HDG{i:04d}', uf='MG'))
+        return (time.perf_counter() - inicio) * 1000
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        latencias = list(executor.map(consultar, range(n)))
+
+    resumo = roteador.resumo()['provedores']
+    return {
+        'hedge': hedge,
+        **_percentis(latencias[20:] or latencias),  # descarta o aquecimento do p90
+        'chamadas_secundario': resumo['secundario']['chamadas'],
+        'respostas_secundario': resumo['secundario']['vitorias']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede o efeito do hedging na latência de cauda.')
+    parser.add_argument('-n', type=int, default=300, help='Consultas por cenário')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--latencia', type=float, default=40, help='Latência típica do primário (ms)')
+    parser.add_argument('--cauda', type=float, default=0.1, help='Fração de respostas lentas do primário')
+    parser.add_argument('--cauda-ms', type=float, default=1500, help='Latência das respostas lentas (ms)')
+    parser.add_argument('--secundario', type=float, default=120, help='Latência do secundário (ms)')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    _, url_primario = iniciar_stub(args.latencia, args.cauda, args.cauda_ms, semente=42)
+    _, url_secundario = iniciar_stub(args.secundario)
+
+    resultados = [executar(url_primario, url_secundario, args.n, args.concorrencia, hedge)
+                  for hedge in (False, True)]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'Hedge':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'chamadas 2º':>14}{'usadas 2º':>12}")
+    for r in resultados:
+        print(f"{'sim' if r['hedge'] else 'não':<8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['chamadas_secundario']:>14}{r['respostas_secundario']:>12}")
+
+
+if __name__ == '__main__':
+    main()
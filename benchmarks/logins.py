@@ -0,0 +1,84 @@
+"""
+Sistema I9 - Benchmark de Logins
+
+Mede verificações de senha por segundo (total e por núcleo) para diferentes
+métodos/custos de hash, com várias threads simultâneas, e opcionalmente o
+fluxo completo de POST /login com a política configurada.
+
+Uso:
+    python benchmarks/logins.py --threads 8 -n 200
+    python benchmarks/logins.py --metodos scrypt:16384:8:1,pbkdf2:sha256:310000 --login
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METODOS_PADRAO = 'scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000,pbkdf2:sha256:310000'
+
+
+def _vazao(n, threads, fn):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fn, range(n)))
+    return n / (time.perf_counter() - inicio)
+
+
+def medir_metodo(metodo, n, threads):
+    """Verificações/s de um método de hash com `threads` logins simultâneos."""
+    senha_hash = generate_password_hash('senha-benchmark', method=metodo)
+    vazao = _vazao(n, threads, lambda i: check_password_hash(senha_hash, 'senha-benchmark'))
+    nucleos = min(threads, os.cpu_count() or 1)
+    return {'metodo': metodo, 'logins_s': round(vazao, 1), 'logins_s_nucleo': round(vazao / nucleos, 1)}
+
+
+def medir_login(n, threads):
+    """POST /login completo (consulta do usuário, verificação e sessão)."""
+    from benchmarks.sqlite_vs_postgres import _criar_app
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix='i9_logins_'), 'bench.db')
+    app = _criar_app(f'sqlite:///{caminho}')
+
+    def login(_):
+        resp = app.test_client().post('/login', data={'email': 'admin@i9sistema.com', 'senha': 'admin123'})
+        assert resp.status_code == 302, resp.status_code
+
+    vazao = _vazao(n, threads, login)
+    nucleos = min(threads, os.cpu_count() or 1)
+    return {'metodo': 'POST /login (' + app.config['PASSWORD_HASH_METHOD'] + ')',
+            'logins_s': round(vazao, 1), 'logins_s_nucleo': round(vazao / nucleos, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede logins por segundo por custo de hash.')
+    parser.add_argument('--metodos', default=METODOS_PADRAO, help='Métodos do werkzeug, separados por vírgula')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Logins simultâneos')
+    parser.add_argument('-n', type=int, default=100, help='Logins por método')
+    parser.add_argument('--login', action='store_true', help='Mede também o fluxo HTTP de /login')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    resultados = [medir_metodo(m.strip(), args.n, args.threads) for m in args.metodos.split(',') if m.strip()]
+    if args.login:
+        resultados.append(medir_login(args.n, args.threads))
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f'{os.cpu_count()} núcleo(s), {args.threads} thread(s)')
+    print(f"{'Método':<40}{'logins/s':>12}{'por núcleo':>12}")
+    for r in resultados:
+        print(f"{r['metodo']:<40}{r['logins_s']:>12}{r['logins_s_nucleo']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Sistema I9 - Benchmark de Normalização das Respostas
+
+Lê o corpus de respostas gravadas (benchmarks/fixtures/respostas), confere
+que cada uma é normalizada sem erro (ou rejeitada, se marcada com
+"espera_erro") e mede:
+
+- parse: respostas/s por arquivo (payload já decodificado -> objetos tipados);
+- serialização do relatório completo: orjson direto nas dataclasses,
+  json da biblioteca padrão via para_dict e jsonify sem orjson (asdict).
+
+Uso:
+    python benchmarks/normalizacao.py
+    python benchmarks/normalizacao.py -n 20000 --json
+"""
+
+import argparse
+import dataclasses
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.conectores.normalizacao import (
+    PARSERS_SECAO, ErroFormato, RelatorioVeiculo, para_dict, parse_restricoes
+)
+from app.conectores.provedores import Consulta
+
+PASTA_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'respostas')
+
+
+def carregar_corpus(pasta=PASTA_FIXTURES):
+    corpus = []
+    for caminho in sorted(glob.glob(os.path.join(pasta, '*.json'))):
+        with open(caminho, encoding='utf-8') as f:
+            corpus.append((os.path.basename(caminho), json.load(f)))
+    return corpus
+
+
+def parser_da_fixture(fixture):
+    """Função sem argumentos que normaliza a resposta da fixture."""
+    resposta = fixture['resposta']
+    consulta = Consulta(placa=fixture['placa'], uf=fixture['uf'])
+    # Infosimples embrulha os registros em "data"; o DETRAN devolve o registro direto
+    dados = resposta['data'] if fixture['provedor'] == 'infosimples' else [resposta]
+
+    if fixture['secao'] == 'restricoes':
+        return lambda: parse_restricoes(dados[0] if dados else {}, consulta)
+    parser = PARSERS_SECAO[fixture['secao']]
+    return lambda: parser(dados)
+
+
+def _por_segundo(n, fn):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return round(n / (time.perf_counter() - inicio))
+
+
+def validar(corpus):
+    """Retorna (relatório montado com as fixtures válidas, lista de falhas)."""
+    relatorio = RelatorioVeiculo()
+    falhas = []
+    for nome, fixture in corpus:
+        try:
+            objeto = parser_da_fixture(fixture)()
+        except ErroFormato as e:
+            if not fixture.get('espera_erro'):
+                falhas.append(f'{nome}: {e}')
+            continue
+        if fixture.get('espera_erro'):
+            falhas.append(f'{nome}: deveria ter sido rejeitada')
+        elif fixture['secao'] == 'restricoes':
+            if not relatorio.encontrado:
+                relatorio.aplicar_restricoes(objeto)
+        else:
+            setattr(relatorio, fixture['secao'], objeto)
+    return relatorio, falhas
+
+
+def medir(corpus, n):
+    resultados = {'parse_por_s': {}}
+    for nome, fixture in corpus:
+        if fixture.get('espera_erro'):
+            continue
+        resultados['parse_por_s'][nome] = _por_segundo(n, parser_da_fixture(fixture))
+
+    relatorio, _ = validar(corpus)
+    serializacao = {
+        'json_para_dict': lambda: json.dumps(para_dict(relatorio), ensure_ascii=False, separators=(',', ':')),
+        'json_asdict': lambda: json.dumps(dataclasses.asdict(relatorio), separators=(',', ':')),
+    }
+    try:
+        import orjson
+        serializacao['orjson'] = lambda: orjson.dumps(relatorio)
+    except ImportError:
+        pass
+    resultados['serializacao_por_s'] = {nome: _por_segundo(n, fn) for nome, fn in serializacao.items()}
+    resultados['tamanho_json_bytes'] = len(json.dumps(para_dict(relatorio), ensure_ascii=False).encode())
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vazão do parse e da serialização das respostas gravadas.')
+    parser.add_argument('-n', type=int, default=5000, help='Repetições por medição')
+    parser.add_argument('--pasta', default=PASTA_FIXTURES, help='Pasta com as respostas gravadas')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+
+    corpus = carregar_corpus(args.pasta)
+    _, falhas = validar(corpus)
+    if falhas:
+        print('Falhas na normalização do corpus:')
+        for falha in falhas:
+            print(f'  - {falha}')
+        sys.exit(1)
+
+    resultados = medir(corpus, args.n)
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f'{len(corpus)} respostas gravadas normalizadas sem falhas\n')
+    print(f"{'Fixture':<48}{'parses/s':>12}")
+    for nome, valor in resultados['parse_por_s'].items():
+        print(f'{nome:<48}{valor:>12}')
+    print(f"\n{'Serialização do relatório':<48}{'por s':>12}")
+    for nome, valor in resultados['serializacao_por_s'].items():
+        print(f'{nome:<48}{valor:>12}')
+    print(f"\nTamanho do JSON: {resultados['tamanho_json_bytes']} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Sistema I9 - Benchmark do Relatório em Paralelo
+
+Monta o relatório com fontes simuladas (uma latência por seção) e compara o
+tempo total com a soma das latências, que seria o custo de consultar as fontes
+em sequência. Com --deadline, a fonte mais lenta estoura o prazo e a seção
+volta marcada como indisponível.
+
+Uso:
+    python benchmarks/relatorio.py --latencias 300,800,500,200,400
+    python benchmarks/relatorio.py --deadline 0.6
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.conectores.provedores import Consulta, ProvedorMock, RoteadorProvedores
+from app.conectores.relatorio import FonteMock, FonteRestricoes, MotorRelatorio
+
+SECOES = ['restricoes', 'multas', 'ipva', 'leilao', 'proprietarios']
+
+
+def executar(latencias, n, deadline):
+    roteador = RoteadorProvedores([ProvedorMock(latencias[0])], {'*': ['mock']}, hedge=False)
+    fontes = [FonteRestricoes(roteador)] + [FonteMock(s, ms) for s, ms in zip(SECOES[1:], latencias[1:])]
+    lenta = SECOES[latencias.index(max(latencias))]
+    deadlines = {lenta: deadline} if deadline else {}
+    motor = MotorRelatorio(fontes, deadlines=deadlines)
+
+    tempos, primeira_secao, indisponiveis = [], [], 0
+    for i in range(n):
+        inicio = time.perf_counter()
+        for j, (secao, dados, erro) in enumerate(motor.executar(Consulta(placa=f'REL{i:04d}', uf='SP'))):
+            if j == 0:
+                primeira_secao.append((time.perf_counter() - inicio) * 1000)
+            indisponiveis += erro is not None
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    return {
+        'fontes': dict(zip(SECOES, latencias)),
+        'soma_sequencial_ms': sum(latencias),
+        'total_medio_ms': round(sum(tempos) / n, 1),
+        'primeira_secao_media_ms': round(sum(primeira_secao) / n, 1),
+        'secoes_indisponiveis': indisponiveis,
+        'deadline': {lenta: deadline} if deadline else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo do relatório com fontes em paralelo.')
+    parser.add_argument('--latencias', default='300,800,500,200,400',
+                        help='Latência (ms) de restricoes,multas,ipva,leilao,proprietarios')
+    parser.add_argument('-n', type=int, default=5, help='Relatórios montados')
+    parser.add_argument('--deadline', type=float, default=0.0, help='Prazo (s) da fonte mais lenta')
+    args = parser.parse_args()
+
+    latencias = [float(x) for x in args.latencias.split(',')]
+    if len(latencias) != len(SECOES):
+        parser.error(f'informe {len(SECOES)} latências ({",".join(SECOES)})')
+
+    print(json.dumps(executar(latencias, args.n, args.deadline), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
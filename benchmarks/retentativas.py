@@ -0,0 +1,98 @@
+"""
+Sistema I9 - Benchmark das Retentativas
+
+Simula um provedor que falha de forma transitória (timeout) numa fração das
+chamadas e compara a taxa de consultas com sucesso sem e com a política de
+retentativas (backoff exponencial com jitter), além do tempo extra gasto.
+
+Uso:
+    python benchmarks/retentativas.py --falhas 0.3
+    python benchmarks/retentativas.py --falhas 0.5 --regras "timeout=3" --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.conectores.provedores import Consulta, ErroProvedor, ProvedorMock, RoteadorProvedores
+from app.conectores.retentativas import PoliticaRetentativa, parse_regras
+
+
+class ProvedorInstavel(ProvedorMock):
+    """ProvedorMock que devolve timeout em `falhas` (0 a 1) das chamadas."""
+
+    def __init__(self, falhas, latencia_ms=0, semente=42):
+        super().__init__(latencia_ms)
+        self.falhas = falhas
+        self._aleatorio = random.Random(semente)
+
+    def consultar(self, consulta):
+        if self._aleatorio.random() < self.falhas:
+            if self.latencia_ms:
+                time.sleep(self.latencia_ms / 1000)
+            raise ErroProvedor('Timeout na Infosimples', classe='timeout')
+        return super().consultar(consulta)
+
+
+def executar(falhas, n, latencia_ms, politica):
+    roteador = RoteadorProvedores([ProvedorInstavel(falhas, latencia_ms)], {'*': ['mock']},
+                                  hedge=False, politica=politica)
+    sucesso, tempos = 0, []
+    for i in range(n):
+        inicio = time.perf_counter()
+        try:
+            roteador.consultar(Consulta(placa=f'RET{i:04d}', uf='SP'))
+            sucesso += 1
+        except ErroProvedor:
+            pass
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        'sucesso_pct': round(100 * sucesso / n, 1),
+        'tempo_medio_ms': round(sum(tempos) / n, 1),
+        'p95_ms': round(tempos[int(0.95 * (n - 1))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Taxa de sucesso com e sem retentativas.')
+    parser.add_argument('--falhas', type=float, default=0.3, help='Fração de chamadas com timeout (0 a 1)')
+    parser.add_argument('-n', type=int, default=200, help='Consultas por cenário')
+    parser.add_argument('--latencia', type=int, default=5, help='Latência (ms) do provedor simulado')
+    parser.add_argument('--regras', default='timeout=2', help='Regras no formato de UPSTREAM_RETRY_REGRAS')
+    parser.add_argument('--base-ms', type=float, default=20, help='Base do backoff (ms)')
+    parser.add_argument('--max-ms', type=float, default=200, help='Espera máxima entre tentativas (ms)')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args()
+    logging.getLogger('app.conectores').setLevel(logging.ERROR)
+
+    politica = PoliticaRetentativa(parse_regras(args.regras, args.base_ms / 1000, args.max_ms / 1000),
+                                   prazo_total_s=30, aleatorio=random.Random(7))
+    resultados = {
+        'sem_retentativa': executar(args.falhas, args.n, args.latencia, None),
+        'com_retentativa': executar(args.falhas, args.n, args.latencia, politica),
+        'politica': politica.resumo()
+    }
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f'Provedor com {args.falhas:.0%} de timeouts, {args.n} consultas, regras "{args.regras}"\n')
+    print(f"{'Cenário':<20}{'sucesso %':>12}{'médio ms':>12}{'p95 ms':>12}")
+    for nome in ('sem_retentativa', 'com_retentativa'):
+        r = resultados[nome]
+        print(f"{nome:<20}{r['sucesso_pct']:>12}{r['tempo_medio_ms']:>12}{r['p95_ms']:>12}")
+    resumo = resultados['politica']
+    print(f"\nRetentativas: {resumo['retentativas']}  recuperadas: {resumo['recuperadas']}  "
+          f"esgotadas: {resumo['esgotadas']}")
+
+
+if __name__ == '__main__':
+    main()
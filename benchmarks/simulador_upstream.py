@@ -0,0 +1,337 @@
+"""
+Sistema I9 - Simulador Local da Infosimples (gravação e reprodução)
+
+Servidor HTTP que responde como a API da Infosimples (POST em
+/<serviço>/<seção>, ex.: /detran/restricoes, /detran/multas) a partir das
+respostas gravadas em benchmarks/fixtures/respostas. Placas sem gravação
+recebem uma resposta gravada da mesma seção, escolhida pela placa (sempre a
+mesma), com a placa trocada: substitui os "veículos simulados" do app.py
+antigo sem chamar a API paga.
+
+Latência, taxa de erros e códigos de erro são configuráveis por UF num JSON
+de perfis (as UFs herdam o que não definirem de "*"):
+
+    {
+      "*":  {"latencia": "lognormal:800:3000", "erros": 0.02, "codigos": [605, 609], "http_5xx": 0.005},
+      "RJ": {"latencia": "lognormal:2500:9000", "erros": 0.08},
+      "MG": {"latencia": "300-900"}
+    }
+
+Latência: "800" (fixa, ms), "300-900" (uniforme) ou "lognormal:mediana:p95".
+"erros" é a fração de respostas com `code` de erro (sorteado de "codigos");
+"http_5xx" a fração de respostas HTTP 503 sem JSON.
+
+Com --gravar, as consultas são repassadas à API real e as respostas com
+code 200 são salvas no corpus (sem token nem certificado) antes de servidas.
+
+Uso:
+    python benchmarks/simulador_upstream.py --porta 9000
+    python benchmarks/simulador_upstream.py --perfis benchmarks/fixtures/simulador_perfis.json --escala 0.1
+    python benchmarks/simulador_upstream.py --gravar https://api.infosimples.com/api/v2/consultas/
+
+Para usar com a aplicação:
+    INFOSIMPLES_API_KEY=simulador
+    INFOSIMPLES_URL=http://127.0.0.1:9000/detran/restricoes
+    INFOSIMPLES_URL_BASE=http://127.0.0.1:9000/
+    UPSTREAM_ROTAS=*=infosimples
+    RELATORIO_FONTES=multas=infosimples:detran/multas;ipva=infosimples:sefaz/ipva;leilao=infosimples:leilao;proprietarios=infosimples:detran/proprietarios
+"""
+
+import argparse
+import copy
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASTA_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'respostas')
+SECOES = ('restricoes', 'multas', 'ipva', 'leilao', 'proprietarios')
+CAMPOS_SIGILOSOS = ('token', 'pkcs12_cert', 'pkcs12_pass')
+
+FONTES_SIMULADOR = ('multas=infosimples:detran/multas;ipva=infosimples:sefaz/ipva;'
+                    'leilao=infosimples:leilao;proprietarios=infosimples:detran/proprietarios')
+
+
+# ============================================================================
+# PERFIS
+# ============================================================================
+
+@dataclass(frozen=True)
+class Latencia:
+    tipo: str = 'fixa'      # fixa, uniforme ou lognormal
+    a: float = 0.0          # ms: valor fixo, mínimo ou mediana
+    b: float = 0.0          # ms: máximo ou p95
+
+    @staticmethod
+    def parse(valor):
+        valor = str(valor).strip()
+        if valor.startswith('lognormal:'):
+            mediana, p95 = valor.split(':')[1:3]
+            return Latencia('lognormal', float(mediana), float(p95))
+        if '-' in valor:
+            minimo, maximo = valor.split('-', 1)
+            return Latencia('uniforme', float(minimo), float(maximo))
+        return Latencia('fixa', float(valor or 0))
+
+    def amostrar(self, aleatorio):
+        """Latência em segundos."""
+        if self.tipo == 'uniforme':
+            return aleatorio.uniform(self.a, self.b) / 1000
+        if self.tipo == 'lognormal':
+            # p95 = mediana * e^(1.645 * sigma)
+            sigma = math.log(max(self.b, self.a) / self.a) / 1.645 if self.a else 0.0
+            return aleatorio.lognormvariate(math.log(self.a or 1), sigma) / 1000
+        return self.a / 1000
+
+
+@dataclass(frozen=True)
+class Perfil:
+    latencia: Latencia = Latencia()
+    erros: float = 0.0
+    codigos: tuple = (605, 609)
+    http_5xx: float = 0.0
+
+
+def carregar_perfis(caminho=None, latencia='0', erros=0.0, http_5xx=0.0):
+    """Perfis por UF ('*' = padrão) do JSON `caminho`, sobre os valores da linha de comando."""
+    padrao = Perfil(Latencia.parse(latencia), erros, (605, 609), http_5xx)
+    config = {}
+    if caminho:
+        with open(caminho, encoding='utf-8') as f:
+            config = json.load(f)
+
+    def perfil(base, valores):
+        campos = {}
+        if 'latencia' in valores:
+            campos['latencia'] = Latencia.parse(valores['latencia'])
+        if 'codigos' in valores:
+            campos['codigos'] = tuple(int(c) for c in valores['codigos'])
+        for chave in ('erros', 'http_5xx'):
+            if chave in valores:
+                campos[chave] = float(valores[chave])
+        return replace(base, **campos)
+
+    perfis = {'*': perfil(padrao, config.get('*', {}))}
+    for uf, valores in config.items():
+        if uf != '*':
+            perfis[uf.upper()] = perfil(perfis['*'], valores)
+    return perfis
+
+
+# ============================================================================
+# ACERVO DE RESPOSTAS GRAVADAS
+# ============================================================================
+
+class Acervo:
+    """Respostas da Infosimples gravadas, por seção e placa."""
+
+    def __init__(self, pasta=PASTA_FIXTURES):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        self.por_placa = {}                       # (secao, placa) -> resposta
+        self.por_secao = {s: [] for s in SECOES}  # secao -> [resposta]
+        for caminho in sorted(glob.glob(os.path.join(pasta, '*.json'))):
+            with open(caminho, encoding='utf-8') as f:
+                fixture = json.load(f)
+            if fixture.get('provedor') == 'infosimples' and not fixture.get('espera_erro'):
+                self._indexar(fixture)
+
+    def _indexar(self, fixture):
+        self.por_placa[(fixture['secao'], fixture['placa'].upper())] = fixture['resposta']
+        self.por_secao.setdefault(fixture['secao'], []).append(fixture['resposta'])
+
+    def resposta(self, secao, placa, uf):
+        """Gravação da placa, ou uma gravação da seção adaptada para a placa."""
+        placa = placa.upper()
+        gravada = self.por_placa.get((secao, placa))
+        if gravada is not None:
+            return copy.deepcopy(gravada)
+        candidatas = self.por_secao.get(secao)
+        if not candidatas:
+            return None
+        indice = int(hashlib.sha1(f'{secao}:{placa}'.encode()).hexdigest(), 16) % len(candidatas)
+        resposta = copy.deepcopy(candidatas[indice])
+        for registro in resposta.get('data') or []:
+            if isinstance(registro, dict) and 'placa' in registro:
+                registro['placa'] = placa
+        parametros = resposta.get('header', {}).get('parameters')
+        if isinstance(parametros, dict):
+            parametros.update(placa=placa, uf=uf)
+        return resposta
+
+    def gravar(self, secao, placa, uf, resposta):
+        """Salva a resposta real no corpus (mesmo formato das fixtures)."""
+        parametros = resposta.get('header', {}).get('parameters')
+        if isinstance(parametros, dict):
+            for campo in CAMPOS_SIGILOSOS:
+                parametros.pop(campo, None)
+        fixture = {'provedor': 'infosimples', 'secao': secao, 'placa': placa.upper(), 'uf': uf,
+                   'resposta': resposta}
+        caminho = os.path.join(self.pasta, f'gravado_{secao}_{placa.upper()}.json')
+        with self._lock:
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump(fixture, f, ensure_ascii=False, indent=2)
+            self._indexar(fixture)
+
+
+# ============================================================================
+# SERVIDOR
+# ============================================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # mantém a conexão aberta (keep-alive)
+    acervo = None
+    perfis = None
+    escala = 1.0
+    gravar = None       # URL base da API real (modo gravação)
+    aleatorio = None
+    lock = None
+    contagem = None
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo, tipo='application/json'):
+        dados = corpo if isinstance(corpo, bytes) else json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _sortear(self):
+        with self.lock:
+            return self.aleatorio.random(), self.aleatorio.random()
+
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip('/') == '/_simulador':
+            with self.lock:
+                return self._responder(200, {f'{s}:{r}': n for (s, r), n in sorted(self.contagem.items())})
+        self._responder(404, {'code': 404, 'code_message': 'Rota inexistente no simulador'})
+
+    def do_POST(self):
+        caminho = urlsplit(self.path).path.strip('/')
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(tamanho).decode('utf-8')).items()}
+        secao = next((p for p in reversed(caminho.split('/')) if p in SECOES), None)
+        placa, uf = form.get('placa', ''), form.get('uf', 'SP').upper()
+
+        if secao is None:
+            return self._responder(404, {'code': 404, 'code_message': f'Serviço desconhecido: {caminho}'})
+        if not form.get('token'):
+            return self._contar(secao, 'token', {'code': 601, 'code_message': 'Token inválido'})
+
+        inicio = time.perf_counter()
+        perfil = self.perfis.get(uf, self.perfis['*'])
+        with self.lock:
+            espera = perfil.latencia.amostrar(self.aleatorio) * self.escala
+        sorteio_5xx, sorteio_erro = self._sortear()
+
+        if self.gravar:
+            resposta = self._repassar(caminho, form, secao, placa, uf)
+        else:
+            time.sleep(espera)
+            if sorteio_5xx < perfil.http_5xx:
+                with self.lock:
+                    self.contagem[(secao, 'http_5xx')] += 1
+                return self._responder(503, b'<html>Service Unavailable</html>', 'text/html')
+            if sorteio_erro < perfil.erros:
+                with self.lock:
+                    codigo = self.aleatorio.choice(perfil.codigos)
+                return self._contar(secao, f'code_{codigo}', {
+                    'code': codigo, 'code_message': 'Erro simulado', 'data_count': 0, 'data': []
+                })
+            resposta = self.acervo.resposta(secao, placa, uf)
+
+        if resposta is None:
+            return self._contar(secao, 'sem_gravacao', {
+                'code': 612, 'code_message': f'Sem respostas gravadas para {secao}', 'data_count': 0, 'data': []
+            })
+        if isinstance(resposta.get('header'), dict):
+            resposta['header']['elapsed_time_in_milliseconds'] = round((time.perf_counter() - inicio) * 1000)
+            resposta['header']['billable'] = bool(self.gravar)
+        codigo = resposta.get('code', 200)
+        self._contar(secao, ('gravada' if self.gravar else 'ok') if codigo == 200 else f'code_{codigo}', resposta)
+
+    def _contar(self, secao, resultado, corpo):
+        with self.lock:
+            self.contagem[(secao, resultado)] += 1
+        self._responder(200, corpo)
+
+    def _repassar(self, caminho, form, secao, placa, uf):
+        """Modo gravação: consulta a API real e salva a resposta com code 200."""
+        import requests
+        resposta = requests.post(self.gravar.rstrip('/') + '/' + caminho, data=form, timeout=300).json()
+        if resposta.get('code') == 200:
+            self.acervo.gravar(secao, placa, uf, copy.deepcopy(resposta))
+        return resposta
+
+
+def iniciar_simulador(pasta=PASTA_FIXTURES, perfis=None, porta=0, escala=1.0, gravar=None, semente=None):
+    """Sobe o simulador numa thread. Retorna (servidor, url_base)."""
+    handler = type('Handler', (_Handler,), {
+        'acervo': Acervo(pasta),
+        'perfis': perfis or carregar_perfis(),
+        'escala': escala,
+        'gravar': gravar,
+        'aleatorio': random.Random(semente),
+        'lock': threading.Lock(),
+        'contagem': Counter(),
+    })
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}/'
+
+
+def contagem(servidor):
+    """Respostas servidas por seção e resultado."""
+    handler = servidor.RequestHandlerClass
+    with handler.lock:
+        return {f'{s}:{r}': n for (s, r), n in sorted(handler.contagem.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador local da Infosimples (gravação e reprodução).')
+    parser.add_argument('--porta', type=int, default=9000)
+    parser.add_argument('--pasta', default=PASTA_FIXTURES, help='Corpus de respostas gravadas')
+    parser.add_argument('--perfis', help='JSON de latência/erros por UF')
+    parser.add_argument('--latencia', default='lognormal:800:3000', help='Latência padrão (ms)')
+    parser.add_argument('--erros', type=float, default=0.0, help='Fração padrão de respostas com code de erro')
+    parser.add_argument('--http-5xx', type=float, default=0.0, help='Fração padrão de HTTP 503')
+    parser.add_argument('--escala', type=float, default=1.0, help='Multiplica as latências (ex.: 0.1)')
+    parser.add_argument('--semente', type=int, help='Semente dos sorteios (reprodutível)')
+    parser.add_argument('--gravar', help='URL base da API real: repassa e grava as respostas')
+    args = parser.parse_args()
+
+    perfis = carregar_perfis(args.perfis, args.latencia, args.erros, args.http_5xx)
+    servidor, url = iniciar_simulador(args.pasta, perfis, args.porta, args.escala, args.gravar, args.semente)
+
+    acervo = servidor.RequestHandlerClass.acervo
+    print(f"🛰️  Simulador da Infosimples em {url} ({'gravando de ' + args.gravar if args.gravar else 'reprodução'})")
+    print('   Gravações: ' + ', '.join(f'{s}={len(r)}' for s, r in acervo.por_secao.items()))
+    print('   Perfis: ' + ', '.join(f'{uf}={p.latencia.tipo}:{p.latencia.a:g}/{p.latencia.b:g} erros={p.erros:g}'
+                                    for uf, p in perfis.items()))
+    print(f'   INFOSIMPLES_URL={url}detran/restricoes')
+    print(f'   INFOSIMPLES_URL_BASE={url}')
+    print(f'   RELATORIO_FONTES={FONTES_SIMULADOR}')
+    print(f'   Contagem: GET {url}_simulador')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+/** Sistema I9 - Tailwind: só as classes usadas nos templates e scripts entram no bundle */
+module.exports = {
+  content: [
+    './app/templates/**/*.html',
+    './app/static/js/**/*.js',
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
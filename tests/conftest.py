@@ -0,0 +1,58 @@
+"""
+Sistema I9 - Fixtures dos Testes
+
+Cada teste recebe uma aplicação própria (TestingConfig: SQLite em memória,
+provedores mock, sem threads em segundo plano) com o admin e a filial
+padrão criados por create_app.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CERT_FILIAL_1_PASS', 'teste')
+
+ADMIN_EMAIL = 'admin@i9sistema.com'
+ADMIN_SENHA = 'admin123'
+
+
+@pytest.fixture
+def criar_app():
+    """Fábrica de aplicações de teste: criar_app(CHAVE=valor, ...) sobrescreve a configuração."""
+    from config import TestingConfig, config
+    from app import create_app
+
+    def criar(**sobrescritas):
+        config['teste'] = type('TesteConfig', (TestingConfig,), sobrescritas)
+        return create_app('teste')
+
+    yield criar
+    config.pop('teste', None)
+
+    # O db é global: sem isso o bind da réplica de um teste vaza para o seguinte
+    from app.extensions import db
+    for chave in [chave for chave in db.metadatas if chave is not None]:
+        del db.metadatas[chave]
+
+
+@pytest.fixture
+def app(criar_app):
+    app = criar_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def cliente(app):
+    """Cliente logado como admin e conectado à filial padrão."""
+    cliente = app.test_client()
+    entrar(cliente)
+    return cliente
+
+
+def entrar(cliente, email=ADMIN_EMAIL, senha=ADMIN_SENHA, filial_id=1):
+    cliente.post('/login', data={'email': email, 'senha': senha}).close()
+    if filial_id is not None:
+        cliente.post('/api/conectar_filial', data={'filial_id': filial_id}).close()
@@ -0,0 +1,93 @@
+"""
+Testes da paginação por cursor do histórico (/api/historico): ordem
+(data_consulta desc, id desc), sem repetir nem pular itens com datas iguais.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def consultas(app):
+    """
+    7 auditorias do admin (3 no mesmo instante, 3 com erro) e 1 de outro
+    usuário. Retorna os IDs do admin na ordem do histórico.
+    """
+    from app.extensions import db
+    from app.models import Auditoria, Usuario
+
+    base = datetime(2024, 5, 10, 12, 0, 0)
+    datas = [base - timedelta(minutes=m) for m in (0, 5, 5, 5, 10, 20, 30)]
+    auditorias = [Auditoria(usuario_id=1, filial_id=1, placa_chassi=f'ABC{i:04d}', tipo_busca='placa',
+                            resultado='ok', status='erro' if i in (2, 3, 5) else 'sucesso',
+                            data_consulta=data)
+                  for i, data in enumerate(datas)]
+    outro = Usuario(nome='Outro', email='outro@i9sistema.com', senha_hash='x', role='consultor', ativo=True)
+    db.session.add_all([*auditorias, outro])
+    db.session.commit()
+    db.session.add(Auditoria(usuario_id=outro.id, filial_id=1, placa_chassi='XYZ9999', tipo_busca='placa',
+                             resultado='ok', status='sucesso', data_consulta=base))
+    db.session.commit()
+    return [a.id for a in sorted(auditorias, key=lambda a: (a.data_consulta, a.id), reverse=True)]
+
+
+def _paginas(cliente, **params):
+    """Percorre o histórico seguindo proximo_cursor. Retorna a lista de páginas (IDs)."""
+    paginas, cursor = [], None
+    while True:
+        consulta = dict(params, cursor=cursor) if cursor else params
+        dados = cliente.get('/api/historico', query_string=consulta).get_json()
+        assert dados['sucesso'] is True
+        paginas.append([c['id'] for c in dados['consultas']])
+        cursor = dados['proximo_cursor']
+        if not cursor:
+            return paginas
+
+
+def test_cursor_percorre_tudo_em_ordem_sem_repetir(cliente, consultas):
+    paginas = _paginas(cliente, limite=2)
+
+    assert [len(p) for p in paginas] == [2, 2, 2, 1]
+    assert [i for p in paginas for i in p] == consultas
+
+
+def test_ultima_pagina_cheia_nao_tem_cursor(cliente, consultas):
+    paginas = _paginas(cliente, limite=7)
+
+    assert paginas == [consultas]
+
+
+def test_cursor_respeita_filtros(cliente, consultas):
+    from app.models import Auditoria
+
+    com_erro = {a.id for a in Auditoria.query.filter_by(status='erro')}
+    paginas = _paginas(cliente, limite=1, status='erro')
+
+    assert [i for p in paginas for i in p] == [i for i in consultas if i in com_erro]
+    assert len(paginas) == 3
+
+
+def test_cursor_invalido_volta_para_a_primeira_pagina(cliente, consultas):
+    dados = cliente.get('/api/historico', query_string={'limite': 2, 'cursor': '!!lixo!!'}).get_json()
+
+    assert [c['id'] for c in dados['consultas']] == consultas[:2]
+
+
+@pytest.mark.parametrize('limite, esperado', [(0, 1), (-5, 1), (500, 7)])
+def test_limite_fica_entre_1_e_200(cliente, consultas, limite, esperado):
+    dados = cliente.get('/api/historico', query_string={'limite': limite}).get_json()
+
+    assert len(dados['consultas']) == esperado
+
+
+def test_etag_muda_com_nova_consulta(app, cliente, consultas):
+    from app.models import Auditoria
+
+    etag = cliente.get('/api/historico').headers['ETag']
+    assert cliente.get('/api/historico', headers={'If-None-Match': etag}).status_code == 304
+
+    Auditoria.registrar(1, 1, 'NOV0001', 'placa', 'ok')
+    resposta = cliente.get('/api/historico', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['consultas'][0]['placa_chassi'] == 'NOV0001'
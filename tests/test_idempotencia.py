@@ -0,0 +1,132 @@
+"""
+Testes das chaves de idempotência de /api/consultar (header Idempotency-Key):
+a repetição devolve a resposta gravada sem nova chamada aos provedores.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import entrar
+
+CHAVE = 'consulta-0001'
+CONSULTA = {'placa_chassi': 'ABC1234', 'uf': 'SP'}
+
+
+@pytest.fixture
+def chamadas(monkeypatch):
+    """Conta as consultas aos provedores; `falhas` faz as próximas N falharem."""
+    from app.routes import consulta
+
+    original = consulta.consultar_veiculo_api
+    contador = {'total': 0, 'falhas': 0}
+
+    def consultar_veiculo_api(*args, **kwargs):
+        contador['total'] += 1
+        if contador['falhas']:
+            contador['falhas'] -= 1
+            raise RuntimeError('provedor fora do ar')
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(consulta, 'consultar_veiculo_api', consultar_veiculo_api)
+    return contador
+
+
+def _consultar(cliente, chave=CHAVE, **dados):
+    resposta = cliente.post('/api/consultar', data=dict(CONSULTA, **dados), headers={'Idempotency-Key': chave})
+    return resposta, resposta.get_json()
+
+
+def test_repeticao_devolve_a_resposta_gravada(app, cliente, chamadas):
+    from app.models import Auditoria
+
+    primeira, corpo = _consultar(cliente)
+    repetida, corpo_repetido = _consultar(cliente)
+
+    assert corpo['sucesso'] is True
+    assert 'Idempotent-Replayed' not in primeira.headers
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert corpo_repetido == corpo
+    assert chamadas['total'] == 1
+    assert Auditoria.query.filter_by(status='cache').count() == 1
+
+
+def test_chave_pelo_campo_do_formulario(cliente, chamadas):
+    for _ in range(2):
+        corpo = cliente.post('/api/consultar', data=dict(CONSULTA, chave_idempotencia=CHAVE)).get_json()
+        assert corpo['sucesso'] is True
+    assert chamadas['total'] == 1
+
+
+def test_mesma_chave_com_outra_consulta_e_rejeitada(cliente, chamadas):
+    _consultar(cliente)
+    _, corpo = _consultar(cliente, placa_chassi='DEF5678')
+
+    assert corpo == {'sucesso': False, 'erro': 'Chave de idempotência já usada em outra consulta.'}
+    assert chamadas['total'] == 1
+
+
+@pytest.mark.parametrize('chave', ['curta', 'com espaço no meio', 'x' * 65])
+def test_chave_invalida(cliente, chamadas, chave):
+    _, corpo = _consultar(cliente, chave=chave)
+
+    assert corpo == {'sucesso': False, 'erro': 'Chave de idempotência inválida (8 a 64 caracteres).'}
+    assert chamadas['total'] == 0
+
+
+def test_falha_libera_a_chave(app, cliente, chamadas):
+    from app.models import ChaveIdempotencia
+
+    chamadas['falhas'] = 1
+    _, corpo = _consultar(cliente)
+    assert corpo['sucesso'] is False
+    assert ChaveIdempotencia.query.count() == 0
+
+    resposta, corpo = _consultar(cliente)
+    assert corpo['sucesso'] is True
+    assert 'Idempotent-Replayed' not in resposta.headers
+    assert chamadas['total'] == 2
+
+
+def test_consulta_em_andamento_aguarda_ate_o_limite(criar_app, chamadas):
+    from app.models import ChaveIdempotencia
+
+    app = criar_app(IDEMPOTENCIA_ESPERA_S=0.3)
+    with app.app_context():
+        cliente = app.test_client()
+        entrar(cliente)
+        # Reserva da "consulta original", ainda sem resposta
+        impressao = ChaveIdempotencia.calcular_impressao(1, 'ABC1234', 'SP', '', '', 'placa')
+        _, nova = ChaveIdempotencia.reservar(1, CHAVE, impressao)
+        assert nova
+
+        _, corpo = _consultar(cliente)
+
+    assert corpo == {'sucesso': False, 'erro': 'Consulta com esta chave ainda em andamento. Tente novamente.'}
+    assert chamadas['total'] == 0
+
+
+def test_chave_vencida_e_retomada(app, cliente, chamadas):
+    from app.extensions import db
+    from app.models import ChaveIdempotencia
+
+    _consultar(cliente)
+    ChaveIdempotencia.query.update({'expira_em': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    resposta, corpo = _consultar(cliente, placa_chassi='DEF5678')
+    assert corpo['sucesso'] is True
+    assert 'Idempotent-Replayed' not in resposta.headers
+    assert chamadas['total'] == 2
+    assert ChaveIdempotencia.query.one().status == ChaveIdempotencia.CONCLUIDA
+
+
+def test_limpar_expiradas(app):
+    from app.models import ChaveIdempotencia
+
+    registro, _ = ChaveIdempotencia.reservar(1, 'vencida-01', 'x')
+    ChaveIdempotencia.reservar(1, 'valida-001', 'x')
+    ChaveIdempotencia.concluir(registro.id, '{}', ttl_s=-1)
+
+    assert ChaveIdempotencia.limpar_expiradas() == 1
+    assert [c.chave for c in ChaveIdempotencia.query] == ['valida-001']
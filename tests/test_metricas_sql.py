@@ -0,0 +1,84 @@
+"""
+Testes do contador de SQL (app.database.metricas_sql): esperar_consultas
+trava o número de comandos das listas de auditoria (sem N+1).
+"""
+
+import pytest
+
+from app.database import esperar_consultas, registrar_consultas
+from app.database.metricas_sql import fingerprint
+from conftest import entrar
+
+
+@pytest.fixture
+def auditorias(app):
+    """25 auditorias de 5 consultores em 2 filiais."""
+    from app.extensions import db
+    from app.models import Auditoria, Filial, Usuario
+
+    filial = Filial(nome='Filial RJ', cnpj='00000000000202', uf='RJ', endereco='Rio de Janeiro - RJ',
+                    cert_path='/tmp/rj.pfx', ativa=True)
+    usuarios = [Usuario(nome=f'Consultor {i}', email=f'consultor{i}@i9sistema.com', senha_hash='x',
+                        role='consultor', ativo=True) for i in range(5)]
+    db.session.add_all([filial, *usuarios])
+    db.session.commit()
+    for i in range(25):
+        db.session.add(Auditoria(usuario_id=usuarios[i % 5].id, filial_id=(1, filial.id)[i % 2],
+                                 placa_chassi=f'ABC{i:04d}', tipo_busca='placa', resultado='ok',
+                                 status='sucesso'))
+    db.session.commit()
+    return 25
+
+
+@pytest.mark.parametrize('url, maximo', [
+    ('/admin/auditoria/json', 4),
+    ('/admin/auditoria/excel', 4),
+    ('/admin/auditoria', 6),
+])
+def test_listas_de_auditoria_sem_n_mais_um(app, auditorias, url, maximo):
+    cliente = app.test_client()
+    entrar(cliente, filial_id=None)
+
+    with esperar_consultas(maximo=maximo, repeticoes_max=1):
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    if url.endswith('/json'):
+        linhas = resposta.get_json()['auditorias']
+        assert len(linhas) == auditorias
+        assert {linha['usuario'] for linha in linhas} == {f'Consultor {i}' for i in range(5)}
+    elif url.endswith('/excel'):
+        assert resposta.get_data(as_text=True).count('ABC00') == auditorias
+
+
+def test_esperar_consultas_acusa_n_mais_um(app, auditorias):
+    from app.models import Auditoria
+
+    with pytest.raises(AssertionError, match='máximo 1'):
+        with esperar_consultas(repeticoes_max=1):
+            for auditoria in Auditoria.query.all():
+                auditoria.usuario.nome  # carga preguiçosa: um SELECT por consultor
+
+
+def test_esperar_consultas_acusa_total(app):
+    from app.models import Usuario
+
+    with pytest.raises(AssertionError, match='3 comandos SQL'):
+        with esperar_consultas(maximo=2):
+            for _ in range(3):
+                Usuario.query.filter_by(email='x').first()
+
+
+def test_registrar_consultas_agrupa_por_fingerprint(app):
+    from app.models import Usuario
+
+    with registrar_consultas() as executadas:
+        Usuario.query.filter(Usuario.id.in_([1, 2, 3])).all()
+        Usuario.query.filter(Usuario.id.in_([4])).all()
+    assert executadas.total == 2
+    assert len(executadas.por_fingerprint()) == 1
+
+
+def test_fingerprint_normaliza_literais_e_listas():
+    assert fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)") == \
+        fingerprint("SELECT *  FROM t WHERE a = 'yy' AND b IN (4)")
+    assert fingerprint('SELECT 1 FROM t') != fingerprint('SELECT 1 FROM u')
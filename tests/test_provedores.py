@@ -0,0 +1,137 @@
+"""
+Testes do RoteadorProvedores (app.conectores.provedores): rotas por UF,
+fallback quando um provedor falha e hedge pelo p90 do provedor mais lento.
+"""
+
+import threading
+
+import pytest
+
+from app.conectores.provedores import Consulta, ErroProvedor, ProvedorMock, RoteadorProvedores, parse_rotas
+
+
+class _Provedor(ProvedorMock):
+    """Provedor mock com nome próprio, erros programados e espera opcional por um Event."""
+
+    def __init__(self, nome, erros=(), espera=None, disponivel=True):
+        super().__init__()
+        self.nome = nome
+        self.erros = list(erros)
+        self.espera = espera
+        self._disponivel = disponivel
+        self.chamadas = 0
+
+    def disponivel(self, consulta):
+        return self._disponivel
+
+    def consultar(self, consulta):
+        self.chamadas += 1
+        if self.espera is not None:
+            self.espera.wait(5)
+        if self.erros:
+            raise self.erros.pop(0)
+        return super().consultar(consulta)
+
+
+def _roteador(*provedores, rotas='*=principal,reserva', **kwargs):
+    return RoteadorProvedores(provedores, parse_rotas(rotas), **kwargs)
+
+
+def _aquecer(roteador, nome, ms=10, amostras=20):
+    """Preenche a janela de latências até o mínimo que libera o hedge."""
+    for _ in range(amostras):
+        roteador.estatisticas[nome].registrar(ms)
+
+
+def test_parse_rotas():
+    assert parse_rotas(' sp = detran, infosimples ;*=infosimples;;lixo') == {
+        'SP': ['detran', 'infosimples'],
+        '*': ['infosimples']
+    }
+    assert parse_rotas('') == {}
+
+
+def test_candidatos_por_uf_com_rota_padrao():
+    roteador = _roteador(_Provedor('principal'), _Provedor('reserva'), _Provedor('fora', disponivel=False),
+                         rotas='SP=reserva,fora,inexistente;*=principal,reserva')
+
+    assert [p.nome for p in roteador.candidatos(Consulta('ABC1234', 'sp'))] == ['reserva']
+    assert [p.nome for p in roteador.candidatos(Consulta('ABC1234', 'MG'))] == ['principal', 'reserva']
+
+
+def test_erro_cai_no_proximo_provedor():
+    principal = _Provedor('principal', erros=[ErroProvedor('fora do ar', classe='http_5xx')])
+    reserva = _Provedor('reserva')
+    roteador = _roteador(principal, reserva)
+
+    resultado = roteador.consultar(Consulta('ABC1234', 'MG'))
+
+    assert resultado.provedor == 'reserva'
+    assert roteador.estatisticas['principal'].erros == 1
+    assert roteador.estatisticas['reserva'].vitorias == 1
+    assert roteador.estatisticas['reserva'].hedges == 0
+
+
+def test_todos_falham_propaga_o_ultimo_erro():
+    erro = ErroProvedor('reserva também caiu')
+    roteador = _roteador(_Provedor('principal', erros=[ErroProvedor('caiu')]), _Provedor('reserva', erros=[erro]))
+
+    with pytest.raises(ErroProvedor) as excinfo:
+        roteador.consultar(Consulta('ABC1234', 'MG'))
+    assert excinfo.value is erro
+
+
+def test_erro_inesperado_vira_erro_provedor():
+    roteador = _roteador(_Provedor('principal', erros=[RuntimeError('bug')]), rotas='*=principal')
+
+    with pytest.raises(ErroProvedor, match='Erro na consulta: bug'):
+        roteador.consultar(Consulta('ABC1234', 'MG'))
+
+
+def test_sem_candidatos():
+    roteador = _roteador(_Provedor('principal', disponivel=False), rotas='*=principal')
+
+    with pytest.raises(ErroProvedor, match='Nenhum provedor disponível para MG'):
+        roteador.consultar(Consulta('ABC1234', 'MG'))
+
+
+def test_hedge_dispara_apos_p90_e_fica_com_a_primeira_resposta():
+    lento = threading.Event()
+    principal, reserva = _Provedor('principal', espera=lento), _Provedor('reserva')
+    roteador = _roteador(principal, reserva)
+    _aquecer(roteador, 'principal', ms=10)
+
+    try:
+        resultado = roteador.consultar(Consulta('ABC1234', 'MG'))
+    finally:
+        lento.set()
+
+    assert resultado.provedor == 'reserva'
+    assert principal.chamadas == reserva.chamadas == 1
+    assert roteador.estatisticas['reserva'].hedges == 1
+    assert roteador.estatisticas['reserva'].vitorias == 1
+    assert roteador.estatisticas['principal'].vitorias == 0
+
+
+@pytest.mark.parametrize('hedge, amostras', [(True, 19), (False, 20)])
+def test_sem_hedge_espera_o_primeiro_provedor(hedge, amostras):
+    lento = threading.Event()
+    principal, reserva = _Provedor('principal', espera=lento), _Provedor('reserva')
+    roteador = _roteador(principal, reserva, hedge=hedge)
+    _aquecer(roteador, 'principal', ms=10, amostras=amostras)
+
+    threading.Timer(0.1, lento.set).start()
+    resultado = roteador.consultar(Consulta('ABC1234', 'MG'))
+
+    assert resultado.provedor == 'principal'
+    assert reserva.chamadas == 0
+    assert roteador.estatisticas['reserva'].hedges == 0
+
+
+def test_limite_hedge_usa_o_p90():
+    roteador = _roteador(_Provedor('principal'), _Provedor('reserva'), min_amostras=10)
+    for ms in range(10, 110, 10):
+        roteador.estatisticas['principal'].registrar(ms)
+
+    assert roteador._limite_hedge(roteador.provedores['principal']) == pytest.approx(0.1)
+    assert roteador._limite_hedge(roteador.provedores['reserva']) is None
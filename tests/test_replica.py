@@ -0,0 +1,170 @@
+"""
+Testes do roteamento de leituras para a réplica (app.database.replica),
+com dois SQLite: a réplica é uma cópia do primário em que as auditorias
+trazem "réplica" no resultado, para saber de onde veio cada leitura.
+"""
+
+import shutil
+import sqlite3
+
+import pytest
+
+from app.database.replica import RoteadorReplica
+from conftest import entrar
+
+
+@pytest.fixture
+def bancos(tmp_path):
+    return tmp_path / 'primario.db', tmp_path / 'replica.db'
+
+
+@pytest.fixture
+def app_replica(criar_app, bancos):
+    """Aplicação com réplica sincronizada (2 auditorias do admin em cada banco)."""
+    from app.extensions import db
+    from app.models import Auditoria
+
+    primario, replica = bancos
+    app = criar_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{primario}',
+                    DATABASE_REPLICA_URL=f'sqlite:///{replica}',
+                    DATABASE_REPLICA_MAX_LAG=30.0,
+                    DATABASE_REPLICA_CHECK_INTERVAL=0)
+    with app.app_context():
+        for placa in ('ABC1234', 'DEF5678'):
+            Auditoria.registrar(1, 1, placa, 'placa', 'primário')
+        db.session.remove()
+        db.engines[None].dispose()
+        shutil.copy(primario, replica)
+        with sqlite3.connect(replica) as conn:
+            conn.execute("UPDATE auditorias SET resultado = 'réplica'")
+        yield app
+
+
+def _origens(cliente):
+    resposta = cliente.get('/api/historico')
+    return {c['resultado_resumido'] for c in resposta.get_json()['consultas']}
+
+
+def test_leitura_vai_para_replica_sincronizada(app_replica):
+    cliente = app_replica.test_client()
+    entrar(cliente)
+
+    assert _origens(cliente) == {'réplica'}
+    roteador = app_replica.extensions['i9_replica']
+    assert roteador.leituras_replica > 0
+    assert roteador.resumo()['saudavel'] is True
+
+
+def test_replica_atrasada_volta_para_o_primario(app_replica, bancos):
+    with sqlite3.connect(bancos[1]) as conn:
+        conn.execute("UPDATE auditorias SET data_consulta = datetime(data_consulta, '-1 hour')")
+    cliente = app_replica.test_client()
+    entrar(cliente)
+
+    assert _origens(cliente) == {'primário'}
+    roteador = app_replica.extensions['i9_replica']
+    assert roteador.leituras_replica == 0
+    assert roteador.atraso >= 3600 - 1
+
+
+def test_replica_sem_auditorias_conta_como_atrasada(app_replica, bancos):
+    with sqlite3.connect(bancos[1]) as conn:
+        conn.execute('DELETE FROM auditorias')
+    cliente = app_replica.test_client()
+    entrar(cliente)
+
+    assert _origens(cliente) == {'primário'}
+    assert app_replica.extensions['i9_replica'].resumo()['atraso_s'] is None
+
+
+def test_replica_inacessivel_volta_para_o_primario(app_replica, bancos):
+    from app.extensions import db
+
+    db.engines['replica'].dispose()
+    bancos[1].unlink()
+    bancos[1].mkdir()  # o arquivo vira diretório: a conexão falha
+    cliente = app_replica.test_client()
+    entrar(cliente)
+
+    assert _origens(cliente) == {'primário'}
+    roteador = app_replica.extensions['i9_replica']
+    assert roteador.resumo()['saudavel'] is False
+    assert roteador.leituras_primario > 0
+
+
+def test_leitura_apos_escrita_fica_no_primario(app_replica):
+    cliente = app_replica.test_client()
+    entrar(cliente)
+    assert _origens(cliente) == {'réplica'}
+
+    cliente.post('/api/consultar', data={'placa_chassi': 'GHI9012', 'uf': 'SP'}).close()
+
+    # A consulta nova só existe no primário e o próprio usuário a vê
+    placas = [c['placa_chassi'] for c in cliente.get('/api/historico').get_json()['consultas']]
+    assert 'GHI9012' in placas
+
+    # Outra sessão (sem escrita recente) continua lendo da réplica
+    outro = app_replica.test_client()
+    entrar(outro)
+    assert _origens(outro) == {'réplica'}
+
+
+def test_escritas_nao_vao_para_a_replica(app_replica, bancos):
+    cliente = app_replica.test_client()
+    entrar(cliente)
+    cliente.post('/api/consultar', data={'placa_chassi': 'GHI9012', 'uf': 'SP'}).close()
+
+    with sqlite3.connect(bancos[1]) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM auditorias WHERE placa_chassi = 'GHI9012'").fetchone()[0] == 0
+    with sqlite3.connect(bancos[0]) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM auditorias WHERE placa_chassi = 'GHI9012'").fetchone()[0] == 1
+
+
+class _RoteadorMedido(RoteadorReplica):
+    """Atraso controlado pelo teste, sem banco."""
+
+    def __init__(self, atrasos, **kwargs):
+        super().__init__(_BancoFalso(), **kwargs)
+        self.atrasos = list(atrasos)
+        self.medicoes = 0
+
+    def medir_atraso(self):
+        self.medicoes += 1
+        atraso = self.atrasos.pop(0)
+        if isinstance(atraso, Exception):
+            raise atraso
+        return atraso
+
+
+class _BancoFalso:
+    engines = {'replica': object()}
+
+
+def test_atraso_medido_no_maximo_a_cada_intervalo():
+    roteador = _RoteadorMedido([1.0, 90.0], atraso_max=30.0, intervalo=60.0)
+
+    assert roteador.disponivel() is True
+    assert roteador.disponivel() is True  # ainda dentro do intervalo: não mede de novo
+    assert roteador.medicoes == 1
+
+    roteador._verificado_em -= 61
+    assert roteador.disponivel() is False
+    assert roteador.medicoes == 2
+
+
+def test_falha_na_medicao_desliga_a_replica_ate_a_proxima():
+    roteador = _RoteadorMedido([ConnectionError('recusada'), 0.0], atraso_max=30.0, intervalo=60.0)
+
+    assert roteador.disponivel() is False
+    assert roteador.atraso is None
+    roteador._verificado_em -= 61
+    assert roteador.disponivel() is True
+
+
+def test_sem_replica_configurada(app):
+    assert 'i9_replica' not in app.extensions
+    assert RoteadorReplica(_BancoSemReplica()).disponivel() is False
+
+
+class _BancoSemReplica:
+    engines = {}
@@ -0,0 +1,138 @@
+"""
+Testes das retentativas (app.conectores.retentativas): só erros com regra
+são repetidos, com full jitter e sem passar do prazo da consulta.
+"""
+
+import time
+
+import pytest
+
+from app.conectores.provedores import Consulta, ErroProvedor, ProvedorMock, RoteadorProvedores
+from app.conectores.retentativas import PoliticaRetentativa, RegraRetentativa, parse_regras
+
+
+class _Maximo:
+    """Sorteio que sempre devolve o teto do intervalo (a maior espera possível)."""
+
+    def uniform(self, a, b):
+        return b
+
+
+class _Falhas:
+    """Função que levanta os erros programados e depois retorna 'ok'."""
+
+    def __init__(self, *erros):
+        self.erros = list(erros)
+        self.chamadas = 0
+
+    def __call__(self):
+        self.chamadas += 1
+        if self.erros:
+            raise self.erros.pop(0)
+        return 'ok'
+
+
+def _politica(valor, base_s=0.0, max_s=0.0, **kwargs):
+    return PoliticaRetentativa(parse_regras(valor, base_s, max_s), **kwargs)
+
+
+def test_parse_regras():
+    regras = parse_regras(' Timeout=2;conexao=3; infosimples:605, 609=1;lixo', base_s=0.1, max_s=1.0)
+
+    assert set(regras) == {'timeout', 'conexao', 'infosimples:605', 'infosimples:609'}
+    assert regras['timeout'] == RegraRetentativa(2, 0.1, 1.0)
+    assert regras['infosimples:609'].tentativas == 1
+    assert parse_regras('') == {}
+
+
+@pytest.mark.parametrize('tentativa, teto', [(0, 0.2), (1, 0.4), (2, 0.8), (3, 1.0), (10, 1.0)])
+def test_espera_exponencial_limitada(tentativa, teto):
+    regra = RegraRetentativa(5, base_s=0.2, max_s=1.0)
+
+    assert regra.espera(tentativa, _Maximo()) == pytest.approx(teto)
+    assert 0 <= regra.espera(tentativa) <= teto
+
+
+def test_erro_transitorio_e_recuperado():
+    politica = _politica('timeout=2')
+    funcao = _Falhas(ErroProvedor('lento', classe='timeout'), ErroProvedor('lento', classe='timeout'))
+
+    assert politica.executar(funcao) == 'ok'
+    assert funcao.chamadas == 3
+    assert politica.retentativas['timeout'] == 2
+    assert politica.recuperadas == 1
+    assert not politica.esgotadas
+
+
+@pytest.mark.parametrize('classe', [None, 'conexao', 'infosimples:601'])
+def test_erro_sem_regra_falha_na_hora(classe):
+    politica = _politica('timeout=2;infosimples:605=2')
+    funcao = _Falhas(ErroProvedor('falhou', classe=classe))
+
+    with pytest.raises(ErroProvedor, match='falhou'):
+        politica.executar(funcao)
+    assert funcao.chamadas == 1
+    assert not politica.retentativas
+
+
+def test_erro_que_nao_e_do_provedor_nao_e_repetido():
+    politica = _politica('timeout=2')
+    funcao = _Falhas(ValueError('bug'))
+
+    with pytest.raises(ValueError):
+        politica.executar(funcao)
+    assert funcao.chamadas == 1
+
+
+def test_tentativas_esgotadas():
+    politica = _politica('http_5xx=2')
+    funcao = _Falhas(*[ErroProvedor('HTTP 503', classe='http_5xx') for _ in range(5)])
+
+    with pytest.raises(ErroProvedor, match='HTTP 503'):
+        politica.executar(funcao)
+    assert funcao.chamadas == 3
+    assert politica.retentativas['http_5xx'] == 2
+    assert politica.esgotadas['http_5xx'] == 1
+    assert politica.recuperadas == 0
+
+
+def test_prazo_interrompe_as_retentativas():
+    # Espera sorteada (1 s) passaria do prazo (0,5 s): desiste sem dormir
+    politica = _politica('timeout=5', base_s=1.0, max_s=1.0, aleatorio=_Maximo())
+    funcao = _Falhas(*[ErroProvedor('lento', classe='timeout') for _ in range(5)])
+
+    inicio = time.monotonic()
+    with pytest.raises(ErroProvedor):
+        politica.executar(funcao, prazo=inicio + 0.5)
+    assert time.monotonic() - inicio < 0.5
+    assert funcao.chamadas == 1
+    assert politica.esgotadas['timeout'] == 1
+
+
+def test_repassa_argumentos():
+    politica = _politica('')
+
+    assert politica.executar(lambda a, b=0: a + b, 1, b=2) == 3
+
+
+def test_roteador_repete_no_mesmo_provedor_antes_do_fallback():
+    class Instavel(ProvedorMock):
+        nome = 'principal'
+        erros = [ErroProvedor('Timeout na consulta', classe='timeout')]
+
+        def consultar(self, consulta):
+            if self.erros:
+                raise self.erros.pop(0)
+            return super().consultar(consulta)
+
+    class Reserva(ProvedorMock):
+        nome = 'reserva'
+
+    politica = _politica('timeout=1')
+    roteador = RoteadorProvedores([Instavel(), Reserva()], {'*': ['principal', 'reserva']}, politica=politica)
+
+    resultado = roteador.consultar(Consulta('ABC1234', 'MG'))
+
+    assert resultado.provedor == 'principal'
+    assert politica.recuperadas == 1
+    assert roteador.estatisticas['reserva'].chamadas == 0